@@ -16,7 +16,9 @@ from wepy.runners.openmm import (
 
 from wepy.work_mapper.mapper import Mapper, TaskException
 from wepy.work_mapper.worker import Worker, WorkerMapper, WorkerException
-from wepy.work_mapper.task_mapper import TaskMapper, WalkerTaskProcess, TaskProcessException
+from wepy.work_mapper.task_mapper import (
+    TaskMapper, PoolTaskMapper, WalkerTaskProcess, TaskProcessException,
+)
 
 from wepy_tools.sim_makers.openmm.lennard_jones import LennardJonesPairOpenMMSimMaker
 from wepy_tools.sim_makers.openmm.lysozyme import LysozymeImplicitOpenMMSimMaker
@@ -28,6 +30,9 @@ N_STEPS_TEST = [100] # [5000, 10000, 20000]
 N_CYCLES_TEST = [100]
 SYSTEMS_TEST = [ 'LysozymeImplicit',] # 'LennardJonesPair',
 PLATFORMS_TEST = ['CPU'] #['OpenCL'] #['Reference', 'CPU', 'OpenCL']
+# None is never recycling the processes
+MAX_TASKS_PER_PROCESS_TEST = [None, 1]
+N_MAPS_TEST = 10
 
 
 def get_sim_maker(spec):
@@ -49,7 +54,7 @@ class TestBenchmark():
     @pytest.mark.parametrize('n_steps', N_STEPS_TEST)
     @pytest.mark.parametrize('platform', PLATFORMS_TEST)
     @pytest.mark.parametrize('system', SYSTEMS_TEST)
-    @pytest.mark.parametrize('mapper', ['TaskMapper', 'WorkerMapper'])
+    @pytest.mark.parametrize('mapper', ['TaskMapper', 'PoolTaskMapper', 'WorkerMapper'])
     def test_mappers(self, n_walkers, n_cycles, n_workers, n_steps, platform, system, mapper,
                     benchmark):
 
@@ -97,6 +102,11 @@ def task_pass(walker):
     n = walker.state['num']
     return Walker(WalkerState(**{'num' : n+1}), walker.weight)
 
+def task_noop(walker):
+
+    # return immediately so only the mapper overhead is measured
+    return walker
+
 class TestSimpleBenchmark():
 
     @pytest.mark.parametrize('n_walkers', N_WALKER_TESTS)
@@ -152,3 +162,75 @@ class TestSimpleBenchmark():
         result = benchmark(thunk)
 
         mapper.cleanup()
+
+    @pytest.mark.parametrize('n_walkers', N_WALKER_TESTS)
+    @pytest.mark.parametrize('n_workers', N_WORKER_TESTS)
+    @pytest.mark.parametrize('max_tasks_per_process', MAX_TASKS_PER_PROCESS_TEST)
+    def test_PoolTaskMapper(self, n_walkers, n_workers, max_tasks_per_process,
+                                 benchmark):
+
+        mapper = PoolTaskMapper(segment_func=task_pass,
+                                num_workers=n_workers,
+                                walker_task_type=WalkerTaskProcess,
+                                max_tasks_per_process=max_tasks_per_process)
+
+        mapper.init()
+
+        def thunk():
+
+            return mapper.map(gen_walkers(n_walkers))
+
+        benchmark(thunk)
+
+        mapper.cleanup()
+
+class TestOverheadBenchmark():
+    """Benchmarks of the overhead of the task mappers with tasks that
+    take no time, i.e. of starting processes and communicating with
+    them, over a number of cycles."""
+
+    @pytest.mark.parametrize('n_walkers', N_WALKER_TESTS)
+    @pytest.mark.parametrize('n_workers', N_WORKER_TESTS)
+    def test_TaskMapper(self, n_walkers, n_workers,
+                        benchmark):
+
+        mapper = TaskMapper(segment_func=task_noop,
+                            num_workers=n_workers,
+                            walker_task_type=WalkerTaskProcess)
+
+        mapper.init()
+
+        def thunk():
+
+            for _ in range(N_MAPS_TEST):
+                result = mapper.map(gen_walkers(n_walkers))
+
+            return result
+
+        benchmark(thunk)
+
+        mapper.cleanup()
+
+    @pytest.mark.parametrize('n_walkers', N_WALKER_TESTS)
+    @pytest.mark.parametrize('n_workers', N_WORKER_TESTS)
+    @pytest.mark.parametrize('max_tasks_per_process', MAX_TASKS_PER_PROCESS_TEST)
+    def test_PoolTaskMapper(self, n_walkers, n_workers, max_tasks_per_process,
+                            benchmark):
+
+        mapper = PoolTaskMapper(segment_func=task_noop,
+                                num_workers=n_workers,
+                                walker_task_type=WalkerTaskProcess,
+                                max_tasks_per_process=max_tasks_per_process)
+
+        mapper.init()
+
+        def thunk():
+
+            for _ in range(N_MAPS_TEST):
+                result = mapper.map(gen_walkers(n_walkers))
+
+            return result
+
+        benchmark(thunk)
+
+        mapper.cleanup()
@@ -93,6 +93,7 @@ setup(
     entry_points={
         'console_scripts' : [
             'wepy=wepy.__main__:cli',
+            'wepy-worker=wepy.work_mapper.cli:cli',
         ],
         'pytest11' : [
             'pytest-wepy=pytest_wepy',
@@ -393,6 +393,30 @@ class BoundaryConditions(object):
 
         raise NotImplementedError
 
+    def prepare_walker(self, walker_idx, walker):
+        """Do the work for a single walker of the next call to
+        `warp_walkers` ahead of time.
+
+        The simulation manager may call this for each walker as soon
+        as its segment has finished, so that the work overlaps with
+        the segments of the other walkers. The same walker objects
+        are then passed to `warp_walkers` which should give the same
+        results as if this was never called.
+
+        Does nothing by default.
+
+        Parameters
+        ----------
+        walker_idx : int
+            The index of the walker in the list that will be passed to
+            `warp_walkers`.
+
+        walker : object implementing the Walker interface
+
+        """
+
+        pass
+
     @classmethod
     def warping_discontinuity(cls, warping_record):
         """Given a warping record returns either True for a discontiuity
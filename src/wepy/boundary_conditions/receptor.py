@@ -127,6 +127,18 @@ class ReceptorBC(BoundaryConditions):
         else:
             self._initial_weights = initial_weights
 
+        # progress of walkers computed by `prepare_walker`, maps the
+        # walker index to the walker and its progress
+        self._prepared_progress = {}
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+
+        # boundary conditions pickled before walkers could be prepared
+        if not hasattr(self, '_prepared_progress'):
+            self._prepared_progress = {}
+
     @property
     def initial_states(self):
         """The possible initial states warped walkers may assume."""
@@ -241,6 +253,21 @@ class ReceptorBC(BoundaryConditions):
         # do nothing by default
         return []
 
+    def prepare_walker(self, walker_idx, walker):
+        """Compute the progress of a walker ahead of `warp_walkers`.
+
+        Parameters
+        ----------
+        walker_idx : int
+            The index of the walker in the list that will be passed to
+            `warp_walkers`.
+
+        walker : object implementing the Walker interface
+
+        """
+
+        self._prepared_progress[walker_idx] = (walker, self._progress(walker))
+
 
     def warp_walkers(self, walkers, cycle):
         """Test the progress of all the walkers, warp if required, and update
@@ -281,8 +308,20 @@ class ReceptorBC(BoundaryConditions):
         # continual, one record per call
         progress_data = defaultdict(list)
 
-        # calculate progress data
-        all_progress_data = [self._progress(w) for w in walkers]
+        # calculate progress data, using the progress of the walkers
+        # that were already prepared
+        prepared_progress = self._prepared_progress
+        self._prepared_progress = {}
+
+        all_progress_data = []
+        for walker_idx, walker in enumerate(walkers):
+
+            prepared = prepared_progress.get(walker_idx)
+
+            if prepared is not None and prepared[0] is walker:
+                all_progress_data.append(prepared[1])
+            else:
+                all_progress_data.append(self._progress(walker))
 
         for walker_idx, walker in enumerate(walkers):
 
@@ -382,6 +382,120 @@ Sporadic records can happen multiple or zero times per cycle and so
 require a special index for them which is contained in the extra
 dataset '_cycle_idxs'.
 
+Over-allocated Datasets
+^^^^^^^^^^^^^^^^^^^^^^^
+
+By default datasets are resized to exactly the number of frames (or
+records) in them every time data is added. When a WepyHDF5 object is
+made with a 'growth_policy' the datasets of trajectories, sparse
+fields, and record groups are instead grown in larger steps and only
+the beginning of them is in use. The number of frames in use is kept
+in the 'n_frames' attribute of the group they are in (i.e. the
+trajectory, sparse field, or record group). Groups without this
+attribute use all of their datasets.
+
+The API methods only return the frames in use, however datasets
+accessed directly through h5py may have extra frames at the end until
+they are trimmed with the 'compact' method.
+
+Cycle-major Runs
+^^^^^^^^^^^^^^^^
+
+Analysis often wants the data for all of the walkers of a cycle
+(e.g. for contigs and resampling) which in the layout described above
+is spread over one dataset per trajectory. Runs can instead be
+created with the 'cycles' layout (see 'new_run') where each field is a
+single dataset of shape (n_cycles, n_walkers, feature_vector_shape[0],
+...) chunked along the cycles, in the 'cycles' group of the run:
+
+- 0
+
+  - trajectories
+
+    - 0
+    - 1
+
+  - cycles
+
+    - positions
+    - weights
+    - box_vectors
+
+      - _sparse_idxs
+      - data
+
+The trajectory groups are still there for the metadata of each
+trajectory but have no fields, and the trajectory of walker 'i' is
+the column 'i' of each dataset. Sparse fields have values for all of
+the walkers at the cycles in their '_sparse_idxs'. The layout of a
+run is in its '_layout' attribute.
+
+Walkers may be added in later cycles, in which case their
+trajectories start at the cycle given for them in the
+'_traj_start_cycles' attribute of the cycles group and the rows
+before it are unused. The number of walkers can't decrease.
+
+The API methods for reading trajectory fields work the same for both
+layouts and runs can be converted between them with
+'convert_run_layout'.
+
+Field Storage Policies
+^^^^^^^^^^^^^^^^^^^^^^
+
+By default the datasets of trajectory fields are uncompressed and
+chunked by h5py. Since fields like positions and velocities of large
+systems make up most of a file, WepyHDF5 objects can be made with a
+'field_storage' mapping of field paths to storage policies that are
+used whenever a dataset for the field is created. A policy is a dict
+with any of the keys:
+
+- chunk_frames : the number of frames (or cycles for cycle-major
+  runs) in a chunk of the dataset. By default chunks of about 64 KiB
+  (1 MiB for cycle-major runs) are used. Compressed chunks are
+  compressed again every time frames are added to them, so large
+  chunks slow down writing compressed fields.
+- compression : an h5py compression filter, e.g. 'gzip' or 'lzf'
+- compression_opts : options for the compression filter, e.g. the
+  gzip level
+- shuffle : whether to apply the shuffle filter before compression
+- quantization : lossy storage of floating point fields, either
+  'float16' to store them as half precision floats or an int for
+  the number of decimal digits kept by fixed-point (HDF5
+  scale-offset) storage
+
+For example:
+
+    field_storage = {
+        'positions' : {'chunk_frames' : 64,
+                       'compression' : 'gzip',
+                       'shuffle' : True,
+                       'quantization' : 3},
+        'velocities' : {'compression' : 'lzf',
+                        'quantization' : 'float16'},
+    }
+
+keeps positions to the picometer (in nanometers). Policies are not
+saved in the file, fields added to an existing file without them are
+stored with the defaults. Fields stored as 'float16' are read back as
+'float16' arrays.
+
+Memory-mapped Access
+^^^^^^^^^^^^^^^^^^^^
+
+Reading a trajectory field normally copies it into a new numpy
+array. When a WepyHDF5 object is made with 'memmap=True' and opened
+read-only, fields stored in contiguous and unfiltered datasets are
+instead returned as read-only numpy memmaps of the file, so that
+repeated scans of a large file are served by the page cache of the
+operating system instead of allocations. All other datasets
+(e.g. chunked or compressed ones) are read through h5py as usual.
+
+Datasets are chunked while they are written so that they can grow,
+so to make use of this a finished file must first be compacted with
+'compact(contiguous=True)' which rewrites the unfiltered datasets of
+the runs contiguously. After that no more frames can be added to
+them.
+
 It is worth noting that the underlying methods for each record group
 are general. So while these are the official wepy record groups that
 are supported if there is a use-case that demands a new record group
@@ -396,7 +510,8 @@ import json
 from warnings import warn
 from copy import copy
 import logging
-import gc
+import multiprocessing as mp
+import concurrent.futures
 
 import numpy as np
 import h5py
@@ -454,6 +569,15 @@ ending simulation snapshot in orchestration."""
 TRAJ_IDX = 'traj_idx'
 """Metadata field for trajectory groups for the trajectory index in that run."""
 
+RUN_LAYOUT = '_layout'
+"""Attribute of run groups with the name of the group the trajectory
+field data is in, i.e. the layout of the run. Runs without it use the
+trajectories layout."""
+
+TRAJ_START_CYCLES = '_traj_start_cycles'
+"""Attribute of the cycles group of cycle-major runs with the cycle of
+the first frame of each trajectory."""
+
 ## Misc. Names
 
 CYCLE_IDX = 'cycle_idx'
@@ -500,6 +624,23 @@ CONTINUATIONS = 'continuations'
 TRAJECTORIES = 'trajectories'
 """Run field name for the trajectories group."""
 
+CYCLES = 'cycles'
+"""Run field name for the group of the trajectory fields of all
+walkers in cycle-major runs."""
+
+RUN_LAYOUTS = (TRAJECTORIES, CYCLES)
+"""The layouts runs can have, named by the group with the trajectory
+field data."""
+
+CYCLE_CHUNK_BYTES = 2**20
+"""The target size in bytes of the chunks of cycle-major datasets."""
+
+FIELD_CHUNK_BYTES = 2**16
+"""The target size in bytes of the chunks of trajectory datasets with
+a storage policy. These are kept small since the last chunk of a
+compressed dataset is compressed again each time frames are added to
+it."""
+
 INIT_WALKERS = 'init_walkers'
 """Run field name for the initial walkers group."""
 
@@ -637,6 +778,68 @@ DATA = 'data'
 SPARSE_IDXS = '_sparse_idxs'
 """Name of the dataset that indexes sparse trajectory fields."""
 
+N_FRAMES = 'n_frames'
+"""Name of the attribute of trajectory, sparse field, and record groups
+with the number of frames of their datasets in use when they are
+over-allocated."""
+
+OBSERVABLE_CHUNK_FRAMES = 1000
+"""The default number of frames of a trajectory an observable is
+computed for at a time by 'compute_observable_parallel'."""
+
+TRACE_READ_MAX_GAP = 64
+"""The largest number of unrequested frames between two requested
+frames of a dataset that are read together in a single hyperslab when
+reading the frames of a trace."""
+
+FIELD_STORAGE_KEYS = ('chunk_frames', 'compression', 'compression_opts',
+                      'shuffle', 'quantization')
+"""The options of the storage policies of trajectory fields."""
+
+FLOAT16 = 'float16'
+"""Quantization of field storage policies storing half precision
+floats."""
+
+MEMMAP_DTYPE_KINDS = ('i', 'u', 'f', 'c')
+"""The kinds of numpy dtypes of datasets which can be memory
+mapped. Other types (e.g. compound) may be stored differently in the
+file than in memory."""
+
+def _check_field_storage(field_storage):
+    """Check the storage policies of trajectory fields.
+
+    Parameters
+    ----------
+    field_storage : dict of str : dict of str : value
+
+    Raises
+    ------
+    ValueError
+        If a policy has unknown options or invalid values.
+
+    """
+
+    for field_path, policy in field_storage.items():
+
+        unknown_keys = set(policy.keys()).difference(FIELD_STORAGE_KEYS)
+        if len(unknown_keys) > 0:
+            raise ValueError("Unknown storage options for field {}: {}".format(
+                field_path, ', '.join(sorted(unknown_keys))))
+
+        chunk_frames = policy.get('chunk_frames')
+        if chunk_frames is not None and not (isinstance(chunk_frames, int) and
+                                             chunk_frames > 0):
+            raise ValueError("chunk_frames for field {} must be a positive int, "
+                             "not {}".format(field_path, chunk_frames))
+
+        quantization = policy.get('quantization')
+        if not (quantization is None or
+                quantization == FLOAT16 or
+                (isinstance(quantization, int) and quantization >= 0)):
+            raise ValueError("quantization for field {} must be None, '{}', or a "
+                             "non-negative int, not {}".format(field_path, FLOAT16,
+                                                               quantization))
+
 # utility for paths
 def _iter_field_paths(grp):
     """Return all subgroup field name paths from a group.
@@ -679,6 +882,486 @@ def _iter_field_paths(grp):
             field_paths.append(field_name)
     return field_paths
 
+def _fields_grp_field_paths(grp, sparse_fields):
+    """The paths of all the fields in a trajectory group, or the cycles
+    group of a cycle-major run, including sparse fields.
+
+    Parameters
+    ----------
+    grp : h5py.Group
+    sparse_fields : list of str
+
+    Returns
+    -------
+    field_paths : list of str
+
+    """
+
+    field_paths = []
+    for field_name, obj in grp.items():
+
+        if isinstance(obj, h5py.Dataset) or field_name in sparse_fields:
+            field_paths.append(field_name)
+
+        # compound fields
+        else:
+            for subfield in obj:
+                field_paths.append(field_name + '/' + subfield)
+
+    return field_paths
+
+def _read_n_frames_attr(grp):
+    """Read the number of frames in use of an over-allocated group.
+
+    The low-level h5py API is used since this is done for every
+    trajectory each cycle.
+
+    Parameters
+    ----------
+    grp : h5py.Group
+
+    Returns
+    -------
+    n_frames : int or None
+        None if the group is not over-allocated.
+
+    """
+
+    if not h5py.h5a.exists(grp.id, N_FRAMES.encode()):
+        return None
+
+    n_frames = np.empty((), dtype=np.int64)
+    h5py.h5a.open(grp.id, N_FRAMES.encode()).read(n_frames)
+
+    return int(n_frames)
+
+def _update_n_frames_attr(grp, n_frames, growth_policy):
+    """Set the number of frames in use of a group that is, or may become,
+    over-allocated.
+
+    Parameters
+    ----------
+    grp : h5py.Group
+    n_frames : int
+    growth_policy : None or 'double' or int
+        If None the attribute is only set if the group already has it.
+
+    """
+
+    if h5py.h5a.exists(grp.id, N_FRAMES.encode()):
+        h5py.h5a.open(grp.id, N_FRAMES.encode()).write(
+            np.array(n_frames, dtype=np.int64))
+
+    elif growth_policy is not None:
+        grp.attrs[N_FRAMES] = np.int64(n_frames)
+
+def _dataset_n_frames(grp, dset):
+    """The number of frames in use of a dataset of a group that may be
+    over-allocated.
+
+    Parameters
+    ----------
+    grp : h5py.Group
+        The trajectory, sparse field, or record group.
+    dset : h5py.Dataset
+        A dataset of the group (or one of its compound subgroups).
+
+    Returns
+    -------
+    n_frames : int
+
+    """
+
+    n_frames = _read_n_frames_attr(grp)
+
+    if n_frames is None:
+        return dset.shape[0]
+    else:
+        return min(n_frames, dset.shape[0])
+
+def _grown_n_frames(n_allocated, n_frames, growth_policy):
+    """The number of frames to allocate for a dataset so that it can hold
+    a number of frames.
+
+    Parameters
+    ----------
+    n_allocated : int
+        The number of frames currently allocated.
+    n_frames : int
+        The number of frames needed.
+    growth_policy : None or 'double' or int
+        See the WepyHDF5 constructor.
+
+    Returns
+    -------
+    n_allocated : int
+
+    """
+
+    if n_frames <= n_allocated:
+        return n_allocated
+
+    elif growth_policy is None:
+        return n_frames
+
+    elif growth_policy == 'double':
+        return max(n_frames, 2 * n_allocated)
+
+    # fixed size blocks
+    else:
+        return -(-n_frames // growth_policy) * growth_policy
+
+def _append_dataset_frames(dset, data, n_frames=None, growth_policy=None):
+    """Append frames of data after the frames in use of a resizable
+    dataset.
+
+    This uses the low-level h5py API which avoids most of the overhead
+    of selections in the high-level API for small appends.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Dataset with an unlimited first dimension.
+    data : numpy.ndarray
+        The frames to add, with the same feature dimensions as the dataset.
+    n_frames : int, optional
+        The number of frames of the dataset in use. If None all of
+        them are.
+    growth_policy : None or 'double' or int
+        How to grow the dataset when it is full, see the WepyHDF5
+        constructor. If None it is grown to exactly fit the data.
+
+    """
+
+    dset_id = dset.id
+    n_allocated = dset_id.shape[0]
+
+    if n_frames is None:
+        n_frames = n_allocated
+    else:
+        n_frames = min(n_frames, n_allocated)
+
+    n_new_allocated = _grown_n_frames(n_allocated, n_frames + data.shape[0],
+                                      growth_policy)
+
+    # empty datasets are initialized without their feature dimensions
+    # which are given by the maxshape instead
+    if all([i == 0 for i in dset_id.shape]):
+        feature_dims = dset.maxshape[1:]
+    else:
+        feature_dims = dset_id.shape[1:]
+
+    # strings and objects need the conversions of the high-level API
+    if data.dtype.kind in ('O', 'U'):
+        if n_new_allocated != n_allocated:
+            dset.resize( (n_new_allocated, *feature_dims) )
+        dset[n_frames:n_frames + data.shape[0], ...] = data
+        return
+
+    # like the high-level API allow data with extra single
+    # dimensions, e.g. values of shape (1, 1) for a field of shape (1,)
+    data = np.ascontiguousarray(data).reshape((data.shape[0], *feature_dims))
+
+    if n_new_allocated != n_allocated:
+        dset_id.set_extent( (n_new_allocated, *feature_dims) )
+
+    file_space = dset_id.get_space()
+    file_space.select_hyperslab((n_frames, *[0 for _ in feature_dims]), data.shape)
+
+    dset_id.write(h5py.h5s.create_simple(data.shape), file_space, data)
+
+def _trim_group_datasets(grp, n_frames):
+    """Resize the datasets of a group (and its compound subgroups) to a
+    number of frames if they are bigger.
+
+    Sparse field groups are skipped since their datasets are not
+    frame aligned with the group.
+
+    """
+
+    for obj in grp.values():
+
+        if isinstance(obj, h5py.Group):
+            if N_FRAMES not in obj.attrs and SPARSE_IDXS not in obj:
+                _trim_group_datasets(obj, n_frames)
+
+        elif obj.shape[0] > n_frames:
+            obj.resize( (n_frames, *obj.shape[1:]) )
+
+def _dataset_memmap(dset):
+    """Make a read-only memmap of a dataset if it is stored contiguously
+    and unfiltered in a regular file.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+
+    Returns
+    -------
+    memmap : numpy.memmap or None
+        None if the dataset can't be memory mapped.
+
+    """
+
+    if (dset.chunks is not None or
+        dset.dtype.kind not in MEMMAP_DTYPE_KINDS or
+        dset.file.driver != 'sec2'):
+        return None
+
+    dcpl = dset.id.get_create_plist()
+    if (dcpl.get_layout() != h5py.h5d.CONTIGUOUS or
+        dcpl.get_nfilters() > 0 or
+        dcpl.get_external_count() > 0):
+        return None
+
+    # not allocated in the file yet, e.g. empty
+    offset = dset.id.get_offset()
+    if offset is None:
+        return None
+
+    return np.memmap(dset.file.filename, dtype=dset.dtype, mode='r',
+                     offset=offset, shape=dset.shape)
+
+def _make_dataset_contiguous(grp, name, block_nbytes=2**26):
+    """Rewrite a chunked and unfiltered dataset of a group to be stored
+    contiguously.
+
+    Parameters
+    ----------
+    grp : h5py.Group
+
+    name : str
+        The name of the dataset in the group.
+
+    block_nbytes : int
+        The approximate size of the blocks of the dataset copied at a
+        time.
+
+    Returns
+    -------
+    rewritten : bool
+        False if the dataset was already contiguous, filtered, or
+        empty and wasn't rewritten.
+
+    """
+
+    dset = grp[name]
+
+    if (dset.chunks is None or
+        dset.id.get_create_plist().get_nfilters() > 0 or
+        dset.size == 0):
+        return False
+
+    tmp_name = '_{}_contiguous'.format(name)
+    new_dset = grp.create_dataset(tmp_name, shape=dset.shape, dtype=dset.dtype)
+
+    row_nbytes = max(1, dset.dtype.itemsize * (dset.size // dset.shape[0]))
+    block_rows = max(1, block_nbytes // row_nbytes)
+
+    for start in range(0, dset.shape[0], block_rows):
+        new_dset[start:start + block_rows] = dset[start:start + block_rows]
+
+    for key, value in dset.attrs.items():
+        new_dset.attrs[key] = value
+
+    del grp[name]
+    grp.move(tmp_name, name)
+
+    return True
+
+def _read_dataset_rows(dset, rows, max_gap=TRACE_READ_MAX_GAP, walker_idx=None):
+    """Read rows of a dataset with as few hyperslab reads as possible.
+
+    Rows which are close together are read as a single contiguous
+    hyperslab including the rows between them and the requested ones
+    are then taken in memory, which is much faster than the point
+    selections of h5py fancy indexing.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+    rows : numpy.ndarray of int
+        The indices of the rows to read, sorted and unique.
+    max_gap : int
+        The largest number of unrequested rows between two requested
+        rows read in the same hyperslab.
+    walker_idx : int, optional
+        For cycle-major datasets only read the values of this walker
+        (i.e. this index of the second dimension).
+
+    Returns
+    -------
+    data : numpy.ndarray
+        The rows in the order given.
+
+    """
+
+    if walker_idx is None:
+        walker_sel = ()
+    else:
+        walker_sel = (walker_idx,)
+
+    if len(rows) == 0:
+        return dset[(slice(0, 0), *walker_sel)]
+
+    # split into blocks where the gaps are too large
+    split_idxs = np.flatnonzero(np.diff(rows) > max_gap + 1) + 1
+    starts = np.concatenate(([0], split_idxs))
+    ends = np.concatenate((split_idxs, [len(rows)]))
+
+    blocks = []
+    for start, end in zip(starts, ends):
+
+        first_row = rows[start]
+        last_row = rows[end - 1]
+
+        block = dset[(slice(first_row, last_row + 1), *walker_sel)]
+
+        # only index if there are rows that weren't requested
+        if last_row - first_row + 1 != end - start:
+            block = block[rows[start:end] - first_row]
+
+        blocks.append(block)
+
+    if len(blocks) == 1:
+        return blocks[0]
+    else:
+        return np.concatenate(blocks)
+
+def _group_bounds(keys):
+    """The bounds of the runs of equal values in a sorted array.
+
+    Parameters
+    ----------
+    keys : numpy.ndarray
+
+    Returns
+    -------
+    starts : numpy.ndarray of int
+    ends : numpy.ndarray of int
+
+    """
+
+    starts = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+
+    if len(keys) > 0:
+        starts = np.concatenate(([0], starts))
+
+    ends = np.concatenate((starts[1:], [len(keys)])).astype(int)
+
+    return starts, ends[:len(starts)]
+
+def _frames_chunk_shape(feature_shape, dtype, n_frames=None):
+    """The chunk shape for a trajectory dataset with a storage policy.
+
+    Chunks have whole frames and as many of them as fit in
+    FIELD_CHUNK_BYTES (at least one) unless given.
+
+    Parameters
+    ----------
+    feature_shape : tuple of int
+    dtype : dtype_spec
+    n_frames : int, optional
+        The number of frames in a chunk.
+
+    Returns
+    -------
+    chunk_shape : tuple of int
+
+    """
+
+    if n_frames is None:
+        frame_nbytes = int(np.prod(feature_shape)) * np.dtype(dtype).itemsize
+
+        n_frames = max(1, FIELD_CHUNK_BYTES // max(1, frame_nbytes))
+
+    return (n_frames, *feature_shape)
+
+def _cycle_chunk_shape(n_walkers, feature_shape, dtype, n_cycles=None):
+    """The chunk shape for a cycle-major dataset.
+
+    Chunks have all of the walkers and as many cycles as fit in
+    CYCLE_CHUNK_BYTES (at least one) unless given.
+
+    Parameters
+    ----------
+    n_walkers : int
+    feature_shape : tuple of int
+    dtype : dtype_spec
+    n_cycles : int, optional
+        The number of cycles in a chunk.
+
+    Returns
+    -------
+    chunk_shape : tuple of int
+
+    """
+
+    n_walkers = max(1, n_walkers)
+
+    if n_cycles is None:
+        row_nbytes = n_walkers * int(np.prod(feature_shape)) * np.dtype(dtype).itemsize
+
+        n_cycles = max(1, CYCLE_CHUNK_BYTES // max(1, row_nbytes))
+
+    return (n_cycles, n_walkers, *feature_shape)
+
+# the file opened by each observable worker process
+_OBSERVABLE_WORKER_H5 = None
+
+def _init_observable_worker(filename):
+    """Open the WepyHDF5 file read-only in an observable worker
+    process."""
+
+    global _OBSERVABLE_WORKER_H5
+
+    _OBSERVABLE_WORKER_H5 = WepyHDF5(filename, mode='r', swmr_mode=True)
+    _OBSERVABLE_WORKER_H5.open()
+
+def _compute_observable_chunk(wepy_h5, func, fields, args, work_item):
+    """Compute an observable for a chunk of frames of a trajectory.
+
+    Parameters
+    ----------
+    wepy_h5 : WepyHDF5
+        The open file. If None the file of the worker process is used.
+    func : callable
+    fields : list of str
+    args : tuple
+    work_item : tuple of int
+        The (run_idx, traj_idx, start_frame, end_frame) of the chunk.
+
+    Returns
+    -------
+    work_item : tuple of int
+
+    values : numpy.ndarray
+        The values of the observable for the frames of the chunk.
+
+    """
+
+    if wepy_h5 is None:
+        wepy_h5 = _OBSERVABLE_WORKER_H5
+
+    run_idx, traj_idx, start, end = work_item
+
+    frames = np.arange(start, end)
+    frame_tups = np.column_stack((np.full(len(frames), run_idx),
+                                  np.full(len(frames), traj_idx),
+                                  frames))
+
+    fields_data = wepy_h5.get_trace_fields(frame_tups, fields)
+
+    values = np.asarray(func(fields_data, *args))
+
+    if values.shape[0] != len(frames):
+        raise ValueError("The observable function gave {} values for {} frames, "
+                         "it must give one value per frame".format(
+                             values.shape[0], len(frames)))
+
+    return work_item, values
+
+
 class WepyHDF5(object):
     """Wrapper for h5py interface to an HDF5 file object for creation and
     access of WepyHDF5 data.
@@ -705,7 +1388,11 @@ class WepyHDF5(object):
                  n_dims=None,
                  alt_reps=None, main_rep_idxs=None,
                  swmr_mode=False,
-                 expert_mode=False
+                 expert_mode=False,
+                 growth_policy=None,
+                 compact_on_close=True,
+                 memmap=False,
+                 field_storage=None,
     ):
         """Constructor for the WepyHDF5 class.
 
@@ -762,6 +1449,32 @@ class WepyHDF5(object):
             If True no initialization is performed other than the
             setting of the filename. Useful mainly for debugging.
 
+        growth_policy : None or 'double' or int
+            How trajectory and record datasets are grown when data is
+            added to them. If None they are resized to exactly fit the
+            data each time. If 'double' they are doubled in size when
+            they are full and if an int they are grown in blocks of
+            that many frames. See the module documentation on
+            over-allocated datasets.
+
+        compact_on_close : bool
+            If True and a 'growth_policy' is given, over-allocated
+            datasets are trimmed with the 'compact' method when the
+            file is closed in a write mode. Set this to False when
+            opening and closing the file repeatedly while adding data.
+
+        memmap : bool
+            If True and the file is opened read-only, trajectory fields
+            in contiguous unfiltered datasets are returned as read-only
+            memmaps instead of copies. See the module documentation on
+            memory-mapped access.
+
+        field_storage : dict of str : dict of str : value, optional
+            Mapping of trajectory field paths to the storage policies
+            (chunking, compression, and quantization) of their
+            datasets. See the module documentation on field storage
+            policies.
+
         Raises
         ------
 
@@ -771,6 +1484,12 @@ class WepyHDF5(object):
         AssertionError
             If a topology is not given for a creation mode.
 
+        ValueError
+            If the growth policy is not valid.
+
+        ValueError
+            If a field storage policy is not valid.
+
         Warns
         -----
 
@@ -778,9 +1497,29 @@ class WepyHDF5(object):
 
         """
 
+        # set before anything can raise so that closing the object
+        # when it is deleted doesn't fail
+        self.closed = True
+
         self._filename = filename
         self._swmr_mode = swmr_mode
 
+        if not (growth_policy is None or
+                growth_policy == 'double' or
+                (isinstance(growth_policy, int) and growth_policy > 0)):
+            raise ValueError("growth_policy must be None, 'double', or a positive int,"
+                             " not {}".format(growth_policy))
+
+        self._growth_policy = growth_policy
+        self._compact_on_close = compact_on_close
+        self._memmap = memmap
+
+        if field_storage is None:
+            field_storage = {}
+
+        _check_field_storage(field_storage)
+        self._field_storage = field_storage
+
         if expert_mode is True:
             self._h5 = None
             self._wepy_mode = None
@@ -932,6 +1671,20 @@ class WepyHDF5(object):
     def swmr_mode(self, val):
         self._swmr_mode = val
 
+    @property
+    def field_storage(self):
+        """The storage policies of trajectory fields."""
+        return self._field_storage
+
+    @property
+    def memmap(self):
+        """Whether trajectory fields are memory mapped when possible."""
+        return self._memmap
+
+    @memmap.setter
+    def memmap(self, val):
+        self._memmap = val
+
 
     # TODO custom deepcopy to avoid copying the actual HDF5 object
 
@@ -1385,15 +2138,63 @@ class WepyHDF5(object):
         else:
             return False
 
-    def _init_traj_field(self, run_idx, traj_idx, field_path, feature_shape, dtype):
-        """Initialize a trajectory field.
-
-        Initialize a data field in the trajectory to be empty but
-        resizeable.
+    def _field_dataset_kwargs(self, field_path, feature_shape, dtype, n_walkers=None):
+        """The keyword arguments for creating a dataset of a trajectory
+        field according to its storage policy.
 
         Parameters
         ----------
-        run_idx : int
+        field_path : str
+        feature_shape : tuple of int
+        dtype : dtype_spec
+            The dtype of the data of the field.
+        n_walkers : int, optional
+            The number of walkers for datasets of cycle-major runs.
+
+        Returns
+        -------
+        dset_kwargs : dict of str : value
+            Keyword arguments for h5py.Group.create_dataset including
+            the dtype and chunks.
+
+        """
+
+        policy = self._field_storage.get(field_path, {})
+
+        dset_kwargs = {}
+
+        quantization = policy.get('quantization')
+        if quantization == FLOAT16:
+            dtype = np.float16
+        elif quantization is not None:
+            dset_kwargs['scaleoffset'] = quantization
+
+        dset_kwargs['dtype'] = dtype
+
+        # chunks are left to h5py for fields without a policy
+        chunk_frames = policy.get('chunk_frames')
+        if n_walkers is not None:
+            dset_kwargs['chunks'] = _cycle_chunk_shape(n_walkers, feature_shape, dtype,
+                                                       n_cycles=chunk_frames)
+        elif len(policy) > 0:
+            dset_kwargs['chunks'] = _frames_chunk_shape(feature_shape, dtype,
+                                                        n_frames=chunk_frames)
+
+        for key in ('compression', 'compression_opts', 'shuffle'):
+            if policy.get(key) is not None:
+                dset_kwargs[key] = policy[key]
+
+        return dset_kwargs
+
+    def _init_traj_field(self, run_idx, traj_idx, field_path, feature_shape, dtype):
+        """Initialize a trajectory field.
+
+        Initialize a data field in the trajectory to be empty but
+        resizeable.
+
+        Parameters
+        ----------
+        run_idx : int
         traj_idx : int
         field_path : str
             Field name specification.
@@ -1433,8 +2234,9 @@ class WepyHDF5(object):
 
         # create the empty dataset in the correct group, setting
         # maxshape so it can be resized for new feature vectors to be added
-        traj_grp.create_dataset(field_path, (0, *[0 for i in shape]), dtype=dtype,
-                           maxshape=(None, *shape))
+        traj_grp.create_dataset(field_path, (0, *[0 for i in shape]),
+                           maxshape=(None, *shape),
+                           **self._field_dataset_kwargs(field_path, shape, dtype))
 
 
     def _init_sparse_traj_field(self, run_idx, traj_idx, field_path, shape, dtype):
@@ -1469,8 +2271,9 @@ class WepyHDF5(object):
             sparse_grp = traj_grp.create_group(field_path)
 
             # create the dataset for the feature data
-            sparse_grp.create_dataset(DATA, (0, *[0 for i in shape]), dtype=dtype,
-                               maxshape=(None, *shape))
+            sparse_grp.create_dataset(DATA, (0, *[0 for i in shape]),
+                               maxshape=(None, *shape),
+                               **self._field_dataset_kwargs(field_path, shape, dtype))
 
             # create the dataset for the sparse indices
             sparse_grp.create_dataset(SPARSE_IDXS, (0,), dtype=np.int, maxshape=(None,))
@@ -1526,6 +2329,9 @@ class WepyHDF5(object):
         # get the traj group
         traj_grp = self._h5['{}/{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES, traj_idx)]
 
+        dset_kwargs = self._field_dataset_kwargs(field_path, field_data.shape[1:],
+                                                 field_data.dtype)
+
         # if it is a sparse dataset we need to add the data and add
         # the idxs in a group
         if sparse_idxs is None:
@@ -1536,9 +2342,10 @@ class WepyHDF5(object):
             # user know that they will have to delete the dataset if
             # they want to change it to something else
             try:
-                dset = traj_grp.require_dataset(field_path, shape=field_data.shape, dtype=field_data.dtype,
+                dset = traj_grp.require_dataset(field_path, shape=field_data.shape,
                                          exact=True,
-                                         maxshape=(None, *field_data.shape[1:]))
+                                         maxshape=(None, *field_data.shape[1:]),
+                                         **dset_kwargs)
             except TypeError:
                 raise TypeError("For changing the contents of a trajectory field it must be the same shape and dtype.")
 
@@ -1550,7 +2357,8 @@ class WepyHDF5(object):
             sparse_grp = traj_grp.create_group(field_path)
             # add the data to this group
             sparse_grp.create_dataset(DATA, data=field_data,
-                                      maxshape=(None, *field_data.shape[1:]))
+                                      maxshape=(None, *field_data.shape[1:]),
+                                      **dset_kwargs)
             # add the sparse idxs
             sparse_grp.create_dataset(SPARSE_IDXS, data=sparse_idxs,
                                       maxshape=(None,))
@@ -1573,13 +2381,34 @@ class WepyHDF5(object):
         traj_grp = self.h5['{}/{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES, traj_idx)]
         field = traj_grp[field_path]
 
+        self._extend_contiguous_field_dataset(field, field_data,
+                                              n_frames=_dataset_n_frames(traj_grp, field),
+                                              growth_policy=self._growth_policy)
+
+    @staticmethod
+    def _extend_contiguous_field_dataset(field, field_data,
+                                         n_frames=None, growth_policy=None):
+        """Add multiple new frames worth of data to the end of the dataset
+        of a contiguous (non-sparse) trajectory field.
+
+        Parameters
+        ----------
+        field : h5py.Dataset
+            The dataset for the field.
+        field_data : numpy.array
+            The frames of data to add.
+        n_frames : int, optional
+            The number of frames of the dataset in use. If None all of
+            them are.
+        growth_policy : None or 'double' or int
+            How to grow the dataset, see the constructor.
+
+        """
+
         # make sure this is a feature vector
         assert len(field_data.shape) > 1, \
             "field_data must be a feature vector with the same number of dimensions as the number"
 
-        # of datase new frames
-        n_new_frames = field_data.shape[0]
-
         # check the field to make sure it is not empty
         if all([i == 0 for i in field.shape]):
 
@@ -1588,28 +2417,18 @@ class WepyHDF5(object):
             assert field_data.shape[1:] == field.maxshape[1:], \
                 "field feature dimensions must be the same, i.e. all but the first dimension"
 
-            # if it is empty resize it to make an array the size of
-            # the new field_data with the maxshape for the feature
-            # dimensions
-            feature_dims = field.maxshape[1:]
-            field.resize( (n_new_frames, *feature_dims) )
-
-            # set the new data to this
-            field[0:, ...] = field_data
-
         else:
             # make sure the new data has the right dimensions against
             # the shape it already has
             assert field_data.shape[1:] == field.shape[1:], \
                 "field feature dimensions must be the same, i.e. all but the first dimension"
 
-
-            # append to the dataset on the first dimension, keeping the
-            # others the same, these must be feature vectors and therefore
-            # must exist
-            field.resize( (field.shape[0] + n_new_frames, *field.shape[1:]) )
-            # add the new data
-            field[-n_new_frames:, ...] = field_data
+        # append to the dataset on the first dimension, keeping the
+        # others the same, these must be feature vectors and
+        # therefore must exist. Empty datasets get their feature
+        # dimensions from the new data
+        _append_dataset_frames(field, field_data,
+                               n_frames=n_frames, growth_policy=growth_policy)
 
     def _extend_sparse_traj_field(self, run_idx, traj_idx, field_path, values, sparse_idxs):
         """Add multiple new frames worth of data to the end of an existing
@@ -1630,11 +2449,31 @@ class WepyHDF5(object):
 
         field = self.h5['{}/{}/{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES, traj_idx, field_path)]
 
+        self._extend_sparse_field_grp(field, values, sparse_idxs,
+                                      growth_policy=self._growth_policy)
+
+    @staticmethod
+    def _extend_sparse_field_grp(field, values, sparse_idxs, growth_policy=None):
+        """Add multiple new frames worth of data to the end of the group of
+        a sparse trajectory field.
+
+        Parameters
+        ----------
+        field : h5py.Group
+            The group for the sparse field.
+        values : numpy.array
+            The frames of data to add.
+        sparse_idxs : list of int
+            The cycle indices the values correspond to.
+        growth_policy : None or 'double' or int
+            How to grow the datasets, see the constructor.
+
+        """
+
         field_data = field[DATA]
         field_sparse_idxs = field[SPARSE_IDXS]
 
-        # number of new frames
-        n_new_frames = values.shape[0]
+        n_frames = _dataset_n_frames(field, field_data)
 
         # if this sparse_field has been initialized empty we need to resize
         if all([i == 0 for i in field_data.shape]):
@@ -1646,33 +2485,200 @@ class WepyHDF5(object):
                 "input value features have shape {}, expected {}".format(
                     values.shape[1:], field_data.maxshape[1:])
 
-            # if it is empty resize it to make an array the size of
-            # the new values with the maxshape for the feature
-            # dimensions
-            feature_dims = field_data.maxshape[1:]
-            field_data.resize( (n_new_frames, *feature_dims) )
-
-            # set the new data to this
-            field_data[0:, ...] = values
-
         else:
 
             # make sure the new data has the right dimensions
             assert values.shape[1:] == field_data.shape[1:], \
                 "field feature dimensions must be the same, i.e. all but the first dimension"
 
-            # append to the dataset on the first dimension, keeping the
-            # others the same, these must be feature vectors and therefore
-            # must exist
-            field_data.resize( (field_data.shape[0] + n_new_frames, *field_data.shape[1:]) )
-            # add the new data
-            field_data[-n_new_frames:, ...] = values
+        # append to the dataset on the first dimension, keeping the
+        # others the same, empty datasets get their feature
+        # dimensions from the new data
+        _append_dataset_frames(field_data, values,
+                               n_frames=n_frames, growth_policy=growth_policy)
 
         # add the sparse idxs in the same way
-        field_sparse_idxs.resize( (field_sparse_idxs.shape[0] + n_new_frames,
-                                   *field_sparse_idxs.shape[1:]) )
-        # add the new data
-        field_sparse_idxs[-n_new_frames:, ...] = sparse_idxs
+        _append_dataset_frames(field_sparse_idxs,
+                               np.asarray(sparse_idxs, dtype=field_sparse_idxs.dtype),
+                               n_frames=n_frames, growth_policy=growth_policy)
+
+        _update_n_frames_attr(field, n_frames + values.shape[0], growth_policy)
+
+    def _init_cycles_field(self, run_idx, field_path, n_cycles, n_walkers,
+                           feature_shape, dtype):
+        """Initialize a trajectory field of a cycle-major run.
+
+        Contiguous fields are initialized with rows for the cycles
+        already in the run so that they stay aligned with the other
+        fields.
+
+        Parameters
+        ----------
+        run_idx : int
+        field_path : str
+        n_cycles : int
+            The number of cycles in the run.
+        n_walkers : int
+        feature_shape : tuple of int
+        dtype : dtype_spec
+
+        """
+
+        cycles_grp = self.run_cycles(run_idx)
+
+        dset_kwargs = self._field_dataset_kwargs(field_path, feature_shape, dtype,
+                                                 n_walkers=n_walkers)
+
+        if field_path in self.sparse_fields:
+
+            sparse_grp = cycles_grp.create_group(field_path)
+
+            sparse_grp.create_dataset(DATA, (0, n_walkers, *feature_shape),
+                                      maxshape=(None, None, *feature_shape),
+                                      **dset_kwargs)
+
+            sparse_grp.create_dataset(SPARSE_IDXS, (0,), dtype=np.int, maxshape=(None,))
+
+        else:
+            cycles_grp.create_dataset(field_path, (n_cycles, n_walkers, *feature_shape),
+                                      maxshape=(None, None, *feature_shape),
+                                      **dset_kwargs)
+
+    def _extend_cycles(self, run_idx, cycle_data, weights, metadata=None):
+        """Add a cycle to a cycle-major run, see `extend_cycle`."""
+
+        if metadata is None:
+            metadata = {}
+
+        n_walkers = weights.shape[0]
+
+        run_grp = self.run(run_idx)
+        trajs_grp = run_grp[TRAJECTORIES]
+        cycles_grp = run_grp[CYCLES]
+
+        n_trajs = len(trajs_grp)
+
+        if n_walkers < n_trajs:
+            raise ValueError("Cycle-major runs can't have fewer walkers than trajectories,"
+                             " {} walkers given for {} trajectories".format(n_walkers, n_trajs))
+
+        n_cycles = self.num_run_cycles(run_idx)
+
+        # the new walkers get trajectory groups for their metadata
+        if n_walkers > n_trajs:
+            cycles_grp.attrs[TRAJ_START_CYCLES] = np.concatenate(
+                (self._run_traj_start_cycles(run_idx),
+                 np.full(n_walkers - n_trajs, n_cycles))).astype(np.int64)
+
+        for walker_idx in range(n_trajs, n_walkers):
+
+            traj_grp = trajs_grp.create_group(str(walker_idx))
+
+            traj_grp.attrs[RUN_IDX] = run_idx
+            traj_grp.attrs[TRAJ_IDX] = walker_idx
+
+            for key, val in metadata.items():
+                if not key in [RUN_IDX, TRAJ_IDX]:
+                    traj_grp.attrs[key] = val
+                else:
+                    warn("run_idx and traj_idx are used by wepy and cannot be set", RuntimeWarning)
+
+        # these are read from the file settings so only do it once
+        sparse_fields = set(self.sparse_fields)
+
+        fields_data = dict(cycle_data)
+        fields_data[WEIGHTS] = weights
+
+        for field_path, field_data in fields_data.items():
+
+            if not field_path in cycles_grp:
+
+                # if in SWMR mode you cannot create groups so if we
+                # are in SWMR mode raise a warning that the data won't
+                # be recorded
+                if self.swmr_mode:
+                    warn("New datasets cannot be created while in SWMR mode.  The field {} will"
+                    "not be saved. If you want to save this it must be"
+                         "previously created".format(field_path))
+                    continue
+
+                # the weights are not in the settings
+                if field_path != WEIGHTS:
+                    self._set_new_field_settings(field_path,
+                                                 field_data.shape[1:], field_data.dtype)
+
+                self._init_cycles_field(run_idx, field_path, n_cycles, n_walkers,
+                                        field_data.shape[1:], field_data.dtype)
+
+            if field_path in sparse_fields:
+                dset = cycles_grp[field_path][DATA]
+            else:
+                dset = cycles_grp[field_path]
+
+            # make room for new walkers
+            if dset.shape[1] < n_walkers:
+                dset.resize(n_walkers, axis=1)
+
+            if field_path in sparse_fields:
+                self._extend_sparse_field_grp(cycles_grp[field_path],
+                                              field_data[np.newaxis],
+                                              np.array([n_cycles]),
+                                              growth_policy=self._growth_policy)
+            else:
+                _append_dataset_frames(dset, field_data[np.newaxis],
+                                       n_frames=n_cycles,
+                                       growth_policy=self._growth_policy)
+
+        _update_n_frames_attr(cycles_grp, n_cycles + 1, self._growth_policy)
+
+    def _set_new_field_settings(self, field_path, feature_shape, feature_dtype):
+        """Check the settings for a field which is being added to a
+        trajectory for the first time and set the ones which are
+        determined at runtime.
+
+        Parameters
+        ----------
+        field_path : str
+        feature_shape : tuple of int
+        feature_dtype : dtype_spec
+
+        Raises
+        ------
+        ValueError
+            If the field is not in the settings and is not an observable.
+
+        """
+
+        # not specified as sparse_field, no settings
+        if (not field_path in self.field_feature_shapes) and \
+             (not field_path in self.field_feature_dtypes) and \
+             not field_path in self.sparse_fields:
+            # only save if it is an observable
+            is_observable = False
+            if '/' in field_path:
+                group_name = field_path.split('/')[0]
+                if group_name == OBSERVABLES:
+                    is_observable = True
+            if is_observable:
+                  warn("the field '{}' was received but not previously specified"
+                       " but is being added because it is in observables.".format(field_path))
+                  # save sparse_field flag, shape, and dtype
+                  self._add_sparse_field_flag(field_path)
+                  self._set_field_feature_shape(field_path, feature_shape)
+                  self._set_field_feature_dtype(field_path, feature_dtype)
+            else:
+                raise ValueError("the field '{}' was received but not previously specified"
+                    "it is being ignored because it is not an observable.".format(field_path))
+
+        # specified as sparse_field but no settings given
+        elif (self.field_feature_shapes[field_path] is None and
+           self.field_feature_dtypes[field_path] is None) and \
+           field_path in self.sparse_fields:
+            # set the feature shape and dtype since these
+            # should be 0 in the settings
+            self._set_field_feature_shape(field_path, feature_shape)
+
+            self._set_field_feature_dtype(field_path, feature_dtype)
 
     def _add_sparse_field_flag(self, field_path):
         """Register a trajectory field as sparse in the header settings.
@@ -1783,7 +2789,7 @@ class WepyHDF5(object):
             self._add_field_feature_dtype(field_path, field_feature_dtype)
 
     def _extend_run_record_data_field(self, run_idx, run_record_key,
-                                          field_name, field_data):
+                                          field_name, field_data, n_records=None):
         """Primitive record append method.
 
         Adds data for a single field dataset in a run records group. This
@@ -1799,6 +2805,9 @@ class WepyHDF5(object):
             Name of the field in the record group to add to.
         field_data : arraylike
             The data to add to the field.
+        n_records : int, optional
+            The number of records of the dataset in use, the data is
+            added after these. If None all of them are.
 
         """
 
@@ -1812,36 +2821,29 @@ class WepyHDF5(object):
         # of datase new frames
         n_new_frames = field_data.shape[0]
 
+        if n_records is None:
+            n_records = field.shape[0]
+        else:
+            n_records = min(n_records, field.shape[0])
+
         # check whether it is a variable length record, by getting the
         # record dataset dtype and using the checker to see if it is
         # the vlen special type in h5py
         if h5py.check_dtype(vlen=field.dtype) is not None:
 
             # if it is we have to treat it differently, since it
-            # cannot be multidimensional
-
-            # if the dataset has no data in it we need to reshape it
-            if all([i == 0 for i in field.shape]):
-                # initialize this array
-                # if it is empty resize it to make an array the size of
-                # the new field_data with the maxshape for the feature
-                # dimensions
-                field.resize( (n_new_frames,) )
-
-                # set the new data to this
-                for i, row in enumerate(field_data):
-                    field[i] = row
+            # cannot be multidimensional, so grow the array if there
+            # isn't space for the new records (an empty dataset has
+            # space for none)
+            n_allocated = _grown_n_frames(field.shape[0], n_records + n_new_frames,
+                                          self._growth_policy)
 
-            # otherwise just add the data
-            else:
-
-                # resize the array but it is only of rank because
-                # of variable length data
-                field.resize( (field.shape[0] + n_new_frames, ) )
+            if n_allocated != field.shape[0]:
+                field.resize( (n_allocated, ) )
 
-                # add each row to the newly made space
-                for i, row in enumerate(field_data):
-                    field[(field.shape[0] - 1) + i] = row
+            # add each row to the space after the records
+            for i, row in enumerate(field_data):
+                field[n_records + i] = row
 
         # if it is not variable length we don't have to treat it
         # differently
@@ -1855,24 +2857,12 @@ class WepyHDF5(object):
                 assert field_data.shape[1:] == field.maxshape[1:], \
                     "field feature dimensions must be the same, i.e. all but the first dimension"
 
-                # if it is empty resize it to make an array the size of
-                # the new field_data with the maxshape for the feature
-                # dimensions
-                feature_dims = field.maxshape[1:]
-                field.resize( (n_new_frames, *feature_dims) )
-
-                # set the new data to this
-                field[0:, ...] = field_data
-
-            # otherwise just add the data
-            else:
-                # append to the dataset on the first dimension, keeping the
-                # others the same, these must be feature vectors and therefore
-                # must exist
-                field.resize( (field.shape[0] + n_new_frames, *field.shape[1:]) )
-                # add the new data
-                field[-n_new_frames:, ...] = field_data
-
+            # append to the dataset on the first dimension, keeping
+            # the others the same, these must be feature vectors and
+            # therefore must exist
+            _append_dataset_frames(field, field_data,
+                                   n_frames=n_records,
+                                   growth_policy=self._growth_policy)
 
     def _run_record_namedtuple(self, run_record_key):
         """Generate a namedtuple record type for a record group.
@@ -1934,10 +2924,13 @@ class WepyHDF5(object):
         rec_grp = self.records_grp(run_idx, run_record_key)
         dset = rec_grp[record_field]
 
+        # only the records in use
+        n_records = _dataset_n_frames(rec_grp, dset)
+
         # if it is variable length or if it has more than one element
         # cast all elements to tuples
         if h5py.check_dtype(vlen=dset.dtype) is not None:
-            rec_dset = [tuple(value) for value in dset[:]]
+            rec_dset = [tuple(value) for value in dset[:n_records]]
 
         # if it is not variable length make sure it is not more than a
         # 1D feature vector
@@ -1950,12 +2943,12 @@ class WepyHDF5(object):
         # if it is only a rank 1 feature vector and it has more than
         # one element make a tuple out of it
         elif dset.shape[1] > 1:
-            rec_dset = [tuple(value) for value in dset[:]]
+            rec_dset = [tuple(value) for value in dset[:n_records]]
 
         # otherwise just get the single value instead of keeping it as
         # a single valued feature vector
         else:
-            rec_dset = [value[0] for value in dset[:]]
+            rec_dset = [value[0] for value in dset[:n_records]]
 
         return rec_dset
 
@@ -2079,7 +3072,8 @@ class WepyHDF5(object):
 
             # get the cycle idxs for this run
             rec_grp = self.records_grp(run_idx, run_record_key)
-            run_cycle_idxs = rec_grp[CYCLE_IDXS][:]
+            cycle_idxs_dset = rec_grp[CYCLE_IDXS]
+            run_cycle_idxs = cycle_idxs_dset[:_dataset_n_frames(rec_grp, cycle_idxs_dset)]
 
             # add the total number of cycles that came before this run
             # to each of the cycle idxs to get the cycle_idxs in terms
@@ -2154,7 +3148,8 @@ class WepyHDF5(object):
 
             # make the cycle idxs from that
             run_rec_grp = self.records_grp(run_idx, run_record_key)
-            run_cycle_idxs = np.array(range(run_rec_grp[main_record_field].shape[0]))
+            run_cycle_idxs = np.array(range(
+                _dataset_n_frames(run_rec_grp, run_rec_grp[main_record_field])))
 
             # add the total number of cycles that came before this run
             # to each of the cycle idxs to get the cycle_idxs in terms
@@ -2194,15 +3189,111 @@ class WepyHDF5(object):
 
         """
 
-        full_path = '{}/{}/{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES, traj_idx, field_path)
+        # in cycle-major runs the trajectory is a column of the
+        # dataset starting at the cycle it was added in
+        if self.run_layout(run_idx) == CYCLES:
+
+            cycles_grp = self.run_cycles(run_idx)
+            dset = cycles_grp[field_path]
+            n_cycles = _dataset_n_frames(cycles_grp, dset)
+            dset = self._dataset_array(dset)
+
+            start_cycle = self._traj_start_cycle(run_idx, traj_idx)
+
+            if frames is None:
+                field = dset[start_cycle:n_cycles, traj_idx]
+            else:
+                field = dset[[start_cycle + frame for frame in frames], traj_idx]
+
+            return field
+
+        traj_path = '{}/{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES, traj_idx)
+        traj_grp = self._h5[traj_path]
+        dset = traj_grp[field_path]
+        n_frames = _dataset_n_frames(traj_grp, dset)
+        dset = self._dataset_array(dset)
 
         if frames is None:
-            field = self._h5[full_path][:]
+            field = dset[:n_frames]
         else:
-            field = self._h5[full_path][list(frames)]
+            field = dset[list(frames)]
 
         return field
 
+    def _dataset_array(self, dset):
+        """The array to read the data of a dataset from.
+
+        Parameters
+        ----------
+        dset : h5py.Dataset
+
+        Returns
+        -------
+        array : numpy.memmap or h5py.Dataset
+            A memmap of the dataset if memory mapping is on, the file
+            is read-only, and the dataset can be mapped, otherwise the
+            dataset.
+
+        """
+
+        if self._memmap and self._h5.mode == 'r':
+            memmap = _dataset_memmap(dset)
+
+            if memmap is not None:
+                return memmap
+
+        return dset
+
+    def _sparse_traj_field(self, run_idx, traj_idx, field_path):
+        """Get the datasets of a sparse trajectory field.
+
+        Parameters
+        ----------
+        run_idx : int
+        traj_idx : int
+        field_path : str
+
+        Returns
+        -------
+        data_dset : h5py.Dataset
+            The dataset with the values.
+
+        walker_idx : int or None
+            For cycle-major runs the index of the trajectory in the
+            second dimension of the dataset.
+
+        row_offset : int
+            The row of the dataset with the first value of the
+            trajectory.
+
+        sparse_idxs : numpy.ndarray of int
+            The frame indices of the values of the trajectory, which
+            are in the rows following the row offset.
+
+        """
+
+        if self.run_layout(run_idx) == CYCLES:
+
+            field = self.run_cycles(run_idx)[field_path]
+
+            n_values = _dataset_n_frames(field, field[DATA])
+            sparse_cycle_idxs = field[SPARSE_IDXS][:n_values]
+
+            # the cycles are in order so the values for the
+            # trajectory are the ones after it was added
+            start_cycle = self._traj_start_cycle(run_idx, traj_idx)
+            row_offset = int(np.searchsorted(sparse_cycle_idxs, start_cycle))
+
+            return (field[DATA], traj_idx, row_offset,
+                    sparse_cycle_idxs[row_offset:] - start_cycle)
+
+        traj_path = '{}/{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES, traj_idx)
+        field = self._h5[traj_path][field_path]
+
+        n_values = _dataset_n_frames(field, field[DATA])
+
+        return field[DATA], None, 0, field[SPARSE_IDXS][:n_values]
+
     def _get_sparse_traj_field(self, run_idx, traj_idx, field_path, frames=None, masked=True):
         """Access actual data for a trajectory field.
 
@@ -2227,44 +3318,52 @@ class WepyHDF5(object):
 
         """
 
-        traj_path = '{}/{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES, traj_idx)
-        traj_grp = self.h5[traj_path]
-        field = traj_grp[field_path]
+        n_frames = self.num_traj_frames(run_idx, traj_idx)
+
+        data_dset, walker_idx, row_offset, sparse_idxs = \
+                                self._sparse_traj_field(run_idx, traj_idx, field_path)
+
+        # empty datasets are initialized without their feature dimensions
+        if walker_idx is None:
+            feature_dims = 1
+        else:
+            feature_dims = 2
 
-        n_frames = traj_grp[POSITIONS].shape[0]
+        if data_dset.shape[0] == 0:
+            feature_shape = data_dset.maxshape[feature_dims:]
+        else:
+            feature_shape = data_dset.shape[feature_dims:]
 
         if frames is None:
-            data = field[DATA][:]
+            data = _read_dataset_rows(data_dset,
+                                      row_offset + np.arange(len(sparse_idxs)),
+                                      walker_idx=walker_idx).reshape((-1, *feature_shape))
 
             # if it is to be masked make the masked array
             if masked:
-                sparse_idxs = field[SPARSE_IDXS][:]
 
-                filled_data = np.full( (n_frames, *data.shape[1:]), np.nan)
+                filled_data = np.full( (n_frames, *feature_shape), np.nan)
                 filled_data[sparse_idxs] = data
 
-                mask = np.full( (n_frames, *data.shape[1:]), True)
+                mask = np.full( (n_frames, *feature_shape), True)
                 mask[sparse_idxs] = False
 
                 data = np.ma.masked_array(filled_data, mask=mask)
 
         else:
 
-            # get the sparse idxs and the frames to slice from the
-            # data
-            sparse_idxs = field[SPARSE_IDXS][:]
+            # we get the rows of the data table that we are to slice
+            # from
+            sparse_frame_idxs = np.flatnonzero(np.isin(sparse_idxs, frames))
 
-            # we get a boolean array of the rows of the data table
-            # that we are to slice from
-            sparse_frame_idxs = np.argwhere(np.isin(sparse_idxs, frames))
-
-            data = field[DATA][list(sparse_frame_idxs)]
+            data = _read_dataset_rows(data_dset, row_offset + sparse_frame_idxs,
+                                      walker_idx=walker_idx).reshape((-1, *feature_shape))
 
             # if it is to be masked make the masked array
             if masked:
                 # the empty arrays the size of the number of requested frames
-                filled_data = np.full( (len(frames), *field[DATA].shape[1:]), np.nan)
-                mask = np.full( (len(frames), *field[DATA].shape[1:]), True )
+                filled_data = np.full( (len(frames), *feature_shape), np.nan)
+                mask = np.full( (len(frames), *feature_shape), True )
 
                 # take the data which exists and is part of the frames
                 # selection, and put it into the filled data where it is
@@ -2362,6 +3461,11 @@ class WepyHDF5(object):
                                                   traj_idx, traj_data.shape[0],
                                                   self.num_run_cycles(run_idx)))
 
+        # cycle-major runs have a single dataset for all the trajectories
+        if self.run_layout(run_idx) == CYCLES:
+            self._add_cycles_field_data(run_idx, field_path, data, sparse_idxs=sparse_idxs)
+            return
+
         # add it to each traj
         for i, idx_tup in enumerate(self.run_traj_idx_tuples([run_idx])):
             if sparse_idxs is None:
@@ -2370,6 +3474,59 @@ class WepyHDF5(object):
                 self._add_traj_field_data(*idx_tup, field_path, data[i],
                                           sparse_idxs=sparse_idxs[i])
 
+    def _add_cycles_field_data(self, run_idx, field_path, data, sparse_idxs=None):
+        """Add a trajectory field to all trajectories of a cycle-major run.
+
+        Parameters
+        ----------
+        run_idx : int
+        field_path : str
+        data : list of arraylike
+            The data for each trajectory, which must be for all of
+            its frames.
+        sparse_idxs : None
+            Sparse fields can't be added to cycle-major runs.
+
+        """
+
+        if sparse_idxs is not None:
+            raise ValueError("Sparse fields can't be added to cycle-major runs, convert "
+                             "the run to the trajectories layout first")
+
+        n_cycles = self.num_run_cycles(run_idx)
+        start_cycles = self._run_traj_start_cycles(run_idx)
+
+        data = [np.asarray(traj_data) for traj_data in data]
+
+        for traj_idx, traj_data in enumerate(data):
+            if traj_data.shape[0] != n_cycles - start_cycles[traj_idx]:
+                raise ValueError("The number of frames in data for traj {}, {}, is different "
+                                 "than the number of frames of the trajectory, {}".format(
+                                     traj_idx, traj_data.shape[0],
+                                     n_cycles - start_cycles[traj_idx]))
+
+        feature_shape = data[0].shape[1:]
+
+        dset_kwargs = self._field_dataset_kwargs(field_path, feature_shape, data[0].dtype,
+                                                 n_walkers=len(data))
+
+        cycles_grp = self.run_cycles(run_idx)
+
+        if field_path in cycles_grp:
+            dset = cycles_grp[field_path]
+
+            if dset.shape[2:] != feature_shape or dset.dtype != dset_kwargs['dtype']:
+                raise TypeError("For changing the contents of a trajectory field it must be "
+                                "the same shape and dtype.")
+        else:
+            dset = cycles_grp.create_dataset(
+                field_path, (n_cycles, len(data), *feature_shape),
+                maxshape=(None, None, *feature_shape),
+                **dset_kwargs)
+
+        for traj_idx, traj_data in enumerate(data):
+            dset[start_cycles[traj_idx]:n_cycles, traj_idx] = traj_data
+
     def _add_field(self, field_path, data, sparse_idxs=None,
                    force=False):
         """Add a trajectory field to all runs in a file.
@@ -2432,56 +3589,367 @@ class WepyHDF5(object):
             raise IOError("This file is already open")
 
     def close(self):
-        """Close the underlying HDF5 file. """
+        """Close the underlying HDF5 file.
+
+        If the file is open for writing with a growth policy and
+        'compact_on_close' it is compacted first.
+
+        """
         if not self.closed:
+
+            if (self._compact_on_close and
+                self._growth_policy is not None and
+                self._h5.mode == 'r+'):
+                self.compact()
+
             self._h5.flush()
             self._h5.close()
             self.closed = True
 
-    @property
-    def mode(self):
-        """The WepyHDF5 mode this object was created with."""
-        return self._wepy_mode
+    def compact(self, contiguous=False):
+        """Trim over-allocated datasets to the frames (and records) in
+        use.
 
-    @mode.setter
-    def mode(self, mode):
-        """Set the mode for opening the file with."""
-        self.set_mode(mode)
+        Afterwards the file has the same layout as one that was written
+        without a growth policy. Note that HDF5 doesn't give freed
+        space back to the filesystem, use a tool like 'h5repack' to
+        shrink the file itself.
 
-    def set_mode(self, mode):
-        """Set the mode for opening the file with."""
+        Parameters
+        ----------
+        contiguous : bool
+            If True also rewrite the unfiltered datasets of the runs to
+            be stored contiguously so that they can be memory
+            mapped. Contiguous datasets can't be resized so no more
+            data can be added to them.
 
-        if not self.closed:
-            raise AttributeError("Cannot set the mode while the file is open.")
+        """
 
-        self._set_h5_mode(mode)
+        over_allocated_grps = []
 
-        self._wepy_mode = mode
+        def collect_grp(name, obj):
+            if isinstance(obj, h5py.Group) and N_FRAMES in obj.attrs:
+                over_allocated_grps.append(obj)
 
-    @property
-    def h5_mode(self):
-        """The h5py.File mode the HDF5 file currently has."""
-        return self._h5.mode
+        self._h5[RUNS].visititems(collect_grp)
 
-    def _set_h5_mode(self, h5_mode):
-        """Set the mode to open the HDF5 file with.
+        for grp in over_allocated_grps:
+            _trim_group_datasets(grp, int(grp.attrs[N_FRAMES]))
 
-        This really shouldn't be set without using the main wepy mode
-        as they need to be aligned.
+        for grp in over_allocated_grps:
+            del grp.attrs[N_FRAMES]
 
-        """
+        if contiguous:
 
-        if not self.closed:
-            raise AttributeError("Cannot set the mode while the file is open.")
+            dset_paths = []
 
-        self._h5py_mode = h5_mode
+            def collect_dset(name, obj):
+                if isinstance(obj, h5py.Dataset):
+                    dset_paths.append(obj.name)
 
-    @property
-    def h5(self):
-        """The underlying h5py.File object."""
-        return self._h5
+            self._h5[RUNS].visititems(collect_dset)
 
-    ### h5py object access
+            for dset_path in dset_paths:
+                grp_path, name = dset_path.rsplit('/', 1)
+                _make_dataset_contiguous(self._h5[grp_path], name)
+
+    def convert_run_layout(self, run_idx, layout):
+        """Convert the trajectory field data of a run to another layout.
+
+        The data is copied in blocks of cycles so that the whole run
+        is never in memory. As with 'compact' the freed space is not
+        given back to the filesystem, use a tool like 'h5repack' to
+        shrink the file itself.
+
+        To convert to the cycles layout all of the trajectories must
+        end at the last cycle of the run and have the same fields,
+        and sparse fields must have values for all of the walkers
+        at the same cycles.
+
+        Parameters
+        ----------
+        run_idx : int
+        layout : 'trajectories' or 'cycles'
+            The layout to convert to, see the module documentation.
+
+        Raises
+        ------
+        ValueError
+            If the layout is unknown or the run can't be stored in it.
+
+        """
+
+        if layout not in RUN_LAYOUTS:
+            raise ValueError("layout must be one of {}, not {}".format(RUN_LAYOUTS, layout))
+
+        if layout == self.run_layout(run_idx):
+            return
+
+        if layout == CYCLES:
+            self._convert_run_to_cycles(run_idx)
+        else:
+            self._convert_run_to_trajectories(run_idx)
+
+    def _convert_run_to_cycles(self, run_idx):
+        """Convert a run from the trajectories to the cycles layout, see
+        `convert_run_layout`."""
+
+        run_grp = self.run(run_idx)
+        traj_idxs = self.run_traj_idxs(run_idx)
+        n_trajs = len(traj_idxs)
+
+        sparse_fields = set(self.sparse_fields)
+
+        start_cycles = self._run_traj_start_cycles(run_idx)
+
+        if n_trajs > 0:
+            n_cycles = max(self.num_traj_frames(run_idx, traj_idx) for traj_idx in traj_idxs)
+        else:
+            n_cycles = 0
+
+        field_paths = []
+        for traj_idx in traj_idxs:
+            for field_path in _fields_grp_field_paths(self.traj(run_idx, traj_idx),
+                                                      sparse_fields):
+                if field_path not in field_paths:
+                    field_paths.append(field_path)
+
+        # check that the run can be converted and get the rows of
+        # each field for each trajectory, before changing anything
+        field_rows = {}
+        for field_path in field_paths:
+
+            for traj_idx in traj_idxs:
+                if field_path not in self.traj(run_idx, traj_idx):
+                    raise ValueError("Trajectory {} doesn't have the field {}, all of the "
+                                     "trajectories must have the same fields".format(
+                                         traj_idx, field_path))
+
+            if field_path not in sparse_fields:
+                field_rows[field_path] = np.arange(n_cycles)
+                continue
+
+            traj_cycle_idxs = [start_cycles[traj_idx] +
+                               self.get_traj_field_cycle_idxs(run_idx, traj_idx, field_path)
+                               for traj_idx in traj_idxs]
+
+            cycle_idxs = np.unique(np.concatenate(traj_cycle_idxs)).astype(int)
+
+            for traj_idx in traj_idxs:
+                if not np.array_equal(np.sort(traj_cycle_idxs[traj_idx]),
+                                      cycle_idxs[cycle_idxs >= start_cycles[traj_idx]]):
+                    raise ValueError("The sparse field {} doesn't have values for all "
+                                     "of the walkers at the same cycles".format(field_path))
+
+            field_rows[field_path] = cycle_idxs
+
+        cycles_grp = run_grp.create_group(CYCLES)
+
+        for field_path in field_paths:
+
+            rows = field_rows[field_path]
+
+            # the functions to read the values of each trajectory in
+            # the order of the rows
+            traj_readers = []
+            for traj_idx in traj_idxs:
+
+                traj_grp = self.traj(run_idx, traj_idx)
+
+                if field_path in sparse_fields:
+                    traj_dset = traj_grp[field_path][DATA]
+
+                    cycle_order = np.argsort(self.get_traj_field_cycle_idxs(
+                        run_idx, traj_idx, field_path), kind='stable')
+
+                    # the values are usually already in order
+                    if not np.array_equal(cycle_order, np.arange(len(cycle_order))):
+                        traj_dset = traj_dset[:len(cycle_order)][cycle_order]
+                else:
+                    traj_dset = traj_grp[field_path]
+
+                traj_readers.append(traj_dset)
+
+            # the feature shape and dtype from the first trajectory,
+            # empty datasets are initialized without their feature
+            # dimensions
+            first_dset = traj_readers[0]
+            if first_dset.shape[0] == 0 and isinstance(first_dset, h5py.Dataset):
+                feature_shape = first_dset.maxshape[1:]
+            else:
+                feature_shape = first_dset.shape[1:]
+            dset_kwargs = self._field_dataset_kwargs(field_path, feature_shape,
+                                                     first_dset.dtype, n_walkers=n_trajs)
+
+            if field_path in sparse_fields:
+                sparse_grp = cycles_grp.create_group(field_path)
+                sparse_grp.create_dataset(SPARSE_IDXS, data=rows, dtype=np.int,
+                                          maxshape=(None,))
+                dset = sparse_grp.create_dataset(DATA, (len(rows), n_trajs, *feature_shape),
+                                                 maxshape=(None, None, *feature_shape),
+                                                 **dset_kwargs)
+            else:
+                dset = cycles_grp.create_dataset(field_path, (len(rows), n_trajs, *feature_shape),
+                                                 maxshape=(None, None, *feature_shape),
+                                                 **dset_kwargs)
+
+            # the first row of each trajectory
+            row_offsets = np.searchsorted(rows, start_cycles)
+
+            block_rows = dset.chunks[0]
+            for block_start in range(0, len(rows), block_rows):
+                block_end = min(block_start + block_rows, len(rows))
+
+                block = np.zeros((block_end - block_start, n_trajs, *feature_shape),
+                                 dtype=first_dset.dtype)
+
+                for traj_idx, traj_dset in enumerate(traj_readers):
+
+                    first_row = max(block_start, row_offsets[traj_idx])
+
+                    if first_row < block_end:
+                        block[first_row - block_start:, traj_idx] = \
+                            traj_dset[first_row - row_offsets[traj_idx]:
+                                      block_end - row_offsets[traj_idx]]
+
+                dset[block_start:block_end] = block
+
+        # the trajectory groups are only kept for their metadata
+        for traj_idx in traj_idxs:
+
+            traj_grp = self.traj(run_idx, traj_idx)
+
+            for key in list(traj_grp.keys()):
+                del traj_grp[key]
+
+            if N_FRAMES in traj_grp.attrs:
+                del traj_grp.attrs[N_FRAMES]
+
+        cycles_grp.attrs[TRAJ_START_CYCLES] = start_cycles.astype(np.int64)
+
+        run_grp.attrs[RUN_LAYOUT] = CYCLES
+
+    def _convert_run_to_trajectories(self, run_idx):
+        """Convert a run from the cycles to the trajectories layout, see
+        `convert_run_layout`."""
+
+        run_grp = self.run(run_idx)
+        cycles_grp = run_grp[CYCLES]
+        traj_idxs = self.run_traj_idxs(run_idx)
+
+        sparse_fields = set(self.sparse_fields)
+
+        n_cycles = self.num_run_cycles(run_idx)
+        start_cycles = self._run_traj_start_cycles(run_idx)
+
+        for field_path in _fields_grp_field_paths(cycles_grp, sparse_fields):
+
+            if field_path in sparse_fields:
+                field = cycles_grp[field_path]
+                n_rows = _dataset_n_frames(field, field[DATA])
+                rows = field[SPARSE_IDXS][:n_rows]
+                dset = field[DATA]
+            else:
+                n_rows = n_cycles
+                rows = np.arange(n_cycles)
+                dset = cycles_grp[field_path]
+
+            feature_shape = dset.shape[2:]
+
+            dset_kwargs = self._field_dataset_kwargs(field_path, feature_shape, dset.dtype)
+
+            # the first row of each trajectory
+            row_offsets = np.searchsorted(rows, start_cycles)
+
+            traj_dsets = []
+            for traj_idx in traj_idxs:
+
+                traj_grp = self.traj(run_idx, traj_idx)
+                n_values = n_rows - row_offsets[traj_idx]
+
+                if field_path in sparse_fields:
+                    sparse_grp = traj_grp.create_group(field_path)
+                    sparse_grp.create_dataset(SPARSE_IDXS,
+                                              data=rows[row_offsets[traj_idx]:] -
+                                                   start_cycles[traj_idx],
+                                              maxshape=(None,))
+                    traj_dset = sparse_grp.create_dataset(DATA, (n_values, *feature_shape),
+                                                          maxshape=(None, *feature_shape),
+                                                          **dset_kwargs)
+                else:
+                    traj_dset = traj_grp.create_dataset(field_path, (n_values, *feature_shape),
+                                                        maxshape=(None, *feature_shape),
+                                                        **dset_kwargs)
+
+                traj_dsets.append(traj_dset)
+
+            if dset.chunks is not None:
+                block_size = dset.chunks[0]
+            else:
+                block_size = max(1, n_rows)
+
+            for block_start in range(0, n_rows, block_size):
+                block_end = min(block_start + block_size, n_rows)
+
+                block = dset[block_start:block_end]
+
+                for traj_idx, traj_dset in enumerate(traj_dsets):
+
+                    first_row = max(block_start, row_offsets[traj_idx])
+
+                    if first_row < block_end:
+                        traj_dset[first_row - row_offsets[traj_idx]:
+                                  block_end - row_offsets[traj_idx]] = \
+                            block[first_row - block_start:, traj_idx]
+
+        del run_grp[CYCLES]
+
+        del run_grp.attrs[RUN_LAYOUT]
+
+    @property
+    def mode(self):
+        """The WepyHDF5 mode this object was created with."""
+        return self._wepy_mode
+
+    @mode.setter
+    def mode(self, mode):
+        """Set the mode for opening the file with."""
+        self.set_mode(mode)
+
+    def set_mode(self, mode):
+        """Set the mode for opening the file with."""
+
+        if not self.closed:
+            raise AttributeError("Cannot set the mode while the file is open.")
+
+        self._set_h5_mode(mode)
+
+        self._wepy_mode = mode
+
+    @property
+    def h5_mode(self):
+        """The h5py.File mode the HDF5 file currently has."""
+        return self._h5.mode
+
+    def _set_h5_mode(self, h5_mode):
+        """Set the mode to open the HDF5 file with.
+
+        This really shouldn't be set without using the main wepy mode
+        as they need to be aligned.
+
+        """
+
+        if not self.closed:
+            raise AttributeError("Cannot set the mode while the file is open.")
+
+        self._h5py_mode = h5_mode
+
+    @property
+    def h5(self):
+        """The underlying h5py.File object."""
+        return self._h5
+
+    ### h5py object access
 
     def run(self, run_idx):
         """Get the h5py.Group for a run.
@@ -2526,6 +3994,97 @@ class WepyHDF5(object):
         """
         return self._h5['{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES)]
 
+    def run_layout(self, run_idx):
+        """The layout of the trajectory field data of a run.
+
+        Parameters
+        ----------
+        run_idx : int
+
+        Returns
+        -------
+        layout : str
+            'trajectories' or 'cycles', see the module documentation.
+
+        """
+        return self.run(run_idx).attrs.get(RUN_LAYOUT, TRAJECTORIES)
+
+    def run_cycles(self, run_idx):
+        """Get the cycles group of a cycle-major run.
+
+        Parameters
+        ----------
+        run_idx : int
+
+        Returns
+        -------
+        cycles_grp : h5py.Group
+
+        """
+        return self._h5['{}/{}/{}'.format(RUNS, run_idx, CYCLES)]
+
+    def _traj_fields_grp(self, run_idx, traj_idx):
+        """The group the fields of a trajectory are in.
+
+        For cycle-major runs this is the cycles group which has the
+        fields of all of the trajectories.
+
+        Parameters
+        ----------
+        run_idx : int
+        traj_idx : int
+
+        Returns
+        -------
+        fields_grp : h5py.Group
+
+        """
+
+        if self.run_layout(run_idx) == CYCLES:
+            return self.run_cycles(run_idx)
+        else:
+            return self.traj(run_idx, traj_idx)
+
+    def _traj_start_cycle(self, run_idx, traj_idx):
+        """The cycle of the first frame of a trajectory of a cycle-major
+        run."""
+
+        return int(self._run_traj_start_cycles(run_idx)[traj_idx])
+
+    def _run_traj_start_cycles(self, run_idx):
+        """The cycles of the first frames of all the trajectories of a run.
+
+        For runs with the trajectories layout trajectories are taken
+        to end at the last cycle of the run.
+
+        Parameters
+        ----------
+        run_idx : int
+
+        Returns
+        -------
+        start_cycles : numpy.ndarray of int
+
+        """
+
+        traj_idxs = self.run_traj_idxs(run_idx)
+
+        if self.run_layout(run_idx) == CYCLES:
+            cycles_grp = self.run_cycles(run_idx)
+
+            if TRAJ_START_CYCLES in cycles_grp.attrs:
+                return np.array(cycles_grp.attrs[TRAJ_START_CYCLES], dtype=int)
+            else:
+                return np.zeros(len(traj_idxs), dtype=int)
+
+        n_frames = np.array([self.num_traj_frames(run_idx, traj_idx)
+                             for traj_idx in traj_idxs], dtype=int)
+
+        if len(n_frames) == 0:
+            return n_frames
+
+        return n_frames.max() - n_frames
+
     @property
     def runs(self):
         """The runs group."""
@@ -2798,8 +4357,9 @@ class WepyHDF5(object):
 
         n_trajs = self.num_trajs
         field_names = Counter()
-        for traj in self.iter_trajs():
-            for name in list(traj['observables']):
+        for run_idx, traj_idx in self.run_traj_idx_tuples():
+            traj_fields_grp = self._traj_fields_grp(run_idx, traj_idx)
+            for name in list(traj_fields_grp['observables']):
                 field_names[name] += 1
 
         # if any of the field names has not occured for every
@@ -3231,6 +4791,10 @@ class WepyHDF5(object):
             raise ValueError(
                 f"Run {run_idx} has {self.num_run_cycles(run_idx)} cycles, {cycle_idx} requested")
 
+        # walkers can only be added in cycle-major runs
+        if self.run_layout(run_idx) == CYCLES:
+            return int(np.count_nonzero(self._run_traj_start_cycles(run_idx) <= cycle_idx))
+
         # TODO: currently we do not have a well-defined mechanism for
         # actually storing variable number of walkers in the
         # trajectory data so just return the number of trajectories
@@ -3262,6 +4826,16 @@ class WepyHDF5(object):
         n_cycles : int
 
         """
+
+        if self.run_layout(run_idx) == CYCLES:
+            cycles_grp = self.run_cycles(run_idx)
+
+            # no cycles have been added yet
+            if POSITIONS not in cycles_grp:
+                return 0
+
+            return _dataset_n_frames(cycles_grp, cycles_grp[POSITIONS])
+
         return self.num_traj_frames(run_idx, 0)
 
     def num_traj_frames(self, run_idx, traj_idx):
@@ -3277,7 +4851,13 @@ class WepyHDF5(object):
         n_frames : int
 
         """
-        return self.traj(run_idx, traj_idx)[POSITIONS].shape[0]
+
+        if self.run_layout(run_idx) == CYCLES:
+            return self.num_run_cycles(run_idx) - self._traj_start_cycle(run_idx, traj_idx)
+
+        traj_grp = self.traj(run_idx, traj_idx)
+
+        return _dataset_n_frames(traj_grp, traj_grp[POSITIONS])
 
     @property
     def run_idxs(self):
@@ -3341,17 +4921,18 @@ class WepyHDF5(object):
 
         """
 
-        traj_path = '{}/{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES, traj_idx)
-
-        if not field_path in self._h5[traj_path]:
+        if not field_path in self._traj_fields_grp(run_idx, traj_idx):
             raise KeyError("key for field {} not found".format(field_path))
 
         # if the field is not sparse just return the cycle indices for
         # that run
         if field_path not in self.sparse_fields:
-            cycle_idxs = np.array(range(self.num_run_cycles(run_idx)))
+            if self.run_layout(run_idx) == CYCLES:
+                cycle_idxs = np.arange(self.num_traj_frames(run_idx, traj_idx))
+            else:
+                cycle_idxs = np.array(range(self.num_run_cycles(run_idx)))
         else:
-            cycle_idxs = self._h5[traj_path][field_path][SPARSE_IDXS][:]
+            _, _, _, cycle_idxs = self._sparse_traj_field(run_idx, traj_idx, field_path)
 
         return cycle_idxs
 
@@ -3872,7 +5453,7 @@ class WepyHDF5(object):
         continuations_dset.resize((continuations_dset.shape[0] + 1, continuations_dset.shape[1],))
         continuations_dset[continuations_dset.shape[0] - 1] = np.array([continuation_run, base_run])
 
-    def new_run(self, init_walkers, continue_run=None, **kwargs):
+    def new_run(self, init_walkers, continue_run=None, layout=TRAJECTORIES, **kwargs):
         """Initialize a new run.
 
         Parameters
@@ -3881,6 +5462,10 @@ class WepyHDF5(object):
             The walkers that will be the start of this run.
         continue_run : int, optional
             If this run is a continuation of another set which one it is continuing.
+        layout : 'trajectories' or 'cycles'
+            How the trajectory field data is stored, see the module
+            documentation. The trajectories of cycle-major runs can
+            only be added to with 'extend_cycle'.
 
         kwargs : dict
             Metadata to set for the run.
@@ -3898,6 +5483,9 @@ class WepyHDF5(object):
                 raise ValueError("The continue_run idx given, {}, is not present in this file".format(
                     continue_run))
 
+        if layout not in RUN_LAYOUTS:
+            raise ValueError("layout must be one of {}, not {}".format(RUN_LAYOUTS, layout))
+
         # get the index for this run
         new_run_idx = self.next_run_idx()
 
@@ -3913,6 +5501,11 @@ class WepyHDF5(object):
         # initialize the walkers group
         traj_grp = run_grp.create_group(TRAJECTORIES)
 
+        # the fields of cycle-major runs are all in one group
+        if layout == CYCLES:
+            run_grp.create_group(CYCLES)
+            run_grp.attrs[RUN_LAYOUT] = layout
+
 
         # run the initialization routines for adding a run
         self._add_run_init(new_run_idx, continue_run=continue_run)
@@ -4251,6 +5844,9 @@ class WepyHDF5(object):
 
         """
 
+        if self.run_layout(run_idx) == CYCLES:
+            raise ValueError("Trajectories can only be added to cycle-major runs with extend_cycle")
+
         # convenient alias
         traj_data = data
 
@@ -4306,12 +5902,17 @@ class WepyHDF5(object):
         # add datasets to the traj group
 
         # weights
-        traj_grp.create_dataset(WEIGHTS, data=weights, dtype=WEIGHT_DTYPE,
-                                maxshape=(None, *WEIGHT_SHAPE))
+        traj_grp.create_dataset(WEIGHTS, data=weights,
+                                maxshape=(None, *WEIGHT_SHAPE),
+                                **self._field_dataset_kwargs(WEIGHTS, WEIGHT_SHAPE,
+                                                             WEIGHT_DTYPE))
         # positions
 
         positions_shape = traj_data[POSITIONS].shape
 
+        # read from the file settings so only do it once
+        sparse_fields = self.sparse_fields
+
         # add the rest of the traj_data
         for field_path, field_data in traj_data.items():
 
@@ -4322,7 +5923,7 @@ class WepyHDF5(object):
             # we still need to initialize it as a sparse field so it
             # can be extended properly so we make sparse_idxs to match
             # the full length of this initial trajectory data
-            elif field_path in self.sparse_fields:
+            elif field_path in sparse_fields:
                 field_sparse_idxs = np.arange(positions_shape[0])
             # otherwise it is not a sparse field so we just pass in None
             else:
@@ -4334,7 +5935,7 @@ class WepyHDF5(object):
         ## initialize empty sparse fields
         # get the sparse field datasets that haven't been initialized
         traj_init_fields = list(sparse_idxs.keys()) + list(traj_data.keys())
-        uninit_sparse_fields = set(self.sparse_fields).difference(traj_init_fields)
+        uninit_sparse_fields = set(sparse_fields).difference(traj_init_fields)
         # the shapes
         uninit_sparse_shapes = [self.field_feature_shapes[field] for field in uninit_sparse_fields]
         # the dtypes
@@ -4363,6 +5964,9 @@ class WepyHDF5(object):
         if self._wepy_mode == 'c-':
             assert self._append_flags[dataset_key], "dataset is not available for appending to"
 
+        if self.run_layout(run_idx) == CYCLES:
+            raise ValueError("Trajectories of cycle-major runs can only be extended with extend_cycle")
+
         # convenient alias
         traj_data = data
 
@@ -4393,13 +5997,10 @@ class WepyHDF5(object):
 
         # append to the dataset on the first dimension, keeping the
         # others the same, if they exist
-        if len(weights_ds.shape) > 1:
-            weights_ds.resize( (weights_ds.shape[0] + n_new_frames, *weights_ds.shape[1:]) )
-        else:
-            weights_ds.resize( (weights_ds.shape[0] + n_new_frames, ) )
-
-        # add the new data
-        weights_ds[-n_new_frames:, ...] = weights
+        _append_dataset_frames(weights_ds,
+                               weights.reshape((n_new_frames, *weights_ds.shape[1:])),
+                               n_frames=n_frames,
+                               growth_policy=self._growth_policy)
 
 
         # add the other fields
@@ -4421,45 +6022,119 @@ class WepyHDF5(object):
                     feature_shape = field_data.shape[1:]
                     feature_dtype = field_data.dtype
 
-                    # not specified as sparse_field, no settings
-                    if (not field_path in self.field_feature_shapes) and \
-                         (not field_path in self.field_feature_dtypes) and \
-                         not field_path in self.sparse_fields:
-                        # only save if it is an observable
-                        is_observable = False
-                        if '/' in field_path:
-                            group_name = field_path.split('/')[0]
-                            if group_name == OBSERVABLES:
-                                is_observable = True
-                        if is_observable:
-                              warn("the field '{}' was received but not previously specified"
-                                   " but is being added because it is in observables.".format(field_path))
-                              # save sparse_field flag, shape, and dtype
-                              self._add_sparse_field_flag(field_path)
-                              self._set_field_feature_shape(field_path, feature_shape)
-                              self._set_field_feature_dtype(field_path, feature_dtype)
-                        else:
-                            raise ValueError("the field '{}' was received but not previously specified"
-                                "it is being ignored because it is not an observable.".format(field_path))
-
-                    # specified as sparse_field but no settings given
-                    elif (self.field_feature_shapes[field_path] is None and
-                       self.field_feature_dtypes[field_path] is None) and \
-                       field_path in self.sparse_fields:
-                        # set the feature shape and dtype since these
-                        # should be 0 in the settings
-                        self._set_field_feature_shape(field_path, feature_shape)
-
-                        self._set_field_feature_dtype(field_path, feature_dtype)
+                    self._set_new_field_settings(field_path, feature_shape, feature_dtype)
 
                     # initialize
                     self._init_traj_field(run_idx, traj_idx, field_path, feature_shape, feature_dtype)
 
             # extend it either as a sparse field or a contiguous field
             if field_path in self.sparse_fields:
-                self._extend_sparse_traj_field(run_idx, traj_idx, field_path, field_data, sparse_idxs)
+                self._extend_sparse_field_grp(traj_grp[field_path], field_data, sparse_idxs,
+                                              growth_policy=self._growth_policy)
             else:
-                self._extend_contiguous_traj_field(run_idx, traj_idx, field_path, field_data)
+                self._extend_contiguous_field_dataset(traj_grp[field_path], field_data,
+                                                      n_frames=n_frames,
+                                                      growth_policy=self._growth_policy)
+
+        _update_n_frames_attr(traj_grp, n_frames + n_new_frames, self._growth_policy)
+
+    def extend_cycle(self, run_idx, cycle_data, weights=None, metadata=None):
+        """Add the data for one cycle of all the walkers of a run.
+
+        The frame for walker `i` is appended to trajectory `i` of the
+        run. Walkers without a trajectory yet have one added for them
+        (which must be in order of their indices).
+
+        This is equivalent to calling `extend_traj` (or `add_traj`)
+        for each walker but with the per trajectory overhead of
+        looking up the file settings and groups done only once.
+
+        For cycle-major runs this adds a row to each of the field
+        datasets, and is the only way to add data to them.
+
+        Parameters
+        ----------
+        run_idx : int
+        cycle_data : dict of str : arraylike
+            The data to add for each field, stacked for all walkers so
+            that the first dimension is the walker index. Must include
+            positions.
+        weights : arraylike of float
+            The weights of the walkers. If None defaults all to 1.0.
+        metadata : dict of str : value
+            Metadata for any new trajectories which are added.
+
+        """
+
+        n_walkers = cycle_data[POSITIONS].shape[0]
+
+        # if weights are None then we assume they are 1.0
+        if weights is None:
+            weights = np.ones((n_walkers, 1), dtype=float)
+        else:
+            assert isinstance(weights, np.ndarray), "weights must be a numpy.ndarray"
+            assert weights.shape[0] == n_walkers,\
+                "weights and the number of walkers must be the same length"
+
+            weights = weights.reshape((n_walkers, *WEIGHT_SHAPE))
+
+        if self.run_layout(run_idx) == CYCLES:
+            self._extend_cycles(run_idx, cycle_data, weights, metadata=metadata)
+            return
+
+        trajs_grp = self._h5['{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES)]
+
+        n_trajs = len(trajs_grp)
+
+        # these are read from the file settings so only do it once
+        sparse_fields = set(self.sparse_fields)
+
+        for traj_idx in range(min(n_trajs, n_walkers)):
+
+            walker_data = {field_path : field_data[traj_idx:traj_idx+1]
+                           for field_path, field_data in cycle_data.items()}
+            walker_weights = weights[traj_idx:traj_idx+1]
+
+            traj_grp = trajs_grp[str(traj_idx)]
+
+            # fields that haven't been initialized for this trajectory
+            # need the full treatment
+            if not all(field_path in traj_grp for field_path in walker_data):
+                self.extend_traj(run_idx, traj_idx, walker_data,
+                                 weights=walker_weights)
+                continue
+
+            weights_ds = traj_grp[WEIGHTS]
+
+            n_frames = _dataset_n_frames(traj_grp, weights_ds)
+
+            _append_dataset_frames(weights_ds,
+                                   walker_weights.reshape((1, *weights_ds.shape[1:])),
+                                   n_frames=n_frames,
+                                   growth_policy=self._growth_policy)
+
+            for field_path, field_data in walker_data.items():
+
+                if field_path in sparse_fields:
+                    self._extend_sparse_field_grp(traj_grp[field_path], field_data,
+                                                  np.array([n_frames]),
+                                                  growth_policy=self._growth_policy)
+                else:
+                    self._extend_contiguous_field_dataset(traj_grp[field_path],
+                                                          field_data,
+                                                          n_frames=n_frames,
+                                                          growth_policy=self._growth_policy)
+
+            _update_n_frames_attr(traj_grp, n_frames + 1, self._growth_policy)
+
+        # add trajectories for the new walkers
+        for walker_idx in range(n_trajs, n_walkers):
+
+            self.add_traj(run_idx,
+                          data={field_path : field_data[walker_idx:walker_idx+1]
+                                for field_path, field_data in cycle_data.items()},
+                          weights=weights[walker_idx:walker_idx+1],
+                          metadata=metadata)
 
     ## application level append methods for run records groups
 
@@ -4560,27 +6235,43 @@ class WepyHDF5(object):
 
         record_grp = self.records_grp(run_idx, run_record_key)
 
-        # if it is sporadic add the cycle idx
-        if self._is_sporadic_records(run_record_key):
+        # number of new records
+        n_new_records = len(fields_data)
+
+        if n_new_records == 0:
+            return
 
-            # get the cycle idxs dataset
-            record_cycle_idxs_ds = record_grp[CYCLE_IDXS]
+        is_sporadic = self._is_sporadic_records(run_record_key)
 
-            # number of old and new records
-            n_new_records = len(fields_data)
-            n_existing_records = record_cycle_idxs_ds.shape[0]
+        # get the number of records in use, if the group isn't
+        # over-allocated all of the records are in use
+        n_records = _read_n_frames_attr(record_grp)
+
+        if n_records is None:
+            if is_sporadic:
+                n_records = record_grp[CYCLE_IDXS].shape[0]
+            else:
+                n_records = record_grp[next(iter(fields_data[0]))].shape[0]
 
-            # make a new chunk for the new records
-            record_cycle_idxs_ds.resize( (n_existing_records + n_new_records,) )
+        # if it is sporadic add the cycle idx
+        if is_sporadic:
 
             # add an array of the cycle idx for each record
-            record_cycle_idxs_ds[n_existing_records:] = np.full((n_new_records,), cycle_idx)
+            _append_dataset_frames(record_grp[CYCLE_IDXS],
+                                   np.full((n_new_records,), cycle_idx,
+                                           dtype=record_grp[CYCLE_IDXS].dtype),
+                                   n_frames=n_records,
+                                   growth_policy=self._growth_policy)
 
         # then add all the data for the field
-        for record_dict in fields_data:
+        for record_idx, record_dict in enumerate(fields_data):
             for field_name, field_data in record_dict.items():
                 self._extend_run_record_data_field(run_idx, run_record_key,
-                                                   field_name, np.array([field_data]))
+                                                   field_name, np.array([field_data]),
+                                                   n_records=n_records + record_idx)
+
+        _update_n_frames_attr(record_grp, n_records + n_new_records,
+                              self._growth_policy)
 
     ### Analysis Routines
 
@@ -5096,6 +6787,11 @@ class WepyHDF5(object):
         results : list of arraylike, if 'return_results' option is True
             A list of arraylike feature vectors for each trajectory.
 
+        See Also
+        --------
+        compute_observable_parallel : for computing and saving
+            observables of large files in parallel
+
         """
 
         if save_to_hdf5 is not None:
@@ -5154,10 +6850,279 @@ class WepyHDF5(object):
                 return result_idxs, results
             else:
                 return results
-    ## Trajectory Getters
 
-    def get_traj_field(self, run_idx, traj_idx, field_path, frames=None, masked=True):
-        """Returns a numpy array for the given trajectory field.
+    def compute_observable_parallel(self, func, fields, args, save_to_hdf5,
+                                    n_workers=None,
+                                    chunk_frames=OBSERVABLE_CHUNK_FRAMES,
+                                    traj_sel=None,
+                                    max_pending=None,
+                                    mp_context='spawn'):
+        """Compute an observable in worker processes and save it in the
+        observables group of the trajectories as it is computed.
+
+        The trajectories are split into chunks of frames which are
+        given to the workers. Each worker opens the file read-only
+        itself and reads the fields for its chunks, so the trajectory
+        data never passes through this process. The values are sent
+        back and written to the datasets of the observable by this
+        process, which is the only writer.
+
+        At most 'max_pending' chunks are computed or waiting to be
+        written at any time so the memory used doesn't depend on the
+        size of the file.
+
+        While the workers run the file is in SWMR mode, so no other
+        objects can be added to it, and afterwards it is reopened
+        normally.
+
+        Parameters
+        ----------
+        func : callable
+            The function to apply to the trajectory fields. Must accept
+            a dictionary mapping the field names to the feature vectors
+            for a chunk of frames of a trajectory and return an
+            arraylike with a value for each frame, computed for each
+            frame independently. Must be picklable, e.g. a module
+            level function.
+
+        fields : list of str
+            A list of trajectory field names to pass to the function.
+
+        args : tuple
+            Extra positional arguments passed to the function for
+            every chunk.
+
+        save_to_hdf5 : str
+            The name of the observables sub-field to save the values
+            in.
+
+        n_workers : int, optional
+            The number of worker processes. Defaults to the number of
+            CPUs.
+
+        chunk_frames : int
+            The number of frames of a trajectory computed at a time.
+
+        traj_sel : list of tuple, optional
+            If not None, a list of trajectory identifier tuple
+            (run_idx, traj_idx) to restrict the computation to. Runs
+            with the 'cycles' layout must be computed for all of their
+            trajectories.
+
+        max_pending : int, optional
+            The largest number of chunks submitted to the workers and
+            not written yet. Defaults to twice the number of workers.
+
+        mp_context : str or None
+            The multiprocessing start method for the workers. The
+            default 'spawn' avoids the workers inheriting the state of
+            the HDF5 library for the open file.
+
+        Raises
+        ------
+        ValueError
+            If the function doesn't give a value for every frame or
+            only part of a cycle-major run is selected.
+
+        concurrent.futures.process.BrokenProcessPool
+            If a worker process died, e.g. it was killed or failed to
+            start.
+
+        TypeError
+            If the observable already exists with a different shape
+            or dtype.
+
+        """
+
+        assert self.mode in ['w', 'w-', 'x', 'r+', 'c', 'c-'],\
+            "File must be in a write mode"
+        assert isinstance(save_to_hdf5, str),\
+            "`save_to_hdf5` should be the field name to save the data in the `observables`"\
+            " group in each trajectory"
+
+        obs_path = '{}/{}'.format(OBSERVABLES, save_to_hdf5)
+
+        if chunk_frames < 1:
+            raise ValueError("chunk_frames must be positive, not {}".format(chunk_frames))
+
+        if traj_sel is None:
+            traj_sel = self.run_traj_idx_tuples()
+        else:
+            traj_sel = [tuple(idx_tup) for idx_tup in traj_sel]
+
+            for run_idx in set(run_idx for run_idx, traj_idx in traj_sel):
+                if (self.run_layout(run_idx) == CYCLES and
+                    not set(self.run_traj_idxs(run_idx)).issubset(traj_sel)):
+                    raise ValueError("All of the trajectories of run {} must be selected "
+                                     "since it has the cycles layout".format(run_idx))
+
+        if n_workers is None:
+            n_workers = mp.cpu_count()
+
+        if max_pending is None:
+            max_pending = 2 * n_workers
+
+        traj_n_frames = [self.num_traj_frames(run_idx, traj_idx)
+                         for run_idx, traj_idx in traj_sel]
+
+        work_items = ((run_idx, traj_idx, start, min(start + chunk_frames, n_frames))
+                      for (run_idx, traj_idx), n_frames in zip(traj_sel, traj_n_frames)
+                      for start in range(0, n_frames, chunk_frames))
+
+        # compute the first chunk here to get the shape and dtype of
+        # the observable, datasets can't be created in SWMR mode
+        first_item = next(work_items, None)
+        if first_item is None:
+            return
+
+        first_result = _compute_observable_chunk(self, func, fields, args, first_item)
+        first_values = first_result[1]
+
+        obs_dsets = self._init_observable_dsets(obs_path, traj_sel, traj_n_frames,
+                                                first_values.shape[1:], first_values.dtype)
+
+        # SWMR can't be turned off again so the file is reopened when
+        # done
+        self._h5.swmr_mode = True
+
+        try:
+
+            self._write_observable_chunk(obs_dsets, *first_result)
+
+            # the futures of the executor raise BrokenProcessPool if
+            # a worker dies instead of never finishing
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=n_workers,
+                    mp_context=mp.get_context(mp_context),
+                    initializer=_init_observable_worker,
+                    initargs=(self._filename,)) as executor:
+
+                def submit(work_item):
+                    return executor.submit(_compute_observable_chunk,
+                                           None, func, fields, args, work_item)
+
+                pending = set(submit(work_item)
+                              for work_item in it.islice(work_items, max_pending))
+
+                try:
+                    while len(pending) > 0:
+
+                        done, pending = concurrent.futures.wait(
+                            pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                        for future in done:
+
+                            # raises the exception of the worker
+                            self._write_observable_chunk(obs_dsets, *future.result())
+
+                            for work_item in it.islice(work_items, 1):
+                                pending.add(submit(work_item))
+
+                finally:
+
+                    # don't wait on the rest of the chunks if one failed
+                    for future in pending:
+                        future.cancel()
+
+        finally:
+
+            self._h5.close()
+            self._h5 = h5py.File(self._filename, 'r+',
+                                 libver=H5PY_LIBVER, swmr=self.swmr_mode)
+
+    def _init_observable_dsets(self, obs_path, traj_sel, traj_n_frames,
+                               feature_shape, dtype):
+        """Make the datasets for an observable computed in chunks.
+
+        Parameters
+        ----------
+        obs_path : str
+        traj_sel : list of tuple of int
+        traj_n_frames : list of int
+            The number of frames of each of the trajectories.
+        feature_shape : tuple of int
+        dtype : dtype_spec
+
+        Returns
+        -------
+        obs_dsets : dict of tuple of int : (h5py.Dataset, int or None, int)
+            For each trajectory the dataset, the index of the
+            trajectory in the second dimension for cycle-major runs,
+            and the row of the first frame.
+
+        """
+
+        obs_dsets = {}
+
+        for run_idx in sorted(set(run_idx for run_idx, traj_idx in traj_sel)):
+
+            if self.run_layout(run_idx) != CYCLES:
+                continue
+
+            cycles_grp = self.run_cycles(run_idx)
+            n_trajs = self.num_run_trajs(run_idx)
+            n_cycles = self.num_run_cycles(run_idx)
+
+            dset_kwargs = self._field_dataset_kwargs(obs_path, feature_shape, dtype,
+                                                     n_walkers=n_trajs)
+
+            if obs_path in cycles_grp:
+                dset = cycles_grp[obs_path]
+
+                if (dset.shape[0] < n_cycles or dset.shape[1] != n_trajs or
+                    dset.shape[2:] != feature_shape or dset.dtype != dset_kwargs['dtype']):
+                    raise TypeError("For changing the contents of a trajectory field it must be "
+                                    "the same shape and dtype.")
+            else:
+                dset = cycles_grp.create_dataset(obs_path, (n_cycles, n_trajs, *feature_shape),
+                                                 maxshape=(None, None, *feature_shape),
+                                                 **dset_kwargs)
+
+            start_cycles = self._run_traj_start_cycles(run_idx)
+
+            for traj_idx in range(n_trajs):
+                obs_dsets[(run_idx, traj_idx)] = (dset, traj_idx, start_cycles[traj_idx])
+
+        dset_kwargs = self._field_dataset_kwargs(obs_path, feature_shape, dtype)
+
+        for (run_idx, traj_idx), n_frames in zip(traj_sel, traj_n_frames):
+
+            if (run_idx, traj_idx) in obs_dsets:
+                continue
+
+            traj_grp = self.traj(run_idx, traj_idx)
+
+            try:
+                dset = traj_grp.require_dataset(obs_path, shape=(n_frames, *feature_shape),
+                                                exact=True,
+                                                maxshape=(None, *feature_shape),
+                                                **dset_kwargs)
+            except TypeError:
+                raise TypeError("For changing the contents of a trajectory field it must be "
+                                "the same shape and dtype.")
+
+            obs_dsets[(run_idx, traj_idx)] = (dset, None, 0)
+
+        return obs_dsets
+
+    @staticmethod
+    def _write_observable_chunk(obs_dsets, work_item, values):
+        """Write the values of an observable for a chunk of frames of a
+        trajectory to its dataset."""
+
+        run_idx, traj_idx, start, end = work_item
+
+        dset, walker_idx, row_offset = obs_dsets[(run_idx, traj_idx)]
+
+        if walker_idx is None:
+            dset[row_offset + start:row_offset + end] = values
+        else:
+            dset[row_offset + start:row_offset + end, walker_idx] = values
+
+    ## Trajectory Getters
+
+    def get_traj_field(self, run_idx, traj_idx, field_path, frames=None, masked=True):
+        """Returns a numpy array for the given trajectory field.
 
         You can control how sparse fields are returned using the
         `masked` option. When True (default) a masked numpy array will
@@ -5187,10 +7152,8 @@ class WepyHDF5(object):
 
         """
 
-        traj_path = '{}/{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES, traj_idx)
-
         # if the field doesn't exist return None
-        if not field_path in self._h5[traj_path]:
+        if not field_path in self._traj_fields_grp(run_idx, traj_idx):
             raise KeyError("key for field {} not found".format(field_path))
             # return None
 
@@ -5233,123 +7196,384 @@ class WepyHDF5(object):
 
         """
 
-        # TODO, WARN: this is known to not work properly in all
-        # cases. While this is an important feature, we defer the
-        # implementation of chunking to another function or interace
-        if False:
+        frame_tups = np.asarray(frame_tups, dtype=int).reshape((-1, 3))
 
-            def argsort(seq):
-                return sorted(range(len(seq)), key=seq.__getitem__)
+        return self._get_trace_fields(frame_tups, fields, same_order=same_order)
 
-            def apply_argsorted(shuffled_seq, sorted_idxs):
-                return [shuffled_seq[i] for i in sorted_idxs]
+    def get_run_trace_fields(self, run_idx, frame_tups, fields):
+        """Get trajectory field data for the frames specified by the trace
+        within a single run.
 
-            # first sort the frame_tups so we can chunk them up by
-            # (run, traj) to get more efficient reads since these are
-            # chunked by these datasets.
+        Parameters
+        ----------
+        run_idx : int
 
-            # we do an argsort here so that we can map fields back to
-            # the order they came in (if requested)
-            sorted_idxs = argsort(frame_tups)
+        frame_tups : list of tuple of int
+            The trace values. Each tuple is of the form
+            (traj_idx, frame_idx).
 
-            # then sort them as we will iterate through them
-            sorted_frame_tups = apply_argsorted(frame_tups, sorted_idxs)
+        fields : list of str
+            The names of the fields to get for each frame.
 
-            # generate the chunks by (run, traj)
-            read_chunks = defaultdict(list)
-            for run_idx, traj_idx, frame_idx in sorted_frame_tups:
-                read_chunks[(run_idx, traj_idx)].append(frame_idx)
+        Returns
+        -------
+        trace_fields : dict of str : arraylike
+            Mapping of the field names to the array of feature vectors
+            for the trace.
 
-            # go through each chunk and read data for each field
-            frame_fields = {}
-            for field in fields:
+        """
 
-                # for each field collect the chunks
-                field_chunks = []
+        frame_tups = np.asarray(frame_tups, dtype=int).reshape((-1, 2))
 
-                for chunk_key, frames in read_chunks.items():
-                    run_idx, traj_idx = chunk_key
+        run_frame_tups = np.empty((frame_tups.shape[0], 3), dtype=int)
+        run_frame_tups[:, 0] = run_idx
+        run_frame_tups[:, 1:] = frame_tups
 
-                    frames_field = self.get_traj_field(run_idx, traj_idx, field,
-                                                       frames=frames)
+        return self._get_trace_fields(run_frame_tups, fields)
 
-                    field_chunks.append(frames_field)
+    def get_run_cycle_fields(self, run_idx, fields, cycle_idxs=None):
+        """Get trajectory field data for all of the walkers at cycles of
+        a run.
 
-                # then aggregate them
-                field_unsorted = np.concatenate(field_chunks)
-                del field_chunks; gc.collect()
+        For cycle-major runs the cycles are read as whole rows of the
+        datasets, so a range of cycles is a single contiguous read.
 
-                # if we want them sorted sort them back to the
-                # original (unsorted) order, otherwise just return
-                # them
-                if same_order:
-                    frame_fields[field] = field_unsorted[sorted_idxs]
-                else:
-                    frame_fields[field] = field_unsorted
+        Parameters
+        ----------
+        run_idx : int
+
+        fields : list of str
+            The names of the fields to get.
+
+        cycle_idxs : list of int, optional
+            The cycles to get, all of them if None.
+
+        Returns
+        -------
+        cycle_fields : dict of str : arraylike
+            Mapping of the field names to arrays of shape (n_cycles,
+            n_walkers, feature_vector_shape[0], ...). Sparse fields
+            are masked arrays, as are the other fields when walkers
+            were added to the run after the first of the cycles.
+
+        """
+
+        if cycle_idxs is None:
+            cycle_idxs = np.arange(self.num_run_cycles(run_idx))
+        else:
+            cycle_idxs = np.asarray(cycle_idxs, dtype=int)
+
+        start_cycles = self._run_traj_start_cycles(run_idx)
+
+        cycle_grid, traj_grid = np.meshgrid(cycle_idxs, np.arange(len(start_cycles)),
+                                            indexing='ij')
+
+        # the walkers which were in the run at each cycle
+        present = cycle_grid >= start_cycles[traj_grid]
+
+        frame_tups = np.stack([np.full(np.count_nonzero(present), run_idx),
+                               traj_grid[present],
+                               cycle_grid[present] - start_cycles[traj_grid[present]]],
+                              axis=1)
+
+        trace_fields = self._get_trace_fields(frame_tups, fields)
+
+        cycle_fields = {}
+        for field, trace_field in trace_fields.items():
+
+            feature_shape = trace_field.shape[1:]
+
+            if np.all(present) and not np.ma.isMaskedArray(trace_field):
+                cycle_fields[field] = trace_field.reshape((*present.shape, *feature_shape))
+
+            else:
+                data = np.zeros((*present.shape, *feature_shape), dtype=trace_field.dtype)
+                data[present] = np.ma.getdata(trace_field)
+
+                mask = np.full(data.shape, True)
+                mask[present] = np.ma.getmaskarray(trace_field)
+
+                cycle_fields[field] = np.ma.masked_array(data, mask=mask)
 
-                del field_unsorted; gc.collect()
+        return cycle_fields
 
+    def _get_trace_fields(self, frame_tups, fields, same_order=True):
+        """Read the fields for the frames of a trace in bulk.
 
+        The frames are grouped by trajectory (or by run for
+        cycle-major runs) and the frames of each trajectory are read
+        in order with as few reads as possible (see
+        `_read_dataset_rows`), each frame only once no matter how many
+        times it is in the trace.
+
+        Parameters
+        ----------
+        frame_tups : numpy.ndarray of int
+            Array of shape (n_frames, 3) with the (run_idx, traj_idx,
+            frame_idx) of each frame.
+
+        fields : list of str
+
+        same_order : bool
+            If True the frames are in the order of the trace otherwise
+            they are sorted by (run_idx, traj_idx, frame_idx).
+
+        Returns
+        -------
+        trace_fields : dict of str : arraylike
+            Sparse fields are masked arrays.
+
+        """
+
+        # sort by run, then trajectory, then frame
+        sort_idxs = np.lexsort((frame_tups[:, 2], frame_tups[:, 1], frame_tups[:, 0]))
+        sorted_tups = frame_tups[sort_idxs]
+
+        if same_order:
+            out_idxs = sort_idxs
         else:
+            out_idxs = np.arange(len(sort_idxs))
 
-            frame_fields = {field : [] for field in fields}
-            for run_idx, traj_idx, cycle_idx in frame_tups:
-                for field in fields:
-                    frame_field = self.get_traj_field(
-                        run_idx,
-                        traj_idx,
-                        field,
-                        frames=[cycle_idx],
-                    )
-                    # the first dimension doesn't matter here since we
-                    # only get one frame at a time.
-                    frame_fields[field].append(frame_field[0])
-
-            # combine all the parts of each field into single arrays
-            for field in fields:
-                frame_fields[field] = np.array(frame_fields[field])
+        # the boundaries of the runs in the sorted frames
+        run_starts, run_ends = _group_bounds(sorted_tups[:, 0])
+
+        frame_fields = {}
+        for field in fields:
+
+            field_data = None
+            field_mask = None
+
+            for start, end in zip(run_starts, run_ends):
+
+                data, mask = self._get_run_field_frames(sorted_tups[start, 0], field,
+                                                        sorted_tups[start:end, 1],
+                                                        sorted_tups[start:end, 2])
+
+                # allocate the output now that the feature shape is known
+                if field_data is None:
+                    field_data = np.empty((len(frame_tups), *data.shape[1:]),
+                                          dtype=data.dtype)
+
+                    if mask is not None:
+                        field_mask = np.full(field_data.shape, True)
+
+                field_data[out_idxs[start:end]] = data
+
+                if field_mask is not None:
+                    field_mask[out_idxs[start:end]] = mask
+
+            if field_data is None:
+                field_data = np.array([])
+
+            if field_mask is not None:
+                field_data = np.ma.masked_array(field_data, mask=field_mask)
+
+            frame_fields[field] = field_data
 
         return frame_fields
 
-    def get_run_trace_fields(self, run_idx, frame_tups, fields):
-        """Get trajectory field data for the frames specified by the trace
-        within a single run.
+    def _get_run_field_frames(self, run_idx, field_path, traj_idxs, frames):
+        """Read frames of a trajectory field from the trajectories of a run.
 
         Parameters
         ----------
         run_idx : int
+        field_path : str
+        traj_idxs : numpy.ndarray of int
+            The trajectory of each frame.
+        frames : numpy.ndarray of int
+            The frame indices, sorted by trajectory then frame.
 
-        frame_tups : list of tuple of int
-            The trace values. Each tuple is of the form
-            (traj_idx, frame_idx).
+        Returns
+        -------
+        data : numpy.ndarray
+            The data for each frame, for sparse fields frames without
+            values are NaN.
 
-        fields : list of str
-            The names of the fields to get for each frame.
+        mask : numpy.ndarray of bool or None
+            For sparse fields the mask of the frames without values,
+            otherwise None.
+
+        """
+
+        if self.run_layout(run_idx) == CYCLES:
+
+            start_cycles = self._run_traj_start_cycles(run_idx)
+            traj_n_frames = self.num_run_cycles(run_idx) - start_cycles
+
+            out_of_range = (frames < 0) | (frames >= traj_n_frames[traj_idxs])
+            if np.any(out_of_range):
+                traj_idx = traj_idxs[np.argmax(out_of_range)]
+                raise IndexError("Frames out of range for trajectory {} of run {} "
+                                 "with {} frames".format(traj_idx, run_idx,
+                                                         traj_n_frames[traj_idx]))
+
+            return self._get_cycles_field_frames(run_idx, field_path, traj_idxs, frames,
+                                                 start_cycles)
+
+        traj_starts, traj_ends = _group_bounds(traj_idxs)
+
+        for start, end in zip(traj_starts, traj_ends):
+
+            n_frames = self.num_traj_frames(run_idx, traj_idxs[start])
+
+            if frames[start] < 0 or frames[end - 1] >= n_frames:
+                raise IndexError("Frames out of range for trajectory {} of run {} "
+                                 "with {} frames".format(traj_idxs[start], run_idx, n_frames))
+
+        traj_data = []
+        traj_masks = []
+        for start, end in zip(traj_starts, traj_ends):
+
+            # read each frame once
+            traj_frames, frame_inv_idxs = np.unique(frames[start:end], return_inverse=True)
+
+            data, mask = self._get_traj_field_frames(run_idx, traj_idxs[start],
+                                                     field_path, traj_frames)
+
+            traj_data.append(data[frame_inv_idxs])
+
+            if mask is not None:
+                traj_masks.append(mask[frame_inv_idxs])
+
+        if len(traj_masks) > 0:
+            return np.concatenate(traj_data), np.concatenate(traj_masks)
+        else:
+            return np.concatenate(traj_data), None
+
+    def _get_cycles_field_frames(self, run_idx, field_path, traj_idxs, frames,
+                                 start_cycles):
+        """Read frames of a trajectory field from a cycle-major run.
+
+        The frames are read as whole cycles for all of the walkers, so
+        each cycle is read once however many trajectories it is read
+        for.
+
+        See `_get_run_field_frames` for the other parameters and the
+        return values.
+
+        Parameters
+        ----------
+        start_cycles : numpy.ndarray of int
+            The start cycle of each trajectory of the run.
+
+        """
+
+        cycles_grp = self.run_cycles(run_idx)
+
+        if not field_path in cycles_grp:
+            raise KeyError("key for field {} not found".format(field_path))
+
+        cycle_idxs = start_cycles[traj_idxs] + frames
+
+        cycle_idxs, cycle_inv_idxs = np.unique(cycle_idxs, return_inverse=True)
+
+        if field_path not in self.sparse_fields:
+
+            cycles_data = _read_dataset_rows(cycles_grp[field_path], cycle_idxs)
+
+            return cycles_data[cycle_inv_idxs, traj_idxs], None
+
+        field = cycles_grp[field_path]
+        n_values = _dataset_n_frames(field, field[DATA])
+        sparse_cycle_idxs = field[SPARSE_IDXS][:n_values]
+
+        # the sparse cycle idxs are in order
+        rows = np.searchsorted(sparse_cycle_idxs, cycle_idxs)
+
+        if n_values > 0:
+            rows = np.minimum(rows, n_values - 1)
+            has_value = sparse_cycle_idxs[rows] == cycle_idxs
+        else:
+            has_value = np.full(len(cycle_idxs), False)
+
+        values = _read_dataset_rows(field[DATA], rows[has_value])
+
+        # the index of each cycle with a value in the values
+        value_idxs = np.cumsum(has_value) - 1
+
+        # empty datasets are initialized without their feature dimensions
+        if field[DATA].shape[0] == 0:
+            feature_shape = field[DATA].maxshape[2:]
+        else:
+            feature_shape = field[DATA].shape[2:]
+
+        frame_has_value = has_value[cycle_inv_idxs]
+
+        data = np.full((len(frames), *feature_shape), np.nan)
+        data[frame_has_value] = values[value_idxs[cycle_inv_idxs][frame_has_value],
+                                       traj_idxs[frame_has_value]]
+
+        mask = np.full(data.shape, True)
+        mask[frame_has_value] = False
+
+        return data, mask
+
+    def _get_traj_field_frames(self, run_idx, traj_idx, field_path, frames):
+        """Read some frames of a trajectory field of a run with the
+        trajectories layout.
+
+        Parameters
+        ----------
+        run_idx : int
+        traj_idx : int
+        field_path : str
+        frames : numpy.ndarray of int
+            The frame indices, sorted and unique.
 
         Returns
         -------
-        trace_fields : dict of str : arraylike
-            Mapping of the field names to the array of feature vectors
-            for the trace.
+        data : numpy.ndarray
+            The data for each frame, for sparse fields frames without
+            values are NaN.
+
+        mask : numpy.ndarray of bool or None
+            For sparse fields the mask of the frames without values,
+            otherwise None.
 
         """
-        frame_fields = {field : [] for field in fields}
-        for traj_idx, cycle_idx in frame_tups:
-            for field in fields:
 
+        traj_path = '{}/{}/{}/{}'.format(RUNS, run_idx, TRAJECTORIES, traj_idx)
+        traj_grp = self._h5[traj_path]
 
+        if not field_path in traj_grp:
+            raise KeyError("key for field {} not found".format(field_path))
 
+        if field_path not in self.sparse_fields:
+            return _read_dataset_rows(traj_grp[field_path], frames), None
 
-                frame_field = self.get_traj_field(run_idx, traj_idx, field, frames=[cycle_idx])
-                # the first dimension doesn't matter here since we
-                # only get one frame at a time.
-                frame_fields[field].append(frame_field[0])
+        field = traj_grp[field_path]
+        n_values = _dataset_n_frames(field, field[DATA])
+        sparse_idxs = field[SPARSE_IDXS][:n_values]
 
-        # combine all the parts of each field into single arrays
-        for field in fields:
-            frame_fields[field] = np.array(frame_fields[field])
+        # find the rows of the data for the frames that have values
+        sparse_sort_idxs = np.argsort(sparse_idxs, kind='stable')
+        positions = np.searchsorted(sparse_idxs, frames, sorter=sparse_sort_idxs)
+        positions = np.minimum(positions, len(sparse_idxs) - 1)
 
-        return frame_fields
+        if len(sparse_idxs) > 0:
+            rows = sparse_sort_idxs[positions]
+            has_value = sparse_idxs[rows] == frames
+        else:
+            rows = positions
+            has_value = np.full(len(frames), False)
+
+        value_rows, value_row_inv_idxs = np.unique(rows[has_value], return_inverse=True)
+        values = _read_dataset_rows(field[DATA], value_rows)
+
+        # empty datasets are initialized without their feature dimensions
+        if field[DATA].shape[0] == 0:
+            feature_shape = field[DATA].maxshape[1:]
+        else:
+            feature_shape = field[DATA].shape[1:]
+
+        data = np.full((len(frames), *feature_shape), np.nan)
+        data[has_value] = values[value_row_inv_idxs]
+
+        mask = np.full(data.shape, True)
+        mask[has_value] = False
+
+        return data, mask
 
 
     def get_contig_trace_fields(self, contig_trace, fields):
@@ -5475,9 +7699,16 @@ class WepyHDF5(object):
             # dsets['run_idx'] = run_idx
             # dsets[TRAJ_IDX] = traj_idx
 
+            is_cycles_run = self.run_layout(run_idx) == CYCLES
+
             for field in fields:
                 try:
-                    dset = traj[field][:]
+                    if is_cycles_run:
+                        dset = self.get_traj_field(run_idx, traj_idx, field)
+                    else:
+                        dset = traj[field]
+                        n_frames = _dataset_n_frames(traj, dset)
+                        dset = self._dataset_array(dset)[:n_frames]
                 except KeyError:
                     warn("field \"{}\" not found in \"{}\"".format(field, traj.name), RuntimeWarning)
                     dset = None
@@ -5811,6 +8042,10 @@ class WepyHDF5(object):
         if run_slice is not None:
             assert run_slice[1] >= run_slice[0], "Must be a contiguous slice"
 
+            if self.run_layout(run_idx) == CYCLES:
+                raise ValueError("Slices of cycle-major runs can't be copied, convert "
+                                 "the run to the trajectories layout first")
+
             # get a list of the frames to use
             slice_frames = list(range(*run_slice))
 
@@ -5868,7 +8103,8 @@ class WepyHDF5(object):
 
                         # slice the _sparse_idxs from the original
                         # dataset that are between the slice
-                        cycle_idxs = self.traj(run_idx, traj_idx)[field_name]['_sparse_idxs'][:]
+                        cycle_idxs = self.get_traj_field_cycle_idxs(run_idx, traj_idx,
+                                                                    field_name)
 
                         sparse_idx_idxs = np.argwhere(np.logical_and(
                             cycle_idxs[:] >= run_slice[0], cycle_idxs[:] < run_slice[1]
@@ -5952,11 +8188,12 @@ class WepyHDF5(object):
                 # necessary for sporadic records
                 if self._is_sporadic_records(rec_grp_name):
 
-                    cycle_idxs = rec_grp[CYCLE_IDXS][:]
-
                     # get dataset info
                     cycle_idxs_dset = rec_grp[CYCLE_IDXS]
 
+                    cycle_idxs = cycle_idxs_dset[:_dataset_n_frames(rec_grp,
+                                                                    cycle_idxs_dset)]
+
                     # we use autochunk, because I can't figure out how
                     # the chunks are set and I can't reuse them
                     idxs_dset_kwargs = {
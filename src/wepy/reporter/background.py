@@ -0,0 +1,184 @@
+"""Running reporters in background threads.
+
+Reporters usually perform I/O which the simulation manager would
+otherwise wait for before running the next cycle. A ReporterThread
+runs the `report` calls of a group of reporters in a separate thread
+so that they overlap with the next segments of the simulation. This is
+effective since the segments are run in other processes (or in
+libraries like OpenMM that release the GIL).
+
+Reports are passed to the thread through a bounded queue. If the
+reporters fall behind by more reports than fit in the queue then
+submitting a new report blocks until there is room. This bounds the
+memory used by pending reports and keeps the simulation from running
+arbitrarily far ahead of its output.
+
+The `init` and `cleanup` methods of the reporters are not run in the
+thread and should be called before starting and after stopping it.
+
+See the 'background_reporters' option of wepy.sim_manager.Manager for
+running reporters this way in simulations.
+
+"""
+
+import threading
+import queue as pyq
+import logging
+
+from wepy.reporter.reporter import ReporterError
+
+class ReporterThread(object):
+    """Runs the `report` method of a group of reporters in a
+    background thread.
+
+    The reporters are called in order for each report and the reports
+    are processed in the order they were submitted.
+
+    If a reporter raises an error the remaining reports are skipped
+    and a ReporterError is raised from the next call to `submit`,
+    `flush`, or `stop`.
+
+    """
+
+    NAME_TEMPLATE = "ReporterThread-{}"
+    """The name template for the threads, substituting in the names of
+    the reporter classes."""
+
+    def __init__(self, reporters, queue_size=1):
+        """Constructor for the ReporterThread.
+
+        Parameters
+        ----------
+        reporters : list of objects implementing the Reporter interface
+            The reporters to run in the thread.
+
+        queue_size : int
+            The maximum number of reports that can be waiting for the
+            reporters.
+
+        """
+
+        self.reporters = reporters
+        self.queue_size = queue_size
+
+        self._queue = None
+        self._thread = None
+        self._exception = None
+
+    @property
+    def running(self):
+        """Whether the thread has been started and not stopped."""
+        return self._thread is not None
+
+    def start(self):
+        """Start the thread so that reports can be submitted."""
+
+        if self.running:
+            raise RuntimeError("The reporter thread is already running")
+
+        self._queue = pyq.Queue(maxsize=self.queue_size)
+        self._exception = None
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name=self.NAME_TEMPLATE.format(
+                ','.join(type(reporter).__name__ for reporter in self.reporters)),
+            daemon=True,
+        )
+
+        self._thread.start()
+
+    def _run(self):
+        """Target function of the thread which reports the reports from
+        the queue until it gets None."""
+
+        while True:
+
+            report = self._queue.get()
+
+            try:
+
+                if report is None:
+                    return
+
+                # after an error the rest of the reports are skipped
+                if self._exception is None:
+                    for reporter in self.reporters:
+                        reporter.report(**report)
+
+            except Exception as exception:
+
+                logging.error("Reporter failed in thread {}: {}".format(
+                    threading.current_thread().name, exception))
+
+                self._exception = exception
+
+            finally:
+                self._queue.task_done()
+
+    def _check_exception(self):
+        """Raise a ReporterError if a reporter failed in the thread."""
+
+        if self._exception is not None:
+            raise ReporterError("A reporter failed in the background") from self._exception
+
+    def submit(self, report):
+        """Queue a report for the reporters.
+
+        Blocks while the queue is full.
+
+        Parameters
+        ----------
+        report : dict of str : value
+            The key-word arguments for the `report` methods. This
+            should not be modified afterwards.
+
+        Raises
+        ------
+        ReporterError
+            If a reporter has failed for a previous report.
+
+        """
+
+        if not self.running:
+            raise RuntimeError("The reporter thread must be started to submit reports")
+
+        self._check_exception()
+
+        self._queue.put(report)
+
+    def flush(self):
+        """Wait until all of the submitted reports have been reported.
+
+        Raises
+        ------
+        ReporterError
+            If a reporter has failed.
+
+        """
+
+        if self.running:
+            self._queue.join()
+
+        self._check_exception()
+
+    def stop(self):
+        """Wait until all of the submitted reports have been reported and
+        stop the thread.
+
+        Raises
+        ------
+        ReporterError
+            If a reporter has failed.
+
+        """
+
+        if self.running:
+
+            self._queue.put(None)
+            self._thread.join()
+
+            self._thread = None
+            self._queue = None
+
+        self._check_exception()
@@ -17,6 +17,7 @@ from jinja2 import Template
 import logging
 
 from wepy.reporter.reporter import ProgressiveFileReporter
+from wepy.work_mapper.scheduler import straggler_time
 
 class DashboardReporter(ProgressiveFileReporter):
     """A text based report of the status of a wepy simulation.
@@ -138,10 +139,18 @@ Worker Avg. Segment Times:
         # performance
         self.cycle_compute_times = []
         self.cycle_runner_times = []
+        self.cycle_straggler_times = []
         self.cycle_bc_times = []
         self.cycle_resampling_times = []
         self.worker_records = []
 
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+
+        # dashboards pickled before straggler times were recorded
+        if not hasattr(self, 'cycle_straggler_times'):
+            self.cycle_straggler_times = [None for _ in self.cycle_compute_times]
 
     def init(self, **kwargs):
 
@@ -221,6 +230,10 @@ Worker Avg. Segment Times:
         self.cycle_bc_times.append(kwargs['cycle_bc_time'])
         self.cycle_resampling_times.append(kwargs['cycle_resampling_time'])
 
+        # how long workers waited on the slowest one
+        self.cycle_straggler_times.append(
+            straggler_time(kwargs.get('scheduling_data', [])))
+
         # TODO: produces nan if one of them is not given
         # add up the three components to get the overall cycle time
         cycle_time = (kwargs['cycle_runner_time'] +
@@ -276,12 +289,14 @@ Worker Avg. Segment Times:
         cycle_table_colnames = ('cycle_time (s)',
                                 'runner_time (s)',
                                 'boundary_conditions_time (s)',
-                                'resampling_time (s)')
+                                'resampling_time (s)',
+                                'straggler_time (s)')
 
         cycle_table_df = pd.DataFrame({'cycle_times (s)' : self.cycle_compute_times,
                                        'runner_time (s)' : self.cycle_runner_times,
                                        'boundary_conditions_time (s)' : self.cycle_bc_times,
-                                       'resampling_time (s)' : self.cycle_resampling_times},
+                                       'resampling_time (s)' : self.cycle_resampling_times,
+                                       'straggler_time (s)' : self.cycle_straggler_times},
                                       columns=cycle_table_colnames)
 
         cycle_table_str = tabulate(cycle_table_df,
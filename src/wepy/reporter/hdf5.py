@@ -70,6 +70,9 @@ class WepyHDF5Reporter(FileReporter):
 
                  # other settings
                  swmr_mode=False,
+                 growth_policy=None,
+                 layout='trajectories',
+                 field_storage=None,
 
                  **kwargs
                  ):
@@ -142,6 +145,24 @@ class WepyHDF5Reporter(FileReporter):
            Whether to write to open the HDF5 in single-writer
            multi-reader (SWMR) mode.
 
+        growth_policy : None or 'double' or int
+           How trajectory and record datasets are grown as cycles are
+           reported, see the WepyHDF5 constructor. The file is
+           compacted when the reporter is cleaned up at the end of the
+           simulation.
+
+        layout : 'trajectories' or 'cycles'
+           The layout of the trajectory data of the runs, see
+           WepyHDF5.new_run. With the 'cycles' layout all of the
+           walkers must have the same fields each cycle, so the
+           frequencies of sparse fields can't be staggered between
+           walkers.
+
+        field_storage : dict of str : dict of str : value, optional
+           Mapping of trajectory field paths to the storage policies
+           (chunking, compression, and quantization) of their
+           datasets, see the WepyHDF5 constructor.
+
 
         Other Parameters
         ----------------
@@ -195,6 +216,12 @@ class WepyHDF5Reporter(FileReporter):
         # written to during reporting
         self.swmr_mode = swmr_mode
 
+        self.growth_policy = growth_policy
+
+        self.layout = layout
+
+        self.field_storage = field_storage
+
         # do all the WepyHDF5 specific stuff
 
         self.wepy_run_idx = None
@@ -360,7 +387,12 @@ class WepyHDF5Reporter(FileReporter):
                                 feature_dtypes=self._feature_dtypes,
                                 n_dims=self._n_dims,
                                 main_rep_idxs=self.main_rep_idxs,
-                                alt_reps=self.alt_reps_idxs)
+                                alt_reps=self.alt_reps_idxs,
+                                growth_policy=self.growth_policy,
+                                field_storage=self.field_storage,
+                                # the file is opened and closed every
+                                # cycle so this is done in cleanup
+                                compact_on_close=False)
 
         # if we specify save fields only save these for the initial walkers
         if self.save_fields is not None:
@@ -413,7 +445,8 @@ class WepyHDF5Reporter(FileReporter):
             # initialize it as such
 
             # initialize a new run
-            run_grp = self.wepy_h5.new_run(filtered_init_walkers, continue_run=continue_run)
+            run_grp = self.wepy_h5.new_run(filtered_init_walkers, continue_run=continue_run,
+                                           layout=self.layout)
             self.wepy_run_idx = run_grp.attrs['run_idx']
 
             # initialize the run record groups using their fields
@@ -454,6 +487,11 @@ class WepyHDF5Reporter(FileReporter):
         if not self.wepy_h5.closed:
             self.wepy_h5.close()
 
+        # trim the over-allocated datasets
+        if self.growth_policy is not None:
+            with self.wepy_h5:
+                self.wepy_h5.compact()
+
         # remove reference to the WepyHDF5 file so we can serialize this object
         del self.wepy_h5
 
@@ -484,107 +522,158 @@ class WepyHDF5Reporter(FileReporter):
             if self.swmr_mode:
                 self.wepy_h5.swmr_mode = True
 
-            # add trajectory data for the walkers
-            for walker_idx, walker in enumerate(new_walkers):
+            walkers_data = [self._walker_field_data(walker, cycle_idx, save_fields)
+                            for walker in new_walkers]
+
+            # stack the data for all walkers if they have the same
+            # fields so the whole cycle can be written at once
+            cycle_data = None
+            if all(walker_data.keys() == walkers_data[0].keys()
+                   for walker_data in walkers_data):
+                try:
+                    cycle_data = {field_path : np.concatenate(
+                                      [walker_data[field_path]
+                                       for walker_data in walkers_data])
+                                  for field_path in walkers_data[0].keys()}
+                except ValueError:
+                    cycle_data = None
+
+            if cycle_data is not None:
+
+                self.wepy_h5.extend_cycle(
+                    self.wepy_run_idx,
+                    cycle_data,
+                    weights=np.array([[walker.weight] for walker in new_walkers]),
+                    # the cycle idx where any new walkers started
+                    metadata={'cycle_idx' : cycle_idx},
+                )
+
+            elif self.layout == 'cycles':
+                raise ValueError("The walkers must have the same fields to be saved "
+                                 "in a cycle-major run")
+
+            # otherwise add trajectory data for the walkers one by one
+            else:
+                run_traj_idxs = self.wepy_h5.run_traj_idxs(self.wepy_run_idx)
+
+                for walker_idx, (walker, walker_data) in enumerate(
+                        zip(new_walkers, walkers_data)):
+
+                    # check to see if the walker has a trajectory in the run
+                    if walker_idx in run_traj_idxs:
+
+                        # if it does then append to the trajectory
+                        self.wepy_h5.extend_traj(self.wepy_run_idx, walker_idx,
+                                                 weights=np.array([[walker.weight]]),
+                                                 data=walker_data)
+                    # start a new trajectory
+                    else:
+                        # add the traj for the walker with the data
 
-                walker_weight = walker.weight
-                walker_data = walker.state.dict()
+                        traj_grp = self.wepy_h5.add_traj(self.wepy_run_idx,
+                                                         weights=np.array([[walker.weight]]),
+                                                         data=walker_data)
 
-                # iterate through the feature vectors of the walker
-                # (fields), and the keys for the alt_reps
-                for field_path in list(walker_data.keys()):
+                        # add as metadata the cycle idx where this walker started
+                        traj_grp.attrs['cycle_idx'] = cycle_idx
 
-                    # save the field if it is in the list of save_fields
-                    if field_path not in save_fields:
-                        walker_data.pop(field_path)
-                        continue
 
-                    # if the result is None don't save anything
-                    if walker_data[field_path] is None:
-                        walker_data.pop(field_path)
-                        continue
+            # report the boundary conditions records data, if boundary
+            # conditions were initialized
+            if self.warping_fields is not None:
+                self._report_warping(cycle_idx, warp_data)
+                self._report_bc(cycle_idx, bc_data)
+                self._report_progress(cycle_idx, progress_data)
 
-                    # if this is a sparse field we decide
-                    # whether it is a valid cycle to save on
-                    if field_path in self._sparse_fields:
-                        if cycle_idx % self._sparse_fields[field_path] != 0:
-                            # this is not a valid cycle so we
-                            # remove from the walker_data
-                            walker_data.pop(field_path)
-                            continue
+            # report the resampling records data
+            self._report_resampling(cycle_idx, resampling_data)
 
+            self._report_resampler(cycle_idx, resampler_data)
 
-                # Add the alt_reps fields by slicing the positions
-                for alt_rep_key, alt_rep_idxs in self.alt_reps_idxs.items():
-                    alt_rep_path = "alt_reps/{}".format(alt_rep_key)
+        super().report(**kwargs)
 
-                    # if the alt rep is also a sparse field check this
-                    if alt_rep_path in self._sparse_fields:
 
-                        # check to make sure this is a cycle this is
-                        # to be saved to, if it is not continue on to
-                        # the next field without saving this one
-                        if cycle_idx % self._sparse_fields[alt_rep_path] != 0:
+    def _walker_field_data(self, walker, cycle_idx, save_fields):
+        """Get the trajectory field data to save for a walker in a cycle.
 
-                            continue
+        Parameters
+        ----------
+        walker : object implementing the Walker interface
 
-                    # slice them and save them
+        cycle_idx : int
 
-                    # if the idxs are None we want all of the atoms
-                    if alt_rep_idxs is None:
-                        alt_rep_data = walker_data['positions'][:]
-                    # otherwise get only th atoms we want
-                    else:
-                        alt_rep_data = walker_data['positions'][alt_rep_idxs]
-                    walker_data[alt_rep_path] = alt_rep_data
+        save_fields : list of str
 
+        Returns
+        -------
+        walker_data : dict of str : numpy.ndarray
+            The data for each field with a frame dimension of 1.
 
-                # lastly reduce the atoms for the main representation
-                # if this option was given
-                if self.main_rep_idxs is not None:
-                    walker_data['positions'] = walker_data['positions'][self.main_rep_idxs]
+        """
 
+        walker_data = walker.state.dict()
 
-                # for all of these fields we wrap them in another
-                # dimension to make them feature vectors
-                for field_path in list(walker_data.keys()):
-                    walker_data[field_path] = np.array([walker_data[field_path]])
+        # iterate through the feature vectors of the walker
+        # (fields), and the keys for the alt_reps
+        for field_path in list(walker_data.keys()):
 
-                # save the data to the HDF5 file for this walker
+            # save the field if it is in the list of save_fields
+            if field_path not in save_fields:
+                walker_data.pop(field_path)
+                continue
 
-                # check to see if the walker has a trajectory in the run
-                if walker_idx in self.wepy_h5.run_traj_idxs(self.wepy_run_idx):
+            # if the result is None don't save anything
+            if walker_data[field_path] is None:
+                walker_data.pop(field_path)
+                continue
 
-                    # if it does then append to the trajectory
-                    self.wepy_h5.extend_traj(self.wepy_run_idx, walker_idx,
-                                             weights=np.array([[walker_weight]]),
-                                             data=walker_data)
-                # start a new trajectory
-                else:
-                    # add the traj for the walker with the data
+            # if this is a sparse field we decide
+            # whether it is a valid cycle to save on
+            if field_path in self._sparse_fields:
+                if cycle_idx % self._sparse_fields[field_path] != 0:
+                    # this is not a valid cycle so we
+                    # remove from the walker_data
+                    walker_data.pop(field_path)
+                    continue
 
-                    traj_grp = self.wepy_h5.add_traj(self.wepy_run_idx,
-                                                     weights=np.array([[walker_weight]]),
-                                                     data=walker_data)
 
-                    # add as metadata the cycle idx where this walker started
-                    traj_grp.attrs['cycle_idx'] = cycle_idx
+        # Add the alt_reps fields by slicing the positions
+        for alt_rep_key, alt_rep_idxs in self.alt_reps_idxs.items():
+            alt_rep_path = "alt_reps/{}".format(alt_rep_key)
 
+            # if the alt rep is also a sparse field check this
+            if alt_rep_path in self._sparse_fields:
 
-            # report the boundary conditions records data, if boundary
-            # conditions were initialized
-            if self.warping_fields is not None:
-                self._report_warping(cycle_idx, warp_data)
-                self._report_bc(cycle_idx, bc_data)
-                self._report_progress(cycle_idx, progress_data)
+                # check to make sure this is a cycle this is
+                # to be saved to, if it is not continue on to
+                # the next field without saving this one
+                if cycle_idx % self._sparse_fields[alt_rep_path] != 0:
 
-            # report the resampling records data
-            self._report_resampling(cycle_idx, resampling_data)
+                    continue
 
-            self._report_resampler(cycle_idx, resampler_data)
+            # slice them and save them
 
-        super().report(**kwargs)
+            # if the idxs are None we want all of the atoms
+            if alt_rep_idxs is None:
+                alt_rep_data = walker_data['positions'][:]
+            # otherwise get only th atoms we want
+            else:
+                alt_rep_data = walker_data['positions'][alt_rep_idxs]
+            walker_data[alt_rep_path] = alt_rep_data
+
+
+        # lastly reduce the atoms for the main representation
+        # if this option was given
+        if self.main_rep_idxs is not None:
+            walker_data['positions'] = walker_data['positions'][self.main_rep_idxs]
+
+
+        # for all of these fields we wrap them in another
+        # dimension to make them feature vectors
+        for field_path in list(walker_data.keys()):
+            walker_data[field_path] = np.array([walker_data[field_path]])
 
+        return walker_data
 
     # sporadic
     def _report_warping(self, cycle_idx, warping_data):
@@ -123,6 +123,10 @@ class Reporter(object):
             Mapping worker index to the times they took for each
             segment they processed.
 
+        scheduling_data : list of dict of str : value
+            Records of the order the segments were dispatched to the
+            workers in, see wepy.work_mapper.scheduler.
+
         cycle_runner_time : float
             Total time runner took in last cycle.
 
@@ -20,9 +20,24 @@ high cost.
 So use the 'image' to do precomputations on raw walker states and use
 the 'image_distance' to compute distances using only those images.
 
+For resamplers that need the distances between many images at once
+(e.g. the all-to-all distance matrix in REVO) there is also a batched
+interface of 'images' and 'image_distance_matrix'. The default
+implementations of these simply fall back to calling 'image' and
+'image_distance' for every state and pair of images, but subclasses
+are encouraged to override them with vectorized implementations
+which avoid the O(N^2) python calls.
+
+Resamplers keep the images they have computed in an ImageCache so
+that each state is only imaged once, even when it is shared between
+walkers (e.g. clones) or used several times in a cycle.
+
 """
 import logging
+import itertools as it
+
 import numpy as np
+from scipy.spatial.distance import cdist
 
 class Distance(object):
     """Abstract Base class for Distance classes."""
@@ -98,7 +113,231 @@ class Distance(object):
         return self.image_distance(self.image(state_a),
                                       self.image(state_b))
 
+    def images(self, states):
+        """Compute the images for a collection of walker states.
+
+        The default implementation just calls 'image' on each state,
+        override this if the images can be computed for all the
+        states at once.
+
+        Parameters
+        ----------
+        states : list of objects implementing WalkerState
+            The states which will be transformed to images
+
+        Returns
+        -------
+        images : list of objects produced by Distance.image
+            The images of each state in the same order.
+
+        """
+
+        return [self.image(state) for state in states]
+
+    def image_distance_matrix(self, images, other_images=None):
+        """Compute the all-to-all distance matrix between images.
+
+        The default implementation calls 'image_distance' once for
+        each pair of images, override this with a vectorized
+        implementation for better performance.
+
+        If other_images is given the rectangular matrix of distances
+        between each of the images and each of the other images is
+        computed instead, which allows for the full matrix to be
+        computed in blocks.
+
+        Parameters
+        ----------
+        images : list of objects produced by Distance.image
+
+        other_images : list of objects produced by Distance.image or None
+
+        Returns
+        -------
+        distance_matrix : arraylike of float of shape (n_images, n_images)
+            Symmetric matrix of the distances between each pair of
+            images with zeros on the diagonal. If other_images was
+            given the shape is (n_images, n_other_images).
+
+        """
+
+        n_images = len(images)
+
+        if other_images is not None:
+
+            dist_mat = np.zeros((n_images, len(other_images)))
+
+            for i, j in it.product(range(n_images), range(len(other_images))):
+                dist_mat[i][j] = self.image_distance(images[i], other_images[j])
+
+            return dist_mat
+
+        # initialize the matrix with 0.0 for self distances
+        dist_mat = np.zeros((n_images, n_images))
+
+        for i, j in it.combinations(range(n_images), 2):
+
+            dist = self.image_distance(images[i], images[j])
+
+            # save this in the matrix in both spots
+            dist_mat[i][j] = dist
+            dist_mat[j][i] = dist
+
+        return dist_mat
+
+
+
+class ImageCache(object):
+    """Cache of the images of walker states for a distance metric.
+
+    States are keyed on their identity, so walkers that share a state
+    object (i.e. clones made by splitting a walker) share an image as
+    well. A reference to each state is kept with its image so that the
+    identity can't be reused by another state while it is cached.
+
+    """
+
+    def __init__(self, distance):
+        """Constructor for ImageCache.
+
+        Parameters
+        ----------
+        distance : object implementing Distance
+            The distance metric used to make images.
+
+        """
+
+        self._distance = distance
+
+        # id(state) -> (state, image)
+        self._cache = {}
+
+    def __getstate__(self):
+
+        # identities are meaningless in another process and keeping
+        # the states would make copies of the resampler expensive so
+        # copies always start empty
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+
+        return state
+
+    @property
+    def distance(self):
+        """The distance metric images are made with."""
+        return self._distance
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, state):
+
+        entry = self._cache.get(id(state))
+
+        return entry is not None and entry[0] is state
+
+    def missing(self, states):
+        """Get the states which don't have images in the cache.
+
+        Parameters
+        ----------
+        states : list of objects implementing WalkerState
+
+        Returns
+        -------
+        missing_states : list of objects implementing WalkerState
+            Unique states in the order they first appeared.
+
+        """
+
+        missing_states = []
+        missing_ids = set()
+        for state in states:
+            if state not in self and id(state) not in missing_ids:
+                missing_ids.add(id(state))
+                missing_states.append(state)
+
+        return missing_states
+
+    def add(self, states, images):
+        """Add already computed images to the cache.
+
+        Parameters
+        ----------
+        states : list of objects implementing WalkerState
+
+        images : list of objects produced by Distance.image
+            The image for each state.
+
+        """
+
+        for state, image in zip(states, images):
+            self._cache[id(state)] = (state, image)
+
+    def image(self, state):
+        """Get the image of a state, computing it if it isn't cached.
+
+        Parameters
+        ----------
+        state : object implementing WalkerState
+
+        Returns
+        -------
+        image : object produced by Distance.image
+
+        """
+
+        return self.images([state])[0]
+
+    def images(self, states):
+        """Get the images of states, computing the ones that aren't cached.
 
+        The missing images are computed together with the batched
+        'images' method of the distance if it has one.
+
+        Parameters
+        ----------
+        states : list of objects implementing WalkerState
+
+        Returns
+        -------
+        images : list of objects produced by Distance.image
+
+        """
+
+        missing_states = self.missing(states)
+
+        if len(missing_states) > 0:
+
+            if hasattr(self._distance, 'images'):
+                new_images = self._distance.images(missing_states)
+            else:
+                new_images = [self._distance.image(state) for state in missing_states]
+
+            self.add(missing_states, new_images)
+
+        return [self._cache[id(state)][1] for state in states]
+
+    def retain(self, states):
+        """Evict the images of all states except the given ones.
+
+        Parameters
+        ----------
+        states : list of objects implementing WalkerState
+            The states to keep images for, e.g. those of the walkers
+            left after resampling.
+
+        """
+
+        keep_ids = set(id(state) for state in states)
+
+        self._cache = {state_id : entry for state_id, entry in self._cache.items()
+                       if state_id in keep_ids}
+
+    def clear(self):
+        """Evict all images."""
+
+        self._cache = {}
 
 class XYEuclideanDistance(Distance):
     """2 dimensional euclidean distance between points. 
@@ -116,3 +355,18 @@ class XYEuclideanDistance(Distance):
 
         return np.sqrt((image_a[0] - image_b[0])**2 +
                        (image_a[1] - image_b[1])**2)
+
+    def images(self, states):
+
+        return np.array([[state['x'], state['y']] for state in states])
+
+    def image_distance_matrix(self, images, other_images=None):
+
+        images = np.asarray(images)
+
+        if other_images is None:
+            other_images = images
+        else:
+            other_images = np.asarray(other_images)
+
+        return cdist(images, other_images, metric='euclidean')
@@ -7,6 +7,7 @@ metric is a scaled version of the Manhattan Norm.
 import logging
 
 import numpy as np
+from scipy.spatial.distance import cdist
 
 from wepy.resampling.distances.distance import Distance
 
@@ -66,3 +67,57 @@ class RandomWalkDistance(Distance):
 
         """
         return np.average(np.abs(image_a - image_b))
+
+    def images(self, states):
+        """Transform a collection of states into random walk images.
+
+        Parameters
+        ----------
+
+        states : list of objects implementing WalkerState
+            Walker states with positions in a numpy array of shape (N).
+
+        Returns
+        -------
+
+        randomwalk_images : array of floats of shape (n_states, N)
+            The positions of each walker in the N-dimensional space.
+
+        """
+        return np.array([state['positions'] for state in states])
+
+    def image_distance_matrix(self, images, other_images=None):
+        """Compute the distances between all pairs of images.
+
+        Parameters
+        ----------
+
+        images : array of float of shape (n_images, N)
+            Positions of the walkers' states.
+
+        other_images : array of float of shape (n_other_images, N) or None
+            If given the distances are between the images and these
+            instead of between all pairs of images.
+
+        Returns
+        -------
+
+        distance_matrix : array of float of shape (n_images, n_images)
+            The normalized Manhattan distances between each pair of
+            images, or of shape (n_images, n_other_images) if
+            other_images was given.
+
+        """
+
+        if other_images is None:
+            other_images = images
+
+        # flatten each image so that the normalization is over all of
+        # the elements like in 'image_distance'
+        images = np.asarray(images)
+        images = images.reshape((images.shape[0], -1))
+
+        other_images = np.asarray(other_images)
+        other_images = other_images.reshape((other_images.shape[0], -1))
+
+        return cdist(images, other_images, metric='cityblock') / images.shape[1]
@@ -7,7 +7,11 @@ correct indices of receptor and ligand atoms, and a common image
 function.
 
 Subclasses of ReceptorDistance need only implement the
-'image_distance' function according to their needs.
+'image_distance' function according to their needs. The 'images'
+method of ReceptorDistance does the regrouping, recentering, and
+superposition for a whole collection of states at once, and the
+subclasses here also implement 'image_distance_matrix' so that the
+RMSDs between all images can be computed in a single call.
 
 The UnbindingDistance is a useful metric for enhancing ligand movement
 away from the reference bound state conformation.
@@ -20,6 +24,7 @@ a ligand towards a reference state.
 import logging
 
 import numpy as np
+from scipy.spatial.distance import cdist
 
 from wepy.util.util import box_vectors_to_lengths_angles
 
@@ -158,6 +163,100 @@ class ReceptorDistance(Distance):
         return sup_image
 
 
+    def _unaligned_images(self, states):
+        """The preprocessing of states done for all states at once.
+
+        Same as '_unaligned_image' except the regrouping and
+        recentering is done on stacked arrays of the positions and box
+        vectors of every state.
+
+        Parameters
+        ----------
+        states : list of objects implementing WalkerState
+            States with 'positions' (Nx3 dims) and 'box_vectors' (3x3
+            array) attributes.
+
+        Returns
+        -------
+
+        unaligned_images : arraylike of float of shape (n_states, n_image_atoms, 3)
+
+        """
+
+        # stack only the atoms which are part of the image, the rest
+        # of the atoms don't matter to the regrouping or centering
+        positions = np.array([state['positions'][self._image_idxs]
+                              for state in states],
+                             dtype=np.float64)
+
+        box_vectors = np.array([state['box_vectors'] for state in states])
+
+        # the box lengths are the norms of the box vectors
+        box_lengths = np.linalg.norm(box_vectors, axis=2)
+
+        # regroup the ligand into the same periodic image as the
+        # binding site, this moves the ligand by at most one box
+        # length in each dimension just like 'group_pair'
+        bs_centroids = positions[:, self._image_bs_idxs].mean(axis=1)
+        lig_centroids = positions[:, self._image_lig_idxs].mean(axis=1)
+        centroid_dists = bs_centroids - lig_centroids
+
+        half_box_lengths = box_lengths * 0.5
+        shifts = box_lengths * ((centroid_dists > half_box_lengths).astype(np.float64) -
+                                (centroid_dists < -half_box_lengths).astype(np.float64))
+
+        positions[:, self._image_lig_idxs] += shifts[:, np.newaxis, :]
+
+        # then center them around the binding site
+        positions -= positions[:, self._image_bs_idxs].mean(axis=1)[:, np.newaxis, :]
+
+        return positions
+
+    def images(self, states):
+        """Transform a collection of states to receptor images.
+
+        Does the same thing as 'image' but for all the states in a
+        single vectorized pass, the superposition to the reference
+        binding site is done with the Kabsch algorithm.
+
+        Parameters
+        ----------
+        states : list of objects implementing WalkerState
+            States with 'positions' (Nx3 dims) and 'box_vectors' (3x3
+            array) attributes.
+
+        Returns
+        -------
+
+        receptor_images : arraylike of float of shape (n_states, n_image_atoms, 3)
+            The positions of binding site and ligand after
+            preprocessing for each state.
+
+        """
+
+        unaligned_images = self._unaligned_images(states)
+
+        ref_bs_coords = self.ref_image[self._image_bs_idxs]
+        ref_bs_centroid = ref_bs_coords.mean(axis=0)
+
+        # the covariance matrices between the binding sites of each
+        # image and the reference
+        bs_coords = unaligned_images[:, self._image_bs_idxs]
+        covariances = np.einsum('nai,aj->nij', bs_coords, ref_bs_coords)
+
+        # the rotation matrices that minimize the RMSD, correcting
+        # for reflections. These act on the right of the coordinates
+        # like in 'superimpose'
+        u, _, vt = np.linalg.svd(covariances)
+        signs = np.where(np.linalg.det(np.matmul(u, vt)) < 0., -1., 1.)
+        u[:, :, -1] *= signs[:, np.newaxis]
+        rotations = np.matmul(u, vt)
+
+        sup_images = np.matmul(unaligned_images, rotations) + ref_bs_centroid
+
+        return sup_images
+
+
 class UnbindingDistance(ReceptorDistance):
     """Distance metric for measuring differences between walker states in
     regards to the RMSDs between ligands.
@@ -179,6 +278,22 @@ class UnbindingDistance(ReceptorDistance):
 
         return lig_rmsd
 
+    def image_distance_matrix(self, images, other_images=None):
+
+        if other_images is None:
+            other_images = images
+
+        # flatten the ligand coordinates of each image so that the
+        # squared euclidean distance between them is the sum of the
+        # squared deviations of the ligand atoms
+        lig_coords = np.asarray(images)[:, self._image_lig_idxs].reshape((len(images), -1))
+        other_lig_coords = np.asarray(other_images)[:, self._image_lig_idxs].reshape(
+                                                                (len(other_images), -1))
+
+        sq_devs = cdist(lig_coords, other_lig_coords, metric='sqeuclidean')
+
+        return np.sqrt(sq_devs / self._n_lig_atoms)
+
 class RebindingDistance(ReceptorDistance):
     """Distance metric for measuring differences between walker states in
     regards to the RMSDs between ligands.
@@ -201,3 +316,26 @@ class RebindingDistance(ReceptorDistance):
         d = abs(1./state_a_rmsd - 1./state_b_rmsd)
 
         return d
+
+    def _inv_ref_rmsds(self, images):
+
+        # the ligand RMSDs of every image to the reference
+        lig_coords = np.asarray(images)[:, self._image_lig_idxs]
+        ref_lig_coords = self.ref_image[self._image_lig_idxs]
+
+        ref_rmsds = np.sqrt(np.sum(np.square(lig_coords - ref_lig_coords),
+                                   axis=(1, 2)) / self._n_lig_atoms)
+
+        return 1. / ref_rmsds
+
+    def image_distance_matrix(self, images, other_images=None):
+
+        inv_rmsds = self._inv_ref_rmsds(images)
+
+        if other_images is None:
+            other_inv_rmsds = inv_rmsds
+        else:
+            other_inv_rmsds = self._inv_ref_rmsds(other_images)
+
+        # then the differences between all of the reciprocals
+        return np.abs(inv_rmsds[:, np.newaxis] - other_inv_rmsds[np.newaxis, :])
@@ -1,6 +1,8 @@
 import itertools as it
 from collections import defaultdict
 from warnings import warn
+import multiprocessing as mp
+import multiprocessing.pool
 
 import logging
 from eliot import start_action, log_call
@@ -258,10 +260,17 @@ class Resampler():
     # valid debug modes
     DEBUG_MODES = (True, False,)
 
+    DISTANCE_POOL_TYPES = ('process', 'thread',)
+    """The kinds of pools that can be started for parallelizing distance
+    computations."""
+
     def __init__(self,
                  min_num_walkers=Ellipsis,
                  max_num_walkers=Ellipsis,
                  debug_mode=False,
+                 num_distance_workers=None,
+                 distance_pool_type='process',
+                 distance_pool=None,
                  **kwargs):
         """Constructor for Resampler class
 
@@ -281,6 +290,20 @@ class Resampler():
         debug_mode : bool
             Expert mode stuff don't use unless you know what you are doing.
 
+        num_distance_workers : int or None
+            The number of workers to use for parallelizing distance
+            computations in resamplers that support it. If None
+            (and no distance_pool is given) they are done serially.
+
+        distance_pool_type : str
+            Either 'process' or 'thread', the kind of pool that is
+            started for the distance workers.
+
+        distance_pool : object implementing `map` or None
+            An already started pool (e.g. a multiprocessing.Pool or
+            concurrent.futures executor) to use for distance
+            computations instead of starting one. It will not be
+            closed by the resampler.
 
         """
 
@@ -316,6 +339,132 @@ class Resampler():
         # set them to the args given
         self.set_debug_mode(debug_mode)
 
+        if distance_pool_type not in self.DISTANCE_POOL_TYPES:
+            raise ValueError("distance pool type, {}, not valid".format(distance_pool_type))
+
+        self._num_distance_workers = num_distance_workers
+        self._distance_pool_type = distance_pool_type
+
+        # if a pool is given it is owned by someone else, otherwise
+        # we start one the first time it is needed and keep it until
+        # cleanup
+        self._distance_pool = distance_pool
+        self._owns_distance_pool = False
+
+    def __getstate__(self):
+
+        # pools can't be pickled or copied so we don't keep them,
+        # a new one will be started when needed
+        state = self.__dict__.copy()
+        state['_distance_pool'] = None
+        state['_owns_distance_pool'] = False
+
+        return state
+
+    def __setstate__(self, state):
+
+        # resamplers pickled before there were distance pools
+        state.setdefault('_num_distance_workers', None)
+        state.setdefault('_distance_pool_type', 'process')
+        state.setdefault('_distance_pool', None)
+        state.setdefault('_owns_distance_pool', False)
+
+        self.__dict__.update(state)
+
+    @property
+    def num_distance_workers(self):
+        """The number of workers used for distance computations, None if serial."""
+        return self._num_distance_workers
+
+    @property
+    def distance_pool(self):
+        """The pool used for parallel distance computations.
+
+        If none was given and the number of distance workers was set
+        then one will be started on first access and persists until
+        `cleanup` is called. None if distance computations are
+        serial.
+
+        """
+
+        if self._distance_pool is None and self._num_distance_workers is not None:
+
+            if self._distance_pool_type == 'process':
+                self._distance_pool = mp.Pool(processes=self._num_distance_workers)
+
+            elif self._distance_pool_type == 'thread':
+                self._distance_pool = mp.pool.ThreadPool(processes=self._num_distance_workers)
+
+            self._owns_distance_pool = True
+
+        return self._distance_pool
+
+    def _distance_map(self, func, args):
+        """Map a function over arguments with the distance pool.
+
+        Results are always in the same order as the arguments so
+        parallel and serial results are identical.
+
+        Parameters
+        ----------
+        func : callable
+            Must be picklable (i.e. a module level function) for
+            process pools.
+
+        args : list
+            Each element is the sole argument to one call of func.
+
+        Returns
+        -------
+        results : list
+
+        """
+
+        pool = self.distance_pool
+
+        if pool is None:
+            return [func(arg) for arg in args]
+        else:
+            return list(pool.map(func, args))
+
+    def _distance_chunks(self, n_items):
+        """Split indices into contiguous chunks, one for each distance worker.
+
+        Parameters
+        ----------
+        n_items : int
+
+        Returns
+        -------
+        chunks : list of arraylike of int
+
+        """
+
+        if self._num_distance_workers is not None:
+            n_chunks = self._num_distance_workers
+        else:
+            n_chunks = mp.cpu_count()
+
+        n_chunks = max(1, min(n_chunks, n_items))
+
+        return [chunk for chunk in np.array_split(np.arange(n_items), n_chunks)
+                if len(chunk) > 0]
+
+    def cleanup(self):
+        """Runtime post-simulation tasks.
+
+        Closes the distance pool if the resampler started it.
+
+        """
+
+        if self._owns_distance_pool and self._distance_pool is not None:
+            self._distance_pool.close()
+            self._distance_pool.join()
+
+        if self._owns_distance_pool:
+            self._distance_pool = None
+            self._owns_distance_pool = False
+
 
     @property
     def decision(self):
@@ -555,6 +704,29 @@ class Resampler():
         self._unset_resampling_num_walkers()
 
 
+    def prepare_walker(self, walker_idx, walker):
+        """Do the work for a single walker of the next call to
+        `resample` ahead of time.
+
+        The simulation manager may call this for each walker as soon
+        as its segment has finished, so that the work overlaps with
+        the segments of the other walkers. The walkers passed to
+        `resample` may still differ from these (e.g. from warping) and
+        the results must be the same as if this was never called.
+
+        Does nothing by default.
+
+        Parameters
+        ----------
+        walker_idx : int
+            The index of the walker in the cycle.
+
+        walker : Walker object
+
+        """
+
+        pass
+
     @log_call(include_args=[],
               include_result=False)
     def resample(self, walkers, debug_mode=False):
@@ -1,6 +1,7 @@
 import multiprocessing as mulproc
 import random as rand
 import itertools as it
+from copy import copy
 
 import logging
 from eliot import start_action, log_call
@@ -10,6 +11,299 @@ import numpy as np
 from wepy.resampling.resamplers.resampler import Resampler
 from wepy.resampling.resamplers.clone_merge  import CloneMergeResampler
 from wepy.resampling.decisions.clone_merge import MultiCloneMergeDecision
+from wepy.resampling.distances.distance import ImageCache
+
+def _images_task(args):
+    """Compute the images for a chunk of states in a distance worker."""
+
+    distance, states = args
+
+    return distance.images(states)
+
+def _distance_rows_task(args):
+    """Compute a block of rows of the distance matrix in a distance worker."""
+
+    distance, row_images, col_images = args
+
+    return np.asarray(distance.image_distance_matrix(row_images, col_images))
+
+class _IncrementalVariation():
+    """The state of the variation optimization in REVO with walker
+    variations that are updated incrementally.
+
+    The walker variations (V_i) and the total variation are sums whose
+    exact floating point values depend on the order of summation, and
+    the decisions of REVO depend on these values (e.g. which of a set
+    of identical clones has the highest variation). So the values
+    computed here are either exactly those of
+    `REVOResampler._calcvariation` (using sequential cumulative sums)
+    or approximations from incremental updates with a bound on their
+    error from those values. Decisions are only made from the
+    approximations when the bounds separate the choices, otherwise the
+    exact values are computed for the candidates.
+
+    """
+
+    # unit roundoff for double precision
+    UNIT_ROUNDOFF = np.finfo(float).eps / 2
+
+    def __init__(self, resampler, walker_weights, num_walker_copies, distance_matrix):
+
+        self._novelty = resampler._novelty
+
+        self.weights = np.array(walker_weights, dtype=float)
+        self.copies = np.array(num_walker_copies, dtype=float)
+        self.novelties = np.array([self._novelty(weight, copies)
+                                   for weight, copies in zip(self.weights, self.copies)],
+                                  dtype=float)
+
+        self.n_walkers = len(self.weights)
+        self._walker_idxs = np.arange(self.n_walkers)
+
+        # the distance part of the partial variation of each pair of
+        # walkers, this never changes
+        self.dist_terms = (np.array(distance_matrix, dtype=float) / resampler.char_dist) \
+                          ** resampler.dist_exponent
+
+        # the bounds on the rounding errors of the summations
+        self._walker_gamma = self._gamma(self.n_walkers)
+        self._total_gamma = self._gamma(self.n_walkers * self.n_walkers)
+
+        # start with the exact values
+        self.variation, self.walker_variations = self.exact_variation()
+
+        # which walker variations are exact, and for the others a
+        # bound on the error from the exact sum of their terms
+        self.exact = np.ones(self.n_walkers, dtype=bool)
+        self.errors = self._walker_gamma * self.walker_variations
+
+    @classmethod
+    def _gamma(cls, n):
+        """The bound on the relative error of a sum of n nonnegative terms."""
+
+        n_u = n * cls.UNIT_ROUNDOFF
+
+        return n_u / (1 - n_u)
+
+    def _partials(self, walker_idx):
+        """The partial variations of a walker with every other walker,
+        computed as in `REVOResampler._calcvariation`."""
+
+        novelties = self.novelties
+        walker_novelty = novelties[walker_idx]
+
+        # the lower index walker of the pair is always first
+        return np.where(self._walker_idxs < walker_idx,
+                        (self.dist_terms[:, walker_idx] * novelties) * walker_novelty,
+                        (self.dist_terms[walker_idx, :] * walker_novelty) * novelties)
+
+    def _column_terms(self, walker_idx):
+        """The terms the walker contributes to the walker variations of
+        all of the walkers."""
+
+        if self.copies[walker_idx] <= 0:
+            return np.zeros(self.n_walkers)
+
+        terms = self._partials(walker_idx) * self.copies[walker_idx]
+        terms[walker_idx] = 0.0
+        terms[self.copies <= 0] = 0.0
+
+        return terms
+
+    def exact_walker_variation(self, walker_idx):
+        """Compute the walker variation exactly as in
+        `REVOResampler._calcvariation` and save it."""
+
+        if self.copies[walker_idx] <= 0:
+            value = 0.0
+
+        else:
+            terms = self._partials(walker_idx) * self.copies
+            terms[walker_idx] = 0.0
+            terms[self.copies <= 0] = 0.0
+
+            # summed in order of the walkers
+            value = np.cumsum(terms)[-1]
+
+        self.walker_variations[walker_idx] = value
+        self.exact[walker_idx] = True
+        self.errors[walker_idx] = self._walker_gamma * value
+
+        return value
+
+    def exact_variation(self):
+        """Compute the variation and walker variations exactly as in
+        `REVOResampler._calcvariation`.
+
+        Returns
+        -------
+        variation : float
+
+        walker_variations : arraylike of float
+
+        """
+
+        novelties = self.novelties
+        copies = self.copies
+        inactive = copies <= 0
+
+        # the partial variations of the upper triangle
+        partials = (self.dist_terms * novelties[:, np.newaxis]) * novelties[np.newaxis, :]
+        upper_partials = np.triu(partials, k=1)
+
+        # the walker variations are sums over the rows in order
+        walker_terms = (upper_partials + upper_partials.T) * copies[np.newaxis, :]
+        walker_terms[:, inactive] = 0.0
+        walker_terms[inactive, :] = 0.0
+
+        walker_variations = np.zeros(self.n_walkers)
+        if self.n_walkers > 0:
+            walker_variations = np.cumsum(walker_terms, axis=1)[:, -1]
+
+        # the variation is the sum of the upper triangle in row major
+        # order
+        pair_terms = (partials * copies[:, np.newaxis]) * copies[np.newaxis, :]
+        pair_terms[:, inactive] = 0.0
+        pair_terms[inactive, :] = 0.0
+        pair_terms = pair_terms[np.triu_indices(self.n_walkers, k=1)]
+
+        variation = 0
+        if len(pair_terms) > 0:
+            variation = np.cumsum(pair_terms)[-1]
+
+        return variation, walker_variations
+
+    def snapshot(self):
+        """A copy of the current weights and copies of the walkers which
+        can be used to compute the exact variation later."""
+
+        snapshot = copy(self)
+        snapshot.weights = self.weights.copy()
+        snapshot.copies = self.copies.copy()
+        snapshot.novelties = self.novelties.copy()
+
+        return snapshot
+
+    def walker_variation_bounds(self):
+        """The bounds on the differences between the walker variations
+        and their exact values."""
+
+        bounds = self.errors + self._walker_gamma * (self.walker_variations + self.errors)
+        bounds[self.exact] = 0.0
+
+        return 2 * bounds
+
+    def approx_variation(self):
+        """The variation computed from the walker variations.
+
+        Returns
+        -------
+        variation : float
+
+        bound : float
+            The bound on the difference from the exact value.
+
+        """
+
+        errors = np.where(self.exact, self._walker_gamma * self.walker_variations, self.errors)
+
+        variation = 0.5 * np.dot(self.copies, self.walker_variations)
+
+        bound = 0.5 * np.dot(self.copies, errors) + \
+                (self._walker_gamma + self._total_gamma + 4 * self.UNIT_ROUNDOFF) * variation
+
+        return variation, 2 * bound
+
+    def update(self, walker_idxs, weights=None, copies=None):
+        """Change the weights and/or copies of walkers and update the
+        walker variations.
+
+        Parameters
+        ----------
+        walker_idxs : list of int
+
+        weights : list of float or None
+
+        copies : list of float or None
+
+        """
+
+        walker_idxs = list(walker_idxs)
+
+        old_terms = [self._column_terms(walker_idx) for walker_idx in walker_idxs]
+
+        for i, walker_idx in enumerate(walker_idxs):
+
+            if weights is not None:
+                self.weights[walker_idx] = weights[i]
+
+            if copies is not None:
+                self.copies[walker_idx] = copies[i]
+
+            self.novelties[walker_idx] = self._novelty(self.weights[walker_idx],
+                                                       self.copies[walker_idx])
+
+        new_terms = [self._column_terms(walker_idx) for walker_idx in walker_idxs]
+
+        old_sum = np.sum(old_terms, axis=0)
+        new_sum = np.sum(new_terms, axis=0)
+
+        # only the terms of the changed walkers change in the others
+        old_variations = self.walker_variations
+        self.walker_variations = old_variations + (new_sum - old_sum)
+
+        self.errors = self.errors + 8 * self.UNIT_ROUNDOFF * \
+                      (old_variations + np.abs(self.walker_variations) + old_sum + new_sum)
+        self.exact[:] = False
+
+        # while the changed walkers are just recomputed
+        for walker_idx in walker_idxs:
+            self.exact_walker_variation(walker_idx)
+
+    def select(self, eligible, maximum=True):
+        """Choose the walker with the maximum (or minimum) walker
+        variation as `max` (or `min`) of (value, idx) tuples would.
+
+        Parameters
+        ----------
+        eligible : arraylike of bool
+
+        maximum : bool
+
+        Returns
+        -------
+        walker_idx : int or None
+            None if no walker is eligible.
+
+        """
+
+        eligible_idxs = np.flatnonzero(eligible)
+
+        if len(eligible_idxs) == 0:
+            return None
+
+        values = self.walker_variations[eligible_idxs]
+        bounds = self.walker_variation_bounds()[eligible_idxs]
+
+        # all the walkers that could be the chosen one given the
+        # uncertainty of their values
+        if maximum:
+            candidate_idxs = eligible_idxs[values + bounds >= np.max(values - bounds)]
+        else:
+            candidate_idxs = eligible_idxs[values - bounds <= np.min(values + bounds)]
+
+        if len(candidate_idxs) == 1:
+            return int(candidate_idxs[0])
+
+        tups = [(self.exact_walker_variation(walker_idx), walker_idx)
+                for walker_idx in candidate_idxs]
+
+        if maximum:
+            _, walker_idx = max(tups)
+        else:
+            _, walker_idx = min(tups)
+
+        return int(walker_idx)
 
 class REVOResampler(CloneMergeResampler):
     r"""Resampler implementing the REVO algorithm.
@@ -111,6 +405,9 @@ class REVOResampler(CloneMergeResampler):
     RESAMPLER_RECORD_FIELDS = CloneMergeResampler.RESAMPLER_RECORD_FIELDS + \
                               ('variation',)
 
+    OPTIMIZERS = ('full', 'incremental',)
+    """The methods available for optimizing the variation."""
+
 
     def __init__(self,
                  merge_dist=None,
@@ -122,6 +419,7 @@ class REVOResampler(CloneMergeResampler):
                  pmax=0.1,
                  dist_exponent=4,
                  seed=None,
+                 optimizer='full',
                  **kwargs):
 
         """Constructor for the REVO Resampler.
@@ -158,6 +456,13 @@ class REVOResampler(CloneMergeResampler):
         seed : None or int, optional
             The random seed. If None, the system (random) one will be used.
 
+        optimizer : str
+            The method for optimizing the variation, either 'full'
+            which recomputes the whole variation for every move or
+            'incremental' which only updates the terms that change
+            and scales to many more walkers. Both make the same
+            decisions.
+
         """
 
         # call the init methods in the CloneMergeResampler
@@ -185,6 +490,9 @@ class REVOResampler(CloneMergeResampler):
 
         self.distance = distance
 
+        # images of walker states that have already been computed
+        self._image_cache = ImageCache(self.distance)
+
         # the characteristic distance, char_dist
 
         self.char_dist = char_dist
@@ -197,12 +505,28 @@ class REVOResampler(CloneMergeResampler):
         # setting the weights parameter
         self.weights = weights
 
+        if optimizer not in self.OPTIMIZERS:
+            raise ValueError("optimizer, {}, not valid".format(optimizer))
+
+        self.optimizer = optimizer
+
         # we do not know the shape and dtype of the images until
         # runtime so we determine them here
 
         image = self.distance.image(init_state)
         self.image_dtype = image.dtype
 
+    def __setstate__(self, state):
+
+        super().__setstate__(state)
+
+        # resamplers pickled before images were cached
+        if not hasattr(self, '_image_cache'):
+            self._image_cache = ImageCache(self.distance)
+
+        if not hasattr(self, 'optimizer'):
+            self.optimizer = 'full'
+
     def resampler_field_dtypes(self):
         """ Finds out the datatype of the image.
 
@@ -345,6 +669,14 @@ class REVOResampler(CloneMergeResampler):
             The resampling records resulting from the decisions.
 
         """
+        if self.optimizer == 'incremental':
+
+            merge_groups, walker_clone_nums, variation = \
+                    self._incremental_optimize(walker_weights, num_walker_copies,
+                                               distance_matrix)
+
+            return self._walker_actions(merge_groups, walker_clone_nums), variation
+
         num_walkers = len(walker_weights)
 
         variations = []
@@ -503,6 +835,23 @@ class REVOResampler(CloneMergeResampler):
                     new_num_walker_copies[closewalk] = 1
                     new_num_walker_copies[max_idx] -= 1
 
+        return self._walker_actions(merge_groups, walker_clone_nums), variations[-1]
+
+    def _walker_actions(self, merge_groups, walker_clone_nums):
+        """Make the resampling records for the decided merges and clones.
+
+        Parameters
+        ----------
+        merge_groups : list of list of int
+
+        walker_clone_nums : list of int
+
+        Returns
+        -------
+        walker_actions : list of dict of str: value
+
+        """
+
         # given we know what we want to clone to specific slots
         # (squashing other walkers) we need to determine where these
         # squashed walkers will be merged
@@ -515,7 +864,190 @@ class REVOResampler(CloneMergeResampler):
             walker_record['step_idx'] = np.array([0])
             walker_record['walker_idx'] = np.array([walker_idx])
 
-        return walker_actions, variations[-1]
+        return walker_actions
+
+    def _incremental_optimize(self, walker_weights, num_walker_copies, distance_matrix):
+        """Optimize the trajectory variation with incremental updates to
+        the walker variations.
+
+        Makes the same decisions as the loop in `decide`, but instead
+        of recomputing the variation from the whole distance matrix
+        for every move only the terms of the walkers that change are
+        updated, so each move costs O(N) instead of O(N^2).
+
+        Parameters
+        ----------
+
+        walker_weights : list of float
+
+        num_walker_copies : list of int
+
+        distance_matrix : list of arraylike of shape (num_walkers)
+
+        Returns
+        -------
+        merge_groups : list of list of int
+
+        walker_clone_nums : list of int
+
+        variation : float
+            The optimized value of the trajectory variation.
+
+        """
+
+        num_walkers = len(walker_weights)
+
+        merge_groups = [[] for i in range(num_walkers)]
+        walker_clone_nums = [0 for i in range(num_walkers)]
+
+        # walkers that are the keep walkers of a merge can't be cloned
+        merge_targets = np.zeros(num_walkers, dtype=bool)
+
+        state = _IncrementalVariation(self, walker_weights, num_walker_copies, distance_matrix)
+
+        # the variation to beat, which is exact until a move is accepted
+        variation, variation_bound = state.variation, 0.0
+        variation_snapshot = None
+
+        final_variation = state.variation
+
+        logging.info("Starting variance optimization: {}".format(variation))
+
+        productive = True
+        while productive:
+            productive = False
+
+            weights = state.weights
+            copies = state.copies
+
+            # the walker with the highest walker variation which can
+            # be cloned and the one with the lowest that can be merged
+            max_idx = state.select((copies >= 1) &
+                                   (weights / (copies + 1) > self.pmin) &
+                                   ~merge_targets,
+                                   maximum=True)
+
+            min_idx = state.select((copies == 1) & (weights < self.pmax),
+                                   maximum=False)
+
+            # does min_idx have an eligible merging partner?
+            closewalk = None
+            if (min_idx is not None) and (max_idx is not None) and min_idx != max_idx:
+
+                min_dists = np.asarray(distance_matrix[min_idx])
+
+                close_walkers = (copies == 1) & \
+                                (weights + weights[min_idx] < self.pmax) & \
+                                (min_dists < self.merge_dist)
+                close_walkers[[min_idx, max_idx]] = False
+
+                # the closest one, with the lowest index for ties
+                if close_walkers.any():
+                    close_idxs = np.flatnonzero(close_walkers)
+                    closewalk = int(close_idxs[np.argmin(min_dists[close_idxs])])
+
+            if closewalk is None:
+                break
+
+            # the tentative copies for this move
+            old_copies = [copies[min_idx], copies[closewalk], copies[max_idx]]
+            tempsum = weights[min_idx] + weights[closewalk]
+            state.update([min_idx, closewalk, max_idx],
+                         copies=[weights[min_idx]/tempsum,
+                                 weights[closewalk]/tempsum,
+                                 copies[max_idx] + 1])
+
+            new_variation, new_variation_bound = state.approx_variation()
+
+            # only compute the exact variations if the bounds don't
+            # decide whether the move is better
+            if new_variation - new_variation_bound > variation + variation_bound:
+                better = True
+
+            elif new_variation + new_variation_bound <= variation - variation_bound:
+                better = False
+
+            else:
+
+                if variation_snapshot is not None:
+                    variation, _ = variation_snapshot.exact_variation()
+                    variation_bound = 0.0
+
+                new_variation, _ = state.exact_variation()
+                new_variation_bound = 0.0
+
+                better = new_variation > variation
+
+            if better:
+
+                logging.info("Variance move to {} accepted".format(new_variation))
+
+                productive = True
+                variation, variation_bound = new_variation, new_variation_bound
+
+                # keep what is needed to compute it exactly if need be
+                variation_snapshot = state.snapshot()
+
+                # make a decision on which walker to keep
+                # (min_idx, or closewalk), equivalent to:
+                # `random.choices([closewalk, min_idx],
+                #                 weights=[new_walker_weights[closewalk], new_walker_weights[min_idx])`
+                r = rand.uniform(0.0, weights[closewalk] + weights[min_idx])
+
+                 # keeps closewalk and gets rid of min_idx
+                if r < weights[closewalk]:
+                    keep_idx = closewalk
+                    squash_idx = min_idx
+
+                # keep min_idx, get rid of closewalk
+                else:
+                    keep_idx = min_idx
+                    squash_idx = closewalk
+
+                # update the weights and copies
+                state.update([keep_idx, squash_idx],
+                             weights=[weights[keep_idx] + weights[squash_idx], 0.0],
+                             copies=[1, 0])
+
+                # add the squash index and its merge group to the
+                # merge group of the keep walker
+                merge_groups[keep_idx].append(squash_idx)
+                merge_groups[keep_idx].extend(merge_groups[squash_idx])
+                merge_groups[squash_idx] = []
+                merge_targets[keep_idx] = True
+                merge_targets[squash_idx] = False
+
+                # increase the number of clones that the cloned
+                # walker has
+                walker_clone_nums[max_idx] += 1
+
+                final_variation = None
+
+            # if not productive
+            else:
+                state.update([min_idx, closewalk, max_idx], copies=old_copies)
+
+        # the variation of the final state
+        if final_variation is None:
+            final_variation, _ = state.exact_variation()
+
+        logging.info("variance after selection: {}".format(final_variation))
+
+        return merge_groups, walker_clone_nums, final_variation
+
+    def prepare_walker(self, walker_idx, walker):
+        """Compute the image of the state of a walker ahead of resampling.
+
+        Parameters
+        ----------
+        walker_idx : int
+            The index of the walker in the cycle.
+
+        walker : Walker object
+
+        """
+
+        self._image_cache.image(walker.state)
 
     def _all_to_all_distance(self, walkers):
         """ Calculate the pairwise all-to-all distances between walkers.
@@ -532,14 +1064,112 @@ class REVOResampler(CloneMergeResampler):
         images : list of image obeject
 
         """
-        # initialize an all-to-all matrix, with 0.0 for self distances
-        dist_mat = np.zeros((len(walkers), len(walkers)))
+        states = [walker.state for walker in walkers]
+
+        # the images of states already seen (e.g. those shared by
+        # clones) are reused from the cache and the rest are computed
+        # together, split over the distance workers if we have them
+        if self.distance_pool is not None and hasattr(self.distance, 'images'):
+            self._parallel_images(states)
+
+        images = self._image_cache.images(states)
+
+        # use the batched interface of the distance metric if it has
+        # one, this lets the distance compute the whole matrix at
+        # once instead of a python call for every pair of walkers
+        if hasattr(self.distance, 'image_distance_matrix'):
+
+            if self.distance_pool is not None:
+                dist_mat = self._parallel_distance_matrix(images)
+
+            else:
+                dist_mat = np.asarray(self.distance.image_distance_matrix(images))
+
+        else:
+            dist_mat = self._pairwise_distance_matrix(images)
+
+        return [walker_dists for walker_dists in dist_mat], images
+
+    def _parallel_images(self, states):
+        """Compute the images missing from the cache with the distance pool.
+
+        Parameters
+        ----------
+        states : list of WalkerState objects
+
+        """
+
+        missing_states = self._image_cache.missing(states)
+
+        if len(missing_states) == 0:
+            return
+
+        chunks = self._distance_chunks(len(missing_states))
 
-        # make images for all the walker states for us to compute distances on
-        images = []
-        for walker in walkers:
-            image = self.distance.image(walker.state)
-            images.append(image)
+        chunk_images = self._distance_map(_images_task,
+                                          [(self.distance, [missing_states[i] for i in chunk])
+                                           for chunk in chunks])
+
+        self._image_cache.add(missing_states, it.chain(*chunk_images))
+
+    def _parallel_distance_matrix(self, images):
+        """Calculate the all-to-all distances in blocks with the distance pool.
+
+        Each worker computes a block of rows of the upper triangle of
+        the distance matrix, which is mirrored to the lower
+        triangle. The results are the same as computing the whole
+        matrix serially.
+
+        Parameters
+        ----------
+        images : list of image obeject
+
+        Returns
+        -------
+        distance_matrix : arraylike of shape (num_walkers, num_walkers)
+
+        """
+
+        n_images = len(images)
+        chunks = self._distance_chunks(n_images)
+
+        # each block is the rows for the chunk from the diagonal to
+        # the end
+        blocks = self._distance_map(_distance_rows_task,
+                                    [(self.distance,
+                                      images[chunk[0]:chunk[-1]+1],
+                                      images[chunk[0]:])
+                                     for chunk in chunks])
+
+        dist_mat = np.zeros((n_images, n_images))
+        for chunk, block in zip(chunks, blocks):
+            dist_mat[chunk[0]:chunk[-1]+1, chunk[0]:] = block
+
+        # only use the upper triangle and mirror it so the matrix is
+        # exactly symmetric with zeros on the diagonal
+        dist_mat = np.triu(dist_mat, k=1)
+        dist_mat = dist_mat + dist_mat.T
+
+        return dist_mat
+
+    def _pairwise_distance_matrix(self, images):
+        """Calculate the all-to-all distances one pair of images at a time.
+
+        Fallback for distance metrics that don't implement the batched
+        'image_distance_matrix' method.
+
+        Parameters
+        ----------
+        images : list of image obeject
+
+        Returns
+        -------
+        distance_matrix : arraylike of shape (num_walkers, num_walkers)
+
+        """
+
+        # initialize an all-to-all matrix, with 0.0 for self distances
+        dist_mat = np.zeros((len(images), len(images)))
 
         # get the combinations of indices for all walker pairs
         for i, j in it.combinations(range(len(images)), 2):
@@ -551,7 +1181,7 @@ class REVOResampler(CloneMergeResampler):
             dist_mat[i][j] = dist
             dist_mat[j][i] = dist
 
-        return [walker_dists for walker_dists in dist_mat], images
+        return dist_mat
 
     @log_call(include_args=[],
               include_result=False)
@@ -598,6 +1228,9 @@ class REVOResampler(CloneMergeResampler):
         # actually do the cloning and merging of the walkers
         resampled_walkers = self.DECISION.action(walkers, [resampling_data])
 
+        # the images of squashed walkers won't be needed again
+        self._image_cache.retain([walker.state for walker in resampled_walkers])
+
        # flatten the distance matrix and give the number of walkers
         # as well for the resampler data, there is just one per cycle
         resampler_data = [{'distance_matrix' : np.ravel(np.array(distance_matrix)),
@@ -1,7 +1,7 @@
 import math
 import random as rand
 import itertools as it
-from collections import namedtuple, defaultdict
+from collections import namedtuple, defaultdict, deque
 from copy import copy, deepcopy
 
 import logging
@@ -13,6 +13,7 @@ import networkx as nx
 from wepy.resampling.resamplers.resampler  import ResamplerError
 from wepy.resampling.resamplers.clone_merge  import CloneMergeResampler
 from wepy.resampling.decisions.clone_merge import MultiCloneMergeDecision
+from wepy.resampling.distances.distance import ImageCache
 
 class RegionTreeError(Exception):
     """Errors related to violations of constraints in RegionTree algorithms."""
@@ -195,9 +196,28 @@ def calc_max_num_clones(walker_weight, min_weight, max_num_walkers):
     return max_n_clones
 
 
-class RegionTree(nx.DiGraph):
+def _assign_states_task(args):
+    """Assign a chunk of states to a region tree in a distance worker."""
+
+    region_tree, states = args
+
+    assignments = region_tree.assign_many(states)
+
+    # send back the images that were made so they can be cached
+    return assignments, region_tree.image_cache.images(states)
+
+class RegionTree():
     """Used internally in the WExploreResampler module. Not really
-    intended to be used outside this module."""
+    intended to be used outside this module.
+
+    The regions (nodes) of the tree are identified by tuples of the
+    indices of the children taken at each level from the root, which
+    is the empty tuple. Internally they are also given integer indices
+    in the order they were made which index the arrays holding the
+    attributes of the nodes that change every cycle. Use `to_graph`
+    to get a networkx graph of the tree with these attributes.
+
+    """
 
     # the strings for choosing a method of solving how deciding how
     # many walkers can be merged together given a group of walkers and
@@ -228,9 +248,8 @@ class RegionTree(nx.DiGraph):
                  max_region_sizes=None,
                  distance=None,
                  pmin=None, pmax=None,
-                 merge_method='single'):
-
-        super().__init__()
+                 merge_method='single',
+                 image_cache=None):
 
         if (max_n_regions is None) or \
            (max_region_sizes is None) or \
@@ -246,6 +265,13 @@ class RegionTree(nx.DiGraph):
         self._pmin = pmin
         self._pmax = pmax
 
+        # the images of walker states, may be shared with the
+        # resampler
+        if image_cache is None:
+            image_cache = ImageCache(distance)
+
+        self._image_cache = image_cache
+
         # initialize the max and min number of walkers, this is a
         # dynamic thing and is manually set by the WExploreResampler
         self._max_num_walkers = False
@@ -265,25 +291,38 @@ class RegionTree(nx.DiGraph):
         image = self.distance.image(init_state)
         self._images = [image]
 
+        # the images of the children of each node, in the order of
+        # the children, for computing the distances to all of them
+        # at once
+        self._children_images = {}
+
+        # the structure of the tree, each node is given an integer
+        # index in the order they are made
+        self._node_ids = []
+        self._node_idxs = {}
+        self._node_image_idxs = []
+        self._children_idxs = []
+        self._level_node_idxs = [[] for level in range(self._n_levels + 1)]
+
+        # the node indices from the root to each node
+        self._node_paths = []
+
+        # the attributes of the nodes which are reset every cycle
+        self._n_walkers = np.zeros(0, dtype=int)
+        self._n_squashable = np.zeros(0, dtype=int)
+        self._n_possible_clones = np.zeros(0, dtype=int)
+        self._balance = np.zeros(0, dtype=int)
+
+        # the node indices from the root to the leaf each walker is
+        # assigned to, with a row for each walker
+        self._walker_paths = np.zeros((0, self._n_levels + 1), dtype=int)
+
         parent_id = self.ROOT_NODE
-        self.add_node(parent_id, image_idx=0,
-                      n_walkers=0,
-                      n_squashable=0,
-                      n_possible_clones=0,
-                      balance=0,
-                      walker_idxs=[])
+        self._add_node(parent_id, image_idx)
 
         # make the first branch
         for level in range(len(max_n_regions)):
-            child_id = parent_id + (0,)
-            self.add_node(child_id, image_idx=image_idx,
-                          n_walkers=0,
-                          n_squashable=0,
-                          n_possible_clones=0,
-                          balance=0,
-                          walker_idxs=[])
-            self.add_edge(parent_id, child_id)
-            parent_id = child_id
+            parent_id = self.add_child(parent_id, image_idx)
 
         # add the region for this branch to the regions list
         self._regions = [tuple([0 for i in range(self._n_levels)])]
@@ -303,6 +342,11 @@ class RegionTree(nx.DiGraph):
         """ """
         return self._images
 
+    @property
+    def image_cache(self):
+        """The cache of images of walker states."""
+        return self._image_cache
+
     @property
     def max_n_regions(self):
         """ """
@@ -343,6 +387,122 @@ class RegionTree(nx.DiGraph):
         """ """
         return self._regions
 
+    @property
+    def nodes(self):
+        """The ids of all the nodes in the order they were made."""
+        return list(self._node_ids)
+
+    @property
+    def n_nodes(self):
+        """The number of nodes in the tree."""
+        return len(self._node_ids)
+
+    def _add_node(self, node_id, image_idx, parent_idx=None):
+        """Add a node to the tree structure and the attribute arrays.
+
+        Parameters
+        ----------
+        node_id : tuple of int
+
+        image_idx : int
+
+        parent_idx : int or None
+            The index of the parent node, None for the root.
+
+        Returns
+        -------
+        node_idx : int
+
+        """
+
+        node_idx = len(self._node_ids)
+
+        self._node_ids.append(node_id)
+        self._node_idxs[node_id] = node_idx
+        self._node_image_idxs.append(image_idx)
+        self._children_idxs.append([])
+        self._level_node_idxs[len(node_id)].append(node_idx)
+
+        if parent_idx is None:
+            self._node_paths.append((node_idx,))
+        else:
+            self._children_idxs[parent_idx].append(node_idx)
+            self._node_paths.append(self._node_paths[parent_idx] + (node_idx,))
+
+        self._n_walkers = np.append(self._n_walkers, 0)
+        self._n_squashable = np.append(self._n_squashable, 0)
+        self._n_possible_clones = np.append(self._n_possible_clones, 0)
+        self._balance = np.append(self._balance, 0)
+
+        return node_idx
+
+    def _node_walker_idxs(self, node_id):
+        """The indices of the walkers assigned to a node.
+
+        Parameters
+        ----------
+        node_id : tuple of int
+
+        Returns
+        -------
+        walker_idxs : list of int
+            In increasing order.
+
+        """
+
+        node_idx = self._node_idxs[node_id]
+
+        return np.flatnonzero(self._walker_paths[:, len(node_id)] == node_idx).tolist()
+
+    def node_attributes(self, node_id):
+        """Get the attributes of a node.
+
+        Parameters
+        ----------
+        node_id : tuple of int
+
+        Returns
+        -------
+        attributes : dict of str: value
+            The 'image_idx', 'n_walkers', 'walker_idxs',
+            'n_squashable', 'n_possible_clones', and 'balance' of the
+            node.
+
+        """
+
+        node_idx = self._node_idxs[node_id]
+
+        return {'image_idx' : self._node_image_idxs[node_idx],
+                'n_walkers' : int(self._n_walkers[node_idx]),
+                'walker_idxs' : self._node_walker_idxs(node_id),
+                'n_squashable' : int(self._n_squashable[node_idx]),
+                'n_possible_clones' : int(self._n_possible_clones[node_idx]),
+                'balance' : int(self._balance[node_idx]),}
+
+    def to_graph(self):
+        """Make a networkx directed graph of the tree.
+
+        The nodes have the attributes given by `node_attributes`. This
+        is not used by the tree itself and is meant for reporting and
+        analysis.
+
+        Returns
+        -------
+        graph : networkx.DiGraph
+
+        """
+
+        graph = nx.DiGraph()
+
+        for node_id in self._node_ids:
+            graph.add_node(node_id, **self.node_attributes(node_id))
+
+        for parent_idx, children_idxs in enumerate(self._children_idxs):
+            for child_idx in children_idxs:
+                graph.add_edge(self._node_ids[parent_idx], self._node_ids[child_idx])
+
+        return graph
+
     def add_child(self, parent_id, image_idx):
         """
 
@@ -357,24 +517,50 @@ class RegionTree(nx.DiGraph):
         -------
 
         """
+        parent_idx = self._node_idxs[parent_id]
+
         # make a new child id which will be the next index of the
         # child with the parent id
-        child_id = parent_id + (len(self.children(parent_id)), )
+        child_id = parent_id + (len(self._children_idxs[parent_idx]), )
 
-        # create the node with the image_idx
-        self.add_node(child_id,
-                      image_idx=image_idx,
-                      n_walkers=0,
-                      n_squashable=0,
-                      n_possible_clones=0,
-                      balance=0,
-                      walker_idxs=[])
+        # create the node with the image_idx as a child of the parent
+        self._add_node(child_id, image_idx, parent_idx=parent_idx)
 
-        # make the edge to the child
-        self.add_edge(parent_id, child_id)
+        self._add_child_image(parent_id, self.images[image_idx])
 
         return child_id
 
+    def _add_child_image(self, parent_id, image):
+        """Add the image of a new child to the images of its siblings.
+
+        Images that are arrays are stacked into a single array so
+        that the distances to all of them can be vectorized.
+
+        Parameters
+        ----------
+        parent_id : tuple of int
+
+        image : object produced by Distance.image
+
+        """
+
+        children_images = self._children_images.get(parent_id)
+
+        if children_images is None:
+
+            if isinstance(image, np.ndarray):
+                children_images = image[np.newaxis, ...]
+            else:
+                children_images = [image]
+
+        elif isinstance(children_images, np.ndarray):
+            children_images = np.concatenate([children_images, image[np.newaxis, ...]])
+
+        else:
+            children_images.append(image)
+
+        self._children_images[parent_id] = children_images
+
     def children(self, parent_id):
         """
 
@@ -387,10 +573,9 @@ class RegionTree(nx.DiGraph):
         -------
 
         """
-        children_ids = list(self.adj[parent_id].keys())
-        # sort them
-        children_ids.sort()
-        return children_ids
+        # children are always made in order
+        return [self._node_ids[child_idx]
+                for child_idx in self._children_idxs[self._node_idxs[parent_id]]]
 
     def level_nodes(self, level):
         """Get the nodes/regions at the specified level.
@@ -408,8 +593,7 @@ class RegionTree(nx.DiGraph):
         if level > self.n_levels:
             raise ValueError("level is greater than the number of levels for this tree")
 
-        return [node_id for node_id in self.nodes
-                if len(node_id) == level]
+        return [self._node_ids[node_idx] for node_idx in self._level_node_idxs[level]]
 
     def leaf_nodes(self):
         """ """
@@ -533,68 +717,95 @@ class RegionTree(nx.DiGraph):
 
         """
 
-        assignment = []
-        dists = []
+        return self.assign_many([state])[0]
+
+    def assign_many(self, states):
+        """Assign many states to the regions of the tree at once.
+
+        The tree is descended one level at a time and the distances
+        from all of the states in a region to the images of its
+        children are computed with a single call to the distance's
+        'image_distance_matrix'.
 
-        # a cache for the distance calculations so they need not be
-        # performed more than once
-        dist_cache = {}
+        Parameters
+        ----------
+        states : list of objects implementing WalkerState
+
+        Returns
+        -------
+        assignments : list of tuple of (tuple of int, tuple of float)
+            For each state the index of the closest child at each
+            level and the distances to them, the same as `assign`.
+
+        """
+
+        images = self.image_cache.images(states)
+
+        assignments = [[] for state in states]
+        dists = [[] for state in states]
+
+        # the region each state is in at the current level
+        state_nodes = [self.ROOT_NODE for state in states]
 
         # perform a n-ary search through the hierarchy of regions by
         # performing a distance calculation to the images at each
         # level starting at the top
-        node = self.ROOT_NODE
         for level in range(self.n_levels):
-            level_nodes = self.children(node)
-
-            # perform a distance calculation to all nodes at this
-            # level
-            image_dists = []
-            for level_node in level_nodes:
-
-                # get the image
-                image_idx = self.node[level_node]['image_idx']
-                image = self.images[image_idx]
-
-                # if this distance is already calculated don't
-                # calculate it again and just get it from the cache
-                if image_idx in dist_cache:
-                    dist = dist_cache[image_idx]
-                # otherwise calculate it and save it in the cache
-                else:
-                    # image of the state
-                    state_image = self.distance.image(state)
-
-                    # there is the possibility of
-                    try:
-                        dist = self.distance.image_distance(state_image, image)
-                    except ValueError:
-                        print("state: ", state.dict())
-                        print("state_image: ", state_image)
-                        print("image: ", image)
-                        raise ValueError("If you have triggered this error you have"
-                                         " encountered a rare bug. Please attempt to"
-                                         " report this using the printed outputs.")
-
-                    # save in the dist_cache
-                    dist_cache[image_idx] = dist
-
-                # add it to the dists for this state
-                image_dists.append(dist)
-
-            # get the index of the image that is closest
-            level_closest_child_idx = np.argmin(image_dists)
-            # get the distance for the closest image
-            level_closest_image_dist = image_dists[level_closest_child_idx]
-
-            # save for return
-            assignment.append(level_closest_child_idx)
-            dists.append(level_closest_image_dist)
-
-            # set this node as the next node
-            node = level_nodes[level_closest_child_idx]
-
-        return tuple(assignment), tuple(dists)
+
+            # group the states by the region they are in
+            node_state_idxs = defaultdict(list)
+            for state_idx, node in enumerate(state_nodes):
+                node_state_idxs[node].append(state_idx)
+
+            for node, state_idxs in node_state_idxs.items():
+
+                # the distances from each state to all of the children
+                image_dists = self._children_image_distances(node,
+                                                             [images[i] for i in state_idxs])
+
+                # get the index of the image that is closest
+                closest_child_idxs = np.argmin(image_dists, axis=1)
+
+                for state_idx, child_idx, state_dists in zip(state_idxs,
+                                                             closest_child_idxs,
+                                                             image_dists):
+
+                    # save for return
+                    assignments[state_idx].append(child_idx)
+                    dists[state_idx].append(state_dists[child_idx])
+
+                    # set this node as the next node
+                    state_nodes[state_idx] = node + (int(child_idx),)
+
+        return [(tuple(assignment), tuple(state_dists))
+                for assignment, state_dists in zip(assignments, dists)]
+
+    def _children_image_distances(self, parent_id, images):
+        """Compute the distances from images to the images of the
+        children of a node.
+
+        Parameters
+        ----------
+        parent_id : tuple of int
+
+        images : list of objects produced by Distance.image
+
+        Returns
+        -------
+        distances : arraylike of float of shape (n_images, n_children)
+
+        """
+
+        children_images = self._children_images[parent_id]
+
+        if hasattr(self.distance, 'image_distance_matrix'):
+            return np.asarray(self.distance.image_distance_matrix(images, children_images))
+
+        image_dists = np.zeros((len(images), len(children_images)))
+        for i, j in it.product(range(len(images)), range(len(children_images))):
+            image_dists[i, j] = self.distance.image_distance(images[i], children_images[j])
+
+        return image_dists
 
     def clear_walkers(self):
         """Remove all walkers from the regions."""
@@ -604,22 +815,24 @@ class RegionTree(nx.DiGraph):
         self._walker_weights = []
 
         # set all the node attributes to their defaults
-        for node_id in self.nodes:
-            self.node[node_id]['n_walkers'] = 0
-            self.node[node_id]['walker_idxs'] = []
+        self._walker_paths = np.zeros((0, self.n_levels + 1), dtype=int)
 
-            self.node[node_id]['n_squashable'] = 0
-            self.node[node_id]['n_possible_clones'] = 0
-            self.node[node_id]['balance'] = 0
+        self._n_walkers = np.zeros(self.n_nodes, dtype=int)
+        self._n_squashable = np.zeros(self.n_nodes, dtype=int)
+        self._n_possible_clones = np.zeros(self.n_nodes, dtype=int)
+        self._balance = np.zeros(self.n_nodes, dtype=int)
 
-
-    def place_walkers(self, walkers):
+    def place_walkers(self, walkers, walker_assignments=None):
         """
 
         Parameters
         ----------
         walkers :
-            
+
+        walker_assignments : list of tuple or None
+            The results of `assign_many` for the walkers' states with
+            the tree as it is, e.g. computed in parallel. If not given
+            they are computed here.
 
         Returns
         -------
@@ -629,15 +842,24 @@ class RegionTree(nx.DiGraph):
         # clear all the walkers and reset node attributes to defaults
         self.clear_walkers()
 
+        states = [walker.state for walker in walkers]
+
+        # assign all of the walkers to the tree as it is at once,
+        # unless this was already done
+        if walker_assignments is None:
+            walker_assignments = self.assign_many(states)
+        else:
+            walker_assignments = list(walker_assignments)
+
         # keep track of new branches made
         new_branches = []
 
         # place each walker
         for walker_idx, walker in enumerate(walkers):
 
-            # assign the state of the walker to the tree and get the
-            # distances to the images at each level
-            assignment, distances = self.assign(walker.state)
+            # the assignment of the state of the walker to the tree
+            # and the distances to the images at each level
+            assignment, distances = walker_assignments[walker_idx]
 
             # check the distances going down the levels to see if a
             # branching (region creation) is necessary
@@ -649,8 +871,8 @@ class RegionTree(nx.DiGraph):
                 if distance > self.max_region_sizes[level] and \
                    len(self.children(assignment[:level])) < self.max_n_regions[level]:
 
-                    # make an image for the region
-                    image = self.distance.image(walker.state)
+                    # get the image for the region
+                    image = self.image_cache.image(walker.state)
                     parent_id = assignment[:level]
 
                     # make the new branch
@@ -662,6 +884,11 @@ class RegionTree(nx.DiGraph):
                                          'new_leaf_id' : np.array(assignment),
                                          'image' : image,})
 
+                    # the tree has changed so the rest of the walkers
+                    # must be assigned again
+                    walker_assignments[walker_idx+1:] = \
+                                    self.assign_many(states[walker_idx+1:])
+
                     # we have made a new branch so we don't need to
                     # continue this loop
                     break
@@ -670,51 +897,46 @@ class RegionTree(nx.DiGraph):
             self._walker_assignments.append(assignment)
             self._walker_weights.append(walker.weight)
 
-            # go back through the nodes in this walker's branch
-            # increase the n_walkers for each node, and save the
-            # walkers (index in self.walker_assignments) it has, and
-            # save increase the number above pmin if valid
-            for level in range(len(assignment) + 1):
-                node_id = assignment[:level]
+        # the nodes in each walker's branch, from the root to the leaf
+        self._walker_paths = np.array([self._node_paths[self._node_idxs[assignment]]
+                                       for assignment in self._walker_assignments],
+                                      dtype=int).reshape((len(walkers), self.n_levels + 1))
 
-                self.node[node_id]['n_walkers'] += 1
-                self.node[node_id]['walker_idxs'].append(walker_idx)
+        # count the walkers in every node at once
+        self._n_walkers = np.bincount(self._walker_paths.ravel(), minlength=self.n_nodes)
 
         # We also want to find out some details about the ability of
         # the leaf nodes to clone and merge walkers. This is useful
         # for being able to balance the tree. Once this has been
         # figured out for the leaf nodes we want to aggregate these
-        # numbers for the higher level regions
-        for node_id in self.leaf_nodes():
+        # numbers for the higher level regions. Leaves without walkers
+        # can't clone or merge so only the occupied ones are done
+        walker_leaf_idxs = self._walker_paths[:, -1]
+        occupied_leaf_idxs = np.unique(walker_leaf_idxs)
+
+        leaves_n_squashable = np.zeros(len(occupied_leaf_idxs), dtype=int)
+        leaves_n_possible_clones = np.zeros(len(occupied_leaf_idxs), dtype=int)
+        for i, leaf_idx in enumerate(occupied_leaf_idxs):
 
-            leaf_walker_idxs = self.node[node_id]['walker_idxs']
-            leaf_weights = [self.walker_weights[i] for i in leaf_walker_idxs]
+            leaf_weights = [self.walker_weights[walker_idx] for walker_idx in
+                            np.flatnonzero(walker_leaf_idxs == leaf_idx)]
 
             # first figure out how many walkers are squashable (AKA
             # reducible)
-            n_squashable = self._calc_squashable_walkers(leaf_weights)
+            leaves_n_squashable[i] = self._calc_squashable_walkers(leaf_weights)
 
             # get the max number of clones for each walker and sum
             # them up to get the total number of cloneable walkers
-            walker_max_n_clones = [self._calc_max_num_clones(walker_weight)
-                                   for walker_weight in leaf_weights]
-            n_possible_clones = sum(walker_max_n_clones)
-
-            # actually set them as attributes for the node
-            self.node[node_id]['n_squashable'] = n_squashable
-            self.node[node_id]['n_possible_clones'] = n_possible_clones
-
-            # also add this amount to all of the nodes above it
+            leaves_n_possible_clones[i] = sum([self._calc_max_num_clones(walker_weight)
+                                               for walker_weight in leaf_weights])
 
-            # n_squashable
-            for level in reversed(range(self.n_levels)):
-                branch_node_id = node_id[:level]
-                self.node[branch_node_id]['n_squashable'] += n_squashable
+        # set them for the leaves and add them to all of the nodes
+        # above them
+        leaf_paths = np.array([self._node_paths[leaf_idx] for leaf_idx in occupied_leaf_idxs],
+                              dtype=int).reshape((len(occupied_leaf_idxs), self.n_levels + 1))
 
-            # n_posssible_clones
-            for level in reversed(range(self.n_levels)):
-                branch_node_id = node_id[:level]
-                self.node[branch_node_id]['n_possible_clones'] += n_possible_clones
+        np.add.at(self._n_squashable, leaf_paths, leaves_n_squashable[:, np.newaxis])
+        np.add.at(self._n_possible_clones, leaf_paths, leaves_n_possible_clones[:, np.newaxis])
 
         return new_branches
 
@@ -848,20 +1070,24 @@ class RegionTree(nx.DiGraph):
         # slots/replicas that will be allocated to this region for
         # running sampling on
 
+        children_node_idxs = [self._node_idxs[child_id] for child_id in children_node_ids]
+
         # we get the current number of shares for each child
-        orig_children_shares = {child_id : len(self.node[child_id]['walker_idxs'])
-                           for child_id in children_node_ids}
+        orig_children_shares = {child_id : int(self._n_walkers[child_idx])
+                           for child_id, child_idx in zip(children_node_ids, children_node_idxs)}
 
         # the copy to use as a tally of the shares
         children_shares = copy(orig_children_shares)
 
         # the donatable (squashable) walkers to start with
-        children_donatable_shares = {child_id : self.node[child_id]['n_squashable']
-                                     for child_id in children_node_ids}
+        children_donatable_shares = {child_id : int(self._n_squashable[child_idx])
+                                     for child_id, child_idx in zip(children_node_ids,
+                                                                    children_node_idxs)}
 
         # the donatable (squashable) walkers to start with
-        children_receivable_shares = {child_id : self.node[child_id]['n_possible_clones']
-                                     for child_id in children_node_ids}
+        children_receivable_shares = {child_id : int(self._n_possible_clones[child_idx])
+                                      for child_id, child_idx in zip(children_node_ids,
+                                                                     children_node_idxs)}
 
         # Our first goal in this subroutine is to dispense a parental
         # balance to it's children in a simply valid manner
@@ -909,7 +1135,7 @@ class RegionTree(nx.DiGraph):
         # children have been generated we set them into their nodes
         for child_node_id, child_net_balance in net_balances.items():
 
-            self.node[child_node_id]['balance'] = child_net_balance
+            self._balance[self._node_idxs[child_node_id]] = child_net_balance
 
 
     def _dispense_parental_shares(self, parental_balance, children_shares,
@@ -1518,13 +1744,13 @@ class RegionTree(nx.DiGraph):
         walker_idxs = list(range(len(merge_groups)))
 
         # the balance of this leaf
-        leaf_balance = self.node[leaf]['balance']
+        leaf_balance = int(self._balance[self._node_idxs[leaf]])
 
         # there should not be any taken walkers in this leaf since a
         # leaf should only have this method run for it once during
         # decision making, so the mergeable walkers are just all the
         # walkers in this leaf
-        leaf_walker_idxs = self.node[leaf]['walker_idxs']
+        leaf_walker_idxs = self._node_walker_idxs(leaf)
         leaf_walker_weights = [self.walker_weights[walker_idx] for walker_idx in leaf_walker_idxs]
 
 
@@ -1667,10 +1893,10 @@ class RegionTree(nx.DiGraph):
 
         # if this leaf node was assigned a debt we need to merge
         # walkers
-        leaf_balance = self.node[leaf]['balance']
-        leaf_walker_idxs = self.node[leaf]['walker_idxs']
+        leaf_balance = int(self._balance[self._node_idxs[leaf]])
+        leaf_walker_idxs = self._node_walker_idxs(leaf)
         leaf_walker_weights = {walker_idx : self.walker_weights[walker_idx]
-                               for walker_idx in self.node[leaf]['walker_idxs']}
+                               for walker_idx in leaf_walker_idxs}
 
         # calculate the maximum possible number of clones each free walker
         # could produce
@@ -1801,7 +2027,7 @@ class RegionTree(nx.DiGraph):
 
         # get all the leaf balances
         leaf_nodes = self.leaf_nodes()
-        leaf_balances = [self.node[leaf]['balance'] for leaf in leaf_nodes]
+        leaf_balances = self._balance[self._level_node_idxs[self.n_levels]].tolist()
 
         # get the negative and positive balanced leaves
         neg_leaves = [leaf_nodes[leaf_idx[0]] for leaf_idx in
@@ -1983,6 +2209,30 @@ class RegionTree(nx.DiGraph):
                 "Clone specs produce underweight walkers for clone walkers {}".format(
                     [str(i) for i in underweight_producer_idxs]))
 
+    def _bfs_successors(self):
+        """Generate the children of each node with children in breadth
+        first order starting from the root.
+
+        Yields
+        ------
+        parent : tuple of int
+
+        children : list of tuple of int
+
+        """
+
+        queue = deque([self._node_idxs[self.ROOT_NODE]])
+        while len(queue) > 0:
+
+            parent_idx = queue.popleft()
+            children_idxs = self._children_idxs[parent_idx]
+
+            if len(children_idxs) > 0:
+                yield (self._node_ids[parent_idx],
+                       [self._node_ids[child_idx] for child_idx in children_idxs])
+
+                queue.extend(children_idxs)
+
     def balance_tree(self, delta_walkers=0):
         """Do balancing between the branches of the tree. the `delta_walkers`
         kwarg can be used to increase or decrease the total number of
@@ -2000,14 +2250,14 @@ class RegionTree(nx.DiGraph):
         """
 
         # set the delta walkers to the balance of the root node
-        self.node[self.ROOT_NODE]['balance'] = delta_walkers
+        self._balance[self._node_idxs[self.ROOT_NODE]] = delta_walkers
 
         # do a breadth first traversal and balance at each level
-        for parent, children in nx.bfs_successors(self, self.ROOT_NODE):
+        for parent, children in self._bfs_successors():
 
             # pass on the balance of this parent to the children from the
             # parents, distribute walkers between
-            parental_balance = self.node[parent]['balance']
+            parental_balance = int(self._balance[self._node_idxs[parent]])
 
             # this will both propagate the balance set for the root
             # walker down the tree and balance between the children
@@ -2015,7 +2265,7 @@ class RegionTree(nx.DiGraph):
 
         # check that the sum of the balances of the leaf nodes
         # balances to delta_walkers
-        leaf_balances = [self.node[leaf]['balance'] for leaf in self.leaf_nodes()]
+        leaf_balances = self._balance[self._level_node_idxs[self.n_levels]].tolist()
         if sum(leaf_balances) != delta_walkers:
 
             raise RegionTreeError(
@@ -2318,6 +2568,8 @@ class WExploreResampler(CloneMergeResampler):
         self.image_shape = image.shape
         self.image_dtype = image.dtype
 
+        # images of walker states that have already been computed
+        self._image_cache = ImageCache(self.distance)
 
         # initialize the region tree with the first state
         self._region_tree = RegionTree(init_state,
@@ -2325,7 +2577,17 @@ class WExploreResampler(CloneMergeResampler):
                                        max_region_sizes=self.max_region_sizes,
                                        distance=self.distance,
                                        pmin=self.pmin,
-                                       pmax=self.pmax)
+                                       pmax=self.pmax,
+                                       image_cache=self._image_cache)
+
+    def __setstate__(self, state):
+
+        super().__setstate__(state)
+
+        # resamplers pickled before images were cached
+        if not hasattr(self, '_image_cache'):
+            self._image_cache = ImageCache(self.distance)
+            self._region_tree._image_cache = self._image_cache
 
     def resampler_field_shapes(self):
 
@@ -2359,6 +2621,24 @@ class WExploreResampler(CloneMergeResampler):
         return self._region_tree
 
 
+    def prepare_walker(self, walker_idx, walker):
+        """Compute the image of the state of a walker ahead of resampling.
+
+        With distance workers the images are computed by the workers
+        while assigning the walkers so nothing is done.
+
+        Parameters
+        ----------
+        walker_idx : int
+            The index of the walker in the cycle.
+
+        walker : Walker object
+
+        """
+
+        if self.distance_pool is None:
+            self._image_cache.image(walker.state)
+
     def assign(self, walkers):
         """Assign walkers to regions in the tree, with region creation.
 
@@ -2380,7 +2660,32 @@ class WExploreResampler(CloneMergeResampler):
         ## images which assign them to bins/leaf-nodes, possibly
         ## creating new regions, do this by calling the method to
         ## "place_walkers"  on the tree which changes the tree's state
-        new_branches = self.region_tree.place_walkers(walkers)
+
+        # if we have distance workers the assignments to the tree as
+        # it currently is can be computed in parallel
+        walker_assignments = None
+        if self.distance_pool is not None:
+
+            states = [walker.state for walker in walkers]
+            chunks = self._distance_chunks(len(states))
+
+            chunk_results = self._distance_map(_assign_states_task,
+                                               [(self.region_tree,
+                                                 [states[i] for i in chunk])
+                                                for chunk in chunks])
+
+            walker_assignments = []
+            for chunk, (chunk_assignments, chunk_images) in zip(chunks, chunk_results):
+
+                walker_assignments.extend(chunk_assignments)
+
+                # keep the images the workers made
+                for i, image in zip(chunk, chunk_images):
+                    if states[i] not in self._image_cache:
+                        self._image_cache.add([states[i]], [image])
+
+        new_branches = self.region_tree.place_walkers(walkers,
+                                                      walker_assignments=walker_assignments)
 
         # data records about changes to the resampler, here is just
         # the new branches data
@@ -2605,6 +2910,9 @@ class WExploreResampler(CloneMergeResampler):
         # records a lists of lists for steps and walkers
         resampled_walkers = self.DECISION.action(walkers, [resampling_data])
 
+        # the images of squashed walkers won't be needed again
+        self._image_cache.retain([walker.state for walker in resampled_walkers])
+
         # normally decide is only for a single step and so does not
         # include the step_idx, so we add this to the records
         for walker_idx, walker_record in enumerate(resampling_data):
@@ -22,9 +22,20 @@ worker type for the WorkerMapper work mapper. This is necessary to
 allow passing of the device index to OpenMM for which GPU device to
 use.
 
+For cheap systems the OpenMMReplicaRunner can be used instead which
+runs many walkers together as non-interacting copies of the system in
+a single context when used with a batched mapper.
+
+When the runner is constructed with `reuse_simulation=True` the
+Simulation object (and its Context) is built once and then reused for
+each segment by just setting the walker state into the context. The
+OpenMM workers each keep a SimulationCache for this so that contexts
+are built once per worker process.
+
 """
 from copy import copy
 import random as rand
+import hashlib
 from warnings import warn
 import logging
 import time
@@ -111,6 +122,77 @@ UNIT_NAMES = (('positions_unit', unit.nanometer.get_name()),
 # TODO: test this isn't needed
 # RAND_SEED_RANGE_MAX = 1000000
 
+
+class SimulationCache(object):
+    """Holds a single OpenMM Simulation object for reuse between segments.
+
+    Only the most recently set simulation is kept since a process
+    typically only runs one system on one platform. Setting a
+    simulation with a different key replaces (and frees) the old one.
+
+    """
+
+    def __init__(self):
+        """Constructor for SimulationCache."""
+
+        self._key = None
+        self._simulation = None
+
+    def __getstate__(self):
+
+        # simulations can't be pickled and wouldn't be valid in
+        # another process so copies always start empty
+        state = self.__dict__.copy()
+        state['_key'] = None
+        state['_simulation'] = None
+
+        return state
+
+    @property
+    def key(self):
+        """The key of the cached simulation."""
+        return self._key
+
+    def get(self, key):
+        """Get the cached simulation if it matches the key.
+
+        Parameters
+        ----------
+        key : hashable
+
+        Returns
+        -------
+        simulation : simtk.openmm.app.Simulation object or None
+            None if there is no simulation for this key.
+
+        """
+
+        if self._simulation is not None and self._key == key:
+            return self._simulation
+        else:
+            return None
+
+    def set(self, key, simulation):
+        """Cache a simulation, replacing any current one.
+
+        Parameters
+        ----------
+        key : hashable
+
+        simulation : simtk.openmm.app.Simulation object
+
+        """
+
+        self._key = key
+        self._simulation = simulation
+
+    def clear(self):
+        """Remove the cached simulation."""
+
+        self._key = None
+        self._simulation = None
+
+
 # the runner for the simulation which runs the actual dynamics
 class OpenMMRunner(Runner):
     """Runner for OpenMM simulations."""
@@ -118,7 +200,8 @@ class OpenMMRunner(Runner):
     def __init__(self, system, topology, integrator,
                  platform=None,
                  platform_kwargs=None,
-                 enforce_box=False):
+                 enforce_box=False,
+                 reuse_simulation=False):
         """Constructor for OpenMMRunner.
 
         Parameters
@@ -149,6 +232,14 @@ class OpenMMRunner(Runner):
             Calls 'context.getState' with 'enforcePeriodicBox' if True.
              (Default value = False)
 
+        reuse_simulation : bool
+            If True the Simulation object for a platform is only built
+            the first time it is needed and subsequent segments reuse
+            it by setting the walker state into its context. When run
+            by an OpenMM worker the simulation is cached in the worker
+            process, otherwise in the runner itself.
+             (Default value = False)
+
         Warnings
         --------
 
@@ -173,6 +264,17 @@ class OpenMMRunner(Runner):
         enforce the boxes will be applied and confusingly wrong
         answers will result that are difficult to find root cause of.
 
+        Regarding the 'reuse_simulation' option.
+
+        OpenMM only reads the random number seed of the integrator
+        when a context is created, so a reused simulation is not
+        reseeded for each segment. Instead the random number stream
+        of the context continues from segment to segment, which still
+        gives different noise to walkers started from the same state
+        (i.e. clones). Integrator state that is not part of an OpenMM
+        State (e.g. global variables of a CustomIntegrator which are
+        not context parameters) is also carried over between segments.
+
         """
 
         assert isinstance(platform, str), f"platform should be a string, not {type(platform)}"
@@ -190,6 +292,14 @@ class OpenMMRunner(Runner):
 
         self.enforce_box = enforce_box
 
+        self.reuse_simulation = reuse_simulation
+
+        # identifies the system and integrator for cached simulations
+        self._simulation_key = self._gen_simulation_key(system, integrator)
+
+        # used when run outside of a worker with its own cache
+        self._simulation_cache = SimulationCache()
+
         self.getState_kwargs = dict(GET_STATE_KWARG_DEFAULTS)
         # update with the user based enforce_box
         self.getState_kwargs['enforcePeriodicBox'] = self.enforce_box
@@ -201,6 +311,43 @@ class OpenMMRunner(Runner):
         # performance
         self._last_cycle_segments_split_times = []
 
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+
+        # runners pickled before simulations could be reused
+        if 'reuse_simulation' not in state:
+            self.reuse_simulation = False
+            self._simulation_key = self._gen_simulation_key(self.system,
+                                                            self.integrator)
+            self._simulation_cache = SimulationCache()
+
+    @staticmethod
+    def _gen_simulation_key(system, integrator):
+        """Generate a key identifying the system and integrator of a
+        simulation.
+
+        This is computed from the serialized forms so that it is the
+        same for copies of the runner in other processes.
+
+        Parameters
+        ----------
+        system : simtk.openmm.System object
+
+        integrator : subclass simtk.openmm.Integrator object
+
+        Returns
+        -------
+        simulation_key : str
+
+        """
+
+        digest = hashlib.sha1()
+        digest.update(omm.XmlSerializer.serialize(system).encode())
+        digest.update(omm.XmlSerializer.serialize(integrator).encode())
+
+        return digest.hexdigest()
+
     @log_call(include_args=[
         'platform',
         'platform_kwargs',
@@ -274,6 +421,97 @@ class OpenMMRunner(Runner):
         return platform_name, \
                platform_kwargs,
 
+    def _gen_platform(self, platform_name, platform_kwargs):
+        """Generate the platform for a new simulation.
+
+        Parameters
+        ----------
+        platform_name : str or None
+            The name of the platform to use.
+
+        platform_kwargs : dict of str : str or None
+            Properties to set for the platform.
+
+        Returns
+        -------
+        platform : simtk.openmm.Platform object or None
+            None if no platform was given and the OpenMM default or
+            environmentally defined one should be used.
+
+        """
+
+        # create the platform and customize
+        if platform_name is not None:
+
+            logging.info("Using platform configured in code.")
+
+            # get the platform by its name to use
+            platform = omm.Platform.getPlatformByName(platform_name)
+            logging.info(f"Platform object created: {platform}")
+
+            if platform_kwargs is None:
+                platform_kwargs = {}
+
+            # set properties from the kwargs if they apply to the platform
+            for key, value in platform_kwargs.items():
+
+                if key in platform.getPropertyNames():
+
+                    logging.info(f"Setting platform property: {key} : {value}")
+                    platform.setPropertyDefaultValue(key, value)
+
+                else:
+                    warn(f"Platform kwargs given ({key} : {value}) "
+                         f"but is not valid for this platform ({platform_name})")
+
+            return platform
+
+        # otherwise just use the default or environmentally defined one
+        else:
+            logging.info("Using environmental platform.")
+            return None
+
+    def _gen_simulation(self, platform_name, platform_kwargs):
+        """Generate a new simulation object for this runner.
+
+        Parameters
+        ----------
+        platform_name : str or None
+            The name of the platform to use. If None the OpenMM
+            default or environmentally defined one is used.
+
+        platform_kwargs : dict of str : str or None
+            Properties to set for the platform.
+
+        Returns
+        -------
+        simulation : simtk.openmm.app.Simulation object
+
+        """
+
+        # make a copy of the integrator for this particular simulation
+        new_integrator = copy(self.integrator)
+        # force setting of random seed to 0, which is a special
+        # value that forces the integrator to choose another
+        # random number
+        new_integrator.setRandomNumberSeed(0)
+
+        platform = self._gen_platform(platform_name, platform_kwargs)
+
+        # if a platform was given we use it to make a Simulation object
+        if platform is not None:
+
+            # make a new simulation object
+            simulation = omma.Simulation(self.topology, self.system,
+                                         new_integrator, platform)
+
+        # otherwise just use the default or environmentally defined one
+        else:
+            simulation = omma.Simulation(self.topology, self.system,
+                                         new_integrator)
+
+        return simulation
+
     @log_call(
         include_args=[
             'segment_length',
@@ -289,6 +527,7 @@ class OpenMMRunner(Runner):
                     getState_kwargs=None,
                     platform=None,
                     platform_kwargs=None,
+                    simulation_cache=None,
                     **kwargs):
         """Run dynamics for the walker.
 
@@ -318,6 +557,10 @@ class OpenMMRunner(Runner):
             key-values to set for a platform with
             platform.setPropertyDefaultValue for this segment only.
 
+        simulation_cache : SimulationCache, optional
+            Cache to get and store the simulation in when
+            'reuse_simulation' is set. If None the runner's own cache
+            is used. Ignored if 'reuse_simulation' is not set.
 
         Returns
         -------
@@ -348,13 +591,6 @@ class OpenMMRunner(Runner):
 
         gen_sim_start = time.time()
 
-        # make a copy of the integrator for this particular segment
-        new_integrator = copy(self.integrator)
-        # force setting of random seed to 0, which is a special
-        # value that forces the integrator to choose another
-        # random number
-        new_integrator.setRandomNumberSeed(0)
-
         ## Platform
 
         logging.info("Default 'platform' in runner: "
@@ -389,45 +625,32 @@ class OpenMMRunner(Runner):
 
 
 
-        # create simulation object
+        if self.reuse_simulation:
 
-        ## create the platform and customize
+            if simulation_cache is None:
+                simulation_cache = self._simulation_cache
 
+            simulation_key = (
+                self._simulation_key,
+                platform_name,
+                tuple(sorted(platform_kwargs.items()))
+                if platform_kwargs is not None else None,
+            )
 
+            simulation = simulation_cache.get(simulation_key)
 
-        # if a platform was given we use it to make a Simulation object
-        if platform_name is not None:
-
-            logging.info("Using platform configured in code.")
-
-            # get the platform by its name to use
-            platform = omm.Platform.getPlatformByName(platform_name)
-            logging.info(f"Platform object created: {platform}")
-
-            if platform_kwargs is None:
-                platform_kwargs = {}
-
-            # set properties from the kwargs if they apply to the platform
-            for key, value in platform_kwargs.items():
-
-                if key in platform.getPropertyNames():
+            if simulation is None:
 
-                    logging.info(f"Setting platform property: {key} : {value}")
-                    platform.setPropertyDefaultValue(key, value)
+                logging.info("Building a new simulation to reuse")
 
-                else:
-                    warn(f"Platform kwargs given ({key} : {value}) "
-                         f"but is not valid for this platform ({platform_name})")
+                simulation = self._gen_simulation(platform_name, platform_kwargs)
+                simulation_cache.set(simulation_key, simulation)
 
-            # make a new simulation object
-            simulation = omma.Simulation(self.topology, self.system,
-                                         new_integrator, platform)
+            else:
+                logging.info("Reusing the cached simulation")
 
-        # otherwise just use the default or environmentally defined one
         else:
-            logging.info("Using environmental platform.")
-            simulation = omma.Simulation(self.topology, self.system,
-                                         new_integrator)
+            simulation = self._gen_simulation(platform_name, platform_kwargs)
 
         # set the state to the context from the walker
         simulation.context.setState(walker.state.sim_state)
@@ -535,6 +758,213 @@ class OpenMMRunner(Runner):
         return new_state
 
 
+STATE_ARRAY_UNITS = (('positions', 'getPositions', 'Position',
+                      unit.nanometer),
+                     ('velocities', 'getVelocities', 'Velocity',
+                      unit.nanometer / unit.picosecond),
+                     ('forces', 'getForces', 'Force',
+                      unit.kilojoule_per_mole / unit.nanometer),)
+"""The arrays of a simtk.openmm.State saved as numpy arrays when
+pickling an OpenMMState. Each entry is the name of the field, the
+getter of the State, the name of the element for each particle in the
+XML of the State, and the unit of the values, which is the one of the
+XML."""
+
+def _state_value(sim_state, getter, *args, **kwargs):
+    """Call a getter of a simtk.openmm.State or give None if the State
+    doesn't have the value."""
+
+    try:
+        return getattr(sim_state, getter)(*args, **kwargs)
+    except Exception:
+        return None
+
+class OpenMMStateFields(object):
+    """The values of a simtk.openmm.State with the arrays as numpy
+    arrays.
+
+    OpenMM State objects pickle themselves as one XML string, so the
+    arrays can't be sent out-of-band (see wepy.work_mapper.transport).
+    OpenMMStates are pickled as these instead and the State is only
+    made again from them when it is needed, e.g. to set the state of a
+    simulation context.
+
+    Implements the getters of the State used by OpenMMState.
+
+    """
+
+    def __init__(self, sim_state):
+        """Constructor for OpenMMStateFields.
+
+        Parameters
+        ----------
+        sim_state : simtk.openmm.State object
+
+        """
+
+        self.arrays = {}
+        for field, getter, _, array_unit in STATE_ARRAY_UNITS:
+
+            values = _state_value(sim_state, getter, asNumpy=True)
+            if values is not None:
+                values = np.ascontiguousarray(values.value_in_unit(array_unit))
+
+            self.arrays[field] = values
+
+        self.box_vectors = _state_value(sim_state, 'getPeriodicBoxVectors',
+                                        asNumpy=True).value_in_unit(unit.nanometer)
+        self.time = sim_state.getTime().value_in_unit(unit.picosecond)
+        self.step_count = _state_value(sim_state, 'getStepCount')
+
+        self.energies = None
+        kinetic_energy = _state_value(sim_state, 'getKineticEnergy')
+        if kinetic_energy is not None:
+            self.energies = (
+                kinetic_energy.value_in_unit(unit.kilojoule_per_mole),
+                sim_state.getPotentialEnergy().value_in_unit(unit.kilojoule_per_mole))
+
+        self.parameters = _state_value(sim_state, 'getParameters')
+        if self.parameters is not None:
+            self.parameters = dict(self.parameters)
+
+        self.parameter_derivatives = _state_value(sim_state,
+                                                  'getEnergyParameterDerivatives')
+        if self.parameter_derivatives is not None:
+            self.parameter_derivatives = dict(self.parameter_derivatives)
+
+    def _array(self, field):
+
+        values = self.arrays[field]
+        if values is None:
+            raise ValueError("The State has no {}".format(field))
+
+        array_unit = {field : array_unit
+                      for field, _, _, array_unit in STATE_ARRAY_UNITS}[field]
+
+        return unit.Quantity(values, array_unit)
+
+    def getPositions(self, asNumpy=True):
+        return self._array('positions')
+
+    def getVelocities(self, asNumpy=True):
+        return self._array('velocities')
+
+    def getForces(self, asNumpy=True):
+        return self._array('forces')
+
+    def getPeriodicBoxVectors(self, asNumpy=True):
+        return unit.Quantity(self.box_vectors, unit.nanometer)
+
+    def getPeriodicBoxVolume(self):
+        # the box vectors are in reduced form as for the State
+        return unit.Quantity(np.prod(np.diag(self.box_vectors)), unit.nanometer**3)
+
+    def getTime(self):
+        return unit.Quantity(self.time, unit.picosecond)
+
+    def getKineticEnergy(self):
+
+        if self.energies is None:
+            raise ValueError("The State has no energies")
+
+        return unit.Quantity(self.energies[0], unit.kilojoule_per_mole)
+
+    def getPotentialEnergy(self):
+
+        if self.energies is None:
+            raise ValueError("The State has no energies")
+
+        return unit.Quantity(self.energies[1], unit.kilojoule_per_mole)
+
+    def getParameters(self):
+
+        if self.parameters is None:
+            raise ValueError("The State has no parameters")
+
+        return self.parameters
+
+    def getEnergyParameterDerivatives(self):
+
+        if self.parameter_derivatives is None:
+            raise ValueError("The State has no parameter derivatives")
+
+        return self.parameter_derivatives
+
+    def to_xml(self):
+        """Make the XML of the State in the format of
+        simtk.openmm.XmlSerializer.
+
+        Returns
+        -------
+        xml : str
+
+        """
+
+        step_count = ''
+        if self.step_count is not None:
+            step_count = ' stepCount="{}"'.format(self.step_count)
+
+        lines = ['<?xml version="1.0" ?>',
+                 '<State{} time="{!r}" type="State" version="1">'.format(step_count,
+                                                                         self.time),
+                 '<PeriodicBoxVectors>']
+
+        for name, vector in zip('ABC', self.box_vectors.tolist()):
+            lines.append('<{} x="{!r}" y="{!r}" z="{!r}"/>'.format(name, *vector))
+
+        lines.append('</PeriodicBoxVectors>')
+
+        if self.parameters is not None:
+            lines.append('<Parameters {}/>'.format(
+                ' '.join('{}="{!r}"'.format(key, float(value))
+                         for key, value in self.parameters.items())))
+
+        if self.energies is not None:
+            lines.append('<Energies KineticEnergy="{!r}" PotentialEnergy="{!r}"/>'.format(
+                *self.energies))
+
+        for field, _, element, _ in STATE_ARRAY_UNITS:
+
+            values = self.arrays[field]
+            if values is None:
+                continue
+
+            # format all of the values at once, repr keeps all of the
+            # digits
+            element_fmt = '<{} x="%r" y="%r" z="%r"/>\n'.format(element)
+            lines.append('<{}>\n'.format(field.capitalize()) +
+                         (element_fmt * values.shape[0]) % tuple(values.ravel().tolist()) +
+                         '</{}>'.format(field.capitalize()))
+
+        lines.append('</State>')
+
+        return '\n'.join(lines)
+
+    def to_state(self):
+        """Make the simtk.openmm.State again.
+
+        The parameter derivatives are not part of the State made,
+        as for the XML serialization of States.
+
+        Returns
+        -------
+        sim_state : simtk.openmm.State object
+
+        """
+
+        return omm.XmlSerializer.deserialize(self.to_xml())
+
+
+def _rebuild_openmm_state(state_type, state_fields, data):
+    """Unpickle an OpenMMState, see OpenMMState.__reduce__."""
+
+    state = state_type.__new__(state_type)
+    state._sim_state = state_fields
+    state._data = data
+
+    return state
+
+
 class OpenMMState(WalkerState):
     """Walker state that wraps an simtk.openmm.State object.
 
@@ -596,8 +1026,23 @@ class OpenMMState(WalkerState):
     @property
     def sim_state(self):
         """The underlying simtk.openmm.State object this is wrapping."""
+
+        # unpickled states only make the State when it is needed
+        if isinstance(self._sim_state, OpenMMStateFields):
+            self._sim_state = self._sim_state.to_state()
+
         return self._sim_state
 
+    def __reduce__(self):
+
+        # pickle the arrays of the State as numpy arrays so they can
+        # be sent out-of-band instead of in the XML of the State
+        state_fields = self._sim_state
+        if not isinstance(state_fields, OpenMMStateFields):
+            state_fields = OpenMMStateFields(state_fields)
+
+        return (_rebuild_openmm_state, (type(self), state_fields, self._data))
+
     def __getitem__(self, key):
 
         # if this was a key for data not mapped from the OpenMM.State
@@ -658,7 +1103,7 @@ class OpenMMState(WalkerState):
     def positions(self):
         """The positions of the state as a numpy array simtk.units.Quantity object."""
         try:
-            return self.sim_state.getPositions(asNumpy=True)
+            return self._sim_state.getPositions(asNumpy=True)
         except:
             warn("Unknown exception handled from `self.sim_state.getPositions()`, "
                      "this is probably because this attribute is not in the State.")
@@ -682,7 +1127,7 @@ class OpenMMState(WalkerState):
     def velocities(self):
         """The velocities of the state as a numpy array simtk.units.Quantity object."""
         try:
-            return self.sim_state.getVelocities(asNumpy=True)
+            return self._sim_state.getVelocities(asNumpy=True)
         except:
             warn("Unknown exception handled from `self.sim_state.getVelocities()`, "
                      "this is probably because this attribute is not in the State.")
@@ -711,7 +1156,7 @@ class OpenMMState(WalkerState):
     def forces(self):
         """The forces of the state as a numpy array simtk.units.Quantity object."""
         try:
-            return self.sim_state.getForces(asNumpy=True)
+            return self._sim_state.getForces(asNumpy=True)
         except:
             warn("Unknown exception handled from `self.sim_state.getForces()`, "
                      "this is probably because this attribute is not in the State.")
@@ -740,7 +1185,7 @@ class OpenMMState(WalkerState):
     def box_vectors(self):
         """The box vectors of the state as a numpy array simtk.units.Quantity object."""
         try:
-            return self.sim_state.getPeriodicBoxVectors(asNumpy=True)
+            return self._sim_state.getPeriodicBoxVectors(asNumpy=True)
         except:
             warn("Unknown exception handled from `self.sim_state.getPeriodicBoxVectors()`, "
                      "this is probably because this attribute is not in the State.")
@@ -772,7 +1217,7 @@ class OpenMMState(WalkerState):
     def kinetic_energy(self):
         """The kinetic energy of the state as a numpy array simtk.units.Quantity object."""
         try:
-            return self.sim_state.getKineticEnergy()
+            return self._sim_state.getKineticEnergy()
         except:
             warn("Unknown exception handled from `self.sim_state.getKineticEnergy()`, "
                      "this is probably because this attribute is not in the State.")
@@ -801,7 +1246,7 @@ class OpenMMState(WalkerState):
     def potential_energy(self):
         """The potential energy of the state as a numpy array simtk.units.Quantity object."""
         try:
-            return self.sim_state.getPotentialEnergy()
+            return self._sim_state.getPotentialEnergy()
         except:
             warn("Unknown exception handled from `self.sim_state.getPotentialEnergy()`, "
                      "this is probably because this attribute is not in the State.")
@@ -830,7 +1275,7 @@ class OpenMMState(WalkerState):
     def time(self):
         """The time of the state as a numpy array simtk.units.Quantity object."""
         try:
-            return self.sim_state.getTime()
+            return self._sim_state.getTime()
         except:
             warn("Unknown exception handled from `self.sim_state.getTime()`, "
                      "this is probably because this attribute is not in the State.")
@@ -859,7 +1304,7 @@ class OpenMMState(WalkerState):
     def box_volume(self):
         """The box volume of the state as a numpy array simtk.units.Quantity object."""
         try:
-            return self.sim_state.getPeriodicBoxVolume()
+            return self._sim_state.getPeriodicBoxVolume()
         except:
             warn("Unknown exception handled from `self.sim_state.getPeriodicBoxVolume()`, "
                      "this is probably because this attribute is not in the State.")
@@ -896,7 +1341,7 @@ class OpenMMState(WalkerState):
         """
 
         try:
-            return self.sim_state.getParameters()
+            return self._sim_state.getParameters()
         except:
             warn("Unknown exception handled from `self.sim_state.getParameters()`, "
                      "this is probably because this attribute is not in the State.")
@@ -945,7 +1390,7 @@ class OpenMMState(WalkerState):
         """
 
         try:
-            return self.sim_state.getEnergyParameterDerivatives()
+            return self._sim_state.getEnergyParameterDerivatives()
         except:
             warn("Unknown exception handled from `self.sim_state.getEnergyParameterDerivatives()`, "
                      "this is probably because this attribute is not in the State.")
@@ -1234,6 +1679,632 @@ class OpenMMWalker(Walker):
         super().__init__(state, weight)
 
 
+ONE_4PI_EPS0 = 138.93545764438198
+"""Coulomb's constant in OpenMM units (kJ nm / (mol e^2)) used when
+converting NonbondedForce objects to custom forces."""
+
+REPLICATED_TERM_FORCES = (
+    ('HarmonicBondForce', 'getNumBonds', 'getBondParameters', 'addBond', 2),
+    ('HarmonicAngleForce', 'getNumAngles', 'getAngleParameters', 'addAngle', 3),
+    ('PeriodicTorsionForce', 'getNumTorsions', 'getTorsionParameters', 'addTorsion', 4),
+    ('RBTorsionForce', 'getNumTorsions', 'getTorsionParameters', 'addTorsion', 4),
+    ('CustomBondForce', 'getNumBonds', 'getBondParameters', 'addBond', 2),
+    ('CustomAngleForce', 'getNumAngles', 'getAngleParameters', 'addAngle', 3),
+    ('CustomTorsionForce', 'getNumTorsions', 'getTorsionParameters', 'addTorsion', 4),
+    ('CustomExternalForce', 'getNumParticles', 'getParticleParameters', 'addParticle', 1),
+)
+"""Forces which are lists of terms over particles that can be
+replicated by adding the terms with shifted particle indices. Each
+entry is the name of the force class, the methods to get the number of
+terms, get the parameters of a term, and add a term, and the number of
+particle indices that lead the parameters of a term."""
+
+
+def _replicate_terms(force, n_particles, n_replicas,
+                     num_method, get_method, add_method, n_idxs):
+    """Make a copy of a force with its terms replicated for each replica."""
+
+    new_force = omm.XmlSerializer.clone(force)
+
+    get_term = getattr(force, get_method)
+    add_term = getattr(new_force, add_method)
+
+    terms = [get_term(term_idx)
+             for term_idx in range(getattr(force, num_method)())]
+
+    for replica_idx in range(1, n_replicas):
+        offset = replica_idx * n_particles
+
+        for term in terms:
+            idxs = [idx + offset for idx in term[:n_idxs]]
+            add_term(*idxs, *term[n_idxs:])
+
+    return new_force
+
+
+def _replicate_custom_nonbonded(force, n_particles, n_replicas):
+    """Make a copy of a CustomNonbondedForce with the particles
+    replicated and interactions restricted to within replicas."""
+
+    if force.getUseLongRangeCorrection():
+        raise ValueError("CustomNonbondedForce objects with a long range "
+                         "correction cannot be replicated")
+
+    new_force = omm.XmlSerializer.clone(force)
+
+    particle_params = [force.getParticleParameters(idx)
+                       for idx in range(n_particles)]
+    exclusions = [force.getExclusionParticles(idx)
+                  for idx in range(force.getNumExclusions())]
+    groups = [force.getInteractionGroupParameters(idx)
+              for idx in range(force.getNumInteractionGroups())]
+
+    # without groups every particle interacts with every other
+    # one, so this is restricted to a group for the first replica
+    if len(groups) == 0:
+        groups = [(set(range(n_particles)), set(range(n_particles)))]
+        new_force.addInteractionGroup(*groups[0])
+
+    for replica_idx in range(1, n_replicas):
+        offset = replica_idx * n_particles
+
+        for params in particle_params:
+            new_force.addParticle(params)
+
+        for i, j in exclusions:
+            new_force.addExclusion(i + offset, j + offset)
+
+        for set1, set2 in groups:
+            new_force.addInteractionGroup([idx + offset for idx in set1],
+                                          [idx + offset for idx in set2])
+
+    return new_force
+
+
+def _direct_nonbonded_force(force, energy, params, use_switching):
+    """Make a CustomNonbondedForce with the cutoff of a NonbondedForce."""
+
+    direct_force = omm.CustomNonbondedForce(energy)
+
+    for param in params:
+        direct_force.addPerParticleParameter(param)
+
+    direct_force.setNonbondedMethod({
+        omm.NonbondedForce.NoCutoff : omm.CustomNonbondedForce.NoCutoff,
+        omm.NonbondedForce.CutoffNonPeriodic : omm.CustomNonbondedForce.CutoffNonPeriodic,
+        omm.NonbondedForce.CutoffPeriodic : omm.CustomNonbondedForce.CutoffPeriodic,
+    }[force.getNonbondedMethod()])
+
+    direct_force.setCutoffDistance(force.getCutoffDistance())
+    direct_force.setUseSwitchingFunction(use_switching)
+    direct_force.setSwitchingDistance(force.getSwitchingDistance())
+    direct_force.setForceGroup(force.getForceGroup())
+
+    return direct_force
+
+
+def _replicate_nonbonded(force, n_particles, n_replicas):
+    """Make custom forces that compute a NonbondedForce for each replica
+    independently.
+
+    Only the methods without a reciprocal space component can be
+    expressed this way. The direct space particle interactions are
+    converted to CustomNonbondedForces, one for the Lennard-Jones
+    interactions and one for the Coulomb interactions since only the
+    former are switched off, and the exceptions to a CustomBondForce.
+
+    """
+
+    method = force.getNonbondedMethod()
+
+    if method not in (omm.NonbondedForce.NoCutoff,
+                      omm.NonbondedForce.CutoffNonPeriodic,
+                      omm.NonbondedForce.CutoffPeriodic):
+        raise ValueError("Only the NoCutoff, CutoffNonPeriodic, and CutoffPeriodic "
+                         "methods of NonbondedForce can be replicated")
+
+    if method == omm.NonbondedForce.CutoffPeriodic and \
+       force.getUseDispersionCorrection():
+        raise ValueError("NonbondedForce objects with a dispersion correction "
+                         "cannot be replicated")
+
+    if force.getNumParticleParameterOffsets() > 0 or \
+       force.getNumExceptionParameterOffsets() > 0:
+        raise ValueError("NonbondedForce objects with parameter offsets "
+                         "cannot be replicated")
+
+    lj_expr = "4*epsilon*((sigma/r)^12 - (sigma/r)^6)"
+
+    if method == omm.NonbondedForce.NoCutoff:
+        coulomb_expr = f"{ONE_4PI_EPS0}*q1*q2/r"
+
+    # the cutoff methods use the reaction field approximation
+    else:
+        cutoff = force.getCutoffDistance().value_in_unit(unit.nanometer)
+        dielectric = force.getReactionFieldDielectric()
+
+        krf = (1 / cutoff**3) * (dielectric - 1) / (2 * dielectric + 1)
+        crf = (1 / cutoff) * (3 * dielectric) / (2 * dielectric + 1)
+
+        coulomb_expr = f"{ONE_4PI_EPS0}*q1*q2*(1/r + {krf}*r^2 - {crf})"
+
+    # NonbondedForce only applies the switching function to the
+    # Lennard-Jones interactions
+    lj_force = _direct_nonbonded_force(
+        force,
+        f"{lj_expr}; sigma=0.5*(sigma1+sigma2); epsilon=sqrt(epsilon1*epsilon2)",
+        ('sigma', 'epsilon'),
+        force.getUseSwitchingFunction())
+
+    coulomb_force = _direct_nonbonded_force(
+        force,
+        coulomb_expr,
+        ('q',),
+        False)
+
+    exception_force = omm.CustomBondForce(
+        f"{ONE_4PI_EPS0}*chargeProd/r + {lj_expr}")
+
+    exception_force.addPerBondParameter('chargeProd')
+    exception_force.addPerBondParameter('sigma')
+    exception_force.addPerBondParameter('epsilon')
+
+    exception_force.setUsesPeriodicBoundaryConditions(
+        force.getExceptionsUsePeriodicBoundaryConditions())
+    exception_force.setForceGroup(force.getForceGroup())
+
+    particle_params = [
+        [param.value_in_unit_system(unit.md_unit_system)
+         for param in force.getParticleParameters(idx)]
+        for idx in range(n_particles)]
+
+    exceptions = [
+        [exception[0], exception[1]] +
+        [param.value_in_unit_system(unit.md_unit_system)
+         for param in exception[2:]]
+        for exception in (force.getExceptionParameters(idx)
+                          for idx in range(force.getNumExceptions()))]
+
+    for replica_idx in range(n_replicas):
+        offset = replica_idx * n_particles
+
+        for charge, sigma, epsilon in particle_params:
+            coulomb_force.addParticle([charge])
+            lj_force.addParticle([sigma, epsilon])
+
+        replica_idxs = set(range(offset, offset + n_particles))
+        coulomb_force.addInteractionGroup(replica_idxs, replica_idxs)
+        lj_force.addInteractionGroup(replica_idxs, replica_idxs)
+
+        for i, j, charge_prod, sigma, epsilon in exceptions:
+
+            # every exception is excluded from the direct
+            # interactions but only the non-zero ones are computed
+            coulomb_force.addExclusion(i + offset, j + offset)
+            lj_force.addExclusion(i + offset, j + offset)
+
+            if charge_prod != 0.0 or epsilon != 0.0:
+                exception_force.addBond(i + offset, j + offset,
+                                        [charge_prod, sigma, epsilon])
+
+    new_forces = [lj_force]
+
+    # uncharged systems don't need the Coulomb interactions
+    if any(charge != 0.0 for charge, _, _ in particle_params):
+        new_forces.append(coulomb_force)
+
+    if exception_force.getNumBonds() > 0:
+        new_forces.append(exception_force)
+
+    return new_forces
+
+
+def replicate_system(system, n_replicas):
+    """Make a system of non-interacting copies of a system.
+
+    The particles of replica `i` are the particles of the original
+    system shifted by `i * system.getNumParticles()`.
+
+    Parameters
+    ----------
+    system : simtk.openmm.System object
+        The system to replicate.
+
+    n_replicas : int
+        The number of copies of the system.
+
+    Returns
+    -------
+    replicated_system : simtk.openmm.System object
+
+    Raises
+    ------
+    ValueError
+        If the system has a feature that can't be made to act on each
+        replica independently. These are virtual sites, any force
+        with a reciprocal space or long range correction term, and any
+        force type not known here.
+
+    Warnings
+    --------
+
+    CMMotionRemover forces are dropped since they would remove the
+    center of mass motion of all the replicas together.
+
+    """
+
+    n_particles = system.getNumParticles()
+
+    if any(system.isVirtualSite(idx) for idx in range(n_particles)):
+        raise ValueError("Systems with virtual sites cannot be replicated")
+
+    new_system = omm.System()
+    new_system.setDefaultPeriodicBoxVectors(*system.getDefaultPeriodicBoxVectors())
+
+    masses = [system.getParticleMass(idx) for idx in range(n_particles)]
+    constraints = [system.getConstraintParameters(idx)
+                   for idx in range(system.getNumConstraints())]
+
+    for replica_idx in range(n_replicas):
+        offset = replica_idx * n_particles
+
+        for mass in masses:
+            new_system.addParticle(mass)
+
+        for i, j, distance in constraints:
+            new_system.addConstraint(i + offset, j + offset, distance)
+
+    term_forces = {name : spec for name, *spec in REPLICATED_TERM_FORCES}
+
+    for force in system.getForces():
+
+        force_type = type(force).__name__
+
+        if force_type in term_forces:
+            new_system.addForce(
+                _replicate_terms(force, n_particles, n_replicas,
+                                 *term_forces[force_type]))
+
+        elif force_type == 'CustomNonbondedForce':
+            new_system.addForce(
+                _replicate_custom_nonbonded(force, n_particles, n_replicas))
+
+        elif force_type == 'NonbondedForce':
+            for new_force in _replicate_nonbonded(force, n_particles, n_replicas):
+                new_system.addForce(new_force)
+
+        elif force_type == 'CMMotionRemover':
+            warn("CMMotionRemover forces are not replicated")
+
+        else:
+            raise ValueError(f"Forces of type {force_type} cannot be replicated")
+
+    return new_system
+
+
+class OpenMMReplicaRunner(OpenMMRunner):
+    """Runner for OpenMM simulations which propagates many walkers
+    together as non-interacting replicas of the system in a single
+    context.
+
+    For cheap systems the fixed costs of running a segment (making a
+    simulation, setting states, and the per step overhead) dominate
+    and running many walkers in one context gives a higher
+    throughput of walkers.
+
+    Walkers are only run together by `run_segments` which is used with
+    batched mappers (e.g. wepy.work_mapper.mapper.BatchMapper). The
+    `run_segment` method runs single walkers the same as the
+    OpenMMRunner.
+
+    See `replicate_system` for the kinds of systems that are supported.
+
+    """
+
+    def __init__(self, system, topology, integrator,
+                 max_replicas=None,
+                 **kwargs):
+        """Constructor for OpenMMReplicaRunner.
+
+        Parameters
+        ----------
+        system : simtk.openmm.System object
+            The system (forcefields) for the simulation.
+
+        topology : simtk.openmm.app.Topology object
+            The topology for you system.
+
+        integrator : subclass simtk.openmm.Integrator object
+            Integrator for propagating dynamics.
+
+        max_replicas : int, optional
+            The maximum number of walkers to run together in one
+            context. If None all walkers are run together.
+
+        kwargs
+            Passed to the OpenMMRunner constructor.
+
+        Warnings
+        --------
+
+        Walkers run together share the periodic box vectors and
+        context parameters of the first walker, so these must be the
+        same for all walkers. This is the case as long as the
+        simulation doesn't change them, e.g. with a barostat, which
+        can't be replicated anyways.
+
+        The kinetic energy, potential energy, and forces of each new
+        walker state are computed in a separate context for a single
+        copy of the system after the replicas are propagated.
+
+        """
+
+        super().__init__(system, topology, integrator, **kwargs)
+
+        # check this early instead of when running
+        replicate_system(system, 1)
+
+        self.max_replicas = max_replicas
+
+        # contexts for the replicated systems and simulations for
+        # splitting states out from them, made as needed
+        self._replica_contexts = {}
+        self._split_simulations = {}
+
+    def __getstate__(self):
+
+        # contexts can't be pickled
+        state = self.__dict__.copy()
+        state['_replica_contexts'] = {}
+        state['_split_simulations'] = {}
+
+        return state
+
+    def _replica_context(self, n_replicas, platform_name, platform_kwargs):
+        """Get the context for a number of replicas on a platform, making
+        it if needed."""
+
+        platform_key = (platform_name,
+                        tuple(sorted(platform_kwargs.items()))
+                        if platform_kwargs is not None else None)
+
+        key = (n_replicas,) + platform_key
+
+        if key not in self._replica_contexts:
+
+            logging.info(f"Making a context for {n_replicas} replicas")
+
+            system = replicate_system(self.system, n_replicas)
+
+            integrator = copy(self.integrator)
+            integrator.setRandomNumberSeed(0)
+
+            platform = self._gen_platform(platform_name, platform_kwargs)
+
+            if platform is not None:
+                context = omm.Context(system, integrator, platform)
+            else:
+                context = omm.Context(system, integrator)
+
+            self._replica_contexts[key] = context
+
+        if platform_key not in self._split_simulations:
+            self._split_simulations[platform_key] = \
+                self._gen_simulation(platform_name, platform_kwargs)
+
+        return self._replica_contexts[key], self._split_simulations[platform_key]
+
+    def run_segments(self,
+                     walkers,
+                     segment_lengths,
+                     getState_kwargs=None,
+                     platform=None,
+                     platform_kwargs=None,
+                     **kwargs):
+        """Run dynamics for a list of walkers together.
+
+        Walkers with the same segment length are run together in
+        groups of at most 'max_replicas'.
+
+        Parameters
+        ----------
+        walkers : list of objects implementing the Walker interface
+            The walkers for which dynamics will be propagated.
+
+        segment_lengths : list of int
+            The number of steps to run for each walker.
+
+        getState_kwargs : dict of str : bool, optional
+            Specify the key-word arguments to pass to
+            simulation.context.getState when getting simulation
+            states. If None defaults object values.
+
+        platform : str or None or Ellipsis
+            The platform to use for all walkers, see `run_segment`.
+
+        platform_kwargs : dict of str : bool, optional
+            key-values to set for a platform with
+            platform.setPropertyDefaultValue for these segments only.
+
+        Returns
+        -------
+        new_walkers : list of objects implementing the Walker interface
+            Walkers after dynamics was run in the same order as the input.
+
+        """
+
+        # start with the object value
+        run_getState_kwargs = copy(self.getState_kwargs)
+        if getState_kwargs is not None:
+            run_getState_kwargs.update(getState_kwargs)
+
+        platform_name, platform_kwargs = self._resolve_platform(
+            platform, platform_kwargs
+        )
+
+        # group the walkers by their segment lengths
+        length_groups = {}
+        for walker_idx, segment_length in enumerate(segment_lengths):
+            length_groups.setdefault(segment_length, []).append(walker_idx)
+
+        new_walkers = [None for _ in walkers]
+        for segment_length, walker_idxs in length_groups.items():
+
+            if self.max_replicas is None:
+                batch_size = len(walker_idxs)
+            else:
+                batch_size = self.max_replicas
+
+            for batch_start in range(0, len(walker_idxs), batch_size):
+                batch_idxs = walker_idxs[batch_start : batch_start + batch_size]
+
+                batch_walkers = self._run_replicas(
+                    [walkers[walker_idx] for walker_idx in batch_idxs],
+                    segment_length,
+                    run_getState_kwargs,
+                    platform_name,
+                    platform_kwargs,
+                )
+
+                for walker_idx, new_walker in zip(batch_idxs, batch_walkers):
+                    new_walkers[walker_idx] = new_walker
+
+        return new_walkers
+
+    def _run_replicas(self, walkers, segment_length, getState_kwargs,
+                      platform_name, platform_kwargs):
+        """Run a segment for walkers together in one context.
+
+        Parameters
+        ----------
+        walkers : list of objects implementing the Walker interface
+
+        segment_length : int
+
+        getState_kwargs : dict of str : bool
+
+        platform_name : str or None
+
+        platform_kwargs : dict of str : str or None
+
+        Returns
+        -------
+        new_walkers : list of OpenMMWalker
+
+        """
+
+        run_start = time.time()
+
+        n_replicas = len(walkers)
+        n_particles = self.system.getNumParticles()
+
+        gen_sim_start = time.time()
+
+        context, split_simulation = self._replica_context(
+            n_replicas, platform_name, platform_kwargs)
+
+        sim_states = [walker.state.sim_state for walker in walkers]
+
+        # the box and parameters are shared by all replicas
+        if self.system.usesPeriodicBoundaryConditions():
+            box_vectors = sim_states[0].getPeriodicBoxVectors(asNumpy=True)
+
+            for sim_state in sim_states[1:]:
+                if not np.allclose(
+                        sim_state.getPeriodicBoxVectors(asNumpy=True),
+                        box_vectors):
+                    raise ValueError("Walkers run together must have the same box vectors")
+
+            context.setPeriodicBoxVectors(*box_vectors)
+
+        try:
+            parameters = sim_states[0].getParameters()
+        except Exception:
+            parameters = {}
+
+        for name, value in parameters.items():
+            context.setParameter(name, value)
+
+        context.setPositions(np.concatenate(
+            [sim_state.getPositions(asNumpy=True).value_in_unit(unit.nanometer)
+             for sim_state in sim_states]))
+
+        context.setVelocities(np.concatenate(
+            [sim_state.getVelocities(asNumpy=True).value_in_unit(
+                unit.nanometer/unit.picosecond)
+             for sim_state in sim_states]))
+
+        context.setTime(0.0)
+
+        gen_sim_end = time.time()
+        gen_sim_time = gen_sim_end - gen_sim_start
+
+        steps_start = time.time()
+
+        with start_action(action_type="OpenMM Context.steps") as ommsim_cx:
+            context.getIntegrator().step(segment_length)
+
+        steps_end = time.time()
+        steps_time = steps_end - steps_start
+
+        logging.info("Time to run {} sim steps for {} replicas: {}".format(
+            segment_length, n_replicas, steps_time))
+
+        get_state_start = time.time()
+
+        replicas_state = context.getState(getPositions=True,
+                                          getVelocities=True,
+                                          getParameters=True)
+
+        elapsed_time = replicas_state.getTime()
+        positions = replicas_state.getPositions(asNumpy=True)
+        velocities = replicas_state.getVelocities(asNumpy=True)
+
+        # set each replica into the single system to get its state
+        split_context = split_simulation.context
+
+        if self.system.usesPeriodicBoundaryConditions():
+            split_context.setPeriodicBoxVectors(
+                *replicas_state.getPeriodicBoxVectors())
+
+        for name, value in replicas_state.getParameters().items():
+            split_context.setParameter(name, value)
+
+        new_walkers = []
+        for replica_idx, walker in enumerate(walkers):
+
+            replica_slice = slice(replica_idx * n_particles,
+                                  (replica_idx + 1) * n_particles)
+
+            split_context.setTime(sim_states[replica_idx].getTime() + elapsed_time)
+            split_context.setPositions(positions[replica_slice])
+            split_context.setVelocities(velocities[replica_slice])
+
+            new_state = self.generate_state(split_simulation, segment_length,
+                                            walker, getState_kwargs)
+
+            new_walkers.append(OpenMMWalker(new_state, walker.weight))
+
+        get_state_end = time.time()
+        get_state_time = get_state_end - get_state_start
+
+        run_time = time.time() - run_start
+
+        # the replicas aren't timed individually so each gets an
+        # even share of the times
+        segment_split_times = {
+            'gen_sim_time' :  gen_sim_time / n_replicas,
+            'steps_time' : steps_time / n_replicas,
+            'get_state_time' : get_state_time / n_replicas,
+            'run_segment_time' : run_time / n_replicas,
+        }
+
+        self._last_cycle_segments_split_times.extend(
+            [copy(segment_split_times) for _ in range(n_replicas)])
+
+        return new_walkers
+
+
 class OpenMMCPUWorker(Worker):
     """Worker for OpenMM GPU simulations (CUDA or OpenCL platforms).
 
@@ -1262,6 +2333,9 @@ class OpenMMCPUWorker(Worker):
                          num_threads=num_threads,
                          **kwargs)
 
+        # simulations reused by runners in this worker process
+        self._simulation_cache = SimulationCache()
+
     def run_task(self, task):
         # documented in superclass
 
@@ -1270,7 +2344,8 @@ class OpenMMCPUWorker(Worker):
 
         # run the task and pass in the DeviceIndex for OpenMM to
         # assign work to the correct GPU
-        return task(platform_kwargs=platform_options)
+        return task(platform_kwargs=platform_options,
+                    simulation_cache=self._simulation_cache)
 
 
 class OpenMMGPUWorker(Worker):
@@ -1288,6 +2363,13 @@ class OpenMMGPUWorker(Worker):
     """The name template the worker processes are named to substituting in
     the process number."""
 
+    def __init__(self, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
+
+        # simulations reused by runners in this worker process
+        self._simulation_cache = SimulationCache()
+
     def run_task(self, task):
 
         # get the platform
@@ -1304,6 +2386,7 @@ class OpenMMGPUWorker(Worker):
         return task(
             platform=platform,
             platform_kwargs=platform_options,
+            simulation_cache=self._simulation_cache,
         )
 
 
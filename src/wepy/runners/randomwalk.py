@@ -14,6 +14,11 @@ performance of differnt resamplers as seen in these papers:
 Using the Weighted Ensemble Algorithm" and
 "REVO: Resampling of Ensembles by Variation Optimization".
 
+For simulations with many walkers the 'run_segments' method propagates
+all of the walkers for a whole segment with a few array operations
+using a seeded numpy random Generator. Use it with a batched mapper
+(e.g. wepy.work_mapper.mapper.BatchMapper).
+
 """
 
 import random as rand
@@ -35,11 +40,15 @@ UNIT_NAMES = (('positions_unit', str(units('microsecond').units)),
 
 """Mapping of units identifiers to the corresponding pint units."""
 
+ENSEMBLE_CHUNK_SIZE = 2**24
+"""The maximum number of random moves (walkers x steps x dimensions)
+generated at once when running segments for an ensemble of walkers."""
+
 
 class RandomWalkRunner(Runner):
     """RandomWalk runner for random walk simulations."""
 
-    def __init__(self, probability=0.25):
+    def __init__(self, probability=0.25, seed=None):
         """Constructor for RandomWalkRunner.
 
         Parameters
@@ -50,10 +59,25 @@ class RandomWalkRunner(Runner):
              probability only. The backward-move probability is
              1-probability.(Default = 0.25)
 
+        seed : None or int or numpy.random.SeedSequence, optional
+            Seed for the random Generator used by 'run_segments'. The
+            per walker 'run_segment' uses the python random module
+            and is not affected by this.
+
         """
 
         self._probability = probability
 
+        self._rng = np.random.default_rng(seed)
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+
+        # runners pickled before there was a generator
+        if '_rng' not in state:
+            self._rng = np.random.default_rng()
+
 
     @property
     def probability(self):
@@ -139,3 +163,97 @@ class RandomWalkRunner(Runner):
         new_walker = Walker(new_state, walker.weight)
 
         return new_walker
+
+    def _walk_ensemble(self, positions, n_steps):
+        """Run dynamics for the RandomWalk system for many walkers and steps.
+
+        A walk where moves to negative positions are rejected follows
+        the recursion x_t = max(x_(t-1) + s_t, 0), which has the
+        solution x_n = S_n + max(x_0, -min_(0<=t<=n) S_t) where S_t is
+        the sum of the first t moves. So the positions after all the
+        steps can be computed from the cumulative sums of the moves.
+
+        Parameters
+        ----------
+        positions : arraylike of shape (n_walkers, dimension)
+            Current positions of the walkers.
+
+        n_steps : int
+            The number of steps to run.
+
+        Returns
+        -------
+        new_positions : arraylike of shape (n_walkers, dimension)
+            The positions of the walkers after the steps.
+
+        """
+
+        new_positions = positions.copy()
+
+        n_walkers, dimension = positions.shape
+
+        # bound the memory for the moves by doing chunks of steps,
+        # the positions from one chunk start the next
+        chunk_steps = max(1, ENSEMBLE_CHUNK_SIZE // max(1, n_walkers * dimension))
+
+        steps_left = n_steps
+        while steps_left > 0:
+
+            chunk_n_steps = min(chunk_steps, steps_left)
+            steps_left -= chunk_n_steps
+
+            # +1 for forward moves and -1 for backward ones
+            moves = np.where(
+                self._rng.random((chunk_n_steps, n_walkers, dimension)) < self.probability,
+                1, -1).astype(np.int64)
+
+            move_sums = np.cumsum(moves, axis=0)
+
+            # the min includes the sum of no moves (0)
+            min_sums = np.minimum(move_sums.min(axis=0), 0)
+
+            new_positions = move_sums[-1] + np.maximum(new_positions, -min_sums)
+
+        return new_positions.astype(positions.dtype, copy=False)
+
+    def run_segments(self, walkers, segment_lengths, **kwargs):
+        """Runs random walk simulations for all walkers together.
+
+        Parameters
+        ----------
+        walkers : list of objects implementing the Walker interface
+            The walkers for which dynamics will be propagated.
+
+        segment_lengths : list of int
+            The number of dynamical steps to run for each walker.
+
+        Returns
+        -------
+        new_walkers : list of objects implementing the Walker interface
+            Walkers after dynamics was run in the same order as the input.
+
+        """
+
+        # group the walkers by their segment lengths
+        length_groups = {}
+        for walker_idx, segment_length in enumerate(segment_lengths):
+            length_groups.setdefault(segment_length, []).append(walker_idx)
+
+        new_walkers = [None for _ in walkers]
+        for segment_length, walker_idxs in length_groups.items():
+
+            # the positions of each walker have shape (1, dimension)
+            positions = np.concatenate([walkers[walker_idx].state['positions']
+                                        for walker_idx in walker_idxs])
+
+            new_positions = self._walk_ensemble(positions, segment_length)
+
+            for walker_idx, walker_positions in zip(walker_idxs, new_positions):
+
+                new_state = WalkerState(positions=walker_positions[np.newaxis, :],
+                                        time=0.0)
+
+                new_walkers[walker_idx] = Walker(new_state,
+                                                 walkers[walker_idx].weight)
+
+        return new_walkers
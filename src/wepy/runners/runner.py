@@ -9,6 +9,11 @@ should accept a walker and a spec for the length of the segment to run
 
 Additionally, any number of optional key word arguments should be given.
 
+Runners may also implement the optional 'run_segments' method which
+runs segments for a whole list of walkers at once. This is only used
+with mappers that are marked as batched (e.g. the BatchMapper) and the
+default implementation simply calls 'run_segment' for each walker.
+
 As a matter of convention, classes accessory to a runner (such as
 State, Walker, Worker, etc.) should also be put in the same module as
 the runner.
@@ -63,6 +68,9 @@ class Runner(object):
     def run_segment(self, walker, segment_length, **kwargs):
         """Run dynamics for the walker.
 
+        Runners used with the wepy.work_mapper.async_mapper.AsyncMapper
+        may implement this as a coroutine function instead.
+
         Parameters
         ----------
         walker : object implementing the Walker interface
@@ -79,6 +87,36 @@ class Runner(object):
 
         raise NotImplementedError
 
+    def run_segments(self, walkers, segment_lengths, **kwargs):
+        """Run dynamics for a list of walkers at once.
+
+        Runners that can propagate multiple walkers more efficiently
+        together than separately should override this.
+
+        Parameters
+        ----------
+        walkers : list of objects implementing the Walker interface
+            The walkers for which dynamics will be propagated.
+
+        segment_lengths : list of int or float
+            The segment length for each walker.
+
+        kwargs : key-word arguments
+            Each value is a list with the value for each walker.
+
+        Returns
+        -------
+        new_walkers : list of objects implementing the Walker interface
+            Walkers after dynamics was run in the same order as the input.
+
+        """
+
+        return [self.run_segment(walker, segment_length,
+                                 **{key : value[walker_idx]
+                                    for key, value in kwargs.items()})
+                for walker_idx, (walker, segment_length)
+                in enumerate(zip(walkers, segment_lengths))]
+
 class NoRunner(Runner):
     """Stub Runner that just returns the walkers back with the same state.
 
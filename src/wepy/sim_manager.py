@@ -40,6 +40,19 @@ The simulation manager should provide multiple ways of running
 simulations depending on if the number of cycles is known up front or
 to be determined adaptively (e.g. according to some time limit).
 
+Reporters can optionally be run in background threads (see the
+'background_reporters' option of the Manager) so that their I/O
+overlaps with running the segments of the next cycle. The background
+reporters are given copies of the reports and any reports still
+pending are finished in `cleanup`.
+
+Similarly the cycles can be pipelined (see the 'pipelined' option of
+the Manager) so that the boundary conditions and resampler can do
+their work for each walker (e.g. computing progress values or images)
+as soon as its segment finishes, while the segments of other walkers
+are still running. Warping and resampling still wait for the whole
+ensemble.
+
 """
 
 import numpy as np
@@ -52,6 +65,8 @@ import logging
 from eliot import start_action, log_call
 
 from wepy.work_mapper.mapper import Mapper
+from wepy.reporter.background import ReporterThread
+from wepy.reporter.reporter import ReporterError
 
 class Manager(object):
     """The class that coordinates wepy simulations.
@@ -96,6 +111,7 @@ class Manager(object):
                         'resampling_data',
                         'resampler_data',
                         'worker_segment_times',
+                        'scheduling_data',
                         'cycle_runner_time',
                         'cycle_bc_time',
                         'cycle_resampling_time',
@@ -112,6 +128,9 @@ class Manager(object):
                  boundary_conditions = None,
                  reporters = None,
                  sim_monitor = None,
+                 background_reporters = None,
+                 report_queue_size = 1,
+                 pipelined = False,
     ):
         """Constructor for Manager.
 
@@ -141,6 +160,29 @@ class Manager(object):
             An object implementing SimMonitor interface for providing
             monitoring metrics of a simulation.
 
+        background_reporters : bool or list, optional
+            Reporters to run in background threads. If True each
+            reporter is run in its own thread. Otherwise a list of
+            the reporters (which must be in 'reporters') to run each
+            in their own thread, or lists of reporters to run together
+            in one thread. The other reporters are run in the main
+            process as usual. Each background thread gets its own
+            copy of the report dictionary and its lists, but the
+            walkers and records in them are shared with the other
+            reporters, so reporters must not modify them.
+
+        report_queue_size : int
+            The number of reports that can be waiting for each
+            background reporter thread before a cycle has to wait for
+            it to catch up.
+
+        pipelined : bool
+            If True the walkers are given to the `prepare_walker`
+            methods of the boundary conditions and resampler as their
+            segments finish, using the `map_as_completed` method of
+            the work mapper. This only helps with work mappers that
+            run segments concurrently.
+
         Warnings
         --------
 
@@ -183,11 +225,105 @@ class Manager(object):
         ## Monitor
         self.monitor = sim_monitor
 
+        # the groups of reporters to run in background threads
+        self.background_reporters = self._background_reporter_groups(
+            background_reporters)
+        self.report_queue_size = report_queue_size
+
+        # the threads are started in init
+        self._reporter_threads = []
+
+        self.pipelined = pipelined
+
         # used to have a record of the last report for the simulation
         # monitor without breaking the API. Ugly but I don't want to
         # break it and no one cares about this anyhow
         self._last_report = None
 
+    def _background_reporter_groups(self, background_reporters):
+        """Normalize the specification of background reporters.
+
+        Parameters
+        ----------
+        background_reporters : None or bool or list
+            See the constructor.
+
+        Returns
+        -------
+        reporter_groups : list of list of objects implementing the Reporter interface
+
+        """
+
+        if background_reporters is None or background_reporters is False:
+            return []
+
+        elif background_reporters is True:
+            return [[reporter] for reporter in self.reporters]
+
+        reporter_groups = []
+        for group in background_reporters:
+
+            if isinstance(group, (list, tuple)):
+                reporter_groups.append(list(group))
+            else:
+                reporter_groups.append([group])
+
+        # reporters are compared by identity since they are not
+        # necessarily hashable or comparable
+        reporter_ids = [id(reporter) for group in reporter_groups for reporter in group]
+
+        if len(set(reporter_ids)) != len(reporter_ids):
+            raise ValueError("A reporter can only be in one background group")
+
+        if not set(reporter_ids).issubset([id(reporter) for reporter in self.reporters]):
+            raise ValueError("Background reporters must be in the reporters")
+
+        return reporter_groups
+
+    def _report(self, report):
+        """Give a report to all of the reporters.
+
+        The background reporters each get a shallow copy of the report
+        queued and the rest are called directly.
+
+        Parameters
+        ----------
+        report : dict of str : value
+
+        Raises
+        ------
+        ReporterError
+            If a background reporter failed on an earlier report, after
+            cleaning up.
+
+        """
+
+        for reporter_thread in self._reporter_threads:
+
+            # the walkers and records are made new every cycle and not
+            # changed afterwards, so only the containers are copied
+            # for each thread instead of deep copying all of the
+            # walker states in this thread
+            background_report = {key : list(value) if isinstance(value, list) else value
+                                 for key, value in report.items()}
+
+            try:
+                reporter_thread.submit(background_report)
+
+            # clean up like for errors in running segments, the error
+            # is raised again from the cleanup
+            except ReporterError:
+                self.cleanup()
+                raise
+
+        background_ids = set(id(reporter)
+                             for reporter_thread in self._reporter_threads
+                             for reporter in reporter_thread.reporters)
+
+        for reporter in self.reporters:
+            if id(reporter) not in background_ids:
+                reporter.report(**report)
+
     @log_call(
         include_args=[
             'segment_length',
@@ -221,17 +357,32 @@ class Manager(object):
 
         logging.info("Starting segment")
 
+        map_args = (
+            # args, which must be supported by the map function
+            walkers,
+            (segment_length for i in range(num_walkers)),
+        )
+
+        map_kwargs = {
+            # kwargs which are optionally recognized by the map function
+            'cycle_idx' : (cycle_idx for i in range(num_walkers)),
+            'walker_idx' : (walker_idx for walker_idx in range(num_walkers)),
+        }
+
         try:
-            new_walkers = list(self.work_mapper.map(
-                # args, which must be supported by the map function
-                walkers,
-                (segment_length for i in range(num_walkers)),
 
-                # kwargs which are optionally recognized by the map function
-                cycle_idx=(cycle_idx for i in range(num_walkers)),
-                walker_idx=(walker_idx for walker_idx in range(num_walkers)),
-            )
-            )
+            if self.pipelined and hasattr(self.work_mapper, 'map_as_completed'):
+
+                new_walkers = [None for _ in range(num_walkers)]
+                for walker_idx, new_walker in self.work_mapper.map_as_completed(
+                        *map_args, **map_kwargs):
+
+                    new_walkers[walker_idx] = new_walker
+
+                    self._prepare_walker(walker_idx, new_walker)
+
+            else:
+                new_walkers = list(self.work_mapper.map(*map_args, **map_kwargs))
 
         except Exception as exception:
 
@@ -245,6 +396,22 @@ class Manager(object):
 
         return new_walkers
 
+    def _prepare_walker(self, walker_idx, walker):
+        """Let the boundary conditions and resampler do their work for a
+        walker whose segment has finished.
+
+        Parameters
+        ----------
+        walker_idx : int
+
+        walker : Walker object
+
+        """
+
+        for component in (self.boundary_conditions, self.resampler):
+            if component is not None and hasattr(component, 'prepare_walker'):
+                component.prepare_walker(walker_idx, walker)
+
     @log_call(include_args=[
         'n_segment_steps',
         'cycle_idx',
@@ -284,6 +451,9 @@ class Manager(object):
 
         1. runner.pre_cycle
         2. run_segment -> work_mapper.map(runner.run_segment)
+           (or work_mapper.map_as_completed and the prepare_walker
+           methods of the boundary conditions and resampler when
+           pipelined)
         3. runner.post_cycle
         4. boundary_conditions.warp_walkers (if present)
         5. resampler.resample
@@ -464,6 +634,11 @@ class Manager(object):
             # logging.info("No worker segment times given")
             # logging.info("Runner time = {}".format(runner_time))
 
+        # the order the tasks were dispatched in and how long they took
+        scheduling_data = []
+        if hasattr(self.work_mapper, 'scheduling_data'):
+            scheduling_data = deepcopy(self.work_mapper.scheduling_data)
+
 
         report = {'cycle_idx' : cycle_idx,
                   'new_walkers' : new_walkers,
@@ -481,6 +656,7 @@ class Manager(object):
                   'sim_manager_segment_overhead_time' : sim_manager_segment_overhead_time,
                   'runner_splits_time' : runner_splits,
                   'worker_segment_times' : seg_times,
+                  'scheduling_data' : scheduling_data,
                   'cycle_sim_manager_segment_time' : sim_manager_segment_time,
                   'cycle_runner_time' : sim_manager_segment_time,
                   'cycle_bc_time' : bc_time,
@@ -497,8 +673,7 @@ class Manager(object):
 
         logging.info("Starting reporting")
         # report results to the reporters
-        for reporter in self.reporters:
-            reporter.report(**report)
+        self._report(report)
 
         # prepare resampled walkers for running new state changes
         walkers = resampled_walkers
@@ -582,8 +757,14 @@ class Manager(object):
         # initialize the work_mapper with the function it will be
         # mapping and the number of workers, this may include things like starting processes
         # etc.
+        # batched mappers run all of the walkers with a single call
+        if getattr(self.work_mapper, 'BATCHED', False):
+            segment_func = self.runner.run_segments
+        else:
+            segment_func = self.runner.run_segment
+
         self.work_mapper.init(
-            segment_func=self.runner.run_segment,
+            segment_func=segment_func,
             num_workers=num_workers,
         )
 
@@ -598,6 +779,14 @@ class Manager(object):
                           reporters=self.reporters,
                           continue_run=continue_run)
 
+        # start the threads for the background reporters
+        self._reporter_threads = [ReporterThread(reporter_group,
+                                                 queue_size=self.report_queue_size)
+                                  for reporter_group in self.background_reporters]
+
+        for reporter_thread in self._reporter_threads:
+            reporter_thread.start()
+
     def cleanup(self):
         """Perform cleanup actions for wepy configuration components.
 
@@ -607,9 +796,10 @@ class Manager(object):
         Calls the `cleanup` method on:
 
         - work_mapper
+        - resampler (if it has one)
         - reporters
 
-        Passes nothing to the work mapper.
+        Passes nothing to the work mapper or resampler.
 
         Passes the following to each reporter:
 
@@ -619,6 +809,15 @@ class Manager(object):
         - boundary_conditions
         - reporters
 
+        Background reporters finish all of their pending reports
+        before any reporter is cleaned up.
+
+        Raises
+        ------
+        ReporterError
+            If a background reporter failed. This is raised after all
+            of the components are cleaned up.
+
         """
 
         if self.monitor is not None:
@@ -627,6 +826,22 @@ class Manager(object):
         # cleanup the mapper
         self.work_mapper.cleanup()
 
+        # the resampler may have started workers for distance
+        # computations
+        if hasattr(self.resampler, 'cleanup'):
+            self.resampler.cleanup()
+
+        # finish the pending reports of the background reporters
+        reporter_error = None
+        for reporter_thread in self._reporter_threads:
+            try:
+                reporter_thread.stop()
+            except ReporterError as error:
+                if reporter_error is None:
+                    reporter_error = error
+
+        self._reporter_threads = []
+
         # cleanup things associated with the reporter
         for reporter in self.reporters:
             reporter.cleanup(runner=self.runner,
@@ -635,6 +850,9 @@ class Manager(object):
                              boundary_conditions=self.boundary_conditions,
                              reporters=self.reporters)
 
+        if reporter_error is not None:
+            raise reporter_error
+
 
     def run_simulation_by_time(self, run_time, segments_length, num_workers=None):
         """Run a simulation for a certain amount of time.
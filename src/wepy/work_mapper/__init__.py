@@ -39,6 +39,13 @@ simple test systems) you can use the reference implementation
 (wepy.work_mapper.mapper.Mapper) which is basically just a wrapper
 around a for-loop.
 
+For runners that can propagate many walkers together (i.e. implement
+the optional `run_segments` method) the
+wepy.work_mapper.mapper.BatchMapper makes a single call for all the
+walkers instead. Mappers like this set the class constant `BATCHED` to
+True so that the simulation manager gives them `run_segments` instead
+of `run_segment`.
+
 This sub-module provides reference implementations and/or abstract
 base classes for a few interfaces.
 
@@ -82,7 +89,28 @@ during the call to `init` from the 'segment_func' key-word argument.
 
 The WorkerMapper class and related Worker and Task classes will be
 provided as-is and are not really intended to be superclasses although
-you are free to do so.
+you are free to do so. With the 'shared_memory' option the
+WorkerMapper passes the arrays of walker states to and from its
+workers through shared memory instead of its queues (see
+wepy.work_mapper.transport).
+
+Mappers which dispatch tasks to their workers through a queue (the
+WorkerMapper and PoolTaskMapper) accept a 'scheduler' which chooses
+the order the tasks are dispatched in, e.g. longest expected task
+first to reduce the time workers wait on stragglers (see
+wepy.work_mapper.scheduler). The decisions are reported each cycle as
+'scheduling_data'.
+
+When the segments are actually run outside of the mapping process
+(e.g. by an MD engine in a subprocess) the
+wepy.work_mapper.async_mapper.AsyncMapper can manage many of them
+from one process with an asyncio event loop, using runners whose
+`run_segment` is a coroutine function.
+
+To use the workers of more than one host the
+wepy.work_mapper.distributed.DistributedMapper serves the tasks over
+TCP to worker daemons, which are run on each host with the
+'wepy-worker' command (wepy.work_mapper.cli).
 
 The only interfacing that facilitates their usage is that the
 simulation manager will pass a required keyword argument 'num_workers'
@@ -0,0 +1,344 @@
+"""Work mapper running segments concurrently with an asyncio event loop.
+
+The other mappers run each segment in a separate process (or
+serially) which is needed when the segment is computed by python in
+the mapping process. However, when the real work of a segment happens
+somewhere else, e.g. in an MD engine run as a subprocess or on a
+remote service, the process only has to wait for it and a single
+process can manage many segments at once.
+
+The AsyncMapper runs the segments as tasks in an asyncio event loop
+with at most 'num_workers' of them in flight at a time. If the
+'segment_func' (i.e. the runner's `run_segment`) is a coroutine
+function it is awaited in the loop, for example a runner could be
+implemented as:
+
+    class SubprocessRunner(Runner):
+
+        async def run_segment(self, walker, segment_length, **kwargs):
+
+            process = await asyncio.create_subprocess_exec(...)
+            await process.wait()
+
+            ...
+
+            return new_walker
+
+Plain functions are run in a pool of 'num_workers' threads instead,
+which is only useful for runners that release the GIL (like OpenMM)
+and are safe to call from multiple threads.
+
+The event loop is run in a background thread while mapping so the
+segments keep running while the caller of `map_as_completed` is
+handling a result.
+
+"""
+
+import asyncio
+import concurrent.futures
+import queue
+import threading
+import time
+import logging
+import sys
+import traceback
+
+from wepy.work_mapper.mapper import ABCMapper, TaskException
+
+class AsyncMapper(ABCMapper):
+    """Mapper running the segments as tasks of an asyncio event loop.
+
+    Each of the 'num_workers' slots runs one segment at a time and the
+    times of the segments are reported for the slot that ran them as
+    the 'worker_segment_times'.
+
+    """
+
+    def __init__(self,
+                 num_workers=None,
+                 segment_func=None,
+                 **kwargs):
+        """Constructor for the AsyncMapper.
+
+        Parameters
+        ----------
+        num_workers : int, optional
+            The maximum number of segments to run at once. Typically
+            set at runtime.
+
+        segment_func : callable or coroutine function, optional
+            Set a default segment_func. Typically set at runtime.
+
+        """
+
+        super().__init__(segment_func=segment_func, **kwargs)
+
+        self._num_workers = num_workers
+        self._worker_segment_times = None
+
+        if num_workers is not None:
+            self._worker_segment_times = {i : [] for i in range(self.num_workers)}
+
+        # made in init
+        self._loop = None
+        self._executor = None
+
+    def __getstate__(self):
+
+        # the event loop and threads can't be copied
+        state = self.__dict__.copy()
+        state['_loop'] = None
+        state['_executor'] = None
+
+        return state
+
+    @property
+    def num_workers(self):
+        """The maximum number of segments run at once."""
+        return self._num_workers
+
+    @property
+    def worker_segment_times(self):
+        """The run timings for each segment for each walker.
+
+        Returns
+        -------
+        worker_seg_times : dict of int : list of float
+            Dictionary mapping worker indices to a list of times in
+            seconds for each segment run.
+
+        """
+        return self._worker_segment_times
+
+    @property
+    def is_coroutine(self):
+        """Whether the 'segment_func' is a coroutine function."""
+        return asyncio.iscoroutinefunction(self._func)
+
+    def init(self, num_workers=None, segment_func=None,
+             **kwargs):
+        """Runtime initialization and setting of function to map over walkers.
+
+        Parameters
+        ----------
+        num_workers : int
+            The maximum number of segments to run at once.
+
+        segment_func : callable or coroutine function implementing
+            the Runner.run_segment interface
+
+        """
+
+        super().init(segment_func=segment_func)
+
+        # the number of workers must be given here or set as an object attribute
+        if num_workers is None and self.num_workers is None:
+            raise ValueError("The number of workers must be given, received {}".format(num_workers))
+
+        elif num_workers is not None and self.num_workers is None:
+            self._num_workers = num_workers
+
+        self._worker_segment_times = {i : [] for i in range(self.num_workers)}
+
+        self._loop = asyncio.new_event_loop()
+
+        # plain functions are run in threads
+        if not self.is_coroutine:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.num_workers,
+                thread_name_prefix='AsyncMapper')
+
+    def cleanup(self, **kwargs):
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+
+    def map(self, *args, **kwargs):
+        # docstring in superclass
+
+        results = sorted(self.map_as_completed(*args, **kwargs),
+                         key=lambda result: result[0])
+
+        return [result for task_idx, result in results]
+
+    async def _make_worker_queue(self):
+        """Make the queue of worker slots in the event loop."""
+
+        worker_queue = asyncio.Queue()
+        for worker_idx in range(self.num_workers):
+            worker_queue.put_nowait(worker_idx)
+
+        return worker_queue
+
+    async def _run_task(self, task_idx, worker_queue, call_args, call_kwargs):
+        """Run a single call of the 'segment_func' in one of the worker
+        slots.
+
+        Returns
+        -------
+        task_idx : int
+
+        worker_idx : int
+
+        task_time : float
+
+        result
+
+        """
+
+        worker_idx = await worker_queue.get()
+
+        start = time.time()
+
+        try:
+
+            if self.is_coroutine:
+                result = await self._func(*call_args, **call_kwargs)
+            else:
+                result = await self._loop.run_in_executor(
+                    self._executor,
+                    lambda: self._func(*call_args, **call_kwargs))
+
+        except Exception as task_exception:
+
+            # get the traceback for the exception
+            tb = sys.exc_info()[2]
+
+            msg = "Exception '{}({})' caught in a task.".format(
+                                   type(task_exception).__name__, task_exception)
+            traceback_log_msg = \
+                """Traceback:
+--------------------------------------------------------------------------------
+{}
+--------------------------------------------------------------------------------
+                """.format(''.join(traceback.format_exception(
+                    type(task_exception), task_exception, tb)),
+                )
+
+            logging.critical(msg + '\n' + traceback_log_msg)
+
+            raise TaskException("Error occured during task execution, recovery not possible.",
+                            wrapped_exception=task_exception,
+                            tb=tb)
+
+        finally:
+            worker_queue.put_nowait(worker_idx)
+
+        end = time.time()
+
+        return task_idx, worker_idx, end - start, result
+
+    async def _run_tasks(self, args, kwargs, done_queue):
+        """Run all of the tasks, putting each one on the 'done_queue'
+        as it finishes.
+
+        Once a task has failed the rest are left running until the
+        mapping thread cancels them.
+
+        """
+
+        # the slots for the workers, which limit the number of tasks
+        # running at once
+        worker_queue = await self._make_worker_queue()
+
+        pending = set()
+        for task_idx in range(len(args[0])):
+
+            call_args = [arg[task_idx] for arg in args]
+            call_kwargs = {key : value[task_idx] for key, value in kwargs.items()}
+
+            pending.add(self._loop.create_task(
+                self._run_task(task_idx, worker_queue, call_args, call_kwargs)))
+
+        try:
+
+            while len(pending) > 0:
+
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    done_queue.put(task)
+
+        finally:
+
+            # if a task failed or the generator was closed early
+            # cancel the rest
+            if len(pending) > 0:
+
+                logging.critical("Cancelling {} running tasks".format(len(pending)))
+
+                for task in pending:
+                    task.cancel()
+
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def map_as_completed(self, *args, **kwargs):
+        # docstring in superclass
+
+        # expand the generators for the args and kwargs
+        args = [list(arg) for arg in args]
+        kwargs = {key : list(kwarg) for key, kwarg in kwargs.items()}
+
+        # the finished tasks are passed back from the event loop
+        # thread on this queue
+        done_queue = queue.Queue()
+
+        main_task = self._loop.create_task(self._run_tasks(args, kwargs, done_queue))
+
+        def run_loop():
+
+            try:
+                self._loop.run_until_complete(main_task)
+            # these are raised in the mapping thread instead
+            except (asyncio.CancelledError, Exception):
+                pass
+            finally:
+                # the main task is put last so the mapping thread
+                # doesn't wait forever if it fails
+                done_queue.put(main_task)
+
+        # run the loop in the background so the tasks keep running
+        # while the results are being handled by the caller
+        loop_thread = threading.Thread(target=run_loop,
+                                       name='AsyncMapper-loop',
+                                       daemon=True)
+        loop_thread.start()
+
+        worker_segment_times = {i : [] for i in range(self.num_workers)}
+
+        n_results_left = len(args[0])
+
+        try:
+
+            while n_results_left > 0:
+
+                task = done_queue.get()
+
+                # only gets here if running the tasks failed, so
+                # raise its exception
+                if task is main_task:
+                    main_task.result()
+
+                # raises the TaskException if it failed
+                task_idx, worker_idx, task_time, result = task.result()
+
+                worker_segment_times[worker_idx].append(task_time)
+
+                n_results_left -= 1
+
+                yield task_idx, result
+
+        finally:
+
+            # stop any tasks still running and wait for the loop to
+            # finish
+            self._loop.call_soon_threadsafe(main_task.cancel)
+            loop_thread.join()
+
+        self._worker_segment_times = worker_segment_times
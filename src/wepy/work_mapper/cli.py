@@ -0,0 +1,36 @@
+"""Command line interface for running worker daemons for the
+wepy.work_mapper.distributed.DistributedMapper."""
+
+import click
+
+from wepy.orchestration.cli import set_loglevel
+from wepy.work_mapper.distributed import WorkerDaemon, HEARTBEAT_INTERVAL
+
+@click.command()
+@click.option('--log', default="WARNING")
+@click.option('--authkey', envvar='WEPY_AUTHKEY', required=True,
+              help="The secret key of the mapper, or set WEPY_AUTHKEY.")
+@click.option('--heartbeat-interval', default=HEARTBEAT_INTERVAL, type=click.FLOAT)
+@click.option('--device-index', default=None, type=click.INT,
+              help="The device for OpenMM GPU platforms to run segments on.")
+@click.argument('host')
+@click.argument('port', type=click.INT)
+def cli(log, authkey, heartbeat_interval, device_index, host, port):
+    """Run a worker daemon for the distributed work mapper at HOST and
+    PORT until the mapper stops it."""
+
+    set_loglevel(log)
+
+    task_kwargs = {}
+    if device_index is not None:
+        task_kwargs['platform_kwargs'] = {'DeviceIndex' : str(device_index)}
+
+    daemon = WorkerDaemon((host, port), authkey,
+                          heartbeat_interval=heartbeat_interval,
+                          task_kwargs=task_kwargs)
+
+    daemon.run()
+
+if __name__ == "__main__":
+
+    cli()
@@ -0,0 +1,757 @@
+"""Work mapper distributing segments to worker daemons over TCP.
+
+The WorkerMapper and TaskMapper run their workers as processes on the
+same host as the simulation manager. The DistributedMapper instead
+listens on a TCP socket for worker daemons, which can be run on any
+host that can reach it, and serves them the segment tasks one at a
+time as they become free.
+
+Worker daemons are started with the 'wepy-worker' command (see
+wepy.work_mapper.cli) or by running a WorkerDaemon, e.g.:
+
+    wepy-worker --authkey <secret> coordinator.host.name 8765
+
+Connections are authenticated with a shared secret key, since the
+tasks are pickles and so can execute arbitrary code on the workers.
+Tasks and results are sent as pickles with the data of numpy arrays
+(e.g. positions) streamed as raw bytes after them instead of being
+copied into the pickles (see `send_message`). This needs pickle
+protocol 5, so Python 3.8 or later.
+
+Daemons send a heartbeat message periodically from a separate thread
+while they are connected. If a daemon running a task is not heard
+from for 'heartbeat_timeout' seconds, or its connection is lost, it is
+dropped and its task is dispatched again to another daemon. Daemons
+can join at any time, including while tasks are being mapped. If
+'connect_timeout' is given, mapping raises a TimeoutError when no
+daemons have been connected for that many seconds instead of waiting
+for them forever.
+
+Tasks which raise an error are not dispatched again and the error is
+raised from the mapping as for the other mappers.
+
+"""
+
+import collections
+import logging
+import os
+import pickle
+import queue as pyq
+import socket
+import struct
+import sys
+import threading
+import time
+import traceback
+import multiprocessing.connection as mpc
+
+from wepy.work_mapper.mapper import ABCWorkerMapper, TaskException, WorkerException
+from wepy.work_mapper.transport import dumps_buffers, require_pickle_protocol_5
+
+HEARTBEAT_INTERVAL = 5.
+"""Default number of seconds between heartbeats from worker daemons."""
+
+HEARTBEAT_TIMEOUT = 60.
+"""Default number of seconds a worker daemon running a task can go
+without being heard from before it is considered dead."""
+
+def send_message(conn, message):
+    """Send an object over a connection with its array data streamed
+    as raw bytes.
+
+    The message is sent as a header with the sizes of the out-of-band
+    buffers of the pickle, the pickle itself, and then each buffer.
+
+    Parameters
+    ----------
+    conn : multiprocessing.connection.Connection
+
+    message : object
+
+    """
+
+    data, buffers = dumps_buffers(message)
+
+    sizes = [buffer.nbytes for buffer in buffers]
+
+    conn.send_bytes(struct.pack('!I{}Q'.format(len(sizes)), len(sizes), *sizes))
+    conn.send_bytes(data)
+
+    for buffer in buffers:
+        conn.send_bytes(buffer)
+
+def recv_message(conn):
+    """Receive an object sent with `send_message`.
+
+    Parameters
+    ----------
+    conn : multiprocessing.connection.Connection
+
+    Returns
+    -------
+    message : object
+
+    """
+
+    header = conn.recv_bytes()
+
+    n_buffers, = struct.unpack_from('!I', header)
+    sizes = struct.unpack_from('!{}Q'.format(n_buffers), header, 4)
+
+    data = conn.recv_bytes()
+
+    # receive the buffers directly into writable memory for the arrays
+    buffers = []
+    for size in sizes:
+
+        buffer = bytearray(size)
+        conn.recv_bytes_into(buffer)
+
+        buffers.append(buffer)
+
+    return pickle.loads(data, buffers=buffers)
+
+
+class RemoteWorker(object):
+    """The record of a worker daemon connected to a DistributedMapper."""
+
+    def __init__(self, worker_idx, conn):
+
+        self.worker_idx = worker_idx
+        self.conn = conn
+
+        # set when the daemon introduces itself
+        self.name = "RemoteWorker-{}".format(worker_idx)
+
+        # the index of the task it is running if any
+        self.task_idx = None
+
+        # the last time anything was received from it
+        self.last_seen = time.time()
+
+    @property
+    def busy(self):
+        """Whether the worker is running a task."""
+        return self.task_idx is not None
+
+
+class DistributedMapper(ABCWorkerMapper):
+    """Work mapper serving tasks to worker daemons over TCP.
+
+    The 'num_workers' is the number of daemons expected, although any
+    number can connect. Mapping waits for at least one to be
+    connected, for at most 'connect_timeout' seconds if given.
+
+    """
+
+    def __init__(self,
+                 address=('localhost', 0),
+                 authkey=None,
+                 heartbeat_timeout=HEARTBEAT_TIMEOUT,
+                 connect_timeout=None,
+                 num_workers=None,
+                 segment_func=None,
+                 **kwargs):
+        """Constructor for DistributedMapper.
+
+        Parameters
+        ----------
+        address : tuple of (str, int)
+            The host name and port to listen on. With port 0 a free
+            port is chosen, see the 'address' attribute after `init`.
+
+        authkey : bytes or str
+            The secret key the daemons must have to connect.
+
+        heartbeat_timeout : float
+            The number of seconds a daemon running a task can go
+            without being heard from before its task is dispatched
+            again.
+
+        connect_timeout : float, optional
+            The number of seconds mapping can go without any daemons
+            connected before raising a TimeoutError. By default it
+            waits for them forever.
+
+        num_workers : int, optional
+            The number of worker daemons expected.
+
+        segment_func : callable, optional
+            Set a default segment_func. Typically set at runtime.
+
+        Raises
+        ------
+        RuntimeError
+            If the python version is older than 3.8.
+
+        """
+
+        require_pickle_protocol_5("DistributedMapper")
+
+        super().__init__(num_workers=num_workers,
+                         segment_func=segment_func,
+                         **kwargs)
+
+        if authkey is None:
+            raise ValueError("An authkey must be given")
+
+        if isinstance(authkey, str):
+            authkey = authkey.encode()
+
+        self._address = tuple(address)
+        self._authkey = authkey
+        self._heartbeat_timeout = heartbeat_timeout
+        self._connect_timeout = connect_timeout
+
+        # made in init
+        self._listener = None
+        self._accept_thread = None
+        self._new_conns = None
+        self._wake_recv = None
+        self._wake_send = None
+        self._stopping = False
+
+        self._workers = {}
+        self._next_worker_idx = 0
+
+    def __getstate__(self):
+
+        # the sockets and threads can't be copied
+        state = self.__dict__.copy()
+        state['_listener'] = None
+        state['_accept_thread'] = None
+        state['_new_conns'] = None
+        state['_wake_recv'] = None
+        state['_wake_send'] = None
+        state['_workers'] = {}
+
+        return state
+
+    @property
+    def address(self):
+        """The address the mapper is listening on."""
+
+        if self._listener is not None:
+            return self._listener.address
+        else:
+            return self._address
+
+    @property
+    def heartbeat_timeout(self):
+        """Seconds a busy daemon can be silent before being dropped."""
+        return self._heartbeat_timeout
+
+    @property
+    def connect_timeout(self):
+        """Seconds mapping can be without daemons before raising."""
+        return self._connect_timeout
+
+    @property
+    def workers(self):
+        """The connected worker daemons by their index."""
+        return self._workers
+
+    def init(self, num_workers=None, segment_func=None,
+             **kwargs):
+        """Runtime initialization and setting of function to map over walkers.
+
+        Starts listening for worker daemons.
+
+        Parameters
+        ----------
+        num_workers : int
+            The number of worker daemons expected.
+
+        segment_func : callable implementing the Runner.run_segment interface
+
+        """
+
+        super().init(num_workers=num_workers,
+                     segment_func=segment_func,
+                     **kwargs)
+
+        self._listener = mpc.Listener(self._address, authkey=self._authkey)
+
+        logging.info("Listening for worker daemons on {}".format(self._listener.address))
+
+        # the accepting thread hands over the new connections and
+        # wakes up the mapping with the pipe
+        self._new_conns = pyq.Queue()
+        self._wake_recv, self._wake_send = mpc.Pipe(duplex=False)
+        self._stopping = False
+
+        self._accept_thread = threading.Thread(target=self._accept,
+                                               name="DistributedMapper-accept",
+                                               daemon=True)
+        self._accept_thread.start()
+
+    def _accept(self):
+        """Target of the thread accepting connections from daemons."""
+
+        while True:
+
+            try:
+                conn = self._listener.accept()
+
+            except (mpc.AuthenticationError, EOFError, OSError) as error:
+
+                if self._stopping:
+                    return
+
+                logging.warning("Failed connection from a worker daemon: {}".format(error))
+
+                continue
+
+            if self._stopping:
+                conn.close()
+                return
+
+            self._new_conns.put(conn)
+            self._wake_send.send_bytes(b'')
+
+    def _add_new_workers(self):
+        """Add the workers for the connections made since last called."""
+
+        while True:
+
+            try:
+                conn = self._new_conns.get_nowait()
+            except pyq.Empty:
+                return
+
+            worker = RemoteWorker(self._next_worker_idx, conn)
+            self._next_worker_idx += 1
+
+            self._workers[worker.worker_idx] = worker
+
+            if worker.worker_idx not in self._worker_segment_times:
+                self._worker_segment_times[worker.worker_idx] = []
+
+            logging.info("Worker daemon {} connected".format(worker.worker_idx))
+
+    def _drop_worker(self, worker, task_queue=None):
+        """Disconnect a worker and put its task back on the left of the
+        task queue if given."""
+
+        del self._workers[worker.worker_idx]
+
+        try:
+            worker.conn.close()
+        except OSError:
+            pass
+
+        if worker.busy and task_queue is not None:
+
+            logging.error("Dispatching task {} of {} again".format(worker.task_idx,
+                                                                   worker.name))
+
+            task_queue.appendleft(worker.task_idx)
+
+    def force_shutdown(self):
+
+        # stop all of the daemons, the ones running tasks will stop
+        # when they are done
+        for worker in list(self._workers.values()):
+
+            try:
+                send_message(worker.conn, ('stop',))
+            except OSError:
+                pass
+
+            self._drop_worker(worker)
+
+    def cleanup(self, **kwargs):
+
+        self.force_shutdown()
+
+        if self._listener is not None:
+
+            # wake the accepting thread up with a connection so it can
+            # see it should stop
+            self._stopping = True
+            try:
+                socket.create_connection(self._listener.address).close()
+            except OSError:
+                pass
+
+            self._accept_thread.join()
+            self._listener.close()
+
+            self._wake_recv.close()
+            self._wake_send.close()
+
+            self._listener = None
+            self._accept_thread = None
+
+        super().cleanup(**kwargs)
+
+    def map(self, *args, **kwargs):
+        # docstring in superclass
+
+        results = sorted(self.map_as_completed(*args, **kwargs),
+                         key=lambda result: result[0])
+
+        return [result for task_idx, result in results]
+
+    def map_as_completed(self, *args, **kwargs):
+        # docstring in superclass
+
+        task_args = list(zip(*args))
+        kwargs = {key : list(kwarg) for key, kwarg in kwargs.items()}
+
+        num_tasks = len(args[0])
+
+        # tasks are dispatched in order from the left, tasks of failed
+        # workers are put back on the left
+        task_queue = collections.deque(self._scheduler.order(num_tasks))
+
+        worker_segment_times = {worker_idx : [] for worker_idx in self._worker_segment_times}
+
+        results_found = [False for _ in range(num_tasks)]
+        n_results_left = num_tasks
+
+        # the time since when no daemons have been connected
+        no_workers_since = None
+        while n_results_left > 0:
+
+            self._add_new_workers()
+
+            # give tasks to the idle workers
+            for worker in list(self._workers.values()):
+
+                if len(task_queue) == 0:
+                    break
+
+                if worker.busy:
+                    continue
+
+                task_idx = task_queue.popleft()
+                task_kwargs = {key : value[task_idx] for key, value in kwargs.items()}
+
+                task = self._make_task(*task_args[task_idx], **task_kwargs)
+
+                try:
+                    send_message(worker.conn, ('task', task_idx, task))
+
+                except OSError:
+
+                    logging.error("Lost connection to {}".format(worker.name))
+
+                    task_queue.appendleft(task_idx)
+                    self._drop_worker(worker, task_queue)
+
+                    continue
+
+                worker.task_idx = task_idx
+                worker.last_seen = time.time()
+
+                logging.info("Dispatched task {} to {}".format(task_idx, worker.name))
+
+            if len(self._workers) > 0:
+                no_workers_since = None
+
+            elif no_workers_since is None:
+                logging.warning("Waiting for worker daemons to connect")
+                no_workers_since = time.time()
+
+            elif (self.connect_timeout is not None and
+                  time.time() - no_workers_since >= self.connect_timeout):
+
+                raise TimeoutError(
+                    "No worker daemons connected to {} for {} s".format(
+                        self.address, self.connect_timeout))
+
+            # wait for messages, new workers, or until the next busy
+            # worker would time out
+            deadlines = [worker.last_seen + self.heartbeat_timeout
+                         for worker in self._workers.values()
+                         if worker.busy]
+
+            if no_workers_since is not None and self.connect_timeout is not None:
+                deadlines.append(no_workers_since + self.connect_timeout)
+
+            timeout = None
+            if len(deadlines) > 0:
+                timeout = max(0., min(deadlines) - time.time())
+
+            conns = {worker.conn : worker for worker in self._workers.values()}
+
+            ready = mpc.wait(list(conns.keys()) + [self._wake_recv], timeout=timeout)
+
+            for conn in ready:
+
+                # new workers are added on the next iteration
+                if conn is self._wake_recv:
+                    self._wake_recv.recv_bytes()
+                    continue
+
+                worker = conns[conn]
+
+                try:
+                    message = recv_message(conn)
+
+                except (EOFError, OSError):
+
+                    logging.error("Lost connection to {}".format(worker.name))
+
+                    self._drop_worker(worker, task_queue)
+
+                    continue
+
+                worker.last_seen = time.time()
+
+                if message[0] == 'heartbeat':
+                    pass
+
+                elif message[0] == 'hello':
+
+                    worker.name = "{} ({})".format(worker.name, message[1])
+
+                    logging.info("{} introduced itself".format(worker.name))
+
+                elif message[0] == 'result':
+
+                    _, task_idx, task_time, result = message
+
+                    worker.task_idx = None
+
+                    # a task dispatched again may be finished twice
+                    if results_found[task_idx]:
+                        continue
+
+                    results_found[task_idx] = True
+                    n_results_left -= 1
+
+                    worker_segment_times.setdefault(worker.worker_idx, []).append(task_time)
+                    self._scheduler.record(task_idx, worker.worker_idx, task_time)
+
+                    logging.info("Got result for task {} from {}".format(task_idx,
+                                                                         worker.name))
+
+                    yield task_idx, result
+
+                elif message[0] == 'exception':
+
+                    _, task_idx, exception = message
+
+                    if type(exception) == WorkerException:
+                        logging.critical("Exception encountered in worker daemon {}.".format(
+                            worker.name))
+                    else:
+                        logging.critical(
+                            "Exception encountered in a task which is unrecoverable."
+                            "You will need to reconfigure your components in a stable manner.")
+
+                    self.force_shutdown()
+
+                    logging.critical("Shutdown complete.")
+
+                    raise exception
+
+                else:
+                    logging.error("Unknown message from {}: {}".format(worker.name,
+                                                                       message[0]))
+
+            # drop the busy workers which have not been heard from
+            now = time.time()
+            for worker in list(self._workers.values()):
+
+                if worker.busy and now - worker.last_seen > self.heartbeat_timeout:
+
+                    logging.error("No heartbeat from {} for {} s".format(
+                        worker.name, now - worker.last_seen))
+
+                    self._drop_worker(worker, task_queue)
+
+        self._worker_segment_times = worker_segment_times
+
+
+class WorkerDaemon(object):
+    """Connects to a DistributedMapper and runs the tasks it is sent."""
+
+    def __init__(self,
+                 address,
+                 authkey,
+                 heartbeat_interval=HEARTBEAT_INTERVAL,
+                 task_kwargs=None):
+        """Constructor for WorkerDaemon.
+
+        Parameters
+        ----------
+        address : tuple of (str, int)
+            The host name and port of the mapper.
+
+        authkey : bytes or str
+            The secret key of the mapper.
+
+        heartbeat_interval : float
+            The number of seconds between heartbeats sent to the mapper.
+
+        task_kwargs : dict of str : value, optional
+            Key-word arguments passed to every task, e.g. the
+            'platform_kwargs' for OpenMM runners.
+
+        Raises
+        ------
+        RuntimeError
+            If the python version is older than 3.8.
+
+        """
+
+        require_pickle_protocol_5("WorkerDaemon")
+
+        if isinstance(authkey, str):
+            authkey = authkey.encode()
+
+        self.address = tuple(address)
+        self.authkey = authkey
+        self.heartbeat_interval = heartbeat_interval
+
+        if task_kwargs is None:
+            self.task_kwargs = {}
+        else:
+            self.task_kwargs = task_kwargs
+
+        self._send_lock = threading.Lock()
+
+    @property
+    def name(self):
+        """Name identifying the daemon to the mapper."""
+        return "{}:{}".format(socket.gethostname(), os.getpid())
+
+    def _send(self, conn, message):
+        """Send a message from either thread."""
+
+        with self._send_lock:
+            send_message(conn, message)
+
+    def _heartbeat(self, conn, stop):
+        """Target of the thread sending heartbeats until stopped."""
+
+        while not stop.wait(self.heartbeat_interval):
+
+            try:
+                self._send(conn, ('heartbeat',))
+            except OSError:
+                return
+
+    def run_task(self, task):
+        """Run a task.
+
+        Parameters
+        ----------
+        task : Task object
+
+        Returns
+        -------
+        result
+
+        """
+
+        return task(**self.task_kwargs)
+
+    def _run_task(self, task_idx, task):
+        """Run a task and make the message with its result or error."""
+
+        start = time.time()
+
+        try:
+            result = self.run_task(task)
+
+        except Exception as task_exception:
+
+            # get the traceback for the exception
+            tb = sys.exc_info()[2]
+
+            msg = "Exception '{}({})' caught in a task.".format(
+                                   type(task_exception).__name__, task_exception)
+            traceback_log_msg = \
+                """Traceback:
+--------------------------------------------------------------------------------
+{}
+--------------------------------------------------------------------------------
+                """.format(''.join(traceback.format_exception(
+                    type(task_exception), task_exception, tb)),
+                )
+
+            logging.critical(msg + '\n' + traceback_log_msg)
+
+            exception = TaskException("Error occured during task execution, recovery not possible.",
+                                      wrapped_exception=task_exception,
+                                      tb=tb)
+
+            return ('exception', task_idx, exception)
+
+        end = time.time()
+
+        return ('result', task_idx, end - start, result)
+
+    def run(self):
+        """Connect to the mapper and run tasks until it stops the daemon
+        or the connection is lost."""
+
+        conn = mpc.Client(self.address, authkey=self.authkey)
+
+        logging.info("Connected to the mapper at {}".format(self.address))
+
+        stop = threading.Event()
+        heartbeat_thread = threading.Thread(target=self._heartbeat,
+                                            args=(conn, stop),
+                                            name="WorkerDaemon-heartbeat",
+                                            daemon=True)
+
+        try:
+
+            self._send(conn, ('hello', self.name))
+
+            heartbeat_thread.start()
+
+            while True:
+
+                try:
+                    message = recv_message(conn)
+
+                except (EOFError, OSError):
+                    logging.warning("Lost connection to the mapper")
+                    break
+
+                # e.g. the segment function can't be imported here
+                except Exception as exception:
+
+                    logging.critical("Could not read a message from the mapper: {}".format(
+                        exception))
+
+                    self._send(conn, ('exception', None, WorkerException(
+                        "Worker daemon {} could not read a task".format(self.name),
+                        wrapped_exception=exception,
+                        tb=sys.exc_info()[2])))
+
+                    break
+
+                if message[0] == 'stop':
+                    logging.info("Stopped by the mapper")
+                    break
+
+                elif message[0] == 'task':
+
+                    _, task_idx, task = message
+
+                    logging.info("Running task {}".format(task_idx))
+
+                    try:
+                        self._send(conn, self._run_task(task_idx, task))
+                    except OSError:
+                        logging.warning("Lost connection to the mapper")
+                        break
+
+                else:
+                    logging.error("Unknown message from the mapper: {}".format(message[0]))
+
+        finally:
+
+            stop.set()
+
+            if heartbeat_thread.is_alive():
+                heartbeat_thread.join()
+
+            conn.close()
@@ -5,20 +5,38 @@ wepy simulation cycles.
 """
 import sys
 import multiprocessing as mp
+import multiprocessing.connection as mpc
 import queue as pyq
 import traceback
 import time
 from warnings import warn
 import signal
 
+# only in python 3.8 or later, needed for the shared memory transport
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+    resource_tracker = None
+
 import logging
 from eliot import start_action, log_call
 
+from wepy.work_mapper.transport import (
+    SharedMessage, SharedTask, SharedBlocks, require_pickle_protocol_5,
+)
+from wepy.work_mapper.scheduler import TaskScheduler
+
 PY_MAP = map
 
 class ABCMapper(object):
     """Abstract base class for a Mapper."""
 
+    BATCHED = False
+    """Whether the 'segment_func' is called once for all the walkers
+    (i.e. it implements the Runner.run_segments interface) instead of
+    once for each walker."""
+
     def __init__(self, segment_func=None, **kwargs):
         """Constructor for the Mapper class. No arguments are required.
 
@@ -91,6 +109,28 @@ class ABCMapper(object):
     def map(self, *args, **kwargs):
         raise NotImplementedError
 
+    def map_as_completed(self, *args, **kwargs):
+        """Map the 'segment_func' to args, yielding the results as they
+        are completed.
+
+        Takes the same arguments as `map`. The generator must be
+        exhausted before the mapper is used again.
+
+        This default waits for all of the results from `map` and so
+        only mappers which actually run the tasks concurrently need to
+        override it.
+
+        Yields
+        ------
+        task_idx : int
+            The index of the call in the arguments.
+
+        result
+            The result of the call to 'segment_func'.
+
+        """
+
+        yield from enumerate(self.map(*args, **kwargs))
 
 
 class Mapper(ABCMapper):
@@ -134,12 +174,16 @@ class Mapper(ABCMapper):
 
         """
 
+        return [result for task_idx, result in self.map_as_completed(*args, **kwargs)]
+
+    def map_as_completed(self, *args, **kwargs):
+        # docstring in superclass
+
         # expand the generators for the args and kwargs
         args = [list(arg) for arg in args]
         kwargs = {key : list(kwarg) for key, kwarg in kwargs.items()}
 
         segment_times = []
-        results = []
         for arg_idx in range(len(args[0])):
             start = time.time()
 
@@ -182,12 +226,10 @@ class Mapper(ABCMapper):
             segment_time = end - start
             segment_times.append(segment_time)
 
-            results.append(result)
+            yield arg_idx, result
 
         self._worker_segment_times[0] = segment_times
 
-        return results
-
     @property
     def worker_segment_times(self):
         """The run timings for each segment for each walker.
@@ -202,6 +244,96 @@ class Mapper(ABCMapper):
         return self._worker_segment_times
 
 
+class BatchMapper(Mapper):
+    """Non-parallel mapper which runs the segments for all walkers with
+    a single call.
+
+    The 'segment_func' must implement the Runner.run_segments
+    interface, which the simulation manager will use instead of
+    'run_segment' for this mapper. This is useful for runners which
+    can propagate many walkers together more efficiently than
+    individually.
+
+    """
+
+    BATCHED = True
+
+    @log_call(include_args=[],
+              include_result=False)
+    def map(self, *args, **kwargs):
+        """Map the 'segment_func' to args.
+
+        Parameters
+        ----------
+        *args : list of list
+            Each element is the list of arguments for all walkers
+            which is passed as is to 'segment_func'.
+
+        Returns
+        -------
+        results : list
+            The results for each walker in the same order as input.
+
+        Examples
+        --------
+
+        >>> BatchMapper(segment_func=lambda a, b: [x + y for x, y in zip(a, b)]).map([0, 3], [1, 4])
+        [1, 7]
+
+        """
+
+        # expand the generators for the args and kwargs
+        args = [list(arg) for arg in args]
+        kwargs = {key : list(kwarg) for key, kwarg in kwargs.items()}
+
+        n_calls = len(args[0])
+
+        start = time.time()
+
+        # run the task, catch any errors and reraise as a
+        # TaskException to satisfy the pattern
+        try:
+
+            results = list(self._func(*args, **kwargs))
+
+        except Exception as task_exception:
+
+            # get the traceback for the exception
+            tb = sys.exc_info()[2]
+
+            msg = "Exception '{}({})' caught in a task.".format(
+                                   type(task_exception).__name__, task_exception)
+            traceback_log_msg = \
+                """Traceback:
+--------------------------------------------------------------------------------
+{}
+--------------------------------------------------------------------------------
+                """.format(''.join(traceback.format_exception(
+                    type(task_exception), task_exception, tb)),
+                )
+
+            logging.critical(msg + '\n' + traceback_log_msg)
+
+            raise TaskException("Error occured during task execution, recovery not possible.",
+                            wrapped_exception=task_exception,
+                            tb=tb)
+
+        end = time.time()
+
+        # the segments aren't timed individually so each gets an even
+        # share of the total
+        self._worker_segment_times[0] = [(end - start) / n_calls
+                                         for _ in range(n_calls)]
+
+        return results
+
+    def map_as_completed(self, *args, **kwargs):
+        # docstring in superclass
+
+        # all of the walkers finish together
+        yield from enumerate(self.map(*args, **kwargs))
+
+
 class Task(object):
     """Class that composes a function and arguments."""
 
@@ -250,12 +382,32 @@ class WrapperException(Exception):
 class TaskException(WrapperException):
     pass
 
+def _wait_readers(queues, connections=()):
+    """Block until at least one of the queues or connections has
+    something to receive.
+
+    Waits on the reading ends of the queues the same way as the
+    process pool in concurrent.futures does. Nothing is received and
+    getting from a queue afterwards may still find it empty if
+    another process got there first.
+
+    Parameters
+    ----------
+    queues : list of multiprocessing.Queue
+
+    connections : list of multiprocessing.connection.Connection
+
+    """
+
+    mpc.wait([queue._reader for queue in queues] + list(connections))
+
 class ABCWorkerMapper(ABCMapper):
 
     def __init__(self,
                  num_workers=None,
                  segment_func=None,
                  proc_start_method='fork',
+                 scheduler=None,
                  **kwargs):
         """Constructor for WorkerMapper.
 
@@ -275,6 +427,12 @@ class ABCWorkerMapper(ABCMapper):
             documentation. Generates a context with the method
             multiprocessing.get_context(proc_start_method) on `init`.
 
+        scheduler : TaskScheduler or None
+            Chooses the order tasks are dispatched to the workers in,
+            see wepy.work_mapper.scheduler. If None they are dispatched
+            in order. Only used by mappers that dispatch tasks through
+            a queue.
+
         """
 
         super().__init__(segment_func=segment_func, **kwargs)
@@ -282,6 +440,11 @@ class ABCWorkerMapper(ABCMapper):
 
         self._proc_start_method = proc_start_method
 
+        if scheduler is None:
+            self._scheduler = TaskScheduler()
+        else:
+            self._scheduler = scheduler
+
         self._num_workers = num_workers
         self._worker_segment_times = None
 
@@ -320,6 +483,13 @@ class ABCWorkerMapper(ABCMapper):
         # update the worker segment times
         self._worker_segment_times = {i : [] for i in range(self.num_workers)}
 
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+
+        # mappers pickled before schedulers were added
+        if not hasattr(self, '_scheduler'):
+            self._scheduler = TaskScheduler()
 
     def cleanup(self, **kwargs):
 
@@ -348,6 +518,23 @@ class ABCWorkerMapper(ABCMapper):
         """
         return self._worker_segment_times
 
+    @property
+    def scheduler(self):
+        """The scheduler choosing the order tasks are dispatched in."""
+        return self._scheduler
+
+    @property
+    def scheduling_data(self):
+        """The records of the scheduling decisions for each task of the
+        last mapping, see wepy.work_mapper.scheduler.
+
+        Returns
+        -------
+        scheduling_data : list of dict of str : value
+
+        """
+        return self._scheduler.scheduling_records
+
     def _make_task(self, *args, **kwargs):
         """Generate a task from 'segment_func' attribute.
 
@@ -387,6 +574,10 @@ class WorkerMapper(ABCWorkerMapper):
 
     Uses the python multiprocessing module to spawn multiple worker
     processes which watch a task queue of walker segments.
+
+    Optionally the data of the tasks and results can be sent through
+    shared memory instead of the queues, see
+    wepy.work_mapper.transport.
     """
 
     def __init__(self,
@@ -394,6 +585,7 @@ class WorkerMapper(ABCWorkerMapper):
                  worker_type=None,
                  worker_attributes=None,
                  segment_func=None,
+                 shared_memory=False,
                  **kwargs):
         """Constructor for WorkerMapper.
 
@@ -414,12 +606,32 @@ class WorkerMapper(ABCWorkerMapper):
         segment_func : callable, optional
             Set a default segment_func. Typically set at runtime.
 
+        shared_memory : bool
+            If True the numpy arrays of the tasks and results (e.g.
+            walker states) are passed through shared memory blocks
+            which are reused every cycle, instead of being pickled
+            through the queues. Requires Python 3.8 or later.
+
+        Raises
+        ------
+        RuntimeError
+            If shared_memory is True and the python version is older
+            than 3.8.
+
         """
 
         super().__init__(num_workers=num_workers,
                          segment_func=segment_func,
                          **kwargs)
 
+        if shared_memory:
+            require_pickle_protocol_5("The shared_memory option of WorkerMapper")
+
+        self._shared_memory = shared_memory
+
+        # the blocks are allocated in init
+        self._shared_blocks = None
+
         # since the workers will be their own process classes we
         # handle this data
 
@@ -465,19 +677,28 @@ class WorkerMapper(ABCWorkerMapper):
                      segment_func=segment_func,
                      **kwargs)
 
-        manager = self._mp_ctx.Manager()
+        if self._shared_memory:
+
+            self._shared_blocks = SharedBlocks()
+
+            # the workers must share the resource tracker of this
+            # process, otherwise their own trackers would free the
+            # blocks they attached to when they exit
+            resource_tracker.ensure_running()
 
-        # Establish communication queues
+        # Establish communication queues. These are plain (not
+        # managed) queues so that the mapper and workers can block on
+        # them (see `_wait_readers`) instead of polling.
 
         # A queue for errors
-        self._exception_queue = manager.Queue()
+        self._exception_queue = self._mp_ctx.Queue()
 
         # queue for the tasks we know the batch size so we don't need
         # a JoinableQueue
-        self._task_queue = manager.Queue()
+        self._task_queue = self._mp_ctx.Queue()
 
         # results queue
-        self._result_queue = manager.Queue()
+        self._result_queue = self._mp_ctx.Queue()
 
         # use pipes for communication channels between this parent
         # process and the children for sending specific interrupts
@@ -535,6 +756,12 @@ class WorkerMapper(ABCWorkerMapper):
 
         for worker_idx, worker in enumerate(self._workers):
 
+            # a dead worker can't receive it and the pipe is broken
+            if not worker.is_alive():
+                logging.critical("Worker {} already exited, exit code {}".format(
+                    worker_idx, worker.exitcode))
+                continue
+
             logging.critical("Sending SIGTERM message on {} to worker {}".format(
                 self._irq_parent_conns[worker_idx].fileno(), worker_idx))
 
@@ -630,45 +857,106 @@ class WorkerMapper(ABCWorkerMapper):
         self._result_queue = None
         self._workers = None
 
+        # free the shared memory
+        if self._shared_blocks is not None:
+            self._shared_blocks.close()
+            self._shared_blocks = None
+
+    def __getstate__(self):
+
+        # shared memory blocks can't be copied
+        state = self.__dict__.copy()
+        state['_shared_blocks'] = None
+
+        return state
+
+    def _make_shared_task(self, task_idx, task):
+        """Write a task to the shared memory for its slot.
+
+        Parameters
+        ----------
+        task_idx : int
+
+        task : Task object
+
+        Returns
+        -------
+        shared_task : SharedTask object
+
+        """
+
+        message = SharedMessage.pack(
+            task,
+            block_for=lambda nbytes: self._shared_blocks.reserve(('task', task_idx), nbytes))
+
+        # results are usually about as big as the tasks
+        result_block = self._shared_blocks.reserve(('result', task_idx), message.nbytes)
+
+        return SharedTask(message, result_block.name)
+
 
     def map(self, *args, **kwargs):
         # docstring in superclass
 
+        results = sorted(self.map_as_completed(*args, **kwargs),
+                         key=lambda result: result[0])
+
+        # then just return the values of the function
+        return [result for task_idx, result in results]
+
+    def map_as_completed(self, *args, **kwargs):
+        # docstring in superclass
+
         map_process = self._mp_ctx.current_process()
         logging.info("Mapping from process {}; PID {}".format(map_process.name, map_process.pid))
 
         # make tuples for the arguments to each function call
-        task_args = zip(*args)
+        task_args = list(zip(*args))
         kwargs = {key : list(kwarg) for key, kwarg in kwargs.items()}
 
         num_tasks = len(args[0])
-        # Enqueue the jobs
-        for task_idx, task_arg in enumerate(task_args):
+        # Enqueue the jobs in the order chosen by the scheduler
+        for task_idx in self._scheduler.order(num_tasks):
 
+            task_arg = task_args[task_idx]
             task_kwargs = {key : value[task_idx] for key, value in kwargs.items()}
 
+            task = self._make_task(*task_arg, **task_kwargs)
+
+            if self._shared_blocks is not None:
+                task = self._make_shared_task(task_idx, task)
+
             # a task will be the actual task and its task idx so we can
             # sort them later
-            self._task_queue.put((task_idx, self._make_task(*task_arg, **task_kwargs)))
+            self._task_queue.put((task_idx, task))
 
 
         logging.info("Waiting for tasks to be run")
 
-        # poll the exception and result queues for results
+        # wait on the exception and result queues for results
         n_results_left = num_tasks
-        results = []
+        task_times = []
         while n_results_left > 0:
 
-            # first check if any errors came back but don't wait,
-            # since the methods for querying whether it is empty or
-            # not are not reliable we just try and if we don't get
-            # anything we will come back around
+            # block until there is something on one of the queues or
+            # a worker process has exited, otherwise a worker killed
+            # by the OS would leave us waiting forever
+            _wait_readers([self._exception_queue, self._result_queue],
+                          [worker.sentinel for worker in self._workers])
+
+            received = False
+
+            # first check if any errors came back, since the methods
+            # for querying whether it is empty or not are not reliable
+            # we just try and if we don't get anything we will come
+            # back around
             try:
                 proc_name, pid, exception = self._exception_queue.get_nowait()
             except pyq.Empty:
                 pass
 
             else:
+                received = True
 
                 logging.error("Exception occured in process {}; pid {}.".format(
                     proc_name, pid))
@@ -723,15 +1011,52 @@ class WorkerMapper(ABCWorkerMapper):
 
             # if we get something handle it
             else:
+                received = True
 
                 logging.info("Retrieved result: {}".format(result))
-                results.append(result)
+
+                task_idx, worker_idx, task_time, task_result = result
+                task_times.append((task_idx, worker_idx, task_time))
+                self._scheduler.record(task_idx, worker_idx, task_time)
+
+                if type(task_result) == SharedMessage:
+
+                    # copy it out of the block so it can be reused
+                    task_result_message = task_result
+                    task_result = task_result_message.unpack(
+                        attach=self._shared_blocks.attach, copy=True)
+
+                    # make room for the result next time if it didn't fit
+                    if not task_result_message.shared:
+                        self._shared_blocks.reserve(('result', task_idx),
+                                                    task_result_message.nbytes)
 
                 # reduce the counter so we know when we are done
                 n_results_left -= 1
 
-        # sort the results according to their task_idx
-        results.sort()
+                yield task_idx, task_result
+
+            # only once both queues are drained is a dead worker
+            # known to have exited without posting anything, since
+            # workers only exit during a mapping when killed
+            if not received:
+                for worker in self._workers:
+
+                    exitcode = worker.exitcode
+                    if exitcode is not None:
+
+                        logging.critical("{} exited without a result, exit code {}".format(
+                            worker.name, exitcode))
+
+                        self.force_shutdown()
+
+                        logging.critical("Shutdown complete.")
+
+                        raise WorkerKilledError("{} was killed, exit code {}".format(
+                            worker.name, exitcode))
+
+        # sort the timings according to their task_idx
+        task_times.sort()
 
         # save the task run times, so they can be accessed if desired,
         # after clearing the task times from the last mapping
@@ -739,12 +1064,9 @@ class WorkerMapper(ABCWorkerMapper):
         # DEBUG: removing this because it should be set on init()
         #self._worker_segment_times = {i : [] for i in range(self.num_workers)}
 
-        for task_idx, worker_idx, task_time, result in results:
+        for task_idx, worker_idx, task_time in task_times:
             self._worker_segment_times[worker_idx].append(task_time)
 
-        # then just return the values of the function
-        return [result for task_idx, worker_idx, task_time, result in results]
-
 
 # same for the worker in terms of refactoring
 class Worker(mp.Process):
@@ -817,6 +1139,10 @@ class Worker(mp.Process):
         self._task_queue = task_queue
         self._result_queue = result_queue
 
+        # the shared memory blocks of the mapper this has attached
+        # to by the key of the block in the mapper
+        self._shared_blocks = {}
+
         logging.debug("{} process created".format(self.name))
 
 
@@ -835,6 +1161,46 @@ class Worker(mp.Process):
         """Dictionary of attributes of the worker."""
         return self._mapper_attributes
 
+    def _attach_shared_block(self, key, name):
+        """Get a shared memory block of the mapper by name.
+
+        The blocks are kept attached since the mapper reuses them
+        every cycle. When the mapper replaces the block for a key with
+        a bigger one the old one is closed.
+
+        Parameters
+        ----------
+        key : tuple of (str, int)
+            The key of the block in the mapper, e.g. ('task', task_idx).
+
+        name : str
+
+        Returns
+        -------
+        block : SharedMemory
+
+        """
+
+        block = self._shared_blocks.get(key)
+
+        if block is not None and block.name != name:
+
+            try:
+                block.close()
+
+            # the objects of an old task still using it will unmap it
+            # when they are freed
+            except BufferError:
+                pass
+
+            block = None
+
+        if block is None:
+            block = shared_memory.SharedMemory(name=name)
+            self._shared_blocks[key] = block
+
+        return block
+
     def run(self):
 
         logging.debug("{}: starting to run".format(self.name))
@@ -956,6 +1322,9 @@ class Worker(mp.Process):
 
         while True:
 
+            # block until there is either an interrupt or a task
+            _wait_readers([self._task_queue], [self._irq_channel])
+
             # check to see if there is any signals in the interrupt channel
             if self._irq_channel.poll():
                 # get the message
@@ -1015,6 +1384,15 @@ class Worker(mp.Process):
             # the queue; an Ellipsis indicates continue the loop
             elif next_task is not Ellipsis:
 
+                shared_task = None
+                if type(next_task) == SharedTask:
+
+                    # the arrays of the task are read in place
+                    shared_task = next_task
+                    next_task = shared_task.message.unpack(
+                        attach=lambda name: self._attach_shared_block(('task', task_idx),
+                                                                      name))
+
                 logging.info('{}; task_idx : {}; args : {} '.format(
                     self.name, task_idx, next_task.args))
 
@@ -1026,6 +1404,13 @@ class Worker(mp.Process):
                 end = time.time()
                 task_time = end - start
 
+                if shared_task is not None:
+
+                    # only use the block if the result fits
+                    result_block = self._attach_shared_block(('result', task_idx),
+                                                             shared_task.result_block_name)
+                    answer = SharedMessage.pack(answer, block_for=lambda nbytes: result_block)
+
                 logging.info('{}: task_idx : {}; COMPLETED in {} s'.format(
                     self.name, task_idx, task_time))
 
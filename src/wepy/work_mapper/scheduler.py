@@ -0,0 +1,276 @@
+"""Schedulers that choose the order in which work mappers dispatch
+tasks to their workers.
+
+Mappers like the WorkerMapper put all of the tasks for a cycle on a
+single queue from which the workers take them as they become free. The
+order the tasks are put on the queue determines how well the work is
+balanced between the workers: when segments take different amounts of
+time (e.g. different sized walkers or workers on different hardware) a
+long task taken last by one worker can leave the others waiting for
+it, which makes the whole cycle as long as its unluckiest worker.
+
+The TaskScheduler dispatches tasks in the order they were given and
+the LongestTaskFirstScheduler dispatches the tasks expected to take
+the longest first, based on how long they took in previous cycles, so
+that the short tasks fill in the gaps at the end.
+
+Schedulers also keep a record of each decision made for the last
+mapping (see `TaskScheduler.scheduling_records`), which the simulation
+manager gives to the reporters as 'scheduling_data'. Each record has
+the fields:
+
+- task_idx : the index of the task (i.e. walker) in the mapping
+- dispatch_idx : the position the task was dispatched at
+- expected_time : the expected run time of the task (or None)
+- worker_idx : the worker that ran the task
+- task_time : how long the task took in seconds
+
+The straggler time of a cycle, i.e. how long workers waited on the
+slowest worker, can be computed from these by comparing the total
+times of each worker.
+
+"""
+
+import logging
+
+class TaskScheduler(object):
+    """Dispatches tasks in the order they are given.
+
+    This is the default behavior of the mappers and only keeps the
+    records of the dispatching for reporting.
+
+    """
+
+    def __init__(self):
+
+        self._records = []
+
+        # the positions of the records of each task
+        self._record_idxs = {}
+
+    @property
+    def scheduling_records(self):
+        """The records of the scheduling decisions of the last mapping.
+
+        Returns
+        -------
+        records : list of dict of str : value
+            A record for each task in the order they were dispatched.
+
+        """
+        return self._records
+
+    def expected_time(self, task_idx):
+        """The expected time for a task.
+
+        Parameters
+        ----------
+        task_idx : int
+
+        Returns
+        -------
+        expected_time : float or None
+            None if there is no expectation.
+
+        """
+        return None
+
+    def order(self, num_tasks):
+        """Choose the order to dispatch the tasks of a mapping in.
+
+        Starts new records for the mapping.
+
+        Parameters
+        ----------
+        num_tasks : int
+
+        Returns
+        -------
+        task_idxs : list of int
+            The indices of the tasks in the order they should be
+            dispatched.
+
+        """
+
+        task_idxs = self._order(num_tasks)
+
+        self._records = [{'task_idx' : task_idx,
+                          'dispatch_idx' : dispatch_idx,
+                          'expected_time' : self.expected_time(task_idx),
+                          'worker_idx' : None,
+                          'task_time' : None}
+                         for dispatch_idx, task_idx in enumerate(task_idxs)]
+
+        self._record_idxs = {task_idx : dispatch_idx
+                             for dispatch_idx, task_idx in enumerate(task_idxs)}
+
+        return task_idxs
+
+    def _order(self, num_tasks):
+        """Subclasses override this to choose the order."""
+
+        return list(range(num_tasks))
+
+    def record(self, task_idx, worker_idx, task_time):
+        """Record the run of a task from the last mapping.
+
+        Parameters
+        ----------
+        task_idx : int
+
+        worker_idx : int
+
+        task_time : float
+            Time in seconds the task took.
+
+        """
+
+        if task_idx not in self._record_idxs:
+            raise ValueError("Task {} was not dispatched".format(task_idx))
+
+        record = self._records[self._record_idxs[task_idx]]
+        record['worker_idx'] = worker_idx
+        record['task_time'] = task_time
+
+
+class LongestTaskFirstScheduler(TaskScheduler):
+    """Dispatches the tasks expected to take the longest first.
+
+    The expected time of a task is estimated from the times the task
+    with the same index (i.e. the walker with the same index) took in
+    previous cycles, as an exponential moving average. Since
+    resampling may replace the walker at an index this is only an
+    estimate, but walkers are usually similar to the ones they
+    replaced.
+
+    Times are recorded relative to the speed of the worker which ran
+    them so that tasks which happened to run on a slow worker are not
+    expected to be long on every worker. Tasks without any recorded
+    times are expected to take the mean of the other tasks.
+
+    """
+
+    def __init__(self, worker_speeds=None, smoothing=0.5):
+        """Constructor for LongestTaskFirstScheduler.
+
+        Parameters
+        ----------
+        worker_speeds : dict of int : float or None
+            The relative speed of each worker, i.e. how many times more
+            work it does than a worker with a speed of 1, which is the
+            speed of any worker not given.
+
+        smoothing : float
+            The weight between 0 and 1 of the latest time of a task in
+            its expected time. With 1 only the last time is used.
+
+        """
+
+        super().__init__()
+
+        if not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be in (0, 1], not {}".format(smoothing))
+
+        if worker_speeds is None:
+            self._worker_speeds = {}
+        else:
+            self._worker_speeds = dict(worker_speeds)
+
+            if any(speed <= 0 for speed in self._worker_speeds.values()):
+                raise ValueError("Worker speeds must be positive")
+
+        self._smoothing = smoothing
+
+        # the expected amount of work for each task index
+        self._task_work = {}
+
+    @property
+    def worker_speeds(self):
+        """The relative speeds of the workers."""
+        return self._worker_speeds
+
+    @property
+    def smoothing(self):
+        """The weight of the latest time in the expected times."""
+        return self._smoothing
+
+    def worker_speed(self, worker_idx):
+        """The relative speed of a worker."""
+        return self._worker_speeds.get(worker_idx, 1.)
+
+    def expected_time(self, task_idx):
+        # docstring in superclass
+
+        if task_idx in self._task_work:
+            return self._task_work[task_idx]
+
+        elif len(self._task_work) > 0:
+            return sum(self._task_work.values()) / len(self._task_work)
+
+        else:
+            return None
+
+    def _order(self, num_tasks):
+
+        expected_times = [self.expected_time(task_idx) for task_idx in range(num_tasks)]
+
+        # without any times yet keep the given order
+        if any(expected_time is None for expected_time in expected_times):
+            return list(range(num_tasks))
+
+        # longest first, sorting is stable so ties keep their order
+        return sorted(range(num_tasks),
+                      key=lambda task_idx: expected_times[task_idx],
+                      reverse=True)
+
+    def record(self, task_idx, worker_idx, task_time):
+        # docstring in superclass
+
+        super().record(task_idx, worker_idx, task_time)
+
+        # the time the task would take on a worker with speed 1
+        work = task_time * self.worker_speed(worker_idx)
+
+        if task_idx in self._task_work:
+            self._task_work[task_idx] = (self._smoothing * work +
+                                         (1 - self._smoothing) * self._task_work[task_idx])
+        else:
+            self._task_work[task_idx] = work
+
+        logging.debug("Expected time for task {} is now {}".format(
+            task_idx, self._task_work[task_idx]))
+
+
+def straggler_time(scheduling_records):
+    """The average time the workers waited for the slowest worker to
+    finish in a mapping.
+
+    This is the difference between the largest total time of the
+    tasks run by a worker and the mean of the totals for the workers
+    that ran tasks.
+
+    Parameters
+    ----------
+    scheduling_records : list of dict of str : value
+        The records of the tasks of a mapping.
+
+    Returns
+    -------
+    straggler_time : float or None
+        None if no tasks were recorded.
+
+    """
+
+    worker_times = {}
+    for record in scheduling_records:
+
+        if record['worker_idx'] is None:
+            continue
+
+        worker_times[record['worker_idx']] = (worker_times.get(record['worker_idx'], 0.) +
+                                              record['task_time'])
+
+    if len(worker_times) == 0:
+        return None
+
+    return max(worker_times.values()) - sum(worker_times.values()) / len(worker_times)
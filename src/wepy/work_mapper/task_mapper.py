@@ -1,4 +1,5 @@
 import multiprocessing as mp
+import multiprocessing.connection as mpc
 import queue as pyq
 import time
 import logging
@@ -8,7 +9,8 @@ import traceback
 import signal
 import pickle
 
-from wepy.work_mapper.mapper import ABCWorkerMapper, WrapperException, TaskException, Task
+from wepy.work_mapper.mapper import ABCWorkerMapper, WrapperException, TaskException, Task, \
+    _wait_readers
 
 from wepy.walker import Walker
 
@@ -41,7 +43,8 @@ class TaskMapper(ABCWorkerMapper):
     walkers you may experience a large overhead. If your walker states
     are very small or a very fast serializer is available you may also
     not benefit from full process address space copies. Instead the
-    WorkerMapper may be better suited.
+    WorkerMapper may be better suited, or the PoolTaskMapper which
+    reuses its task processes between cycles.
 
     """
 
@@ -136,14 +139,26 @@ class TaskMapper(ABCWorkerMapper):
 
     def map(self, *args, **kwargs):
 
+        num_walkers = len(args[0])
+
+        new_walkers = [None for _ in range(num_walkers)]
+        for walker_idx, new_walker in self.map_as_completed(*args, **kwargs):
+            new_walkers[walker_idx] = new_walker
+
+        return new_walkers
+
+    def map_as_completed(self, *args, **kwargs):
+        # docstring in superclass
+
         # run computations in a Manager context
         with self._mp_ctx.Manager() as manager:
 
             num_walkers = len(args[0])
 
             # to manage access to worker resources we use a queue with
-            # the index of the worker
-            worker_queue = manager.Queue()
+            # the index of the worker, this is not managed so the task
+            # processes can block on it
+            worker_queue = self._mp_ctx.Queue()
 
             # put the workers onto the queue
             for worker_idx in range(self.num_workers):
@@ -204,10 +219,20 @@ class TaskMapper(ABCWorkerMapper):
 
                 self._walker_processes.append(walker_process)
 
-            new_walkers = [None for _ in range(num_walkers)]
             results_found = [False for _ in range(num_walkers)]
             while not all(results_found):
 
+                # instead of polling the results block until a task
+                # process which hasn't returned a result exits or
+                # sends an interrupt. The results are set before the
+                # processes exit.
+                mpc.wait([self._walker_processes[walker_idx].sentinel
+                          for walker_idx in range(num_walkers)
+                          if not results_found[walker_idx]] +
+                         [self._irq_parent_conns[walker_idx]
+                          for walker_idx in range(num_walkers)
+                          if not results_found[walker_idx]])
+
                 # go through the results list and handle the values that may be there
                 for walker_idx, result in enumerate(results):
 
@@ -246,7 +271,25 @@ class TaskMapper(ABCWorkerMapper):
                     # if it is None no response has been made at all
                     # yet, this is the initialized value
                     if result is None:
-                        pass
+
+                        # if the process has exited without setting a
+                        # result (checking again since it may have
+                        # been set just before exiting) it was killed
+                        if (self._walker_processes[walker_idx].exitcode is not None and
+                            results[walker_idx] is None):
+
+                            logging.critical(
+                                "Process {} exited without a result, shutting down.".format(
+                                    self._walker_processes[walker_idx].name))
+
+                            self.force_shutdown()
+
+                            logging.critical("Shutdown complete.")
+
+                            raise TaskProcessKilledError(
+                                "{} exited with code {} without a result".format(
+                                    self._walker_processes[walker_idx].name,
+                                    self._walker_processes[walker_idx].exitcode))
 
 
                     # walker results are returned serialized as
@@ -273,9 +316,10 @@ class TaskMapper(ABCWorkerMapper):
 
                             logging.info("Got result for walker {}".format(walker_idx))
 
-                            new_walkers[walker_idx] = new_walker
                             results_found[walker_idx] = True
 
+                            yield walker_idx, new_walker
+
                         else:
                             raise ValueError("Unkown result ID: {}".format(result_id))
 
@@ -340,7 +384,266 @@ class TaskMapper(ABCWorkerMapper):
         # deinitialize the current walker processes
         self._walker_processes = None
 
-        return new_walkers
+
+class PoolTaskMapper(TaskMapper):
+    """TaskMapper which keeps its task processes between cycles.
+
+    Instead of starting a new process (and manager) for every walker
+    each cycle, one task process is started for each worker in `init`
+    and these run the tasks for the walkers from a queue.
+
+    The processes are recycled to keep some of the isolation of
+    running each task in a fresh process: a process exits after
+    running 'max_tasks_per_process' tasks and is replaced by a new
+    one, and processes that exited because a task failed or that were
+    killed are replaced on the next call to `map`. Errors are raised
+    the same as for the TaskMapper.
+
+    Since the processes are not forked for each task the tasks
+    (including the segment function and so the runner) are pickled
+    to send them to the processes, as for the WorkerMapper.
+
+    The 'walker_task_type' must support running tasks from a queue as
+    the WalkerTaskProcess does.
+
+    """
+
+    def __init__(self,
+                 max_tasks_per_process=None,
+                 **kwargs):
+        """Constructor for PoolTaskMapper.
+
+        Parameters
+        ----------
+        max_tasks_per_process : int or None
+            The number of tasks a process runs before it is replaced
+            by a new one. If None processes are only replaced when
+            they fail.
+
+        kwargs
+            The arguments for TaskMapper.
+
+        """
+
+        super().__init__(**kwargs)
+
+        self._max_tasks_per_process = max_tasks_per_process
+
+        # made in init
+        self._task_queue = None
+        self._result_queue = None
+        self._walker_processes = None
+        self._irq_parent_conns = None
+
+    def __getstate__(self):
+
+        # the processes and their communication channels can't be
+        # copied
+        state = self.__dict__.copy()
+        state['_task_queue'] = None
+        state['_result_queue'] = None
+        state['_walker_processes'] = None
+        state['_irq_parent_conns'] = None
+
+        return state
+
+    @property
+    def max_tasks_per_process(self):
+        """The number of tasks a process runs before it is replaced."""
+        return self._max_tasks_per_process
+
+    def init(self, **kwargs):
+
+        super().init(**kwargs)
+
+        self._make_queues()
+
+        self._walker_processes = [None for _ in range(self.num_workers)]
+        self._irq_parent_conns = [None for _ in range(self.num_workers)]
+
+        self._start_processes()
+
+    def _make_queues(self):
+        """Make new task and result queues."""
+
+        self._task_queue = self._mp_ctx.Queue()
+        self._result_queue = self._mp_ctx.Queue()
+
+    def _start_process(self, worker_idx):
+        """Start a new task process for a worker."""
+
+        process = self._walker_processes[worker_idx]
+        if process is not None:
+            process.join()
+
+        parent_conn, child_conn = self._mp_ctx.Pipe()
+
+        # the pool processes only get the worker index and the
+        # queues, the tasks come over the queue
+        process = self.walker_task_type(worker_idx,
+                                        self._attributes,
+                                        None,
+                                        None,
+                                        None,
+                                        None,
+                                        None,
+                                        None,
+                                        child_conn,
+                                        task_queue=self._task_queue,
+                                        result_queue=self._result_queue,
+                                        max_tasks=self.max_tasks_per_process,
+        )
+
+        process.start()
+
+        logging.info("Task process started as name: {}; PID: {}".format(process.name,
+                                                                      process.pid))
+
+        self._walker_processes[worker_idx] = process
+        self._irq_parent_conns[worker_idx] = parent_conn
+
+    def _start_processes(self):
+        """Start a new task process for each worker that doesn't have a
+        running one."""
+
+        for worker_idx, process in enumerate(self._walker_processes):
+
+            if process is None or not process.is_alive():
+                self._start_process(worker_idx)
+
+    def force_shutdown(self):
+
+        super().force_shutdown()
+
+        # the rest of the tasks and results from the failed mapping
+        # are thrown away with the queues, which also may have been
+        # left unusable by a process killed while using them
+        self._make_queues()
+
+    def cleanup(self, **kwargs):
+
+        # stop the processes nicely with poison pills
+        for process in self._walker_processes:
+            if process.is_alive():
+                self._task_queue.put(None)
+
+        for process in self._walker_processes:
+            process.join()
+
+        self._walker_processes = None
+        self._irq_parent_conns = None
+        self._task_queue = None
+        self._result_queue = None
+
+        super().cleanup(**kwargs)
+
+    def map_as_completed(self, *args, **kwargs):
+        # docstring in superclass
+
+        # replace any processes that failed in the last mapping
+        self._start_processes()
+
+        task_args = list(zip(*args))
+        kwargs = {key : list(kwarg) for key, kwarg in kwargs.items()}
+
+        num_walkers = len(args[0])
+        # dispatch in the order chosen by the scheduler
+        for walker_idx in self._scheduler.order(num_walkers):
+
+            task_kwargs = {key : value[walker_idx] for key, value in kwargs.items()}
+
+            self._task_queue.put((walker_idx,
+                                  self._make_task(*task_args[walker_idx], **task_kwargs)))
+
+        worker_segment_times = {i : [] for i in range(self.num_workers)}
+
+        n_results_left = num_walkers
+        while n_results_left > 0:
+
+            # block until there are results, a process exited, or a
+            # process sent an interrupt
+            _wait_readers([self._result_queue],
+                          [process.sentinel for process in self._walker_processes] +
+                          self._irq_parent_conns)
+
+            # the results from a process are always on the queue
+            # before it exits so handle them first
+            while n_results_left > 0:
+
+                try:
+                    walker_idx, worker_idx, task_time, result = self._result_queue.get_nowait()
+                except pyq.Empty:
+                    break
+
+                if issubclass(type(result), Exception):
+
+                    if issubclass(type(result), TaskException):
+                        logging.critical(
+                            "Exception encountered in a task which is unrecoverable."
+                            "You will need to reconfigure your components in a stable manner.")
+
+                    elif issubclass(type(result), TaskProcessException):
+                        logging.critical(
+                            "Task process error mode resiliency not supported at this time."
+                            "Performing force shutdown and simulation ending.")
+
+                    else:
+                        logging.critical("Unknown exception {} encountered.".format(result))
+
+                    self.force_shutdown()
+
+                    logging.critical("Shutdown complete.")
+
+                    raise result
+
+                logging.info("Got result for walker {}".format(walker_idx))
+
+                worker_segment_times[worker_idx].append(task_time)
+                self._scheduler.record(walker_idx, worker_idx, task_time)
+                n_results_left -= 1
+
+                yield walker_idx, result
+
+            # processes exit normally after their maximum number of
+            # tasks, otherwise they were killed
+            for worker_idx, process in enumerate(self._walker_processes):
+
+                # check only once since the process may exit while
+                # handling it
+                exitcode = process.exitcode
+
+                killed = exitcode not in (None, 0)
+
+                if self._irq_parent_conns[worker_idx].poll():
+
+                    irq = self._irq_parent_conns[worker_idx].recv()
+
+                    if issubclass(type(irq), TaskProcessKilledError):
+                        killed = True
+                    else:
+                        logging.error("Unrecognized interrupt from {}: {}".format(
+                            process.name, irq))
+
+                if killed:
+
+                    logging.critical(
+                        "Process {} was killed, shutting down.".format(process.name))
+
+                    self.force_shutdown()
+
+                    logging.critical("Shutdown complete.")
+
+                    raise TaskProcessKilledError(
+                        "{} was killed, exit code {}".format(process.name, exitcode))
+
+                # replace processes that ran their maximum number of
+                # tasks
+                if exitcode == 0:
+                    self._start_process(worker_idx)
+
+        # only the timings of the last mapping are kept like the
+        # TaskMapper
+        self._worker_segment_times = worker_segment_times
 
 
 class WalkerTaskProcess(mp.Process):
@@ -357,12 +660,23 @@ class WalkerTaskProcess(mp.Process):
                  results_list,
                  worker_segment_times,
                  interrupt_connection,
+                 task_queue=None,
+                 result_queue=None,
+                 max_tasks=None,
                  **kwargs
                  ):
 
         # initialize the process customizing the name
         mp.Process.__init__(self, name=self.NAME_TEMPLATE.format(walker_idx), **kwargs)
 
+        # when a task queue is given this process is part of a pool
+        # (see PoolTaskMapper) and instead of a single task given
+        # here it runs the tasks from the queue with a fixed worker,
+        # which is the index given as the walker index
+        self._task_queue = task_queue
+        self._result_queue = result_queue
+        self._max_tasks = max_tasks
+
         # the idea with this TaskProcess thing is that we pass in all
         # the data to the constructor to create a "thunk" (a closure
         # that is ready to be run without arguments) and then when run
@@ -380,6 +694,9 @@ class WalkerTaskProcess(mp.Process):
         self._worker_idx = None
         self.mapper_attributes = mapper_attributes
 
+        if self._task_queue is not None:
+            self._worker_idx = walker_idx
+
         # set the managed datastructure proxies as an attribute so we
         self._worker_queue = worker_queue
         self._results_list = results_list
@@ -487,7 +804,10 @@ class WalkerTaskProcess(mp.Process):
             # queue attempt to run the task, and if it succeeds will
             # put the results on the result queue, if the task fails
             # it will catch it and wrap it as a task exception
-            self._run_walker()
+            if self._task_queue is not None:
+                self._run_pool()
+            else:
+                self._run_walker()
 
         except TaskException as task_exception:
 
@@ -536,12 +856,86 @@ class WalkerTaskProcess(mp.Process):
             # then put the exception and the traceback onto the queue
             # so we can communicate back to the parent process
             try:
-                self._results_list[self.walker_idx] = run_exception
+                if self._task_queue is not None:
+                    self._result_queue.put((self.walker_idx, self._worker_idx, None,
+                                            run_exception))
+                else:
+                    self._results_list[self.walker_idx] = run_exception
             except BrokenPipeError as exc:
                 logging.error(
                     "{}: Pipe is broken indicating the root process has already exited:\n{}".format(
                         self.name, exc))
 
+    def _run_pool(self):
+        """Run tasks from the task queue until receiving None, the
+        SIGTERM interrupt, or running the maximum number of tasks."""
+
+        logging.info("Pool task process started as name: {}; PID: {}".format(self.name,
+                                                                             self.pid))
+
+        n_tasks = 0
+        while self._max_tasks is None or n_tasks < self._max_tasks:
+
+            # block until there is either an interrupt or a task
+            _wait_readers([self._task_queue], [self._irq_channel])
+
+            # check to see if there is any signals on the interrupt channel
+            if self._irq_channel.poll():
+
+                message = self._irq_channel.recv()
+
+                logging.debug("{}: Received message from mapper on filehandle {}: {}".format(
+                    self.name, self._irq_channel.fileno(), message))
+
+                if message is signal.SIGTERM:
+
+                    logging.critical(
+                        f"{self.name}: SIGTERM signal received from mapper. Shutting down."
+                    )
+
+                    self._shutdown()
+
+                    return None
+
+                else:
+                    logging.error("{}: Message not recognized, continuing operations and"
+                                  " sending error to mapper".format(self.name))
+                    self._irq_channel.send(
+                        ValueError(
+                            "Message: {} not recognized continuing operations".format(
+                                message)))
+
+            # another process may have taken the task first
+            try:
+                next_task = self._task_queue.get(block=False)
+            except pyq.Empty:
+                continue
+
+            # the poison pill to stop
+            if next_task is None:
+
+                logging.info("{}: received None: FINISHED".format(self.name))
+
+                return None
+
+            self.walker_idx, task = next_task
+
+            logging.info("{}: running task for walker {}".format(self.name,
+                                                                self.walker_idx))
+
+            start = time.time()
+
+            # this can raise a task exception
+            result = self._run_task(task)
+
+            end = time.time()
+
+            self._result_queue.put((self.walker_idx, self._worker_idx, end - start, result))
+
+            n_tasks += 1
+
+        logging.info("{}: Exiting after running {} tasks".format(self.name, n_tasks))
+
     def _run_walker(self):
 
         logging.info("Walker process started as name: {}; PID: {}".format(self.name,
@@ -552,8 +946,11 @@ class WalkerTaskProcess(mp.Process):
         worker_received = False
         while not worker_received:
 
-            # pop off a worker to use it, this will block until it
-            # receives a worker
+            # block until a worker is free or there is an interrupt
+            _wait_readers([self._worker_queue], [self._irq_channel])
+
+            # pop off a worker to use it, another process may have
+            # taken it first
             try:
                 worker_idx = self._worker_queue.get_nowait()
             except pyq.Empty:
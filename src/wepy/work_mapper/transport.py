@@ -0,0 +1,316 @@
+"""Transport of tasks and results between a WorkerMapper and its
+workers through shared memory.
+
+Normally the tasks (walkers and segment arguments) and their results
+are pickled completely and sent through the queues, which means every
+array of every walker state is copied into and out of the pickles and
+through the pipes in both directions each cycle.
+
+Here objects are instead pickled with protocol 5 so that the data of
+contiguous numpy arrays (e.g. positions and velocities) is not copied
+into the pickle but given out-of-band as separate buffers. These
+buffers are written into shared memory blocks which the mapper
+allocates once for each task slot and reuses every cycle, only
+replacing a block when the data no longer fits. Only the small pickle
+of the rest of the object and the locations of the buffers in the
+block go over the queues.
+
+Workers read the arrays of tasks in place, so the walkers they receive
+are views of the shared memory and are only valid while the task is
+running. The mapper copies results out of the shared memory once so
+that the blocks can be reused in the next cycle.
+
+Pickle protocol 5 and shared memory blocks need Python 3.8 or later.
+This module can be imported with older versions but the transport
+can't be used, see `require_pickle_protocol_5`.
+
+Objects which do not keep their data in numpy arrays are still
+transported correctly but do not benefit. OpenMM State objects pickle
+themselves as XML, so OpenMMStates pickle their arrays separately
+instead (see wepy.runners.openmm.OpenMMStateFields).
+
+"""
+
+import pickle
+
+# only in python 3.8 or later, see require_pickle_protocol_5
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+PICKLE_PROTOCOL = 5
+"""The pickle protocol that supports out-of-band buffers."""
+
+BUFFER_ALIGNMENT = 64
+"""The alignment in bytes of the buffers in a block."""
+
+def require_pickle_protocol_5(feature):
+    """Raise an error if pickle protocol 5 is not supported.
+
+    Parameters
+    ----------
+    feature : str
+        Description of what needs it for the error message.
+
+    Raises
+    ------
+    RuntimeError
+        If the python version is older than 3.8.
+
+    """
+
+    if pickle.HIGHEST_PROTOCOL < PICKLE_PROTOCOL:
+        raise RuntimeError("{} requires pickle protocol 5 and shared memory, "
+                           "which need Python 3.8 or later".format(feature))
+
+def _aligned(offset):
+    """Round an offset up to the buffer alignment."""
+
+    return -(-offset // BUFFER_ALIGNMENT) * BUFFER_ALIGNMENT
+
+def dumps_buffers(obj):
+    """Pickle an object with its array data out-of-band.
+
+    Parameters
+    ----------
+    obj : object
+
+    Returns
+    -------
+    data : bytes
+        The pickle of the object without the buffers.
+
+    buffers : list of memoryview
+        The out-of-band buffers in the order they are needed for
+        unpickling.
+
+    """
+
+    buffers = []
+    data = pickle.dumps(obj, protocol=PICKLE_PROTOCOL,
+                        buffer_callback=buffers.append)
+
+    return data, [buffer.raw() for buffer in buffers]
+
+
+class SharedMessage(object):
+    """A pickled object with its buffers in a shared memory block.
+
+    If the buffers didn't fit in the block they are kept in the
+    message instead.
+
+    """
+
+    def __init__(self, data, nbytes, block_name=None, spans=None, buffers=None):
+        """Constructor for SharedMessage, see `pack` for making them.
+
+        Parameters
+        ----------
+        data : bytes
+            The pickle of the object without the buffers.
+
+        nbytes : int
+            The number of bytes needed to store the buffers in a block.
+
+        block_name : str or None
+            The name of the shared memory block with the buffers.
+
+        spans : list of tuple of int or None
+            The start and end of each buffer in the block.
+
+        buffers : list of bytearray or None
+            The buffers if they are not in a block.
+
+        """
+
+        self.data = data
+        self.nbytes = nbytes
+        self.block_name = block_name
+        self.spans = spans
+        self.buffers = buffers
+
+    @property
+    def shared(self):
+        """Whether the buffers are in a shared memory block."""
+        return self.block_name is not None
+
+    @classmethod
+    def pack(cls, obj, block_for=None):
+        """Pickle an object writing its buffers to shared memory.
+
+        Parameters
+        ----------
+        obj : object
+
+        block_for : callable or None
+            Called with the number of bytes needed for the buffers and
+            returns the SharedMemory block to write them in or None to
+            keep them in the message.
+
+        Returns
+        -------
+        message : SharedMessage
+
+        """
+
+        data, buffers = dumps_buffers(obj)
+
+        # the end of the last aligned buffer
+        nbytes = 0
+        for buffer in buffers:
+            nbytes = _aligned(nbytes) + buffer.nbytes
+
+        block = None
+        if block_for is not None and nbytes > 0:
+            block = block_for(nbytes)
+
+        if block is None or block.size < nbytes:
+            return cls(data, nbytes,
+                       buffers=[bytearray(buffer) for buffer in buffers])
+
+        spans = []
+        end = 0
+        for buffer in buffers:
+
+            start = _aligned(end)
+            end = start + buffer.nbytes
+
+            block.buf[start:end] = buffer
+            spans.append((start, end))
+
+        return cls(data, nbytes, block_name=block.name, spans=spans)
+
+    def unpack(self, attach=None, copy=False):
+        """Unpickle the object.
+
+        Parameters
+        ----------
+        attach : callable or None
+            Called with the name of the block to get the SharedMemory
+            block. Required for shared messages.
+
+        copy : bool
+            If True the data is copied out of the block, otherwise the
+            arrays of the object are views of it.
+
+        Returns
+        -------
+        obj : object
+
+        """
+
+        if self.shared:
+
+            block = attach(self.block_name)
+
+            buffers = [block.buf[start:end] for start, end in self.spans]
+
+            if copy:
+                buffers = [bytearray(buffer) for buffer in buffers]
+
+        else:
+            buffers = self.buffers
+
+        return pickle.loads(self.data, buffers=buffers)
+
+
+class SharedTask(object):
+    """A task sent to a worker through shared memory."""
+
+    def __init__(self, message, result_block_name):
+        """Constructor for SharedTask.
+
+        Parameters
+        ----------
+        message : SharedMessage
+            The message for the Task object.
+
+        result_block_name : str
+            The name of the block the worker should write the result to.
+
+        """
+
+        self.message = message
+        self.result_block_name = result_block_name
+
+
+class SharedBlocks(object):
+    """The shared memory blocks owned by a mapper.
+
+    Each block is identified by a key (e.g. for a task slot) and is
+    replaced by a larger one when more space is requested than it
+    has. Blocks are grown to at least twice their size so that slowly
+    growing data doesn't replace them every time.
+
+    """
+
+    def __init__(self):
+
+        self._blocks = {}
+
+        # the blocks by their names
+        self._names = {}
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def attach(self, name):
+        """Get a block by its name.
+
+        Parameters
+        ----------
+        name : str
+
+        Returns
+        -------
+        block : SharedMemory
+
+        """
+
+        return self._names[name]
+
+    def reserve(self, key, nbytes):
+        """Get the block for a key with at least a number of bytes.
+
+        Parameters
+        ----------
+        key : hashable
+
+        nbytes : int
+
+        Returns
+        -------
+        block : SharedMemory
+
+        """
+
+        block = self._blocks.get(key)
+
+        if block is not None and block.size >= nbytes:
+            return block
+
+        size = max(nbytes, 1)
+        if block is not None:
+
+            size = max(size, 2 * block.size)
+
+            del self._names[block.name]
+            block.close()
+            block.unlink()
+
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self._blocks[key] = block
+        self._names[block.name] = block
+
+        return block
+
+    def close(self):
+        """Close and free all of the blocks."""
+
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+
+        self._blocks = {}
+        self._names = {}
@@ -1,33 +1,12 @@
-import numpy as np
-from scipy.spatial.distance import euclidean
-
 from wepy.runners.openmm import GET_STATE_KWARG_DEFAULTS
-from wepy.resampling.distances.distance import Distance
 from wepy.boundary_conditions.receptor import UnbindingBC
 
 from openmm_systems.test_systems import LennardJonesPair
 
+from wepy_tools.systems.lennard_jones import PairDistance
 from wepy_tools.sim_makers.openmm import OpenMMToolsTestSysSimMaker
 
 
-## Distance Metric
-# we define a simple distance metric for this system, assuming the
-# positions are in a 'positions' field
-class PairDistance(Distance):
-
-    def __init__(self, metric=euclidean):
-        self.metric = metric
-
-    def image(self, state):
-        return state['positions']
-
-    def image_distance(self, image_a, image_b):
-        dist_a = self.metric(image_a[0], image_a[1])
-        dist_b = self.metric(image_b[0], image_b[1])
-
-        return np.abs(dist_a - dist_b)
-
-
 # class PairUnbinding(BoundaryCondition):
 
 #     pass
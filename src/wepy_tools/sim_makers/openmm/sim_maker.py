@@ -39,7 +39,7 @@ from simtk.openmm import LangevinIntegrator
 # mappers
 from wepy.work_mapper.mapper import Mapper
 from wepy.work_mapper.worker import WorkerMapper, Worker
-from wepy.work_mapper.task_mapper import TaskMapper, WalkerTaskProcess
+from wepy.work_mapper.task_mapper import TaskMapper, PoolTaskMapper, WalkerTaskProcess
 
 from wepy.runners.openmm import (
     OpenMMCPUWorker, OpenMMGPUWorker,
@@ -146,12 +146,13 @@ class OpenMMSimMaker():
     GET_STATE_KWARGS = {}
 
     ## Work Mappers
-    MAPPERS = [Mapper, WorkerMapper, TaskMapper]
+    MAPPERS = [Mapper, WorkerMapper, TaskMapper, PoolTaskMapper]
 
     DEFAULT_MAPPER_PARAMS = {
         'Mapper' : {},
         'WorkerMapper' : {},
         'TaskMapper' : {},
+        'PoolTaskMapper' : {},
     }
 
 
@@ -339,7 +340,7 @@ class OpenMMSimMaker():
 
             work_mapper_params['worker_type'] = worker_type
 
-        elif mapper_name == 'TaskMapper':
+        elif mapper_name in ('TaskMapper', 'PoolTaskMapper'):
             if platform == 'Reference':
                 worker_type = Worker
             elif platform == 'CPU':
@@ -37,7 +37,7 @@ import h5py
 import mdtraj as mdj
 
 from wepy.resampling.resamplers.resampler import NoResampler
-from wepy.work_mapper.mapper import Mapper
+from wepy.work_mapper.mapper import BatchMapper
 from wepy.reporter.hdf5 import WepyHDF5Reporter
 from wepy.sim_manager import Manager
 from wepy.walker import Walker, WalkerState
@@ -230,7 +230,7 @@ class RandomwalkProfiler(object):
         sim_manager = Manager(init_walkers,
                               runner=runner,
                               resampler=self.resampler,
-                              work_mapper=Mapper(),
+                              work_mapper=BatchMapper(),
                               reporters=[hdf5_reporter])
 
 
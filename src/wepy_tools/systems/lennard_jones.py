@@ -16,3 +16,27 @@ class PairDistance(Distance):
         dist_b = self.metric(image_b[0], image_b[1])
 
         return np.abs(dist_a - dist_b)
+
+    def images(self, states):
+        return np.array([state['positions'] for state in states])
+
+    def _pair_distances(self, images):
+        """The distance between the two particles of each image."""
+
+        # the euclidean metric can be done for all images at once,
+        # anything else is left to the metric function
+        if self.metric is euclidean:
+            return np.linalg.norm(images[:, 0] - images[:, 1], axis=-1)
+        else:
+            return np.array([self.metric(image[0], image[1]) for image in images])
+
+    def image_distance_matrix(self, images, other_images=None):
+
+        pair_dists = self._pair_distances(np.asarray(images))
+
+        if other_images is None:
+            other_pair_dists = pair_dists
+        else:
+            other_pair_dists = self._pair_distances(np.asarray(other_images))
+
+        return np.abs(pair_dists[:, np.newaxis] - other_pair_dists[np.newaxis, :])
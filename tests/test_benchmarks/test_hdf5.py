@@ -0,0 +1,159 @@
+import os
+import os.path as osp
+
+import numpy as np
+import pytest
+
+from wepy.hdf5 import WepyHDF5
+
+from wepy_tools.sim_makers.openmm.lennard_jones import LennardJonesPairOpenMMSimMaker
+from wepy_tools.sim_makers.openmm.lysozyme import LysozymeImplicitOpenMMSimMaker
+
+N_WALKERS_TEST = [48]
+N_CYCLES_TEST = [100]
+SYSTEMS_TEST = ['LennardJonesPair', 'LysozymeImplicit']
+LAYOUTS_TEST = ['trajectories', 'cycles']
+
+# the storage policies for the positions and velocities, compressed
+# fields use the default chunks which fit in the chunk cache
+STORAGE_POLICIES = {
+    'default' : {},
+    'chunked' : {'chunk_frames' : 16},
+    'lzf' : {'compression' : 'lzf',
+             'shuffle' : True},
+    'gzip' : {'compression' : 'gzip',
+              'compression_opts' : 4,
+              'shuffle' : True},
+    'gzip_fixed_point' : {'compression' : 'gzip',
+                          'compression_opts' : 4,
+                          'shuffle' : True,
+                          'quantization' : 3},
+    'lzf_float16' : {'compression' : 'lzf',
+                     'shuffle' : True,
+                     'quantization' : 'float16'},
+}
+
+def get_sim_maker(spec):
+
+    if spec == 'LennardJonesPair':
+        sim_maker = LennardJonesPairOpenMMSimMaker()
+    elif spec == 'LysozymeImplicit':
+        sim_maker = LysozymeImplicitOpenMMSimMaker()
+    else:
+        raise ValueError("Unknown system spec: {}".format(spec))
+
+    return sim_maker
+
+def gen_cycles_data(sim_maker, n_walkers, n_cycles, seed=0):
+    """Make a random walk of the initial state of the system for each
+    walker."""
+
+    rng = np.random.default_rng(seed)
+
+    init_state = sim_maker.init_state
+
+    positions = np.repeat(init_state['positions'][np.newaxis], n_walkers, axis=0)
+    velocities = np.repeat(init_state['velocities'][np.newaxis], n_walkers, axis=0)
+    box_vectors = np.repeat(init_state['box_vectors'][np.newaxis], n_walkers, axis=0)
+
+    cycles_data = []
+    for cycle_idx in range(n_cycles):
+
+        positions = positions + rng.normal(scale=0.01, size=positions.shape)
+        velocities = rng.normal(size=velocities.shape)
+
+        cycles_data.append({'positions' : positions,
+                            'velocities' : velocities,
+                            'box_vectors' : box_vectors})
+
+    return cycles_data
+
+def write_wepy_h5(path, sim_maker, cycles_data, policy, layout):
+
+    field_storage = {'positions' : policy,
+                     'velocities' : policy}
+
+    wepy_h5 = WepyHDF5(path, mode='w',
+                       topology=sim_maker.json_top(),
+                       growth_policy='double',
+                       field_storage=field_storage)
+
+    # don't truncate the file when opening it again
+    wepy_h5.set_mode('r+')
+
+    n_walkers = cycles_data[0]['positions'].shape[0]
+    weights = np.full((n_walkers, 1), 1 / n_walkers)
+
+    with wepy_h5:
+
+        wepy_h5.new_run([], layout=layout)
+
+        for cycle_data in cycles_data:
+            wepy_h5.extend_cycle(0, cycle_data, weights=weights)
+
+class TestHDF5StorageBenchmark():
+
+    @pytest.mark.parametrize('n_walkers', N_WALKERS_TEST)
+    @pytest.mark.parametrize('n_cycles', N_CYCLES_TEST)
+    @pytest.mark.parametrize('system', SYSTEMS_TEST)
+    @pytest.mark.parametrize('layout', LAYOUTS_TEST)
+    @pytest.mark.parametrize('policy', list(STORAGE_POLICIES.keys()))
+    def test_write(self, n_walkers, n_cycles, system, layout, policy, tmp_path,
+                   benchmark):
+
+        sim_maker = get_sim_maker(system)
+        cycles_data = gen_cycles_data(sim_maker, n_walkers, n_cycles)
+
+        path = str(tmp_path / 'write.wepy.h5')
+
+        def setup():
+            if osp.exists(path):
+                os.remove(path)
+
+        def thunk():
+            write_wepy_h5(path, sim_maker, cycles_data, STORAGE_POLICIES[policy], layout)
+
+        benchmark.pedantic(thunk, setup=setup, rounds=3)
+
+        data_nbytes = sum(cycle_data['positions'].nbytes + cycle_data['velocities'].nbytes
+                          for cycle_data in cycles_data)
+
+        benchmark.extra_info['file_size'] = osp.getsize(path)
+        benchmark.extra_info['data_size'] = data_nbytes
+        benchmark.extra_info['write_throughput'] = data_nbytes / benchmark.stats.stats.mean
+
+    @pytest.mark.parametrize('n_walkers', N_WALKERS_TEST)
+    @pytest.mark.parametrize('n_cycles', N_CYCLES_TEST)
+    @pytest.mark.parametrize('system', SYSTEMS_TEST)
+    @pytest.mark.parametrize('layout', LAYOUTS_TEST)
+    @pytest.mark.parametrize('policy', list(STORAGE_POLICIES.keys()))
+    def test_read(self, n_walkers, n_cycles, system, layout, policy, tmp_path,
+                  benchmark):
+
+        sim_maker = get_sim_maker(system)
+        cycles_data = gen_cycles_data(sim_maker, n_walkers, n_cycles)
+
+        path = str(tmp_path / 'read.wepy.h5')
+        write_wepy_h5(path, sim_maker, cycles_data, STORAGE_POLICIES[policy], layout)
+
+        wepy_h5 = WepyHDF5(path, mode='r')
+
+        def thunk():
+            with wepy_h5:
+                return [fields for fields in
+                        wepy_h5.iter_trajs_fields(['positions', 'velocities'])]
+
+        trajs_fields = benchmark(thunk)
+
+        data_nbytes = sum(fields['positions'].nbytes + fields['velocities'].nbytes
+                          for fields in trajs_fields)
+
+        # the error of the stored positions
+        max_error = max(np.abs(fields['positions'][cycle_idx] -
+                               cycles_data[cycle_idx]['positions'][traj_idx]).max()
+                        for traj_idx, fields in enumerate(trajs_fields)
+                        for cycle_idx in range(n_cycles))
+
+        benchmark.extra_info['file_size'] = osp.getsize(path)
+        benchmark.extra_info['read_throughput'] = data_nbytes / benchmark.stats.stats.mean
+        benchmark.extra_info['max_positions_error'] = float(max_error)
@@ -75,6 +75,41 @@ class TestBenchmark():
         result = benchmark(thunk)
 
 
+def task_copy_state(walker):
+
+    # only the transport of the states is measured
+    return OpenMMWalker(walker.state, walker.weight)
+
+class TestSharedMemoryBenchmark():
+
+    @pytest.mark.parametrize('n_walkers', [48])
+    @pytest.mark.parametrize('n_workers', [4])
+    @pytest.mark.parametrize('system', ['LennardJonesPair', 'LysozymeImplicit'])
+    @pytest.mark.parametrize('shared_memory', [False, True])
+    def test_transport(self, n_walkers, n_workers, system, shared_memory,
+                       benchmark):
+
+        sim_maker = get_sim_maker(system)
+
+        walkers = [OpenMMWalker(sim_maker.init_state, 1 / n_walkers)
+                   for _ in range(n_walkers)]
+
+        mapper = WorkerMapper(segment_func=task_copy_state,
+                              num_workers=n_workers,
+                              worker_type=Worker,
+                              shared_memory=shared_memory)
+
+        mapper.init()
+
+        def thunk():
+
+            return mapper.map(walkers)
+
+        benchmark(thunk)
+
+        mapper.cleanup()
+
+
 # TODO make this basically the same as the others so we can have
 # uniformity and just do all of the benchmarks in one
 # - [ ] SimpleRunner
@@ -0,0 +1,573 @@
+import os
+import multiprocessing as mp
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+import numpy as np
+import pandas as pd
+import mdtraj as mdj
+
+from wepy.hdf5 import WepyHDF5
+from wepy.util.mdtraj import mdtraj_to_json_topology
+
+N_DIMS = 3
+
+def gen_topology(n_atoms=2):
+
+    atoms = pd.DataFrame([dict(serial=i, name="H", element="H",
+                               resSeq=i + 1, resName="UNK", chainID=0)
+                          for i in range(n_atoms)])
+
+    top = mdj.Topology.from_dataframe(atoms, bonds=np.zeros((0, 2), dtype='int'))
+
+    return mdtraj_to_json_topology(top)
+
+def gen_wepy_h5(path, **kwargs):
+
+    wepy_h5 = WepyHDF5(str(path), mode='w',
+                       topology=gen_topology(),
+                       n_dims=N_DIMS,
+                       **kwargs)
+
+    # don't truncate the file when opening it again
+    wepy_h5.set_mode('r+')
+
+    return wepy_h5
+
+def gen_cycle_data(rng, n_walkers):
+
+    return {
+        'positions' : rng.random((n_walkers, 2, N_DIMS)),
+        'box_vectors' : rng.random((n_walkers, N_DIMS, N_DIMS)),
+    }
+
+def test_extend_cycle(tmp_path):
+    """Test that extending by cycles gives the same trajectories as
+    extending each trajectory."""
+
+    rng = np.random.default_rng(0)
+
+    n_walkers = 4
+    cycles_data = [gen_cycle_data(rng, n_walkers) for _ in range(3)]
+    cycles_weights = [rng.random((n_walkers, 1)) for _ in range(3)]
+
+    # one more walker in the last cycle gets a new trajectory
+    cycles_data.append(gen_cycle_data(rng, n_walkers + 1))
+    cycles_weights.append(rng.random((n_walkers + 1, 1)))
+
+    cycle_h5 = gen_wepy_h5(tmp_path / 'cycle.wepy.h5', sparse_fields=['box_vectors'])
+    traj_h5 = gen_wepy_h5(tmp_path / 'traj.wepy.h5', sparse_fields=['box_vectors'])
+
+    with cycle_h5, traj_h5:
+
+        cycle_h5.new_run([])
+        traj_h5.new_run([])
+
+        for cycle_idx, (cycle_data, weights) in enumerate(zip(cycles_data, cycles_weights)):
+
+            # the sparse field is only saved every other cycle
+            if cycle_idx % 2 != 0:
+                cycle_data = {'positions' : cycle_data['positions']}
+
+            cycle_h5.extend_cycle(0, cycle_data, weights=weights,
+                                  metadata={'cycle_idx' : cycle_idx})
+
+            for walker_idx in range(weights.shape[0]):
+
+                walker_data = {key : value[walker_idx:walker_idx+1]
+                               for key, value in cycle_data.items()}
+
+                if walker_idx in traj_h5.run_traj_idxs(0):
+                    traj_h5.extend_traj(0, walker_idx, walker_data,
+                                        weights=weights[walker_idx:walker_idx+1])
+                else:
+                    traj_h5.add_traj(0, walker_data,
+                                     weights=weights[walker_idx:walker_idx+1],
+                                     metadata={'cycle_idx' : cycle_idx})
+
+        assert cycle_h5.run_traj_idxs(0) == traj_h5.run_traj_idxs(0)
+        assert cycle_h5.traj(0, n_walkers).attrs['cycle_idx'] == 3
+
+        for traj_idx in cycle_h5.run_traj_idxs(0):
+
+            assert cycle_h5.num_traj_frames(0, traj_idx) == \
+                traj_h5.num_traj_frames(0, traj_idx)
+
+            for field in ('weights', 'positions', 'box_vectors'):
+
+                cycle_field = cycle_h5.get_traj_field(0, traj_idx, field)
+                traj_field = traj_h5.get_traj_field(0, traj_idx, field)
+
+                assert np.array_equal(np.ma.filled(cycle_field, 0.),
+                                      np.ma.filled(traj_field, 0.))
+                assert np.array_equal(np.ma.getmaskarray(cycle_field),
+                                      np.ma.getmaskarray(traj_field))
+
+@pytest.mark.parametrize('growth_policy', ['double', 3])
+def test_growth_policy(tmp_path, growth_policy):
+    """Test that over-allocated files give the same data as exactly
+    allocated ones and are the same after compacting."""
+
+    rng = np.random.default_rng(0)
+
+    n_walkers = 2
+    n_cycles = 7
+
+    warping_fields = [('walker_idx', (1,), int),
+                      ('target_idxs', Ellipsis, int)]
+
+    exact_h5 = gen_wepy_h5(tmp_path / 'exact.wepy.h5', sparse_fields=['box_vectors'])
+    grown_h5 = gen_wepy_h5(tmp_path / 'grown.wepy.h5', sparse_fields=['box_vectors'],
+                           growth_policy=growth_policy)
+
+    with exact_h5, grown_h5:
+
+        for wepy_h5 in (exact_h5, grown_h5):
+
+            wepy_h5.new_run([])
+            wepy_h5.init_run_fields_warping(0, warping_fields)
+            wepy_h5.init_record_fields('warping', ['walker_idx', 'target_idxs'])
+
+        for cycle_idx in range(n_cycles):
+
+            cycle_data = gen_cycle_data(rng, n_walkers)
+            weights = rng.random((n_walkers, 1))
+
+            # the sparse field is only saved every other cycle
+            if cycle_idx % 2 != 0:
+                cycle_data = {'positions' : cycle_data['positions']}
+
+            warping_data = [{'walker_idx' : np.array([walker_idx]),
+                             'target_idxs' : np.arange(cycle_idx)}
+                            for walker_idx in range(cycle_idx % 3)]
+
+            for wepy_h5 in (exact_h5, grown_h5):
+                wepy_h5.extend_cycle(0, cycle_data, weights=weights)
+                wepy_h5.extend_cycle_warping_records(0, cycle_idx, warping_data)
+
+        assert grown_h5.traj(0, 0)['positions'].shape[0] > n_cycles
+        assert grown_h5.num_traj_frames(0, 0) == n_cycles
+
+        for traj_idx in range(n_walkers):
+            for field in ('weights', 'positions', 'box_vectors'):
+
+                exact_field = exact_h5.get_traj_field(0, traj_idx, field)
+                grown_field = grown_h5.get_traj_field(0, traj_idx, field)
+
+                assert np.array_equal(np.ma.filled(exact_field, 0.),
+                                      np.ma.filled(grown_field, 0.))
+                assert np.array_equal(np.ma.getmaskarray(exact_field),
+                                      np.ma.getmaskarray(grown_field))
+
+        for exact_fields, grown_fields in zip(exact_h5.iter_trajs_fields(['positions']),
+                                              grown_h5.iter_trajs_fields(['positions'])):
+            assert np.array_equal(exact_fields['positions'], grown_fields['positions'])
+
+        assert exact_h5.warping_records([0]) == grown_h5.warping_records([0])
+
+        grown_h5.compact()
+
+        assert 'n_frames' not in grown_h5.traj(0, 0).attrs
+
+        for traj_idx in range(n_walkers):
+            for field in ('weights', 'positions', 'box_vectors/data',
+                          'box_vectors/_sparse_idxs'):
+
+                assert np.array_equal(exact_h5.traj(0, traj_idx)[field][:],
+                                      grown_h5.traj(0, traj_idx)[field][:])
+
+# the objects which failed to be made must also be deleted cleanly
+@pytest.mark.filterwarnings('error::pytest.PytestUnraisableExceptionWarning')
+@pytest.mark.parametrize('growth_policy', [0, 'triple'])
+def test_invalid_growth_policy(tmp_path, growth_policy):
+
+    with pytest.raises(ValueError):
+        gen_wepy_h5(tmp_path / 'bad.wepy.h5', growth_policy=growth_policy)
+
+@pytest.mark.parametrize('growth_policy', [None, 'double'])
+def test_get_trace_fields(tmp_path, growth_policy):
+    """Test that reading the fields of a trace in bulk gives the same
+    data as reading each frame."""
+
+    rng = np.random.default_rng(0)
+
+    n_walkers = 3
+    n_cycles = 200
+
+    wepy_h5 = gen_wepy_h5(tmp_path / 'trace.wepy.h5', sparse_fields=['box_vectors'],
+                          growth_policy=growth_policy)
+
+    with wepy_h5:
+
+        for run_idx in range(2):
+
+            wepy_h5.new_run([])
+
+            for cycle_idx in range(n_cycles):
+
+                cycle_data = gen_cycle_data(rng, n_walkers)
+
+                # the sparse field is only saved every third cycle
+                if cycle_idx % 3 != 0:
+                    cycle_data = {'positions' : cycle_data['positions']}
+
+                wepy_h5.extend_cycle(run_idx, cycle_data,
+                                     weights=rng.random((n_walkers, 1)))
+
+        # unordered frames with repeats and large gaps
+        trace = [(int(rng.integers(2)), int(rng.integers(n_walkers)),
+                  int(rng.choice([rng.integers(10), rng.integers(n_cycles)])))
+                 for _ in range(500)]
+        trace.extend(trace[:10])
+
+        fields = ['positions', 'weights', 'box_vectors']
+
+        trace_fields = wepy_h5.get_trace_fields(trace, fields)
+        run_trace_fields = wepy_h5.get_run_trace_fields(
+            1, [frame_tup[1:] for frame_tup in trace if frame_tup[0] == 1], fields)
+
+        run_trace_idxs = [idx for idx, frame_tup in enumerate(trace) if frame_tup[0] == 1]
+
+        for field in fields:
+
+            frames_field = [wepy_h5.get_traj_field(*frame_tup[:2], field,
+                                                   frames=[frame_tup[2]])
+                            for frame_tup in trace]
+
+            expected_data = np.concatenate([np.ma.filled(frame_field, 0.)
+                                            for frame_field in frames_field])
+            expected_mask = np.concatenate([np.ma.getmaskarray(frame_field)
+                                            for frame_field in frames_field])
+
+            assert np.array_equal(np.ma.filled(trace_fields[field], 0.), expected_data)
+            assert np.array_equal(np.ma.getmaskarray(trace_fields[field]), expected_mask)
+
+            assert np.array_equal(np.ma.filled(run_trace_fields[field], 0.),
+                                  expected_data[run_trace_idxs])
+
+        # unordered results are sorted by frame
+        sorted_fields = wepy_h5.get_trace_fields(trace, ['weights'], same_order=False)
+        sort_idxs = sorted(range(len(trace)), key=trace.__getitem__)
+
+        assert np.array_equal(sorted_fields['weights'],
+                              trace_fields['weights'][sort_idxs])
+
+        with pytest.raises(IndexError):
+            wepy_h5.get_trace_fields([(0, 0, n_cycles)], ['positions'])
+
+def assert_same_trajs(wepy_h5, other_h5, fields):
+
+    for run_idx, traj_idx in wepy_h5.run_traj_idx_tuples():
+
+        assert wepy_h5.num_traj_frames(run_idx, traj_idx) == \
+            other_h5.num_traj_frames(run_idx, traj_idx)
+
+        for field in fields:
+
+            traj_field = wepy_h5.get_traj_field(run_idx, traj_idx, field)
+            other_field = other_h5.get_traj_field(run_idx, traj_idx, field)
+
+            assert np.array_equal(np.ma.filled(traj_field, 0.),
+                                  np.ma.filled(other_field, 0.))
+            assert np.array_equal(np.ma.getmaskarray(traj_field),
+                                  np.ma.getmaskarray(other_field))
+
+@pytest.mark.parametrize('growth_policy', [None, 'double'])
+def test_cycle_layout(tmp_path, growth_policy):
+    """Test that cycle-major runs give the same data as runs with the
+    trajectories layout, and converting between them."""
+
+    rng = np.random.default_rng(0)
+
+    n_walkers = 4
+    n_cycles = 9
+
+    traj_h5 = gen_wepy_h5(tmp_path / 'traj.wepy.h5', sparse_fields=['box_vectors'],
+                          growth_policy=growth_policy)
+    cycle_h5 = gen_wepy_h5(tmp_path / 'cycle.wepy.h5', sparse_fields=['box_vectors'],
+                           growth_policy=growth_policy)
+
+    fields = ['positions', 'weights', 'box_vectors']
+
+    with traj_h5, cycle_h5:
+
+        traj_h5.new_run([])
+        cycle_h5.new_run([], layout='cycles')
+
+        assert cycle_h5.run_layout(0) == 'cycles'
+
+        for cycle_idx in range(n_cycles):
+
+            # a walker is added part way through
+            cycle_n_walkers = n_walkers if cycle_idx < 6 else n_walkers + 1
+
+            cycle_data = gen_cycle_data(rng, cycle_n_walkers)
+            weights = rng.random((cycle_n_walkers, 1))
+
+            # the sparse field is only saved every third cycle
+            if cycle_idx % 3 != 0:
+                cycle_data = {'positions' : cycle_data['positions']}
+
+            for wepy_h5 in (traj_h5, cycle_h5):
+                wepy_h5.extend_cycle(0, cycle_data, weights=weights,
+                                     metadata={'cycle_idx' : cycle_idx})
+
+        assert cycle_h5.run_cycles(0)['positions'].shape[1:] == (n_walkers + 1, 2, 3)
+        assert cycle_h5.num_run_cycles(0) == n_cycles
+        assert cycle_h5.traj(0, n_walkers).attrs['cycle_idx'] == 6
+        assert cycle_h5.num_walkers(0, 5) == n_walkers
+        assert cycle_h5.num_walkers(0, 6) == n_walkers + 1
+
+        assert_same_trajs(traj_h5, cycle_h5, fields)
+
+        trace = [(0, int(rng.integers(n_walkers)), int(rng.integers(n_cycles)))
+                 for _ in range(50)]
+        trace.append((0, n_walkers, 0))
+
+        traj_trace_fields = traj_h5.get_trace_fields(trace, fields)
+        cycle_trace_fields = cycle_h5.get_trace_fields(trace, fields)
+
+        for field in fields:
+            assert np.array_equal(np.ma.filled(traj_trace_fields[field], 0.),
+                                  np.ma.filled(cycle_trace_fields[field], 0.))
+
+        for traj_fields, cycle_fields in zip(traj_h5.iter_trajs_fields(['positions']),
+                                             cycle_h5.iter_trajs_fields(['positions'])):
+            assert np.array_equal(traj_fields['positions'], cycle_fields['positions'])
+
+        cycle_fields = cycle_h5.get_run_cycle_fields(0, ['positions', 'box_vectors'])
+
+        assert cycle_fields['positions'].shape == (n_cycles, n_walkers + 1, 2, 3)
+        assert np.array_equal(cycle_fields['positions'][:, 0],
+                              cycle_h5.get_traj_field(0, 0, 'positions'))
+        assert np.all(np.ma.getmaskarray(cycle_fields['positions'])[:6, n_walkers])
+        assert np.array_equal(np.ma.filled(cycle_fields['box_vectors'][6:, n_walkers], 0.),
+                              np.ma.filled(cycle_h5.get_traj_field(0, n_walkers, 'box_vectors'), 0.))
+
+        with pytest.raises(ValueError):
+            cycle_h5.extend_traj(0, 0, {'positions' : cycle_data['positions'][0:1]})
+
+        # the walkers of cycle-major runs can't be removed
+        with pytest.raises(ValueError):
+            cycle_h5.extend_cycle(0, gen_cycle_data(rng, n_walkers))
+
+        traj_h5.convert_run_layout(0, 'cycles')
+        cycle_h5.convert_run_layout(0, 'trajectories')
+
+        assert traj_h5.run_layout(0) == 'cycles'
+        assert 'positions' not in traj_h5.traj(0, 0)
+        assert cycle_h5.run_layout(0) == 'trajectories'
+        assert 'cycles' not in cycle_h5.run(0)
+
+        assert_same_trajs(traj_h5, cycle_h5, fields)
+
+        cycle_h5.convert_run_layout(0, 'cycles')
+
+        assert_same_trajs(traj_h5, cycle_h5, fields)
+
+@pytest.mark.parametrize('layout', ['trajectories', 'cycles'])
+def test_memmap(tmp_path, layout):
+    """Test that compacted files give memmaps of their fields when
+    opened read-only."""
+
+    rng = np.random.default_rng(0)
+
+    n_walkers = 3
+    n_cycles = 10
+
+    path = tmp_path / 'memmap.wepy.h5'
+    wepy_h5 = gen_wepy_h5(path, sparse_fields=['box_vectors'], growth_policy='double')
+
+    with wepy_h5:
+
+        wepy_h5.new_run([], layout=layout)
+
+        for cycle_idx in range(n_cycles):
+            wepy_h5.extend_cycle(0, gen_cycle_data(rng, n_walkers),
+                                 weights=rng.random((n_walkers, 1)))
+
+        expected = {field : [wepy_h5.get_traj_field(0, traj_idx, field)
+                             for traj_idx in range(n_walkers)]
+                    for field in ['positions', 'weights', 'box_vectors']}
+
+        # chunked datasets are never mapped
+        wepy_h5.memmap = True
+        assert not isinstance(wepy_h5.get_traj_field(0, 0, 'positions'), np.memmap)
+
+        wepy_h5.compact(contiguous=True)
+
+    with WepyHDF5(str(path), mode='r', memmap=True) as wepy_h5:
+
+        for traj_idx in range(n_walkers):
+
+            positions = wepy_h5.get_traj_field(0, traj_idx, 'positions')
+
+            assert isinstance(positions, np.memmap)
+            assert not positions.flags.writeable
+            assert np.array_equal(positions, expected['positions'][traj_idx])
+
+            assert np.array_equal(wepy_h5.get_traj_field(0, traj_idx, 'weights', frames=[1, 4]),
+                                  expected['weights'][traj_idx][[1, 4]])
+
+            # sparse fields are read as before
+            assert np.array_equal(wepy_h5.get_traj_field(0, traj_idx, 'box_vectors'),
+                                  expected['box_vectors'][traj_idx])
+
+        for traj_idx, fields in enumerate(wepy_h5.iter_trajs_fields(['positions'])):
+            assert isinstance(fields['positions'], np.memmap)
+            assert np.array_equal(fields['positions'], expected['positions'][traj_idx])
+
+    # contiguous datasets can still be read without mapping them
+    with WepyHDF5(str(path), mode='r') as wepy_h5:
+
+        positions = wepy_h5.get_traj_field(0, 0, 'positions')
+
+        assert not isinstance(positions, np.memmap)
+        assert np.array_equal(positions, expected['positions'][0])
+
+@pytest.mark.filterwarnings('error::pytest.PytestUnraisableExceptionWarning')
+@pytest.mark.parametrize('layout', ['trajectories', 'cycles'])
+def test_field_storage(tmp_path, layout):
+    """Test that fields are stored according to their storage
+    policies."""
+
+    rng = np.random.default_rng(0)
+
+    n_walkers = 3
+    n_cycles = 10
+
+    field_storage = {
+        'positions' : {'chunk_frames' : 4,
+                       'compression' : 'gzip',
+                       'shuffle' : True,
+                       'quantization' : 3},
+        'box_vectors' : {'compression' : 'lzf',
+                         'quantization' : 'float16'},
+    }
+
+    wepy_h5 = gen_wepy_h5(tmp_path / 'storage.wepy.h5', sparse_fields=['box_vectors'],
+                          growth_policy='double', field_storage=field_storage)
+
+    with wepy_h5:
+
+        wepy_h5.new_run([], layout=layout)
+
+        cycles_data = []
+        for cycle_idx in range(n_cycles):
+
+            cycle_data = gen_cycle_data(rng, n_walkers)
+            cycles_data.append(cycle_data)
+
+            wepy_h5.extend_cycle(0, cycle_data, weights=rng.random((n_walkers, 1)))
+
+        if layout == 'cycles':
+            positions_dset = wepy_h5.run_cycles(0)['positions']
+            box_vectors_dset = wepy_h5.run_cycles(0)['box_vectors/data']
+        else:
+            positions_dset = wepy_h5.traj(0, 0)['positions']
+            box_vectors_dset = wepy_h5.traj(0, 0)['box_vectors/data']
+
+        assert positions_dset.chunks[0] == 4
+        assert positions_dset.compression == 'gzip'
+        assert positions_dset.shuffle
+        assert positions_dset.scaleoffset == 3
+
+        assert box_vectors_dset.compression == 'lzf'
+        assert box_vectors_dset.dtype == np.float16
+
+        for traj_idx in range(n_walkers):
+
+            positions = wepy_h5.get_traj_field(0, traj_idx, 'positions')
+            box_vectors = wepy_h5.get_traj_field(0, traj_idx, 'box_vectors', masked=False)
+
+            assert np.allclose(positions,
+                               [cycle_data['positions'][traj_idx] for cycle_data in cycles_data],
+                               rtol=0, atol=1e-3)
+
+            assert box_vectors.dtype == np.float16
+            assert np.allclose(box_vectors,
+                               [cycle_data['box_vectors'][traj_idx] for cycle_data in cycles_data],
+                               rtol=1e-3, atol=0)
+
+    with pytest.raises(ValueError):
+        gen_wepy_h5(tmp_path / 'bad.wepy.h5', field_storage={'positions' : {'level' : 9}})
+
+    with pytest.raises(ValueError):
+        gen_wepy_h5(tmp_path / 'bad.wepy.h5',
+                    field_storage={'positions' : {'quantization' : 'int8'}})
+
+def positions_norm(fields, scale):
+
+    return scale * np.linalg.norm(fields['positions'], axis=(1, 2))
+
+@pytest.mark.parametrize('layout', ['trajectories', 'cycles'])
+def test_compute_observable_parallel(tmp_path, layout):
+    """Test that computing an observable in worker processes gives the
+    same values as computing it serially."""
+
+    rng = np.random.default_rng(0)
+
+    n_walkers = 3
+    n_cycles = 25
+
+    wepy_h5 = gen_wepy_h5(tmp_path / 'observable.wepy.h5', growth_policy='double')
+
+    with wepy_h5:
+
+        for run_idx in range(2):
+
+            wepy_h5.new_run([], layout=layout)
+
+            for cycle_idx in range(n_cycles):
+                wepy_h5.extend_cycle(run_idx, gen_cycle_data(rng, n_walkers),
+                                     weights=rng.random((n_walkers, 1)))
+
+        wepy_h5.compute_observable(positions_norm, ['positions'], (2.,),
+                                   save_to_hdf5='norm', return_results=False)
+
+        wepy_h5.compute_observable_parallel(positions_norm, ['positions'], (2.,),
+                                            'parallel_norm',
+                                            n_workers=2, chunk_frames=7)
+
+        for run_idx, traj_idx in wepy_h5.run_traj_idx_tuples():
+
+            assert np.allclose(
+                wepy_h5.get_traj_field(run_idx, traj_idx, 'observables/parallel_norm'),
+                wepy_h5.get_traj_field(run_idx, traj_idx, 'observables/norm'))
+
+        # the file can be written to normally afterwards
+        wepy_h5.extend_cycle(0, gen_cycle_data(rng, n_walkers),
+                             weights=rng.random((n_walkers, 1)))
+
+def kill_worker(fields):
+
+    # the first chunk is computed in the main process
+    if mp.parent_process() is not None:
+        os._exit(1)
+
+    return np.zeros(fields['positions'].shape[0])
+
+def test_compute_observable_parallel_dead_worker(tmp_path):
+    """Test that a worker dying raises instead of waiting forever and
+    leaves the file writable."""
+
+    rng = np.random.default_rng(0)
+
+    n_walkers = 3
+
+    wepy_h5 = gen_wepy_h5(tmp_path / 'dead_worker.wepy.h5', growth_policy='double')
+
+    with wepy_h5:
+
+        wepy_h5.new_run([])
+
+        for cycle_idx in range(10):
+            wepy_h5.extend_cycle(0, gen_cycle_data(rng, n_walkers),
+                                 weights=rng.random((n_walkers, 1)))
+
+        with pytest.raises(BrokenProcessPool):
+            wepy_h5.compute_observable_parallel(kill_worker, ['positions'], (),
+                                                'dead', n_workers=2, chunk_frames=3)
+
+        wepy_h5.extend_cycle(0, gen_cycle_data(rng, n_walkers),
+                             weights=rng.random((n_walkers, 1)))
@@ -0,0 +1,106 @@
+import threading
+
+import numpy as np
+import pytest
+
+from wepy.walker import Walker, WalkerState
+from wepy.runners.randomwalk import RandomWalkRunner
+from wepy.resampling.resamplers.resampler import NoResampler
+from wepy.reporter.reporter import Reporter, ReporterError
+from wepy.sim_manager import Manager
+
+class RecordingReporter(Reporter):
+    """Keeps the cycle index and walker positions of each report."""
+
+    def __init__(self, fail_cycle=None):
+
+        self.fail_cycle = fail_cycle
+        self.reports = []
+        self.report_threads = set()
+        self.cleaned_up = False
+
+    def report(self, cycle_idx=None, new_walkers=None, **kwargs):
+
+        if cycle_idx == self.fail_cycle:
+            raise ValueError("Failed on purpose")
+
+        self.report_threads.add(threading.current_thread().name)
+        self.reports.append((cycle_idx,
+                             [walker.state['positions'] for walker in new_walkers]))
+
+    def cleanup(self, **kwargs):
+
+        self.cleaned_up = True
+
+class ClearingReporter(RecordingReporter):
+    """Empties the list of walkers of the reports it gets."""
+
+    def report(self, new_walkers=None, **kwargs):
+
+        super().report(new_walkers=new_walkers, **kwargs)
+        new_walkers.clear()
+
+def gen_manager(reporters, **kwargs):
+
+    init_walkers = [Walker(WalkerState(positions=np.zeros((1, 3)), time=0.0), 0.25)
+                    for _ in range(4)]
+
+    return Manager(init_walkers,
+                   runner=RandomWalkRunner(seed=0),
+                   resampler=NoResampler(),
+                   reporters=reporters,
+                   **kwargs)
+
+def test_background_reporters():
+    """Test that background reporters get the same reports as normal ones."""
+
+    sync_reporter = RecordingReporter()
+    background_reporter = RecordingReporter()
+    group_reporters = [RecordingReporter(), RecordingReporter()]
+
+    manager = gen_manager([sync_reporter, background_reporter] + group_reporters,
+                          background_reporters=[background_reporter, group_reporters],
+                          report_queue_size=2)
+
+    manager.run_simulation(5, 10)
+
+    assert sync_reporter.report_threads == {threading.main_thread().name}
+    assert threading.main_thread().name not in background_reporter.report_threads
+
+    for reporter in [background_reporter] + group_reporters:
+
+        assert reporter.cleaned_up
+        assert [cycle_idx for cycle_idx, _ in reporter.reports] == list(range(5))
+
+        for (_, positions), (_, sync_positions) in zip(reporter.reports,
+                                                       sync_reporter.reports):
+            assert np.array_equal(positions, sync_positions)
+
+    with pytest.raises(ValueError):
+        gen_manager([sync_reporter], background_reporters=[background_reporter])
+
+def test_background_reporter_error():
+    """Test that errors in background reporters are raised."""
+
+    reporter = RecordingReporter(fail_cycle=1)
+
+    manager = gen_manager([reporter], background_reporters=True)
+
+    with pytest.raises(ReporterError):
+        manager.run_simulation(4, 10)
+
+    # the reporters are still cleaned up
+    assert reporter.cleaned_up
+    assert [cycle_idx for cycle_idx, _ in reporter.reports] == [0]
+
+def test_background_reports_copied():
+    """Test that each background reporter gets its own report."""
+
+    clearing_reporter = ClearingReporter()
+    reporter = RecordingReporter()
+
+    manager = gen_manager([clearing_reporter, reporter], background_reporters=True)
+
+    manager.run_simulation(3, 10)
+
+    assert [len(positions) for _, positions in reporter.reports] == [4, 4, 4]
@@ -0,0 +1,172 @@
+import itertools as it
+
+import numpy as np
+import pytest
+
+from wepy.walker import Walker, WalkerState, split
+from wepy.resampling.distances.distance import Distance, XYEuclideanDistance, ImageCache
+from wepy.resampling.distances.randomwalk import RandomWalkDistance
+from wepy.resampling.distances.receptor import UnbindingDistance, RebindingDistance
+
+from wepy_tools.systems.lennard_jones import PairDistance
+
+N_STATES = 10
+
+def pairwise_matrix(distance, images):
+
+    dist_mat = np.zeros((len(images), len(images)))
+    for i, j in it.combinations(range(len(images)), 2):
+        dist = distance.image_distance(images[i], images[j])
+        dist_mat[i][j] = dist
+        dist_mat[j][i] = dist
+
+    return dist_mat
+
+def gen_xy_states(rng):
+    return [WalkerState(x=x, y=y) for x, y in rng.random((N_STATES, 2))]
+
+def gen_randomwalk_states(rng):
+    return [WalkerState(positions=pos) for pos in rng.integers(0, 10, size=(N_STATES, 5))]
+
+def gen_pair_states(rng):
+    return [WalkerState(positions=pos) for pos in rng.random((N_STATES, 2, 3))]
+
+N_ATOMS = 20
+LIG_IDXS = np.arange(3)
+BS_IDXS = np.arange(5, 15)
+BOX_VECTORS = np.diag([2.5, 2.5, 2.5])
+
+def gen_receptor_states(rng):
+
+    states = []
+    for i in range(N_STATES):
+        positions = rng.random((N_ATOMS, 3))
+
+        # put the ligand in a different periodic image in some states
+        if i % 3 == 0:
+            positions[LIG_IDXS] += np.array([2.5, 0., -2.5])
+
+        states.append(WalkerState(positions=positions, box_vectors=BOX_VECTORS))
+
+    return states
+
+def make_receptor_distance(distance_class, rng):
+
+    ref_state = WalkerState(positions=rng.random((N_ATOMS, 3)),
+                            box_vectors=BOX_VECTORS)
+
+    return distance_class(LIG_IDXS, BS_IDXS, ref_state)
+
+@pytest.mark.parametrize('distance_spec', [
+    (XYEuclideanDistance, gen_xy_states),
+    (RandomWalkDistance, gen_randomwalk_states),
+    (PairDistance, gen_pair_states),
+    (UnbindingDistance, gen_receptor_states),
+    (RebindingDistance, gen_receptor_states),
+])
+def test_batched_distance_matrix(distance_spec):
+
+    distance_class, gen_states = distance_spec
+
+    rng = np.random.default_rng(1)
+
+    if distance_class in (UnbindingDistance, RebindingDistance):
+        distance = make_receptor_distance(distance_class, rng)
+    else:
+        distance = distance_class()
+
+    states = gen_states(rng)
+
+    # the batched images should be the same as one at a time
+    images = distance.images(states)
+    for image, state in zip(images, states):
+        assert np.allclose(image, distance.image(state))
+
+    dist_mat = distance.image_distance_matrix(images)
+
+    assert dist_mat.shape == (N_STATES, N_STATES)
+    assert np.allclose(dist_mat, pairwise_matrix(distance, images))
+
+    # blocks of the matrix can be computed on their own
+    block = distance.image_distance_matrix(images[2:5], images[4:])
+
+    assert block.shape == (3, N_STATES - 4)
+    assert np.allclose(block, dist_mat[2:5, 4:])
+
+def test_default_distance_matrix():
+
+    # the abstract class falls back to the pairwise calls
+    class AbsDistance(Distance):
+
+        def image_distance(self, image_a, image_b):
+            return abs(image_a['x'] - image_b['x'])
+
+    distance = AbsDistance()
+    states = [WalkerState(x=x) for x in range(4)]
+
+    dist_mat = distance.image_distance_matrix(distance.images(states))
+
+    assert np.allclose(dist_mat,
+                       np.abs(np.arange(4)[:, np.newaxis] - np.arange(4)[np.newaxis, :]))
+
+    block = distance.image_distance_matrix(distance.images(states[:2]),
+                                           distance.images(states[1:]))
+
+    assert np.allclose(block, dist_mat[:2, 1:])
+
+def test_receptor_images_rotated():
+
+    rng = np.random.default_rng(2)
+
+    distance = make_receptor_distance(UnbindingDistance, rng)
+
+    # random rotations of the reference positions with some noise
+    ref_positions = rng.random((N_ATOMS, 3))
+    states = []
+    for i in range(N_STATES):
+        q, r = np.linalg.qr(rng.normal(size=(3, 3)))
+        rotation = q * np.sign(np.diag(r))
+        if np.linalg.det(rotation) < 0:
+            rotation[:, 0] *= -1
+
+        positions = np.dot(ref_positions, rotation) + 0.01 * rng.random((N_ATOMS, 3))
+        states.append(WalkerState(positions=positions, box_vectors=BOX_VECTORS * 4))
+
+    images = distance.images(states)
+
+    for image, state in zip(images, states):
+        assert np.allclose(image, distance.image(state))
+
+def test_image_cache():
+
+    class CountingDistance(XYEuclideanDistance):
+
+        def __init__(self):
+            self.n_imaged = 0
+
+        def images(self, states):
+            self.n_imaged += len(states)
+            return super().images(states)
+
+    distance = CountingDistance()
+    cache = ImageCache(distance)
+
+    walkers = [Walker(WalkerState(x=x, y=0.), 0.25) for x in range(2)]
+    walkers = split(walkers[0]) + walkers[1:]
+    states = [walker.state for walker in walkers]
+
+    # clones share the image of their state
+    images = cache.images(states)
+    assert distance.n_imaged == 2
+    assert images[0] is images[1]
+
+    cache.images(states)
+    assert distance.n_imaged == 2
+
+    # evicting states that were squashed
+    cache.retain(states[:1])
+    assert len(cache) == 1
+    assert states[0] in cache and states[2] not in cache
+
+    cache.images(states)
+    assert distance.n_imaged == 3
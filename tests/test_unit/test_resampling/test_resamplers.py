@@ -0,0 +1,158 @@
+import random as rand
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pytest
+
+from wepy.walker import Walker, WalkerState
+from wepy.resampling.distances.randomwalk import RandomWalkDistance
+from wepy.resampling.resamplers.revo import REVOResampler
+from wepy.resampling.resamplers.wexplore import WExploreResampler
+
+N_WALKERS = 20
+N_DIMS = 3
+
+def gen_walkers(rng):
+
+    weights = rng.random(N_WALKERS)
+    weights /= weights.sum()
+
+    return [Walker(WalkerState(positions=pos), weight)
+            for pos, weight in zip(rng.integers(0, 10, size=(N_WALKERS, N_DIMS)), weights)]
+
+def make_revo(**kwargs):
+
+    init_state = WalkerState(positions=np.zeros(N_DIMS))
+
+    return REVOResampler(distance=RandomWalkDistance(), init_state=init_state,
+                         merge_dist=2.5, char_dist=1.0, pmax=0.5, seed=1,
+                         **kwargs)
+
+def make_wexplore(**kwargs):
+
+    init_state = WalkerState(positions=np.zeros(N_DIMS))
+
+    return WExploreResampler(distance=RandomWalkDistance(), init_state=init_state,
+                             max_region_sizes=(2, 1, 0.5), max_n_regions=(4, 4, 4),
+                             pmax=0.5, **kwargs)
+
+@pytest.mark.parametrize('pool_type', ['thread', 'process'])
+def test_revo_distance_pool(pool_type):
+
+    walkers = gen_walkers(np.random.default_rng(3))
+
+    serial_mat, serial_images = make_revo()._all_to_all_distance(walkers)
+
+    resampler = make_revo(num_distance_workers=3, distance_pool_type=pool_type)
+    try:
+        pool_mat, pool_images = resampler._all_to_all_distance(walkers)
+    finally:
+        resampler.cleanup()
+
+    assert np.array_equal(np.array(serial_mat), np.array(pool_mat))
+    assert np.array_equal(serial_images, pool_images)
+
+def test_wexplore_distance_pool():
+
+    walkers = gen_walkers(np.random.default_rng(4))
+
+    serial_resampler = make_wexplore()
+    serial_assignments, serial_branches = serial_resampler.assign(walkers)
+
+    # an injected pool is not closed by the resampler
+    with ThreadPool(2) as pool:
+        pool_resampler = make_wexplore(distance_pool=pool)
+        pool_assignments, pool_branches = pool_resampler.assign(walkers)
+        pool_resampler.cleanup()
+
+        assert pool.map(abs, [-1]) == [1]
+
+    assert np.array_equal(serial_assignments, pool_assignments)
+    assert len(serial_branches) == len(pool_branches)
+
+def test_region_tree_assign_many():
+
+    rng = np.random.default_rng(5)
+
+    resampler = make_wexplore()
+    region_tree = resampler.region_tree
+    distance = region_tree.distance
+
+    # grow the tree
+    for i in range(3):
+        resampler.assign(gen_walkers(rng))
+
+    states = [walker.state for walker in gen_walkers(rng)]
+
+    for state, (assignment, dists) in zip(states, region_tree.assign_many(states)):
+
+        # descend the tree one image at a time
+        node = region_tree.ROOT_NODE
+        for level in range(region_tree.n_levels):
+
+            children = region_tree.children(node)
+            children_images = [region_tree.images[region_tree.node_attributes(child)['image_idx']]
+                               for child in children]
+            child_dists = [distance.image_distance(distance.image(state), image)
+                           for image in children_images]
+
+            assert assignment[level] == np.argmin(child_dists)
+            assert dists[level] == pytest.approx(min(child_dists))
+
+            node = children[assignment[level]]
+
+def test_region_tree_graph():
+
+    resampler = make_wexplore()
+    walkers = gen_walkers(np.random.default_rng(6))
+
+    assignments, _ = resampler.assign(walkers)
+
+    graph = resampler.region_tree.to_graph()
+
+    assert set(graph.nodes) == set(resampler.region_tree.nodes)
+    assert graph.nodes[()]['n_walkers'] == N_WALKERS
+
+    # the walkers in each leaf are the ones assigned to it
+    for leaf in resampler.region_tree.leaf_nodes():
+        assert graph.nodes[leaf]['walker_idxs'] == \
+            [walker_idx for walker_idx, assignment in enumerate(assignments)
+             if tuple(assignment) == leaf]
+
+        assert list(graph.successors(leaf[:-1])) == resampler.region_tree.children(leaf[:-1])
+
+@pytest.mark.parametrize('lattice', [True, False])
+def test_revo_incremental_optimizer(lattice):
+
+    rng = np.random.default_rng(7)
+
+    for trial in range(10):
+
+        n_walkers = int(rng.integers(2, 40))
+
+        # walkers on a lattice have many ties in their variations
+        if lattice:
+            positions = rng.integers(0, 4, size=(n_walkers, N_DIMS)).astype(float)
+        else:
+            positions = rng.random((n_walkers, N_DIMS)) * 5
+
+        distance_matrix = [row for row in
+                           np.abs(positions[:, np.newaxis] - positions[np.newaxis, :]).mean(axis=2)]
+
+        weights = rng.random(n_walkers) ** 4
+        weights = list(weights / weights.sum())
+
+        results = []
+        for optimizer in ('full', 'incremental'):
+
+            resampler = make_revo(optimizer=optimizer)
+            rand.seed(trial)
+
+            walker_actions, variation = resampler.decide(weights, [1 for i in range(n_walkers)],
+                                                         distance_matrix)
+
+            results.append(([(action['decision_id'], tuple(action['target_idxs']))
+                             for action in walker_actions],
+                            variation))
+
+        assert results[0] == results[1]
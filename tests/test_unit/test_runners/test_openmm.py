@@ -1,8 +1,15 @@
+import pickle
+
 import pytest
 
+import numpy as np
+
 from wepy.walker import Walker
 from wepy.runners.openmm import (
     OpenMMRunner,
+    OpenMMReplicaRunner,
+    SimulationCache,
+    replicate_system,
     gen_walker_state,
 )
 
@@ -90,3 +97,221 @@ def test_runtime_platform():
         2,
         platform=Ellipsis,
     )
+
+def test_reuse_simulation():
+    """Test that simulations are reused between segments when asked to
+    and rebuilt when the platform changes."""
+
+    test_sys = LennardJonesPair()
+    integrator = omm.LangevinIntegrator(
+        300.,
+        1,
+        0.002,
+    )
+
+    positions = test_sys.positions.value_in_unit(test_sys.positions.unit)
+
+    init_state = gen_walker_state(
+        positions,
+        test_sys.system,
+        integrator)
+
+    walker = Walker(
+        init_state,
+        1.0,
+    )
+
+    runner = OpenMMRunner(
+        test_sys.system,
+        test_sys.topology,
+        integrator,
+        platform="Reference",
+        reuse_simulation=True,
+    )
+
+    cache = SimulationCache()
+
+    new_walker = runner.run_segment(walker, 2, simulation_cache=cache)
+    simulation = cache.get(cache.key)
+    assert simulation is not None
+
+    # the same simulation is used from the new state
+    _ = runner.run_segment(new_walker, 2, simulation_cache=cache)
+    assert cache.get(cache.key) is simulation
+
+    # changing the platform builds a new one
+    _ = runner.run_segment(walker, 2, platform='CPU', simulation_cache=cache)
+    assert cache.key[1] == 'CPU'
+    assert cache.get(cache.key) is not simulation
+
+    # copies of the runner don't carry over simulations
+    _ = runner.run_segment(walker, 2)
+    assert runner._simulation_cache.key is not None
+    assert pickle.loads(pickle.dumps(runner))._simulation_cache.key is None
+
+def gen_charged_system():
+    """Make a small charged system with a switched cutoff and
+    exceptions."""
+
+    n_particles = 6
+
+    system = omm.System()
+    system.setDefaultPeriodicBoxVectors(omm.Vec3(4., 0., 0.),
+                                        omm.Vec3(0., 4., 0.),
+                                        omm.Vec3(0., 0., 4.))
+
+    force = omm.NonbondedForce()
+    force.setNonbondedMethod(omm.NonbondedForce.CutoffPeriodic)
+    force.setCutoffDistance(1.2)
+    force.setUseSwitchingFunction(True)
+    force.setSwitchingDistance(0.8)
+    force.setUseDispersionCorrection(False)
+
+    bonds = omm.HarmonicBondForce()
+
+    for particle_idx in range(n_particles):
+        system.addParticle(12.)
+        force.addParticle((-1) ** particle_idx * 0.5, 0.3, 0.5)
+
+    # a bonded pair with a scaled exception and a fully excluded one
+    bonds.addBond(0, 1, 0.15, 1000.)
+    force.addException(0, 1, -0.1, 0.3, 0.2)
+    force.addException(2, 3, 0.0, 0.3, 0.0)
+
+    system.addForce(force)
+    system.addForce(bonds)
+
+    # pairs at distances in the switching region and past the cutoff
+    positions = np.array([[0., 0., 0.],
+                          [0.16, 0., 0.],
+                          [1.05, 0., 0.],
+                          [1.05, 0.9, 0.],
+                          [0., 1.0, 0.2],
+                          [0., 0., 1.5]])
+
+    return system, positions
+
+def test_replica_runner():
+    """Test that walkers run together as replicas get states for a
+    single copy of the system."""
+
+    test_sys = LennardJonesPair()
+    integrator = omm.LangevinIntegrator(
+        300.,
+        1,
+        0.002,
+    )
+
+    positions = test_sys.positions.value_in_unit(test_sys.positions.unit)
+
+    init_state = gen_walker_state(
+        positions,
+        test_sys.system,
+        integrator)
+
+    # the replicated system has the energy of each copy
+    n_replicas = 3
+    replicated = replicate_system(test_sys.system, n_replicas)
+    assert replicated.getNumParticles() == n_replicas * test_sys.system.getNumParticles()
+
+    context = omm.Context(replicated, omm.VerletIntegrator(0.001),
+                          omm.Platform.getPlatformByName('Reference'))
+    context.setPositions(np.concatenate([positions for _ in range(n_replicas)]))
+    energy = context.getState(getEnergy=True).getPotentialEnergy()
+
+    assert energy.value_in_unit(energy.unit) == pytest.approx(
+        n_replicas * init_state['potential_energy'][0])
+
+    # the same for a charged system with a switched cutoff and
+    # exceptions, including the forces
+    charged_system, charged_positions = gen_charged_system()
+
+    context = omm.Context(charged_system, omm.VerletIntegrator(0.001),
+                          omm.Platform.getPlatformByName('Reference'))
+    context.setPositions(charged_positions)
+    single_state = context.getState(getEnergy=True, getForces=True)
+
+    context = omm.Context(replicate_system(charged_system, n_replicas),
+                          omm.VerletIntegrator(0.001),
+                          omm.Platform.getPlatformByName('Reference'))
+    context.setPositions(np.concatenate([charged_positions for _ in range(n_replicas)]))
+    replicated_state = context.getState(getEnergy=True, getForces=True)
+
+    assert replicated_state.getPotentialEnergy()._value == pytest.approx(
+        n_replicas * single_state.getPotentialEnergy()._value)
+
+    assert np.allclose(
+        replicated_state.getForces(asNumpy=True)._value,
+        np.concatenate([single_state.getForces(asNumpy=True)._value
+                        for _ in range(n_replicas)]))
+
+    runner = OpenMMReplicaRunner(
+        test_sys.system,
+        test_sys.topology,
+        integrator,
+        platform="Reference",
+        max_replicas=2,
+    )
+
+    walkers = [Walker(init_state, 0.2) for _ in range(5)]
+
+    new_walkers = runner.run_segments(walkers, [2, 2, 2, 2, 4])
+
+    assert len(new_walkers) == 5
+    assert len(runner._last_cycle_segments_split_times) == 5
+
+    for walker, n_steps in zip(new_walkers, [2, 2, 2, 2, 4]):
+        assert walker.weight == 0.2
+        assert walker.state['positions'].shape == positions.shape
+        assert walker.state['time'][0] == pytest.approx(n_steps * 0.002)
+
+def test_state_pickle():
+    """Test that the arrays of states are pickled out-of-band and the
+    State is made again the same."""
+
+    test_sys = LennardJonesPair()
+    integrator = omm.LangevinIntegrator(
+        300.,
+        1,
+        0.002,
+    )
+
+    # a system with a global parameter
+    system = omm.XmlSerializer.clone(test_sys.system)
+    force = omm.CustomExternalForce('k*x^2')
+    force.addGlobalParameter('k', 0.5)
+    for particle_idx in range(system.getNumParticles()):
+        force.addParticle(particle_idx, [])
+    system.addForce(force)
+
+    positions = test_sys.positions.value_in_unit(test_sys.positions.unit)
+
+    init_state = gen_walker_state(
+        positions,
+        system,
+        integrator)
+
+    buffers = []
+    data = pickle.dumps(init_state, protocol=5, buffer_callback=buffers.append)
+
+    # the positions, velocities, forces and box vectors
+    assert len(buffers) == 4
+
+    state = pickle.loads(data, buffers=buffers)
+
+    for key in ('positions', 'velocities', 'forces', 'box_vectors', 'box_volume',
+                'kinetic_energy', 'potential_energy', 'time', 'parameters/k'):
+        assert np.array_equal(state[key], init_state[key])
+
+    assert (omm.XmlSerializer.serialize(state.sim_state) ==
+            omm.XmlSerializer.serialize(init_state.sim_state))
+
+    runner = OpenMMRunner(
+        system,
+        test_sys.topology,
+        integrator,
+        platform="Reference",
+    )
+
+    new_walker = runner.run_segment(Walker(state, 1.0), 2)
+    assert new_walker.state['time'][0] == pytest.approx(2 * 0.002)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from wepy.walker import Walker, WalkerState
+from wepy.runners import randomwalk
+from wepy.runners.randomwalk import RandomWalkRunner
+
+def test_walk_ensemble(monkeypatch):
+    """Test that the ensemble random walk matches stepping through the
+    same moves one at a time."""
+
+    n_walkers = 50
+    dimension = 3
+    n_steps = 12
+
+    init_positions = np.random.default_rng(0).integers(
+        0, 3, (n_walkers, dimension)).astype(float)
+
+    runner = RandomWalkRunner(probability=0.25, seed=1)
+    positions = runner._walk_ensemble(init_positions, n_steps)
+
+    # the same moves from the generator stepped through one by one
+    rng = np.random.default_rng(1)
+    ref_positions = init_positions.copy()
+    for _ in range(n_steps):
+        moves = np.where(rng.random((1, n_walkers, dimension)) < 0.25, 1, -1)[0]
+        ref_positions = np.maximum(ref_positions + moves, 0)
+
+    assert np.array_equal(positions, ref_positions)
+
+    # generating the moves in chunks doesn't change anything
+    monkeypatch.setattr(randomwalk, 'ENSEMBLE_CHUNK_SIZE', 1)
+    chunked_runner = RandomWalkRunner(probability=0.25, seed=1)
+
+    assert np.array_equal(chunked_runner._walk_ensemble(init_positions, n_steps),
+                          positions)
+
+def test_run_segments():
+
+    runner = RandomWalkRunner(seed=2)
+
+    walkers = [Walker(WalkerState(positions=np.zeros((1, 4)), time=0.0), 0.25)
+               for _ in range(4)]
+
+    new_walkers = runner.run_segments(walkers, [5, 5, 0, 5])
+
+    assert [walker.weight for walker in new_walkers] == [0.25 for _ in range(4)]
+    assert all(walker.state['positions'].shape == (1, 4) for walker in new_walkers)
+    assert np.all(new_walkers[2].state['positions'] == 0)
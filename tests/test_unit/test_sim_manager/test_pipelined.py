@@ -0,0 +1,120 @@
+import random as rand
+import time
+
+import numpy as np
+import pytest
+
+from wepy.walker import Walker, WalkerState
+from wepy.runners.runner import Runner
+from wepy.boundary_conditions.receptor import ReceptorBC
+from wepy.resampling.distances.randomwalk import RandomWalkDistance
+from wepy.resampling.resamplers.revo import REVOResampler
+from wepy.resampling.resamplers.wexplore import WExploreResampler
+from wepy.reporter.reporter import Reporter
+from wepy.work_mapper.mapper import WorkerMapper
+from wepy.work_mapper.worker import Worker
+from wepy.work_mapper.task_mapper import TaskMapper, WalkerTaskProcess
+from wepy.sim_manager import Manager
+
+N_WALKERS = 8
+N_DIMS = 2
+N_CYCLES = 6
+
+class SeededStepRunner(Runner):
+    """Moves walkers by a step that only depends on the cycle and walker
+    index, so the results don't depend on which worker runs them."""
+
+    def run_segment(self, walker, segment_length, cycle_idx=None, walker_idx=None,
+                    **kwargs):
+
+        # the later walkers finish first so they are out of order
+        time.sleep(0.01 * (N_WALKERS - walker_idx))
+
+        rng = np.random.default_rng([cycle_idx, walker_idx])
+        positions = walker.state['positions'] + rng.normal(size=N_DIMS)
+
+        return Walker(WalkerState(positions=positions), walker.weight)
+
+class DistanceBC(ReceptorBC):
+    """Warps walkers further than a distance from the origin."""
+
+    PROGRESS_FIELDS = ('distance',)
+
+    def _progress(self, walker):
+
+        distance = np.linalg.norm(walker.state['positions'])
+
+        return distance > 2.5, {'distance' : distance}
+
+class RecordsReporter(Reporter):
+    """Keeps the records and walkers of each cycle."""
+
+    def __init__(self):
+
+        self.reports = []
+
+    def report(self, new_walkers=None, warp_data=None, bc_data=None,
+               progress_data=None, resampling_data=None, resampled_walkers=None,
+               **kwargs):
+
+        self.reports.append({
+            'new_walkers' : [(walker.state['positions'], walker.weight)
+                             for walker in new_walkers],
+            'warp_data' : warp_data,
+            'bc_data' : bc_data,
+            'progress_data' : dict(progress_data),
+            'resampling_data' : resampling_data,
+            'resampled_walkers' : [(walker.state['positions'], walker.weight)
+                                   for walker in resampled_walkers],
+        })
+
+def run_records(resampler_type, mapper_type, pipelined):
+
+    # the warping and resamplers use the global random generators
+    rand.seed(0)
+    np.random.seed(0)
+
+    init_state = WalkerState(positions=np.zeros(N_DIMS))
+
+    if resampler_type == 'REVO':
+        resampler = REVOResampler(distance=RandomWalkDistance(), init_state=init_state,
+                                  merge_dist=2.5, char_dist=1.0, pmax=0.5, seed=1)
+    else:
+        resampler = WExploreResampler(distance=RandomWalkDistance(), init_state=init_state,
+                                      max_region_sizes=(2, 1, 0.5), max_n_regions=(4, 4, 4),
+                                      pmax=0.5)
+
+    if mapper_type == 'WorkerMapper':
+        work_mapper = WorkerMapper(num_workers=3, worker_type=Worker)
+    else:
+        work_mapper = TaskMapper(num_workers=3, walker_task_type=WalkerTaskProcess)
+
+    bc = DistanceBC(initial_states=[init_state], ligand_idxs=[0], receptor_idxs=[0])
+
+    reporter = RecordsReporter()
+
+    manager = Manager([Walker(init_state, 1 / N_WALKERS) for _ in range(N_WALKERS)],
+                      runner=SeededStepRunner(),
+                      resampler=resampler,
+                      boundary_conditions=bc,
+                      work_mapper=work_mapper,
+                      reporters=[reporter],
+                      pipelined=pipelined)
+
+    manager.run_simulation(N_CYCLES, 10)
+
+    return reporter.reports
+
+@pytest.mark.parametrize('resampler_type', ['REVO', 'WExplore'])
+@pytest.mark.parametrize('mapper_type', ['WorkerMapper', 'TaskMapper'])
+def test_pipelined_same_records(resampler_type, mapper_type):
+    """Test that pipelined cycles give the same walkers and records as
+    normal ones when the segments finish out of order."""
+
+    records = run_records(resampler_type, mapper_type, False)
+    pipelined_records = run_records(resampler_type, mapper_type, True)
+
+    # make sure the boundary conditions did something
+    assert any(len(cycle_records['warp_data']) > 0 for cycle_records in records)
+
+    np.testing.assert_equal(pipelined_records, records)
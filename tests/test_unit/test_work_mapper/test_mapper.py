@@ -2,13 +2,29 @@ import multiprocessing as mp
 import logging
 from copy import deepcopy
 import time
+import asyncio
+import os
+import sys
+import signal
+import subprocess
+import pickle
+import threading
 
 import pytest
+import numpy as np
 
 from wepy.walker import Walker, WalkerState
+from wepy.runners.runner import NoRunner
 from wepy.work_mapper.mapper import Mapper, TaskException
 from wepy.work_mapper.worker import Worker, WorkerMapper, WorkerException
-from wepy.work_mapper.task_mapper import TaskMapper, WalkerTaskProcess, TaskProcessException
+from wepy.work_mapper.mapper import WorkerKilledError
+from wepy.work_mapper.task_mapper import (
+    TaskMapper, PoolTaskMapper, WalkerTaskProcess, TaskProcessException,
+)
+from wepy.work_mapper.scheduler import LongestTaskFirstScheduler
+from wepy.work_mapper.async_mapper import AsyncMapper
+from wepy.work_mapper.distributed import DistributedMapper
+from wepy.work_mapper.transport import SharedBlocks
 
 ARGS = (0,1,2)
 
@@ -28,6 +44,59 @@ def task_pass(walker):
 
 TASK_PASS_ANSWER = [n + 1 for n in ARGS]
 
+async def async_task_pass(walker):
+
+    await asyncio.sleep(0.01 * (len(ARGS) - walker.state['num']))
+    return task_pass(walker)
+
+async def async_task_timed(walker):
+
+    await asyncio.sleep(0.1 * (walker.state['num'] + 1))
+    n = walker.state['num']
+    return Walker(WalkerState(**{'num' : n+1, 'end' : time.time()}), walker.weight)
+
+def task_sleep(walker):
+
+    # larger walkers take longer
+    time.sleep(0.1 * walker.state['num'])
+    return task_pass(walker)
+
+def task_sleep_state(walker):
+
+    time.sleep(walker.state['sleep'])
+    return task_pass(walker)
+
+def start_worker_daemons(mapper, n_daemons, heartbeat_interval=0.1):
+    """Run worker daemons for a DistributedMapper with the command line
+    interface."""
+
+    host, port = mapper.address
+
+    # the daemons are separate programs so they need the same path to
+    # import the segment function
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+
+    return [subprocess.Popen([sys.executable, '-m', 'wepy.work_mapper.cli',
+                              '--authkey', 'test',
+                              '--heartbeat-interval', str(heartbeat_interval),
+                              host, str(port)],
+                             env=env)
+            for _ in range(n_daemons)]
+
+def kill_worker_daemons(daemons):
+
+    for daemon in daemons:
+        if daemon.poll() is None:
+            daemon.kill()
+            daemon.wait()
+
+def task_positions(walker):
+
+    positions = walker.state['positions'] + 1
+    return Walker(WalkerState(num=walker.state['num'] + 1,
+                              positions=np.concatenate([positions, positions])),
+                  walker.weight)
+
 class TestWorkMappers():
 
 
@@ -76,6 +145,293 @@ class TestWorkMappers():
 
         time.sleep(1)
 
+    @pytest.mark.parametrize('max_tasks_per_process', [None, 1])
+    def test_pool_task_mapper(self, max_tasks_per_process):
+
+        mapper = PoolTaskMapper(segment_func=task_pass,
+                                num_workers=2,
+                                walker_task_type=WalkerTaskProcess,
+                                max_tasks_per_process=max_tasks_per_process)
+
+        mapper.init()
+
+        # the processes are reused or replaced between cycles
+        for _ in range(3):
+
+            results = mapper.map(gen_walkers())
+
+            assert all([res.state['num'] == TASK_PASS_ANSWER[i]
+                        for i, res in enumerate(results)])
+
+        mapper.cleanup()
+
+    @pytest.mark.parametrize('mapper', [
+        Mapper(segment_func=task_pass),
+        WorkerMapper(segment_func=task_pass, num_workers=3, worker_type=Worker),
+        TaskMapper(segment_func=task_pass, num_workers=3, walker_task_type=WalkerTaskProcess),
+        PoolTaskMapper(segment_func=task_pass, num_workers=3, walker_task_type=WalkerTaskProcess),
+        AsyncMapper(segment_func=task_pass, num_workers=3),
+        AsyncMapper(segment_func=async_task_pass, num_workers=3),
+    ])
+    def test_map_as_completed(self, mapper):
+
+        mapper.init()
+
+        results = dict(mapper.map_as_completed(gen_walkers()))
+
+        assert sorted(results.keys()) == list(range(len(ARGS)))
+        assert all([results[i].state['num'] == TASK_PASS_ANSWER[i]
+                    for i in range(len(ARGS))])
+
+        mapper.cleanup()
+
+    @pytest.mark.parametrize('segment_func', [task_pass, async_task_pass])
+    def test_async_mapper(self, segment_func):
+
+        mapper = AsyncMapper(segment_func=segment_func, num_workers=2)
+
+        mapper.init()
+
+        for _ in range(2):
+
+            results = mapper.map(gen_walkers())
+
+            assert all([res.state['num'] == TASK_PASS_ANSWER[i]
+                        for i, res in enumerate(results)])
+
+            assert sum(len(times) for times in mapper.worker_segment_times.values()) == \
+                len(ARGS)
+
+        mapper.cleanup()
+
+    def test_async_mapper_runs_while_suspended(self):
+
+        mapper = AsyncMapper(segment_func=async_task_timed, num_workers=3)
+
+        mapper.init()
+
+        results = mapper.map_as_completed(gen_walkers())
+
+        # the first task is done, the others should finish while we
+        # are away from the generator
+        next(results)
+        time.sleep(0.5)
+        resume_time = time.time()
+
+        assert all([result.state['end'] < resume_time
+                    for task_idx, result in results])
+
+        mapper.cleanup()
+
+    @pytest.mark.parametrize('mapper_type, worker_kwargs', [
+        (WorkerMapper, {'worker_type' : Worker}),
+        (PoolTaskMapper, {'walker_task_type' : WalkerTaskProcess}),
+    ])
+    def test_longest_task_first(self, mapper_type, worker_kwargs):
+
+        mapper = mapper_type(segment_func=task_sleep,
+                             num_workers=2,
+                             scheduler=LongestTaskFirstScheduler(),
+                             **worker_kwargs)
+
+        mapper.init()
+
+        for _ in range(2):
+
+            results = mapper.map(gen_walkers())
+
+            assert all([res.state['num'] == TASK_PASS_ANSWER[i]
+                        for i, res in enumerate(results)])
+
+            assert sorted(record['task_idx'] for record in mapper.scheduling_data) == \
+                list(range(len(ARGS)))
+            assert all(record['task_time'] is not None for record in mapper.scheduling_data)
+
+        # the longest walkers are dispatched first the second time
+        assert [record['task_idx'] for record in mapper.scheduling_data] == [2, 1, 0]
+
+        mapper.cleanup()
+
+    def test_distributed_mapper(self):
+
+        # the daemons are separate programs so the segment function
+        # must be importable
+        mapper = DistributedMapper(segment_func=NoRunner().run_segment,
+                                   num_workers=3,
+                                   authkey='test',
+                                   heartbeat_timeout=2.,
+                                   connect_timeout=60.)
+
+        mapper.init()
+
+        daemons = start_worker_daemons(mapper, 3)
+
+        try:
+
+            assert all(daemon.poll() is None for daemon in daemons)
+
+            walkers = gen_walkers()
+            segment_lengths = [10 for _ in walkers]
+
+            results = mapper.map(walkers, segment_lengths)
+
+            assert [res.state['num'] for res in results] == list(ARGS)
+
+            # the other daemons take over when one dies
+            os.kill(daemons[0].pid, signal.SIGKILL)
+
+            results = mapper.map(walkers, segment_lengths)
+
+            assert [res.state['num'] for res in results] == list(ARGS)
+
+            assert len(mapper.workers) == 2
+
+            mapper.cleanup()
+
+            # the rest are stopped by the mapper
+            for daemon in daemons[1:]:
+                assert daemon.wait(timeout=10) == 0
+
+        finally:
+            kill_worker_daemons(daemons)
+
+    def test_distributed_mapper_stopped_daemon(self, caplog):
+
+        mapper = DistributedMapper(segment_func=task_sleep_state,
+                                   num_workers=2,
+                                   authkey='test',
+                                   heartbeat_timeout=1.,
+                                   connect_timeout=60.)
+
+        mapper.init()
+
+        daemons = start_worker_daemons(mapper, 2)
+
+        try:
+
+            assert all(daemon.poll() is None for daemon in daemons)
+
+            # wait for both daemons to connect with quick tasks
+            deadline = time.time() + 60.
+            while len(mapper.workers) < 2:
+
+                assert time.time() < deadline
+
+                mapper.map([Walker(WalkerState(num=arg, sleep=0.), 1/len(ARGS))
+                            for arg in ARGS])
+
+            walkers = [Walker(WalkerState(num=arg, sleep=2.), 1/len(ARGS))
+                       for arg in ARGS]
+
+            # stop a daemon while both are running tasks so it stops
+            # sending heartbeats without the connection being lost
+            stopper = threading.Timer(0.5, os.kill, (daemons[0].pid, signal.SIGSTOP))
+            stopper.start()
+
+            with caplog.at_level(logging.ERROR):
+                results = mapper.map(walkers)
+
+            stopper.join()
+
+            assert [res.state['num'] for res in results] == TASK_PASS_ANSWER
+
+            assert any("No heartbeat from" in record.getMessage()
+                       for record in caplog.records)
+            assert any("again" in record.getMessage()
+                       for record in caplog.records)
+
+            assert len(mapper.workers) == 1
+
+            mapper.cleanup()
+
+        finally:
+            kill_worker_daemons(daemons)
+
+    def test_distributed_mapper_unsupported(self, monkeypatch):
+
+        # as for python versions older than 3.8
+        monkeypatch.setattr(pickle, 'HIGHEST_PROTOCOL', 4)
+
+        with pytest.raises(RuntimeError):
+            DistributedMapper(segment_func=task_pass, authkey='test')
+
+    def test_distributed_mapper_connect_timeout(self):
+
+        mapper = DistributedMapper(segment_func=task_pass,
+                                   num_workers=1,
+                                   authkey='test',
+                                   connect_timeout=0.5)
+
+        mapper.init()
+
+        with pytest.raises(TimeoutError):
+            mapper.map(gen_walkers())
+
+        mapper.cleanup()
+
+    def test_worker_mapper_shared_memory(self):
+
+        mapper = WorkerMapper(segment_func=task_positions,
+                              num_workers=3,
+                              worker_type=Worker,
+                              shared_memory=True)
+
+        mapper.init()
+
+        # the positions grow so the result blocks have to be grown
+        for n_atoms in (10, 10, 1000):
+
+            walkers = [Walker(WalkerState(num=arg, positions=np.full((n_atoms, 3), float(arg))),
+                              1/len(ARGS))
+                       for arg in ARGS]
+
+            results = mapper.map(walkers)
+
+            for arg, res in zip(ARGS, results):
+                assert res.state['num'] == arg + 1
+                assert np.array_equal(res.state['positions'],
+                                      np.full((2 * n_atoms, 3), arg + 1.))
+
+        mapper.cleanup()
+
+    def test_worker_mapper_shared_memory_unsupported(self, monkeypatch):
+
+        # as for python versions older than 3.8
+        monkeypatch.setattr(pickle, 'HIGHEST_PROTOCOL', 4)
+
+        with pytest.raises(RuntimeError):
+            WorkerMapper(segment_func=task_positions,
+                         num_workers=3,
+                         worker_type=Worker,
+                         shared_memory=True)
+
+    def test_worker_closes_replaced_blocks(self):
+
+        # don't keep the SIGTERM handler of the worker in this process
+        handler = signal.getsignal(signal.SIGTERM)
+        try:
+            worker = Worker(0, None, None, None, None)
+        finally:
+            signal.signal(signal.SIGTERM, handler)
+
+        blocks = SharedBlocks()
+
+        old_block = worker._attach_shared_block(
+            ('task', 0), blocks.reserve(('task', 0), 10).name)
+
+        # the same block is reused while the mapper keeps it
+        assert worker._attach_shared_block(('task', 0), old_block.name) is old_block
+
+        # the mapper replaces it with a bigger one
+        new_block = worker._attach_shared_block(
+            ('task', 0), blocks.reserve(('task', 0), 1000).name)
+
+        assert new_block.size >= 1000
+        assert old_block.buf is None
+
+        new_block.close()
+        blocks.close()
+
 # test that task failures are passed up properly
 def task_fail(walker):
 
@@ -127,3 +483,65 @@ class TestTaskFail():
             results = mapper.map(gen_walkers())
 
         mapper.cleanup()
+
+    def test_async_mapper(self):
+
+        mapper = AsyncMapper(segment_func=task_fail, num_workers=3)
+
+        mapper.init()
+
+        with pytest.raises(TaskException) as task_exc_info:
+            results = mapper.map(gen_walkers())
+
+        mapper.cleanup()
+
+    def test_pool_task_mapper(self):
+
+        mapper = PoolTaskMapper(segment_func=task_fail,
+                                num_workers=3,
+                                walker_task_type=WalkerTaskProcess)
+
+        mapper.init()
+
+        with pytest.raises(TaskException) as task_exc_info:
+            results = mapper.map(gen_walkers())
+
+        # the failed processes are replaced for the next cycle
+        results = mapper.map([walker for walker in gen_walkers()
+                              if walker.state['num'] != 1])
+
+        assert [res.state['num'] for res in results] == [1, 3]
+
+        mapper.cleanup()
+
+
+# test that a worker killed by the OS is noticed
+def task_kill(walker):
+
+    n = walker.state['num']
+    if n == 1:
+        os.kill(os.getpid(), signal.SIGKILL)
+    else:
+        return task_pass(walker)
+
+class TestTaskKilled():
+
+    def test_worker_mapper(self):
+
+        mapper = WorkerMapper(segment_func=task_kill,
+                              num_workers=3,
+                              worker_type=Worker)
+
+        mapper.init()
+
+        with pytest.raises(WorkerKilledError) as killed_info:
+            results = mapper.map(gen_walkers())
+
+        assert "exit code {}".format(-signal.SIGKILL) in str(killed_info.value)
+
+        # the other workers are shut down as well
+        for worker in mapper._workers:
+            worker.join(5)
+            assert not worker.is_alive()
+
+        mapper.cleanup()
@@ -0,0 +1,54 @@
+import pytest
+
+from wepy.work_mapper.scheduler import (
+    TaskScheduler, LongestTaskFirstScheduler, straggler_time,
+)
+
+def run_mapping(scheduler, task_times, worker_idxs):
+
+    order = scheduler.order(len(task_times))
+
+    for task_idx in order:
+        scheduler.record(task_idx, worker_idxs[task_idx], task_times[task_idx])
+
+    return order
+
+def test_task_scheduler():
+
+    scheduler = TaskScheduler()
+
+    assert run_mapping(scheduler, [1., 3., 2.], [0, 1, 0]) == [0, 1, 2]
+    assert run_mapping(scheduler, [1., 3., 2.], [0, 1, 0]) == [0, 1, 2]
+
+    assert [record['expected_time'] for record in scheduler.scheduling_records] == \
+        [None, None, None]
+    assert straggler_time(scheduler.scheduling_records) == 0.
+
+def test_longest_task_first_scheduler():
+
+    scheduler = LongestTaskFirstScheduler(worker_speeds={1 : 2.}, smoothing=1.)
+
+    # nothing is known yet so the given order is kept
+    assert run_mapping(scheduler, [1., 2., 2.], [0, 1, 0]) == [0, 1, 2]
+
+    # task 1 ran on a worker twice as fast so it is the longest
+    assert run_mapping(scheduler, [1., 2., 2.], [0, 0, 0]) == [1, 2, 0]
+
+    assert [record['task_idx'] for record in scheduler.scheduling_records] == [1, 2, 0]
+    assert [record['expected_time'] for record in scheduler.scheduling_records] == \
+        [4., 2., 1.]
+    assert [record['task_time'] for record in scheduler.scheduling_records] == \
+        [2., 2., 1.]
+
+    # a new task is expected to take the mean time
+    assert scheduler.order(4) == [1, 2, 3, 0]
+    assert scheduler.scheduling_records[2]['expected_time'] == pytest.approx(5/3)
+
+def test_straggler_time():
+
+    records = [{'worker_idx' : 0, 'task_time' : 3.},
+               {'worker_idx' : 1, 'task_time' : 1.},
+               {'worker_idx' : 1, 'task_time' : 1.}]
+
+    assert straggler_time(records) == 0.5
+    assert straggler_time([]) is None